@@ -12,10 +12,16 @@ from flask import (Blueprint, Flask, Response, abort, jsonify, redirect,
                    request, send_from_directory, session)
 from flask_cors import CORS
 from prometheus_flask_exporter import PrometheusMetrics
+from sentry_sdk.integrations.flask import FlaskIntegration
+from sentry_sdk.integrations.redis import RedisIntegration
 from werkzeug.wrappers.response import Response as BaseResponse
 
 from lib.dummy_data import DUMMY_CONVERSATIONS
 from lib.event_handlers import register_event_handlers
+from lib.infra import instrumentation, request_services
+from lib.infra.async_runtime import AsyncServingMiddleware, SharedLoopFlask
+from lib.infra.json_provider import SurrealJSONProvider
+from lib.infra.request_services import get_service
 from lib.routes.administration import (get_administrators_route,
                                        get_clinics_route,
                                        get_organizations_route,
@@ -28,11 +34,13 @@ from lib.routes.appointments import (cancel_appointment_route,
                                      get_appointment_types_route,
                                      get_appointments_route,
                                      get_available_slots_route,
+                                     get_first_available_slot_route,
                                      update_appointment_route)
 from lib.routes.auth import auth_logout_route, cognito_login_route
 from lib.routes.chat import (create_conversation_route,
                              get_conversation_messages_route,
                              get_user_conversations_route, send_message_route)
+from lib.routes.clinics import clinics_bp
 from lib.routes.llm_agent import llm_agent_endpoint_route
 from lib.routes.api_keys import (create_api_key_route, deactivate_api_key_route,
                                  delete_api_key_route, get_api_key_usage_route,
@@ -79,12 +87,15 @@ from lib.services.lab_results import (LabResultsService,
                                       differential_hematology,
                                       general_chemistry, hematology,
                                       serum_proteins)
-from lib.services.notifications import publish_event_with_buffer
+from lib.services.notifications import (decode_live_message, event_channel,
+                                        format_sse, publish_event_with_buffer,
+                                        replay_events, replay_start_id)
 from lib.services.redis_client import get_redis_connection
+from lib.services.sse_gateway import SSEGateway
 from lib.services.user_service import UserNotAffiliatedError, UserService
 from settings import (APP_URL, CLIENT_ID, COGNITO_DOMAIN, DEBUG,
                       FLASK_SECRET_KEY, HOST, PORT, REDIRECT_URI, SENTRY_DSN,
-                      logger)
+                      SSE_HEARTBEAT_SECONDS, logger)
 
 #from flask_jwt_extended import jwt_required, get_jwt_identity
 
@@ -94,9 +105,15 @@ sentry_sdk.init(
     # Add data like request headers and IP for users,
     # see https://docs.sentry.io/platforms/python/data-management/data-collected/ for more info
     send_default_pii=True,
+    # Auto-enabling imports every supported library that is installed (openai alone takes ~0.4 s); list ours instead.
+    auto_enabling_integrations=False,
+    integrations=[FlaskIntegration(), RedisIntegration()],
 )
 
-app = Flask(__name__)
+app = SharedLoopFlask(__name__)
+app.json = SurrealJSONProvider(app)
+request_services.init_app(app)
+instrumentation.init_app(app)
 CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000", "http://localhost:3012", "http://127.0.0.1:3012", "https://demo.arsmedicatech.com"], "supports_credentials": True, "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"], "allow_headers": ["Content-Type", "Authorization"]}})
 
 app.secret_key = FLASK_SECRET_KEY
@@ -166,51 +183,51 @@ def stream_events() -> Tuple[Response, int]:
     Server-Sent Events (SSE) endpoint to stream events to the client.
     :return: Response object with the event stream.
     """
-    logger.debug(f"SSE endpoint called - Method: {request.method}")
-    logger.debug(f"SSE endpoint - Origin: {request.headers.get('Origin')}")
-    logger.debug(f"SSE endpoint - Headers: {dict(request.headers)}")
-    logger.debug(f"SSE endpoint - Session: {dict(session)}")
-    logger.debug(f"SSE endpoint - Session cookie: {request.cookies.get('session')}")
-    logger.debug(f"SSE endpoint - All cookies: {dict(request.cookies)}")
-    logger.debug(f"SSE endpoint - Request URL: {request.url}")
-    logger.debug(f"SSE endpoint - Request args: {dict(request.args)}")
+    logger.debug("SSE endpoint called - Method: %s", request.method)
+    logger.debug("SSE endpoint - Origin: %s", request.headers.get('Origin'))
+    logger.debug(lambda: f"SSE endpoint - Headers: {dict(request.headers)}")
+    logger.debug(lambda: f"SSE endpoint - Session: {dict(session)}")
+    logger.debug("SSE endpoint - Session cookie: %s", request.cookies.get('session'))
+    logger.debug(lambda: f"SSE endpoint - All cookies: {dict(request.cookies)}")
+    logger.debug("SSE endpoint - Request URL: %s", request.url)
+    logger.debug(lambda: f"SSE endpoint - Request args: {dict(request.args)}")
     
     # Handle preflight OPTIONS request
     if request.method == 'OPTIONS':
         logger.debug("SSE endpoint - Handling OPTIONS preflight request")
         response = Response()
         origin = request.headers.get('Origin')
-        logger.debug(f"OPTIONS Origin: {origin}")
+        logger.debug("OPTIONS Origin: %s", origin)
         # Always allow the origin for SSE
         response.headers['Access-Control-Allow-Origin'] = origin or '*'
-        logger.debug(f"Setting Access-Control-Allow-Origin to: {origin or '*'}")
+        logger.debug("Setting Access-Control-Allow-Origin to: %s", origin or '*')
         response.headers['Access-Control-Allow-Credentials'] = 'false'
         response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, Accept, Cache-Control'
         response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
         response.headers['Access-Control-Max-Age'] = '86400'
-        logger.debug(f"OPTIONS response headers: {dict(response.headers)}")
+        logger.debug(lambda: f"OPTIONS response headers: {dict(response.headers)}")
         logger.debug("SSE endpoint - Returning OPTIONS response")
         return response
 
     user_id = session.get('user_id')
-    logger.debug(f"SSE endpoint - user_id from session: {user_id}")
+    logger.debug("SSE endpoint - user_id from session: %s", user_id)
 
     # For testing, also try to get user_id from query parameter
     if not user_id:
         user_id = request.args.get('user_id')
-        logger.debug(f"SSE endpoint - user_id from query param: {user_id}")
+        logger.debug("SSE endpoint - user_id from query param: %s", user_id)
 
     if not user_id:
         logger.debug("SSE endpoint - No user_id in session or query param, returning 401")
         return Response("Unauthorized", status=401, mimetype="text/plain")
 
+    # In production this path is served by SSEGateway on the event loop; this route covers the dev server.
     redis = get_redis_connection()
     pubsub = redis.pubsub()
-    pubsub.subscribe(f"user:{user_id}")
+    pubsub.subscribe(event_channel(user_id))
 
-    # Optionally: get last known timestamp or event ID
-    # For simplicity, we assume the frontend sends ?since=timestamp
-    since = request.args.get('since')
+    start_id = replay_start_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'),
+                               request.args.get('since'))
 
     def event_stream() -> str:
         """
@@ -218,20 +235,20 @@ def stream_events() -> Tuple[Response, int]:
         :return: Yields event data as a string in SSE format.
         """
         # Replay missed events
-        key = f"user:{user_id}:events"
-        past_events = redis.lrange(key, 0, -1)
-
-        for raw in past_events:
-            try:
-                event = json.loads(raw)
-                if not since or event.get("timestamp") > since:
-                    yield f"data: {json.dumps(event)}\n\n"
-            except Exception as e:
-                logger.error("Error parsing replay event:", e)
-
-        for message in pubsub.listen():
-            if message['type'] == 'message':
-                yield f"data: {message['data']}\n\n"
+        if start_id:
+            for event_id, payload in replay_events(redis, user_id, start_id):
+                yield format_sse(payload, event_id)
+
+        try:
+            while True:
+                message = pubsub.get_message(ignore_subscribe_messages=True, timeout=SSE_HEARTBEAT_SECONDS)
+                if message is None:
+                    yield ": ping\n\n"
+                elif message['type'] == 'message':
+                    event_id, payload = decode_live_message(message['data'])
+                    yield format_sse(payload, event_id)
+        finally:
+            pubsub.close()
 
     response = Response(event_stream(), mimetype="text/event-stream")
     # Allow both localhost and 127.0.0.1 for development
@@ -404,22 +421,22 @@ def search_users() -> Tuple[Response, int]:
 
 @app.route('/api/conversations', methods=['GET'])
 @require_auth
-def get_user_conversations() -> Tuple[Response, int]:
+async def get_user_conversations() -> Tuple[Response, int]:
     """
     Get conversations for the authenticated user.
     :return: Response object with user conversations.
     """
-    return get_user_conversations_route()
+    return await get_user_conversations_route()
 
 @app.route('/api/conversations/<conversation_id>/messages', methods=['GET'])
 @require_auth
-def get_conversation_messages(conversation_id: str) -> Tuple[Response, int]:
+async def get_conversation_messages(conversation_id: str) -> Tuple[Response, int]:
     """
     Get messages for a specific conversation.
     :param conversation_id: The ID of the conversation to retrieve messages for.
     :return: Response object with conversation messages.
     """
-    return get_conversation_messages_route(conversation_id)
+    return await get_conversation_messages_route(conversation_id)
 
 @app.route('/api/conversations/<conversation_id>/messages', methods=['POST'])
 @require_auth
@@ -460,12 +477,12 @@ def chat_endpoint() -> Tuple[Response, int]:
 
 @app.route('/api/llm_chat', methods=['GET', 'POST'])
 @require_auth
-def llm_agent_endpoint() -> Tuple[Response, int]:
+async def llm_agent_endpoint() -> Tuple[Response, int]:
     """
     Endpoint for LLM agent interactions.
     :return: Response object with LLM agent data.
     """
-    return llm_agent_endpoint_route()
+    return await llm_agent_endpoint_route()
 
 @app.route('/api/llm_chat/reset', methods=['POST'])
 @optional_auth
@@ -488,21 +505,21 @@ def get_current_time() -> Tuple[Response, int]:
     return response
 
 @app.route('/api/patients', methods=['GET', 'POST'])
-def patients_endpoint() -> Tuple[Response, int]:
+async def patients_endpoint() -> Tuple[Response, int]:
     """
     Endpoint to handle patient data.
     :return: Response object with patient data.
     """
-    return patients_endpoint_route()
+    return await patients_endpoint_route()
 
 @app.route('/api/patients/<patient_id>', methods=['GET', 'PUT', 'DELETE'])
-def patient_endpoint(patient_id: str) -> Tuple[Response, int]:
+async def patient_endpoint(patient_id: str) -> Tuple[Response, int]:
     """
     Endpoint to handle a specific patient by ID.
     :param patient_id: The ID of the patient to retrieve or modify.
     :return: Response object with patient data.
     """
-    return patient_endpoint_route(patient_id)
+    return await patient_endpoint_route(patient_id)
 
 @app.route('/api/patients/search', methods=['GET'])
 @require_auth
@@ -540,25 +557,25 @@ def search_encounters() -> Tuple[Response, int]:
 @require_auth
 @require_api_key
 @require_api_permission('encounters:read')
-def get_patient_encounters(patient_id: str) -> Tuple[Response, int]:
+async def get_patient_encounters(patient_id: str) -> Tuple[Response, int]:
     """
     Get all encounters for a specific patient.
     :param patient_id: The ID of the patient to retrieve encounters for.
     :return: Response object with patient encounters.
     """
-    return get_encounters_by_patient_route(patient_id)
+    return await get_encounters_by_patient_route(patient_id)
 
 @app.route('/api/encounters/<encounter_id>', methods=['GET'])
 @require_auth
 @require_api_key
 @require_api_permission('encounters:read')
-def get_encounter(encounter_id: str) -> Tuple[Response, int]:
+async def get_encounter(encounter_id: str) -> Tuple[Response, int]:
     """
     Get a specific encounter by its ID.
     :param encounter_id: The ID of the encounter to retrieve.
     :return: Response object with encounter data.
     """
-    return get_encounter_by_id_route(encounter_id)
+    return await get_encounter_by_id_route(encounter_id)
 
 @app.route('/api/patients/<patient_id>/encounters', methods=['POST'])
 @require_auth
@@ -729,12 +746,12 @@ def update_user_profile() -> Tuple[Response, int]:
 # Appointment endpoints
 @app.route('/api/appointments', methods=['GET'])
 @require_auth
-def get_appointments() -> Tuple[Response, int]:
+async def get_appointments() -> Tuple[Response, int]:
     """
     Get a list of appointments for the authenticated user.
     :return: Response object with appointments data.
     """
-    return get_appointments_route()
+    return await get_appointments_route()
 
 @app.route('/api/appointments', methods=['POST'])
 @require_auth
@@ -747,13 +764,13 @@ def create_appointment() -> Tuple[Response, int]:
 
 @app.route('/api/appointments/<appointment_id>', methods=['GET'])
 @require_auth
-def get_appointment(appointment_id: str) -> Tuple[Response, int]:
+async def get_appointment(appointment_id: str) -> Tuple[Response, int]:
     """
     Get details of a specific appointment by its ID.
     :param appointment_id: The ID of the appointment to retrieve.
     :return: Response object with appointment details.
     """
-    return get_appointment_route(appointment_id)
+    return await get_appointment_route(appointment_id)
 
 @app.route('/api/appointments/<appointment_id>', methods=['PUT'])
 @require_auth
@@ -794,6 +811,15 @@ def get_available_slots() -> Tuple[Response, int]:
     """
     return get_available_slots_route()
 
+@app.route('/api/appointments/first-available', methods=['GET'])
+@require_auth
+def get_first_available_slot() -> Tuple[Response, int]:
+    """
+    Find the earliest free slot across several providers and days.
+    :return: Response object with the first available slot.
+    """
+    return get_first_available_slot_route()
+
 @app.route('/api/appointments/types', methods=['GET'])
 @require_auth
 def get_appointment_types() -> Tuple[Response, int]:
@@ -888,7 +914,32 @@ def get_lab_results() -> Tuple[Response, int]:
         general_chemistry=general_chemistry,
         serum_proteins=serum_proteins,
     )
-    return jsonify(lab_results_service.lab_results), 200
+    return jsonify(lab_results_service.flagged(patient_id=session.get('user_id', ''))), 200
+
+@app.route('/api/lab_results/evaluate', methods=['POST'])
+@require_auth
+def evaluate_lab_results() -> Tuple[Response, int]:
+    """
+    Flag a batch of lab results (many patients and dates) and summarise them per analyte.
+
+    Body: {"results": [{"patient_id", "analyte", "collected_at", "result", "units"?, "reference_range"?}, ...],
+           "limit": max flagged results to return (default 1000)}
+    :return: Response object with the per-analyte summary and the flagged results.
+    """
+    from lib.services.lab_evaluation import LabColumns, evaluate
+
+    data = request.get_json() or {}
+    records = data.get('results')
+    if not isinstance(records, list):
+        return jsonify({"error": "results must be a list"}), 400
+    try:
+        evaluation = evaluate(LabColumns.from_records(records))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid lab result: {e}"}), 400
+    return jsonify({
+        "summary": evaluation.summary(),
+        "flagged": evaluation.to_records(flagged_only=True, limit=int(data.get('limit', 1000))),
+    }), 200
 
 @app.route('/api/optimal', methods=['POST'])
 @require_auth
@@ -1180,10 +1231,11 @@ def serve_plugin_js(plugin_name: str) -> Tuple[Response, int]:
 # Register the SSE blueprint
 app.register_blueprint(sse_bp)
 app.register_blueprint(uploads_bp)
+app.register_blueprint(clinics_bp)
 
 from asgiref.wsgi import WsgiToAsgi
 
-asgi_app = WsgiToAsgi(app)
+asgi_app = SSEGateway(AsyncServingMiddleware(WsgiToAsgi(app)), flask_app=app)
 
 @app.route('/api/admin/organizations', methods=['GET'])
 def get_organizations() -> Tuple[Response, int]:
@@ -1203,7 +1255,7 @@ def get_my_organization() -> Tuple[Response, int]:
     if not current_user:
         return jsonify({"error": "Unauthorized"}), 401
 
-    user_service = UserService()
+    user_service = get_service(UserService)
     try:
         org_d = user_service.get_organization_id(current_user)
         if not org_d:
@@ -0,0 +1,91 @@
+"""
+Pool of AsyncDbController connections for async views.
+
+An SDK connection handles one request at a time, so a coroutine checks one out for the duration of its database work
+and hands it back afterwards. Connections are opened lazily, up to ``ASYNC_DB_POOL_SIZE``, and stay open; coroutines
+beyond that wait for a free one. A connection belongs to the loop that opened it, so there is one pool per event loop
+(normally just the shared loop of ``lib.infra.async_runtime``).
+"""
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, AsyncIterator, Callable, List, Optional
+
+from lib.db.surreal import AsyncDbController
+from settings import ASYNC_DB_POOL_SIZE, logger
+
+
+class AsyncDbPool:
+    """
+    Bounded pool of connected AsyncDbController instances.
+    """
+    def __init__(self, size: int = ASYNC_DB_POOL_SIZE,
+                 factory: Callable[[], AsyncDbController] = AsyncDbController) -> None:
+        """
+        :param size: Most connections open at once.
+        :param factory: Creates an unconnected controller.
+        """
+        self.size = size
+        self.factory = factory
+        self._idle: List[AsyncDbController] = []
+        self._slots = asyncio.Semaphore(size)
+        self.opened = 0
+
+    async def _open(self) -> AsyncDbController:
+        db = self.factory()
+        await db.connect()
+        self.opened += 1
+        return db
+
+    @staticmethod
+    async def _discard(db: AsyncDbController) -> None:
+        try:
+            await db.close()
+        except Exception as e:
+            logger.debug("Error closing pooled connection: %s", e)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[AsyncDbController]:
+        """
+        Check out a connection; it is returned to the pool afterwards, or closed if the block raised.
+        """
+        async with self._slots:
+            db = self._idle.pop() if self._idle else await self._open()
+            try:
+                yield db
+            except BaseException:
+                # The connection may have been interrupted mid-request; do not hand it to another coroutine.
+                self.opened -= 1
+                await self._discard(db)
+                raise
+            self._idle.append(db)
+
+    async def close(self) -> None:
+        """
+        Close the idle connections.
+        """
+        idle, self._idle = self._idle, []
+        self.opened -= len(idle)
+        for db in idle:
+            await self._discard(db)
+
+
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncDbPool]" = weakref.WeakKeyDictionary()
+
+
+def get_async_db_pool(loop: Optional[asyncio.AbstractEventLoop] = None) -> AsyncDbPool:
+    """
+    The pool of the running (or given) event loop.
+    """
+    loop = loop or asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = AsyncDbPool()
+    return pool
+
+
+def async_db() -> AsyncContextManager[AsyncDbController]:
+    """
+    Check out a pooled connection on the running loop: ``async with async_db() as db: ...``
+    """
+    return get_async_db_pool().connection()
@@ -0,0 +1,60 @@
+"""
+Decoding of SurrealDB results.
+
+The SDK returns record links as ``RecordID`` objects. ``decode_rows`` replaces them with "table:id" strings in a
+single walk over the result, modifying the rows in place, so neither the controller nor the model serializers need
+to copy each row to fix up its ids.
+
+``json_default`` converts RecordIDs when a response is encoded; see ``lib.infra.json_provider``.
+"""
+from typing import Any, Dict, List, Optional
+
+from surrealdb import RecordID  # type: ignore[import-untyped]
+
+
+def decode_value(value: Any) -> Any:
+    """
+    Replace RecordIDs with strings, descending into dicts and lists (which are updated in place).
+    :param value: Any value returned by the SDK.
+    :return: The decoded value; the same dict or list object for containers.
+    """
+    if isinstance(value, RecordID):
+        return str(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, (RecordID, dict, list)):
+                value[key] = decode_value(item)
+        return value
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            if isinstance(item, (RecordID, dict, list)):
+                value[i] = decode_value(item)
+        return value
+    return value
+
+
+def decode_rows(result: Any) -> List[Dict[str, Any]]:
+    """
+    Rows of a query or select result with RecordIDs decoded in place.
+
+    Accepts plain rows, a single record, or the ``[{'result': rows}]`` shape.
+    :param result: Raw SDK result.
+    :return: List of rows.
+    """
+    if not result:
+        return []
+    if isinstance(result, dict):
+        result = [result]
+    elif isinstance(result[0], dict) and 'result' in result[0]:
+        result = result[0]['result'] or []
+    return decode_value(result)
+
+
+def json_default(value: Any) -> Optional[Any]:
+    """
+    JSON form of RecordIDs, or None for other types.
+    """
+    if isinstance(value, RecordID):
+        return str(value)
+    return None
+
@@ -0,0 +1,114 @@
+"""
+Pool of connected DbController instances for request handling.
+
+``DbController.close`` does not close anything, so every service that connected for a request used to leave a
+signed-in websocket behind. Connections taken from the pool are returned to it after the request (see
+``lib.infra.request_services``), and the next request reuses them without connecting and signing in again.
+
+At most ``DB_POOL_SIZE`` idle connections are kept. Connections idle for more than ``DB_POOL_MAX_IDLE_SECONDS`` are
+closed rather than reused, and so are connections from before a fork.
+"""
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+from lib.db.surreal import DbController
+from settings import DB_POOL_MAX_IDLE_SECONDS, DB_POOL_SIZE, logger
+
+
+def close_connection(db: DbController) -> None:
+    """
+    Close the websocket of a controller (``DbController.close`` leaves it open).
+    """
+    client, db.db = db.db, None
+    if client is None:
+        return
+    try:
+        client.close()
+    except Exception as e:
+        logger.debug("Error closing database connection: %s", e)
+
+
+class DbPool:
+    """
+    Thread-safe pool of connected DbController instances.
+    """
+    def __init__(self, size: int = DB_POOL_SIZE, max_idle_seconds: float = DB_POOL_MAX_IDLE_SECONDS,
+                 factory: Callable[[], DbController] = DbController) -> None:
+        """
+        :param size: Most idle connections kept.
+        :param max_idle_seconds: Idle connections older than this are closed instead of reused.
+        :param factory: Creates an unconnected controller.
+        """
+        self.size = size
+        self.max_idle_seconds = max_idle_seconds
+        self.factory = factory
+        self._idle: List[Tuple[float, DbController]] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def acquire(self) -> DbController:
+        """
+        A connected controller: an idle one if there is one, otherwise a new connection.
+        """
+        stale: List[DbController] = []
+        db: Optional[DbController] = None
+        with self._lock:
+            if self._pid != os.getpid():
+                # The parent's sockets must not be shared with a forked child.
+                self._idle, self._pid = [], os.getpid()
+            now = time.monotonic()
+            while self._idle:
+                released_at, candidate = self._idle.pop()
+                if now - released_at <= self.max_idle_seconds:
+                    db = candidate
+                    break
+                stale.append(candidate)
+        for old in stale:
+            close_connection(old)
+        if db is None:
+            db = self.factory()
+            db.connect()
+        return db
+
+    def release(self, db: DbController, discard: bool = False) -> None:
+        """
+        Return a controller to the pool.
+        :param db: Controller from ``acquire``.
+        :param discard: Close it instead, e.g. after a database error left it in an unknown state.
+        """
+        if not discard and db.db is not None:
+            with self._lock:
+                if self._pid == os.getpid() and len(self._idle) < self.size:
+                    self._idle.append((time.monotonic(), db))
+                    return
+        close_connection(db)
+
+    def close(self) -> None:
+        """
+        Close the idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _, db in idle:
+            close_connection(db)
+
+    def __len__(self) -> int:
+        return len(self._idle)
+
+
+_pool: Optional[DbPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_db_pool() -> DbPool:
+    """
+    The process-wide pool.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = DbPool()
+    return _pool
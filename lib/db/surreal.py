@@ -1,10 +1,216 @@
 """
 Synchronous and Asynchronous SurrealDB Controller
 """
-from typing import Any, Dict, List, Optional
+import re
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+from lib.db.decoding import decode_rows, decode_value
+from lib.infra.instrumentation import timed_query, timed_query_async
 from settings import logger
 
+# Most record IDs sent in one batched SELECT
+BATCH_SELECT_SIZE = 500
+
+
+class ConnectionCounter:
+    """
+    Number of connections opened while it is the context's counter; see ``count_connections``
+    """
+    __slots__ = ("opened",)
+
+    def __init__(self) -> None:
+        self.opened = 0
+
+
+_connection_counter: ContextVar[Optional[ConnectionCounter]] = ContextVar("db_connection_counter", default=None)
+
+
+def count_connections() -> Tuple[ConnectionCounter, "Token[Optional[ConnectionCounter]]"]:
+    """
+    Count the DbController and AsyncDbController connections opened from now on in the current context
+    :return: (counter, token to pass to ``stop_counting_connections``)
+    """
+    counter = ConnectionCounter()
+    return counter, _connection_counter.set(counter)
+
+
+def stop_counting_connections(token: "Token[Optional[ConnectionCounter]]") -> None:
+    """
+    Restore the counter that was current before ``count_connections``
+    """
+    _connection_counter.reset(token)
+
+
+def _connection_opened() -> None:
+    counter = _connection_counter.get()
+    if counter is not None:
+        counter.opened += 1
+
+
+def to_record_id(value: Any, table: Optional[str] = None) -> Any:
+    """
+    Convert "table:id", a bare id (with ``table``) or a RecordID to a RecordID.
+
+    Numeric keys become integers, as SurrealDB parses them.
+    :param value: Record ID in any of the forms above
+    :param table: Table for bare ids
+    :return: RecordID
+    :raises ValueError: If a bare id is given without a table
+    """
+    from surrealdb import RecordID  # type: ignore
+
+    if isinstance(value, RecordID):
+        return value
+    text = str(value)
+    if table and not text.startswith(f"{table}:"):
+        key = text
+    elif ':' in text:
+        table, key = text.split(':', 1)
+    else:
+        raise ValueError(f"Record ID {text!r} has no table")
+    return RecordID(table, int(key) if key.isdigit() else key)
+
+
+def build_select_by_ids(record_ids: Sequence[Any], table: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    One SELECT for a list of record IDs
+    :param record_ids: IDs as accepted by ``to_record_id``
+    :param table: Table for bare ids
+    :return: (statement, params)
+    """
+    return "SELECT * FROM $ids", {"ids": [to_record_id(value, table) for value in record_ids]}
+
+
+def _result_rows(result: Any) -> List[Dict[str, Any]]:
+    if result and isinstance(result, list) and isinstance(result[0], dict) and 'result' in result[0]:
+        return result[0]['result'] or []
+    return result or []
+
+
+def order_by_ids(keys: Sequence[str], rows: Sequence[Dict[str, Any]]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Match the rows of a batched SELECT back to the requested IDs
+    :param keys: Requested IDs as "table:id" strings
+    :param rows: Rows returned for those IDs, in any order
+    :return: One record (with a string id) or None per key, in the order of ``keys``
+    """
+    found: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        if isinstance(row, dict) and row.get('id') is not None:
+            decode_value(row)
+            found[row['id']] = row
+    return [found.get(key) for key in keys]
+
+
+def _batches(record_ids: Sequence[Any], table: Optional[str],
+             chunk_size: int) -> Tuple[List[str], List[Tuple[str, Dict[str, Any]]]]:
+    # Requested keys, and one query per chunk of distinct IDs
+    keys = [str(to_record_id(value, table)) for value in record_ids]
+    unique = list(dict.fromkeys(keys))
+    chunk_size = max(1, chunk_size)
+    return keys, [build_select_by_ids(unique[start:start + chunk_size]) for start in range(0, len(unique), chunk_size)]
+
+
+def _split_found(keys: Sequence[str], records: Sequence[Optional[Dict[str, Any]]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    found = [record for record in records if record is not None]
+    missing = [key for key, record in zip(keys, records) if record is None]
+    if missing:
+        logger.debug("Batch fetch: %d of %d records missing: %s", len(missing), len(keys), missing)
+    return found, missing
+
+
+class TransactionError(RuntimeError):
+    """
+    A statement in a transaction or pipeline failed.
+
+    ``index`` is the position of the failing statement and ``results`` holds the raw per-statement results.
+    """
+    def __init__(self, message: str, index: int, results: List[Dict[str, Any]]) -> None:
+        super().__init__(message)
+        self.index = index
+        self.results = results
+
+
+_PARAM = re.compile(r"\$([A-Za-z_][A-Za-z0-9_]*)")
+_NOT_EXECUTED = "not executed due to a failed transaction"
+
+
+class Transaction:
+    """
+    Several parameterised statements sent to SurrealDB as one request.
+
+    Each statement keeps its own parameter names: they are prefixed per statement when the request is built, so
+    two statements may both use ``$id``. Variables a statement defines itself (``LET``, ``FOR``) are left alone.
+    With ``atomic`` (the default) the statements are wrapped in ``BEGIN``/``COMMIT`` and either all apply or none
+    do; without it they are just pipelined. Run it with ``DbController.execute``, which returns one result per
+    statement or raises ``TransactionError``.
+    """
+    def __init__(self, atomic: bool = True) -> None:
+        self.atomic = atomic
+        self.statements: List[str] = []
+        self.params: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+    def add(self, statement: str, params: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Append a statement
+        :param statement: One SurrealQL statement (a trailing semicolon is optional)
+        :param params: Parameters the statement refers to as ``$name``
+        :return: Index of the statement's result
+        """
+        index = len(self.statements)
+        params = params or {}
+
+        def rename(match: "re.Match[str]") -> str:
+            name = match.group(1)
+            return f"$s{index}_{name}" if name in params else match.group(0)
+
+        self.statements.append(_PARAM.sub(rename, statement.strip().rstrip(';')))
+        self.params.update({f"s{index}_{name}": value for name, value in params.items()})
+        return index
+
+    def build(self) -> Tuple[str, Dict[str, Any]]:
+        """
+        The request text and merged parameters
+        """
+        body = "".join(f"{statement};\n" for statement in self.statements)
+        if self.atomic:
+            body = f"BEGIN TRANSACTION;\n{body}COMMIT TRANSACTION;"
+        return body, self.params
+
+    def parse(self, response: Any) -> List[Any]:
+        """
+        Per-statement results from a raw query response
+        :param response: Response of ``query_raw``, ``{'result': [{'status', 'result'}, ...]}``
+        :return: The result of each statement, in the order they were added
+        :raises TransactionError: If the request or any statement failed
+        """
+        if isinstance(response, dict) and response.get('error'):
+            error = response['error']
+            raise TransactionError(str(error.get('message', error) if isinstance(error, dict) else error), -1, [])
+        results = response.get('result', []) if isinstance(response, dict) else response
+        results = results or []
+        if self.atomic and len(results) == len(self.statements) + 2:
+            # Servers that report BEGIN and COMMIT as statements of their own
+            results = results[1:-1]
+        failures = [(i, r) for i, r in enumerate(results) if isinstance(r, dict) and r.get('status') not in (None, 'OK')]
+        if failures:
+            # Statements cancelled by the failed transaction repeat a generic message; report the cause.
+            index, failed = next(((i, r) for i, r in failures if _NOT_EXECUTED not in str(r.get('result'))),
+                                 failures[0])
+            raise TransactionError(str(failed.get('result')), index, results)
+        if len(results) != len(self.statements):
+            raise TransactionError(f"Expected {len(self.statements)} results, got {len(results)}", -1, results)
+        return [r.get('result') if isinstance(r, dict) else r for r in results]
+
+
+def _table(record: Any) -> str:
+    # Logged in place of a statement for record operations; the table is enough to find the caller.
+    return str(record).split(':', 1)[0]
+
 
 class SurrealWrapper:
     def __init__(self, r: Any) -> None:
@@ -14,7 +220,10 @@ class SurrealWrapper:
         return self._client.signin(vars)
 
     def query(self, sql: str, vars: dict[str, Any] = {}) -> list[Any]:
-        return self._client.query(sql, vars)
+        return timed_query("query", sql, self._client.query, sql, vars)
+
+    def query_raw(self, sql: str, vars: dict[str, Any] = {}) -> Dict[str, Any]:
+        return timed_query("query_raw", sql, self._client.query_raw, sql, vars)
 
     def update(self, record: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -32,7 +241,7 @@ class SurrealWrapper:
             record_arr = record.split(':')
             record = ':'.join(record_arr[1:])
             print(f"SurrealDB update record (fixed): {record}")
-        return self._client.update(record, data)
+        return timed_query("update", _table(record), self._client.update, record, data)
     
     def create(self, table_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -42,7 +251,7 @@ class SurrealWrapper:
         :param data: Dictionary of data for the new record
         :return: Created record
         """
-        return self._client.create(table_name, data)
+        return timed_query("create", _table(table_name), self._client.create, table_name, data)
     
     def select(self, record: str) -> List[Dict[str, Any]]:
         """
@@ -51,7 +260,7 @@ class SurrealWrapper:
         :param record: Record ID string (e.g., "table:id")
         :return: Record data
         """
-        return self._client.select(record)
+        return timed_query("select", _table(record), self._client.select, record)
     
     def delete(self, record: str) -> Dict[str, Any]:
         """
@@ -60,7 +269,7 @@ class SurrealWrapper:
         :param record: Record ID string (e.g., "table:id")
         :return: Result of deletion
         """
-        return self._client.delete(record)
+        return timed_query("delete", _table(record), self._client.delete, record)
     
     def use(self, namespace: str, database: str) -> None:
         """
@@ -88,19 +297,22 @@ class AsyncSurrealWrapper:
         return await self._client.signin(vars)
 
     async def query(self, sql: str, vars: dict[str, Any] = {}) -> list[Any]:
-        return await self._client.query(sql, vars)
+        return await timed_query_async("query", sql, self._client.query, sql, vars)
+
+    async def query_raw(self, sql: str, vars: dict[str, Any] = {}) -> Dict[str, Any]:
+        return await timed_query_async("query_raw", sql, self._client.query_raw, sql, vars)
 
     async def update(self, record: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        return await self._client.update(record, data)
+        return await timed_query_async("update", _table(record), self._client.update, record, data)
     
     async def create(self, table_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        return await self._client.create(table_name, data)
+        return await timed_query_async("create", _table(table_name), self._client.create, table_name, data)
     
     async def select(self, record: str) -> List[Dict[str, Any]]:
-        return await self._client.select(record)
+        return await timed_query_async("select", _table(record), self._client.select, record)
     
     async def delete(self, record: str) -> Dict[str, Any]:
-        return await self._client.delete(record)
+        return await timed_query_async("delete", _table(record), self._client.delete, record)
     
     async def use(self, namespace: str, database: str) -> None:
         await self._client.use(namespace, database)
@@ -190,6 +402,7 @@ class DbController:
             raise ValueError("Namespace and database must not be None.")
         self.db.use(self.namespace, self.database)
         logger.debug(f"Set namespace and database")
+        _connection_opened()
 
         return signin_result
 
@@ -204,11 +417,27 @@ class DbController:
         """
         if params is None:
             params = {}
-        logger.debug("Executing Query:", statement, "with params:", params)
+        logger.debug("Executing Query: %s with params: %s", statement, params)
         if self.db is None:
             raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
         return self.db.query(statement, params)
 
+    def execute(self, transaction: Transaction) -> List[Any]:
+        """
+        Send a transaction or pipeline in one request
+
+        :param transaction: Statements to run
+        :return: The result of each statement, in the order they were added
+        :raises TransactionError: If any statement failed (an atomic transaction is then rolled back)
+        """
+        if self.db is None:
+            raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
+        if not transaction:
+            return []
+        statement, params = transaction.build()
+        logger.debug("Executing %d statements: %s with params: %s", len(transaction), statement, params)
+        return transaction.parse(self.db.query_raw(statement, params))
+
     def search(self, query: str, params: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Execute a search query
@@ -217,7 +446,7 @@ class DbController:
         :return: List of search results
         """
         #logging.info(f"Executing Query: {query} with params: {params}")
-        logger.debug(f"Executing Query: {query} with params: {params}")
+        logger.debug("Executing Query: %s with params: %s", query, params)
         # This mock will return plausible results for the search query.
         if "SEARCH" in query and params and params.get('query'):
             return [{
@@ -255,23 +484,14 @@ class DbController:
         :param data: Dictionary of data to update
         :return: Updated record
         """
-        logger.debug(f"SurrealDB update record: {record}")
+        logger.debug("SurrealDB update record: %s", record)
         try:
             if self.db is None:
                 raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
             result: Dict[str, Any] = self.db.update(record, data)
-            logger.debug(f"SurrealDB update raw result: {result}")
-
-            # Handle record ID conversion
-            if 'id' in result:
-                result = dict(result)  # Ensure result is a dict[str, Any]
-                _id = str(result.pop("id"))
-                final_result: Dict[str, Any] = {**result, 'id': _id}
-                logger.debug(f"Final result: {final_result}")
-                return final_result
-            
-            logger.debug(f"Final result: {result}")
-            return result
+            logger.debug("SurrealDB update raw result: %s", result)
+
+            return decode_value(result)
             
         except Exception as e:
             logger.error(f"Exception in update: {e}")
@@ -290,11 +510,7 @@ class DbController:
         try:
             result = self.db.create(table_name, data) # type: ignore
 
-            # Handle result formatting
-            if 'id' in result:
-                _id = str(result.pop("id"))
-                return {**result, 'id': _id}
-            return result
+            return decode_value(result)
         except Exception as e:
             logger.error(f"Error creating record: {e}")
             return {}
@@ -308,20 +524,42 @@ class DbController:
         """
         if self.db is None:
             raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
-        logger.debug(f"Selecting many from table: {table_name}")
-        result: List[Dict[str, Any]] = self.db.select(table_name)
-        logger.debug(f"Select many raw result: {result}")
-
-        # Process results
-        for i, record in enumerate(result):
-            if 'id' in record:
-                _id = str(record.pop("id"))
-                result[i] = {**record, 'id': _id}
-        
-        logger.debug(f"Select many processed result: {result}")
-
+        logger.debug("Selecting many from table: %s", table_name)
+        result = decode_rows(self.db.select(table_name))
+        logger.debug("Select many: %d records", len(result))
         return result
 
+    def select_many_by_ids(self, record_ids: Sequence[Any], table: Optional[str] = None,
+                           chunk_size: int = BATCH_SELECT_SIZE) -> List[Optional[Dict[str, Any]]]:
+        """
+        Select many records by ID in one round trip per ``chunk_size`` distinct IDs
+
+        :param record_ids: "table:id" strings, RecordIDs, or bare ids with ``table``
+        :param table: Table for bare ids
+        :param chunk_size: Most IDs per query
+        :return: One record or None (missing) per requested ID, in the requested order
+        """
+        if self.db is None:
+            raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
+        keys, queries = _batches(record_ids, table, chunk_size)
+        rows: List[Dict[str, Any]] = []
+        for statement, params in queries:
+            rows.extend(_result_rows(self.db.query(statement, params)))
+        return order_by_ids(keys, rows)
+
+    def fetch_batch(self, record_ids: Sequence[Any], table: Optional[str] = None,
+                    chunk_size: int = BATCH_SELECT_SIZE) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Select many records by ID and report the ones that do not exist
+
+        :param record_ids: "table:id" strings, RecordIDs, or bare ids with ``table``
+        :param table: Table for bare ids
+        :param chunk_size: Most IDs per query
+        :return: (records found, in the requested order; "table:id" of each missing ID)
+        """
+        keys = [str(to_record_id(value, table)) for value in record_ids]
+        return _split_found(keys, self.select_many_by_ids(record_ids, table, chunk_size))
+
     def select(self, record: str) -> Dict[str, Any]:
         """
         Select a specific record
@@ -331,26 +569,13 @@ class DbController:
         """
         if self.db is None:
             raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
-        logger.debug(f"Selecting record: {record}")
+        logger.debug("Selecting record: %s", record)
         result = self.db.select(record)
-        logger.debug(f"Select raw result: {result}")
+        logger.debug("Select raw result: %s", result)
 
-        # Handle record ID conversion - result might be a list or dict
-        if isinstance(result, list) and len(result) > 0:
-            record_data = result[0]
-            if isinstance(record_data, dict) and 'id' in record_data:
-                _id = str(record_data.pop("id"))
-                final_result = {**record_data, 'id': _id}
-                logger.debug(f"Final result: {final_result}")
-                return final_result
-            return record_data if isinstance(record_data, dict) else {}
-        elif isinstance(result, dict) and 'id' in result:
-            _id = str(result.pop("id"))
-            final_result = {**result, 'id': _id}
-            logger.debug(f"Final result: {final_result}")
-            return final_result
-        logger.debug(f"Final result: {result}")
-        return result if isinstance(result, dict) else {}
+        # The result might be the record itself or a list holding it
+        row = (result[0] if result else {}) if isinstance(result, list) else result
+        return decode_value(row) if isinstance(row, dict) else {}
 
     def delete(self, record: str) -> Dict[str, Any]:
         """
@@ -442,6 +667,7 @@ class AsyncDbController:
         if self.namespace is None or self.database is None:
             raise ValueError("Namespace and database must not be None.")
         await self.db.use(self.namespace, self.database)
+        _connection_opened()
 
         return signin_result
 
@@ -459,6 +685,21 @@ class AsyncDbController:
             params = {}
         return await self.db.query(statement, params)
 
+    async def execute(self, transaction: Transaction) -> List[Any]:
+        """
+        Send a transaction or pipeline in one request
+
+        :param transaction: Statements to run
+        :return: The result of each statement, in the order they were added
+        :raises TransactionError: If any statement failed (an atomic transaction is then rolled back)
+        """
+        if self.db is None:
+            raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
+        if not transaction:
+            return []
+        statement, params = transaction.build()
+        return transaction.parse(await self.db.query_raw(statement, params))
+
     async def update(self, record: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Update a record
@@ -469,13 +710,7 @@ class AsyncDbController:
         """
         if self.db is None:
                 raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
-        result = await self.db.update(record, data)
-
-        # Handle record ID conversion
-        if 'id' in result:
-            _id = str(result.pop("id"))
-            return {**result, 'id': _id}
-        return result
+        return decode_value(await self.db.update(record, data))
 
     async def create(self, table_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -490,11 +725,7 @@ class AsyncDbController:
                 raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
             result = await self.db.create(table_name, data)
 
-            # Handle result formatting
-            if 'id' in result:
-                _id = str(result.pop("id"))
-                return {**result, 'id': _id}
-            return result
+            return decode_value(result)
         except Exception as e:
             logger.error(f"Error creating record: {e}")
             return {}
@@ -508,15 +739,38 @@ class AsyncDbController:
         """
         if self.db is None:
             raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
-        result: List[Dict[str, Any]] = await self.db.select(table_name)
+        return decode_rows(await self.db.select(table_name))
 
-        # Process results
-        for i, record in enumerate(result):
-            if 'id' in record:
-                _id = str(record.pop("id"))
-                result[i] = {**record, 'id': _id}
+    async def select_many_by_ids(self, record_ids: Sequence[Any], table: Optional[str] = None,
+                                 chunk_size: int = BATCH_SELECT_SIZE) -> List[Optional[Dict[str, Any]]]:
+        """
+        Select many records by ID in one round trip per ``chunk_size`` distinct IDs
 
-        return result
+        :param record_ids: "table:id" strings, RecordIDs, or bare ids with ``table``
+        :param table: Table for bare ids
+        :param chunk_size: Most IDs per query
+        :return: One record or None (missing) per requested ID, in the requested order
+        """
+        if self.db is None:
+            raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
+        keys, queries = _batches(record_ids, table, chunk_size)
+        rows: List[Dict[str, Any]] = []
+        for statement, params in queries:
+            rows.extend(_result_rows(await self.db.query(statement, params)))
+        return order_by_ids(keys, rows)
+
+    async def fetch_batch(self, record_ids: Sequence[Any], table: Optional[str] = None,
+                          chunk_size: int = BATCH_SELECT_SIZE) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Select many records by ID and report the ones that do not exist
+
+        :param record_ids: "table:id" strings, RecordIDs, or bare ids with ``table``
+        :param table: Table for bare ids
+        :param chunk_size: Most IDs per query
+        :return: (records found, in the requested order; "table:id" of each missing ID)
+        """
+        keys = [str(to_record_id(value, table)) for value in record_ids]
+        return _split_found(keys, await self.select_many_by_ids(record_ids, table, chunk_size))
 
     async def select(self, record: str) -> Dict[str, Any]:
         """
@@ -527,16 +781,11 @@ class AsyncDbController:
         """
         if self.db is None:
             raise RuntimeError("Database connection is not established. Call connect() before performing operations.")
-        result: List[Dict[str, Any]] = await self.db.select(record)
-
-        # Handle record ID conversion - result is a list, so we need to handle it properly
-        if result and len(result) > 0:
-            record_data = result[0]
-            if isinstance(record_data, dict) and 'id' in record_data:
-                _id = str(record_data.pop("id"))
-                return {**record_data, 'id': _id}
-            return record_data if isinstance(record_data, dict) else {}
-        return {}
+        result = await self.db.select(record)
+
+        # The result might be the record itself or a list holding it
+        row = (result[0] if result else {}) if isinstance(result, list) else result
+        return decode_value(row) if isinstance(row, dict) else {}
 
     async def delete(self, record: str) -> Dict[str, Any]:
         """
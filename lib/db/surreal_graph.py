@@ -1,9 +1,235 @@
 """
 This module provides a controller for graph operations in SurrealDB.
+
+Besides single-edge ``relate``/``get_relations``, the controllers offer batched operations that cost one round trip
+regardless of how many records are involved: ``relate_many`` writes any number of edges in one transaction,
+``traverse`` returns every node within N hops, ``count_connections`` returns degrees for a list of nodes, and
+``find_path`` runs a breadth-first search that expands a whole frontier per query.
+
+``GraphCache`` holds adjacency lists for a set of edge tables in memory, for hot read paths such as scoring candidate
+diagnoses from a list of symptoms without touching the database.
 """
-from typing import Any, Callable, Coroutine, Dict, Optional, Union
+import asyncio
+import math
+import re
+import time
+from typing import (Any, Callable, Coroutine, Dict, Iterable, List, Mapping,
+                    Optional, Sequence, Set, Tuple, Union)
+
+from surrealdb import RecordID  # type: ignore[import-untyped]
 
 from lib.db.surreal import AsyncDbController, DbController
+from lib.infra.async_runtime import run_sync
+
+DIRECTIONS = ('->', '<-', '<->')
+MAX_TRAVERSAL_DEPTH = 6
+
+EdgeTables = Union[str, Sequence[str]]
+Edge = Tuple[str, str, str, Optional[Dict[str, Any]]]
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _identifier(name: str) -> str:
+    """
+    Table names are interpolated into SurrealQL, so only plain identifiers are accepted.
+    """
+    if not isinstance(name, str) or not _IDENTIFIER.match(name):
+        raise ValueError(f"Invalid table name: {name!r}")
+    return name
+
+
+def _edge_tables(edge_tables: Optional[EdgeTables]) -> List[str]:
+    if edge_tables is None:
+        return []
+    if isinstance(edge_tables, str):
+        edge_tables = [edge_tables]
+    return [_identifier(name) for name in edge_tables]
+
+
+def _edge_selector(edge_tables: Optional[EdgeTables]) -> str:
+    names = _edge_tables(edge_tables)
+    if not names:
+        return '?'
+    return names[0] if len(names) == 1 else f"({', '.join(names)})"
+
+
+def _hop(edge_tables: Optional[EdgeTables], direction: str, end_table: str = '?') -> str:
+    """
+    One step of a graph path, e.g. ``->HAS_SYMPTOM->symptom`` or ``<->(TREATS, HAS_SYMPTOM)<->?``.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+    end = end_table if end_table == '?' else _identifier(end_table)
+    return f"{direction}{_edge_selector(edge_tables)}{direction}{end}"
+
+
+def _record(value: Any) -> Any:
+    return RecordID.parse(value) if isinstance(value, str) else value
+
+
+def _node_id(value: Any) -> str:
+    if isinstance(value, dict):
+        value = value.get('id')
+    return str(value)
+
+
+def _rows(result: Any) -> List[Dict[str, Any]]:
+    if result and isinstance(result, list) and isinstance(result[0], dict) and 'result' in result[0]:
+        return result[0]['result'] or []
+    return result or []
+
+
+def _flatten(values: Any) -> List[Any]:
+    if not isinstance(values, list):
+        return [] if values is None else [values]
+    flat: List[Any] = []
+    for value in values:
+        flat.extend(_flatten(value))
+    return flat
+
+
+def _check_depth(max_depth: int) -> int:
+    if not 1 <= max_depth <= MAX_TRAVERSAL_DEPTH:
+        raise ValueError(f"max_depth must be between 1 and {MAX_TRAVERSAL_DEPTH}")
+    return max_depth
+
+
+def _schedule(coroutine: Coroutine[Any, Any, Any]) -> Any:
+    """
+    A task for the coroutine on the running loop; without one (sync callers), run it on the shared loop and wait
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return run_sync(coroutine)
+    return asyncio.ensure_future(coroutine)
+
+
+def build_relate_many(edges: Iterable[Edge]) -> Tuple[str, Dict[str, Any]]:
+    """
+    One transaction inserting every edge, with one ``INSERT RELATION`` per edge table.
+    :param edges: (from_record, edge_table, to_record, edge_data) tuples; edge_data may be None.
+    :return: (statement, params)
+    """
+    by_table: Dict[str, List[Dict[str, Any]]] = {}
+    for from_record, edge_table, to_record, edge_data in edges:
+        row = dict(edge_data or {})
+        row['in'] = _record(from_record)
+        row['out'] = _record(to_record)
+        by_table.setdefault(_identifier(edge_table), []).append(row)
+    statements, params = [], {}
+    for i, (edge_table, rows) in enumerate(by_table.items()):
+        statements.append(f"INSERT RELATION INTO {edge_table} $edges_{i};")
+        params[f'edges_{i}'] = rows
+    return f"BEGIN TRANSACTION; {' '.join(statements)} COMMIT TRANSACTION;", params
+
+
+def build_traverse(edge_tables: Optional[EdgeTables], direction: str, max_depth: int,
+                   end_table: str = '?') -> str:
+    """
+    A query returning, for the ``$start`` record, the nodes reached at each depth from 1 to ``max_depth``.
+    """
+    hop = _hop(edge_tables, direction)
+    last = _hop(edge_tables, direction, end_table)
+    fields = [f"array::distinct({hop * (depth - 1)}{last}) AS depth_{depth}"
+              for depth in range(1, _check_depth(max_depth) + 1)]
+    return f"SELECT {', '.join(fields)} FROM $start"
+
+
+def parse_traverse(result: Any, start: str, max_depth: int) -> Dict[str, int]:
+    """
+    Map each reached node to the smallest depth it was reached at, leaving out the start node.
+    """
+    rows = _rows(result)
+    row = rows[0] if rows else {}
+    depths: Dict[str, int] = {start: 0}
+    for depth in range(1, max_depth + 1):
+        for node in _flatten(row.get(f'depth_{depth}')):
+            depths.setdefault(_node_id(node), depth)
+    del depths[start]
+    return depths
+
+
+def build_count_connections(edge_tables: Optional[EdgeTables]) -> str:
+    """
+    A query returning in- and out-degree for every record in ``$nodes``.
+    """
+    selector = _edge_selector(edge_tables)
+    return f"SELECT id, count(->{selector}) AS out_degree, count(<-{selector}) AS in_degree FROM $nodes"
+
+
+def parse_count_connections(result: Any, nodes: Sequence[str]) -> Dict[str, Dict[str, int]]:
+    """
+    Degrees keyed by node, with zeros for nodes that do not exist.
+    """
+    counts = {node: {'out': 0, 'in': 0, 'total': 0} for node in nodes}
+    for row in _rows(result):
+        out_degree, in_degree = int(row.get('out_degree') or 0), int(row.get('in_degree') or 0)
+        counts[_node_id(row.get('id'))] = {'out': out_degree, 'in': in_degree, 'total': out_degree + in_degree}
+    return counts
+
+
+def build_neighbours(edge_tables: Optional[EdgeTables], direction: str) -> str:
+    """
+    A query returning the adjacent nodes of every record in ``$nodes``.
+    """
+    return f"SELECT id, {_hop(edge_tables, direction)} AS next FROM $nodes"
+
+
+class PathSearch:
+    """
+    Breadth-first search state that is advanced one whole frontier at a time.
+
+    The caller fetches the neighbours of ``frontier`` (one query per level) and passes them to ``advance``, so the
+    same search drives the sync and async controllers and ``GraphCache``.
+    """
+    def __init__(self, start: str, end: str, max_depth: int) -> None:
+        self.end = end
+        self.max_depth = _check_depth(max_depth)
+        self.depth = 0
+        self.parents: Dict[str, Optional[str]] = {start: None}
+        self.frontier: List[str] = [start] if start != end else []
+        self.path: Optional[List[str]] = [start] if start == end else None
+
+    @property
+    def done(self) -> bool:
+        return self.path is not None or not self.frontier or self.depth >= self.max_depth
+
+    def advance(self, neighbours: Mapping[str, Iterable[str]]) -> Optional[List[str]]:
+        """
+        Expand the frontier with the fetched neighbours.
+        :param neighbours: Adjacent nodes for each node of the current frontier.
+        :return: The path once ``end`` is reached, otherwise None.
+        """
+        self.depth += 1
+        next_frontier = []
+        for node in self.frontier:
+            for neighbour in neighbours.get(node, ()):
+                if neighbour in self.parents:
+                    continue
+                self.parents[neighbour] = node
+                if neighbour == self.end:
+                    self.path = self._unwind(neighbour)
+                    self.frontier = []
+                    return self.path
+                next_frontier.append(neighbour)
+        self.frontier = next_frontier
+        return None
+
+    def _unwind(self, node: Optional[str]) -> List[str]:
+        path = []
+        while node is not None:
+            path.append(node)
+            node = self.parents[node]
+        return path[::-1]
+
+    def frontier_records(self) -> List[Any]:
+        return [_record(node) for node in self.frontier]
+
+    @staticmethod
+    def parse_neighbours(result: Any) -> Dict[str, List[str]]:
+        return {_node_id(row.get('id')): [_node_id(n) for n in _flatten(row.get('next'))] for row in _rows(result)}
 
 
 class GraphController:
@@ -38,8 +264,7 @@ class GraphController:
         :return: The result of the function execution
         """
         if self._is_async:
-            import asyncio
-            return asyncio.ensure_future(func(*args, **kwargs))
+            return _schedule(func(*args, **kwargs))
         return func(*args, **kwargs)
 
     def relate(
@@ -96,23 +321,93 @@ class GraphController:
         query = f"SELECT {direction}{edge_table}{direction}{end_table} FROM {start_node}"
         return self._execute(self.db.query, query)
 
-    def count_connections(self) -> Any:
+    def _run_async(self, method: str, *args: Any, **kwargs: Any) -> Any:
         """
-        TODO
-        This method should implement logic to count connections in the graph.
-        Currently, it returns an empty query.
+        Schedule the AsyncGraphController implementation of a multi-step operation, like ``_execute`` does for queries
+        :return: An asyncio future, or the result when called outside a running loop
         """
-        query = ""
-        return self._execute(self.db.query, query)
+        if not isinstance(self.db, AsyncDbController):
+            raise TypeError("Async graph operations need an AsyncDbController")
+        return _schedule(getattr(AsyncGraphController(self.db), method)(*args, **kwargs))
+
+    def relate_many(self, edges: Iterable[Edge]) -> Any:
+        """
+        Create many relationships in a single transaction
 
-    def find_path(self) -> Any:
+        :param edges: (from_record, edge_table, to_record, edge_data) tuples, e.g.
+            ("diagnosis:flu", "HAS_SYMPTOM", "symptom:fatigue", {"note": "..."}); edge_data may be None
+        :return: The query result
         """
-        TODO
-        This method should implement logic to find paths in the graph.
-        Currently, it returns an empty query.
+        statement, params = build_relate_many(edges)
+        if not params:
+            return []
+        return self._execute(self.db.query, statement, params)
+
+    def traverse(self, start_node: str, edge_tables: Optional[EdgeTables] = None, direction: str = "->",
+                 max_depth: int = 2, end_table: str = "?") -> Any:
         """
-        query = ""
-        return self._execute(self.db.query, query)
+        Find every node reachable from a node within ``max_depth`` hops, in one query
+
+        :param start_node: Starting node ID (e.g., "symptom:fatigue")
+        :param edge_tables: Edge table or tables to follow; None follows any edge
+        :param direction: "->", "<-" or "<->"
+        :param max_depth: Maximum number of hops (1 to MAX_TRAVERSAL_DEPTH)
+        :param end_table: Only report nodes of this table reached on the last hop ("?" for any)
+        :return: {node_id: depth at which it is first reached}
+        """
+        if self._is_async:
+            return self._run_async('traverse', start_node, edge_tables, direction, max_depth, end_table)
+        statement = build_traverse(edge_tables, direction, max_depth, end_table)
+        result = self.db.query(statement, {'start': _record(start_node)})
+        return parse_traverse(result, start_node, max_depth)
+
+    def count_connections(self, nodes: Sequence[str], edge_tables: Optional[EdgeTables] = None) -> Any:
+        """
+        Count incoming and outgoing edges for many nodes in one query
+
+        :param nodes: Node IDs (e.g., ["diagnosis:flu", "diagnosis:depression"])
+        :param edge_tables: Edge table or tables to count; None counts every edge
+        :return: {node_id: {"out": n, "in": n, "total": n}}
+        """
+        if self._is_async:
+            return self._run_async('count_connections', nodes, edge_tables)
+        if not nodes:
+            return {}
+        result = self.db.query(build_count_connections(edge_tables), {'nodes': [_record(n) for n in nodes]})
+        return parse_count_connections(result, nodes)
+
+    def find_path(self, start_node: str, end_node: str, edge_tables: Optional[EdgeTables] = None,
+                  direction: str = "->", max_depth: int = 4) -> Any:
+        """
+        Find a shortest path between two nodes with a breadth-first search that queries one whole level at a time
+
+        :param start_node: Starting node ID
+        :param end_node: Target node ID
+        :param edge_tables: Edge table or tables to follow; None follows any edge
+        :param direction: "->", "<-" or "<->"
+        :param max_depth: Give up after this many hops
+        :return: Node IDs from start to end, or None if there is no path within ``max_depth``
+        """
+        if self._is_async:
+            return self._run_async('find_path', start_node, end_node, edge_tables, direction, max_depth)
+        statement = build_neighbours(edge_tables, direction)
+        search = PathSearch(start_node, end_node, max_depth)
+        while not search.done:
+            result = self.db.query(statement, {'nodes': search.frontier_records()})
+            search.advance(PathSearch.parse_neighbours(result))
+        return search.path
+
+    def load_cache(self, edge_tables: EdgeTables) -> Any:
+        """
+        Load adjacency lists for the given edge tables into a GraphCache
+
+        :param edge_tables: Edge table or tables to cache
+        :return: GraphCache
+        """
+        if self._is_async:
+            return self._run_async('load_cache', edge_tables)
+        return GraphCache({name: _rows(self.db.query(GraphCache.load_statement(name), {}))
+                           for name in _edge_tables(edge_tables)})
 
 
 class AsyncGraphController:
@@ -182,20 +477,217 @@ class AsyncGraphController:
         query = f"SELECT {direction}{edge_table}{direction}{end_table} FROM {start_node}"
         return await self.db.query(query)
 
-    async def count_connections(self) -> Any:
+    async def relate_many(self, edges: Iterable[Edge]) -> Any:
         """
-        TODO
-        This method should implement logic to count connections in the graph.
-        Currently, it returns an empty query.
+        Create many relationships in a single transaction
+
+        :param edges: (from_record, edge_table, to_record, edge_data) tuples; edge_data may be None
+        :return: The query result
         """
-        query = ""
-        return await self.db.query(query)
+        statement, params = build_relate_many(edges)
+        if not params:
+            return []
+        return await self.db.query(statement, params)
 
-    async def find_path(self) -> Any:
+    async def traverse(self, start_node: str, edge_tables: Optional[EdgeTables] = None, direction: str = "->",
+                       max_depth: int = 2, end_table: str = "?") -> Dict[str, int]:
         """
-        TODO
-        This method should implement logic to find paths in the graph.
-        Currently, it returns an empty query.
+        Find every node reachable from a node within ``max_depth`` hops, in one query
+
+        :param start_node: Starting node ID
+        :param edge_tables: Edge table or tables to follow; None follows any edge
+        :param direction: "->", "<-" or "<->"
+        :param max_depth: Maximum number of hops (1 to MAX_TRAVERSAL_DEPTH)
+        :param end_table: Only report nodes of this table reached on the last hop ("?" for any)
+        :return: {node_id: depth at which it is first reached}
         """
-        query = ""
-        return await self.db.query(query)
+        statement = build_traverse(edge_tables, direction, max_depth, end_table)
+        result = await self.db.query(statement, {'start': _record(start_node)})
+        return parse_traverse(result, start_node, max_depth)
+
+    async def count_connections(self, nodes: Sequence[str],
+                                edge_tables: Optional[EdgeTables] = None) -> Dict[str, Dict[str, int]]:
+        """
+        Count incoming and outgoing edges for many nodes in one query
+
+        :param nodes: Node IDs
+        :param edge_tables: Edge table or tables to count; None counts every edge
+        :return: {node_id: {"out": n, "in": n, "total": n}}
+        """
+        if not nodes:
+            return {}
+        result = await self.db.query(build_count_connections(edge_tables), {'nodes': [_record(n) for n in nodes]})
+        return parse_count_connections(result, nodes)
+
+    async def find_path(self, start_node: str, end_node: str, edge_tables: Optional[EdgeTables] = None,
+                        direction: str = "->", max_depth: int = 4) -> Optional[List[str]]:
+        """
+        Find a shortest path between two nodes with a breadth-first search that queries one whole level at a time
+
+        :param start_node: Starting node ID
+        :param end_node: Target node ID
+        :param edge_tables: Edge table or tables to follow; None follows any edge
+        :param direction: "->", "<-" or "<->"
+        :param max_depth: Give up after this many hops
+        :return: Node IDs from start to end, or None if there is no path within ``max_depth``
+        """
+        statement = build_neighbours(edge_tables, direction)
+        search = PathSearch(start_node, end_node, max_depth)
+        while not search.done:
+            result = await self.db.query(statement, {'nodes': search.frontier_records()})
+            search.advance(PathSearch.parse_neighbours(result))
+        return search.path
+
+    async def load_cache(self, edge_tables: EdgeTables) -> 'GraphCache':
+        """
+        Load adjacency lists for the given edge tables into a GraphCache
+
+        :param edge_tables: Edge table or tables to cache
+        :return: GraphCache
+        """
+        edges = {}
+        for name in _edge_tables(edge_tables):
+            edges[name] = _rows(await self.db.query(GraphCache.load_statement(name), {}))
+        return GraphCache(edges)
+
+
+class GraphCache:
+    """
+    In-memory adjacency lists for a snapshot of some edge tables.
+
+    Lookups, traversals and scoring are plain dictionary and set operations, so they take microseconds. The cache
+    does not see later writes; rebuild it with ``load_cache`` when ``age`` exceeds what the caller can tolerate.
+    """
+    def __init__(self, edges: Dict[str, List[Dict[str, Any]]]) -> None:
+        """
+        :param edges: Edge rows per edge table, each with ``in`` and ``out`` and optionally ``in_name``/``out_name``.
+        """
+        self.loaded_at = time.monotonic()
+        self.names: Dict[str, str] = {}
+        self._outgoing: Dict[str, Dict[str, Set[str]]] = {}
+        self._incoming: Dict[str, Dict[str, Set[str]]] = {}
+        for edge_table, rows in edges.items():
+            outgoing = self._outgoing.setdefault(edge_table, {})
+            incoming = self._incoming.setdefault(edge_table, {})
+            for row in rows:
+                source, target = _node_id(row['in']), _node_id(row['out'])
+                outgoing.setdefault(source, set()).add(target)
+                incoming.setdefault(target, set()).add(source)
+                if row.get('in_name'):
+                    self.names[source] = row['in_name']
+                if row.get('out_name'):
+                    self.names[target] = row['out_name']
+        self._weights: Dict[str, Tuple[Dict[str, float], Dict[str, float]]] = {}
+
+    @staticmethod
+    def load_statement(edge_table: str) -> str:
+        return f"SELECT in, out, in.name AS in_name, out.name AS out_name FROM {_identifier(edge_table)}"
+
+    @property
+    def age(self) -> float:
+        """
+        Seconds since the cache was built.
+        """
+        return time.monotonic() - self.loaded_at
+
+    def neighbours(self, node: str, edge_tables: Optional[EdgeTables] = None, direction: str = "->") -> Set[str]:
+        """
+        Nodes adjacent to ``node``.
+        :param node: Node ID.
+        :param edge_tables: Cached edge table or tables to follow; None follows all of them.
+        :param direction: "->", "<-" or "<->".
+        :return: Set of node IDs.
+        """
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {', '.join(DIRECTIONS)}")
+        names = _edge_tables(edge_tables) or list(self._outgoing)
+        result: Set[str] = set()
+        for name in names:
+            if direction in ('->', '<->'):
+                result |= self._outgoing.get(name, {}).get(node, set())
+            if direction in ('<-', '<->'):
+                result |= self._incoming.get(name, {}).get(node, set())
+        return result
+
+    def degree(self, node: str, edge_tables: Optional[EdgeTables] = None) -> Dict[str, int]:
+        """
+        In- and out-degree of a node over the cached edge tables.
+        """
+        names = _edge_tables(edge_tables) or list(self._outgoing)
+        out_degree = sum(len(self._outgoing.get(name, {}).get(node, ())) for name in names)
+        in_degree = sum(len(self._incoming.get(name, {}).get(node, ())) for name in names)
+        return {'out': out_degree, 'in': in_degree, 'total': out_degree + in_degree}
+
+    def traverse(self, start_node: str, edge_tables: Optional[EdgeTables] = None, direction: str = "->",
+                 max_depth: int = 2) -> Dict[str, int]:
+        """
+        Every node within ``max_depth`` hops, mapped to the depth it is first reached at.
+        """
+        depths = {start_node: 0}
+        frontier = [start_node]
+        for depth in range(1, _check_depth(max_depth) + 1):
+            next_frontier = []
+            for node in frontier:
+                for neighbour in self.neighbours(node, edge_tables, direction):
+                    if neighbour not in depths:
+                        depths[neighbour] = depth
+                        next_frontier.append(neighbour)
+            frontier = next_frontier
+        del depths[start_node]
+        return depths
+
+    def find_path(self, start_node: str, end_node: str, edge_tables: Optional[EdgeTables] = None,
+                  direction: str = "->", max_depth: int = 4) -> Optional[List[str]]:
+        """
+        A shortest path between two nodes, or None if there is none within ``max_depth`` hops.
+        """
+        search = PathSearch(start_node, end_node, max_depth)
+        while not search.done:
+            search.advance({node: self.neighbours(node, edge_tables, direction) for node in search.frontier})
+        return search.path
+
+    def _symptom_weights(self, edge_table: str) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """
+        Inverse-document-frequency weight per symptom and the weighted norm of each diagnosis' symptom set.
+        """
+        if edge_table not in self._weights:
+            diagnoses = self._outgoing.get(edge_table, {})
+            symptom_weight = {symptom: math.log(1 + len(diagnoses) / len(linked))
+                              for symptom, linked in self._incoming.get(edge_table, {}).items()}
+            norms = {diagnosis: math.sqrt(sum(symptom_weight[s] ** 2 for s in symptoms))
+                     for diagnosis, symptoms in diagnoses.items()}
+            self._weights[edge_table] = (symptom_weight, norms)
+        return self._weights[edge_table]
+
+    def candidate_diagnoses(self, symptoms: Iterable[str], edge_table: str = "HAS_SYMPTOM",
+                            limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Rank diagnoses by how well their symptoms match the given ones.
+
+        The score is the cosine similarity of the two symptom sets, with each symptom weighted by how specific it is
+        (symptoms shared by many diagnoses count for less).
+        :param symptoms: Symptom node IDs, e.g. ["symptom:fatigue"].
+        :param edge_table: Diagnosis -> symptom edge table.
+        :param limit: Maximum number of candidates.
+        :return: [{"diagnosis", "name", "score", "matched"}], best first.
+        """
+        symptom_weight, norms = self._symptom_weights(edge_table)
+        query = {s for s in symptoms if s in symptom_weight}
+        if not query:
+            return []
+        query_norm = math.sqrt(sum(symptom_weight[s] ** 2 for s in query))
+        matched: Dict[str, List[str]] = {}
+        for symptom in query:
+            for diagnosis in self._incoming[edge_table][symptom]:
+                matched.setdefault(diagnosis, []).append(symptom)
+        candidates: List[Dict[str, Any]] = []
+        for diagnosis, found in matched.items():
+            overlap = sum(symptom_weight[s] ** 2 for s in found)
+            candidates.append({
+                'diagnosis': diagnosis,
+                'name': self.names.get(diagnosis, ''),
+                'score': overlap / (norms[diagnosis] * query_norm) if norms[diagnosis] else 0.0,
+                'matched': sorted(found),
+            })
+        candidates.sort(key=lambda c: (-float(c['score']), c['diagnosis']))
+        return candidates[:limit]
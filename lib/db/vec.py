@@ -10,6 +10,7 @@ from openai.types.chat import ChatCompletionMessageParam
 # Import surrealdb with type ignore since it lacks proper stubs
 from surrealdb import AsyncSurreal  # type: ignore[import-untyped]
 
+from lib.infra.instrumentation import track_external
 from settings import (SURREALDB_DATABASE, SURREALDB_HOST, SURREALDB_NAMESPACE,
                       SURREALDB_PASS, SURREALDB_PORT, SURREALDB_PROTOCOL,
                       SURREALDB_USER, logger)
@@ -253,7 +254,8 @@ class Vec:
         batch_dicts = [item.__dict__ for item in batch.data] # Convert BatchItem to dict
 
         texts  = [d["text"] for d in batch_dicts]
-        resp = await self.client.embeddings.create(model=self.embed_model, input=texts)
+        with track_external("openai", "embeddings"):
+            resp = await self.client.embeddings.create(model=self.embed_model, input=texts)
         embeds = [e.embedding for e in resp.data]
 
         inserted = 0
@@ -298,7 +300,8 @@ class Vec:
         """
         if not self.client:
             raise ValueError("This function requires an OpenAI client to be initialized.")
-        qvec = (await self.client.embeddings.create(model=self.embed_model, input=[question])).data[0].embedding
+        with track_external("openai", "embeddings"):
+            qvec = (await self.client.embeddings.create(model=self.embed_model, input=[question])).data[0].embedding
         db   = AsyncSurreal(DB_URL)  # type: ignore[no-untyped-call]
         await db.connect()  # type: ignore[no-untyped-call]
         await db.signin({"username": SURREALDB_USER, "password": SURREALDB_PASS})  # type: ignore[no-untyped-call]
@@ -356,7 +359,8 @@ class Vec:
             to_message_param("user", question),
         ]
         
-        answer = (await self.client.chat.completions.create(
-            model=self.model, messages=messages, max_tokens=max_tokens
-        )).choices[0].message.content
+        with track_external("openai", "chat.completions"):
+            answer = (await self.client.chat.completions.create(
+                model=self.model, messages=messages, max_tokens=max_tokens
+            )).choices[0].message.content
         return answer if answer is not None else ""
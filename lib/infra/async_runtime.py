@@ -0,0 +1,138 @@
+"""
+Shared event loop for async views and async database work.
+
+Flask runs an async view by starting a fresh event loop for the call, and the old routes did the same with
+``asyncio.run``, so nothing async could outlive a request. Here every coroutine started from request code runs on one
+long-lived loop per process:
+
+* Under the ASGI server (``asgi_app`` in app.py) it is the server's own loop. ``AsyncServingMiddleware`` binds it on
+  the first request and gives every Flask request its own thread. Without it asgiref runs all WSGI requests on a
+  single thread.
+* Elsewhere (the development server, Celery workers, scripts) a daemon thread runs the loop. It is started on first
+  use and again after a fork.
+
+The request thread only waits; the view's I/O is multiplexed on the loop together with every other request's, and
+the connections in ``lib.db.async_pool`` are reused across requests.
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+from functools import wraps
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+
+from asgiref.sync import ThreadSensitiveContext
+from flask import Flask
+
+from settings import ASGI_MAX_CONCURRENT_REQUESTS, logger
+
+T = TypeVar("T")
+
+_bound_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+
+
+def bind_loop(loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """
+    Use ``loop`` (normally the ASGI server's) as the shared loop; None goes back to the background thread.
+    """
+    global _bound_loop
+    _bound_loop = loop
+
+
+def _start_loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="shared-event-loop", daemon=True).start()
+    logger.debug("Started shared event loop in process %d", os.getpid())
+    return loop
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    The process's shared event loop.
+    :return: The bound server loop while it runs, otherwise the background loop.
+    """
+    global _loop, _loop_pid
+    bound = _bound_loop
+    if bound is not None and bound.is_running():
+        return bound
+    with _loop_lock:
+        # A forked child inherits the parent's loop object but not the thread running it.
+        if _loop is None or _loop.is_closed() or _loop_pid != os.getpid():
+            _loop = _start_loop()
+            _loop_pid = os.getpid()
+        return _loop
+
+
+def run_sync(coroutine: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    """
+    Run a coroutine on the shared loop and wait for its result in the calling thread.
+
+    Context variables (Flask's request, session and g) are copied to the task.
+    :param coroutine: The coroutine to run.
+    :param timeout: Seconds to wait before cancelling it.
+    :return: The coroutine's result.
+    :raises RuntimeError: If called from the shared loop itself, which would deadlock.
+    """
+    loop = get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coroutine.close()
+        raise RuntimeError("run_sync() called from the shared event loop; await the coroutine instead")
+    future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+def async_to_sync(func: Callable[..., Coroutine[Any, Any, T]]) -> Callable[..., T]:
+    """
+    Wrap a coroutine function so that calling it runs it with ``run_sync``.
+    """
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        return run_sync(func(*args, **kwargs))
+    return wrapper
+
+
+class SharedLoopFlask(Flask):
+    """
+    Flask app whose async views and hooks run on the shared event loop instead of a new loop per call.
+    """
+    def async_to_sync(self, func: Callable[..., Coroutine[Any, Any, Any]]) -> Callable[..., Any]:
+        return async_to_sync(func)
+
+
+class AsyncServingMiddleware:
+    """
+    ASGI middleware around the WSGI adapter: binds the server loop as the shared loop and runs each HTTP request in
+    its own thread, at most ``max_concurrent_requests`` at a time.
+    """
+    def __init__(self, app: Any, max_concurrent_requests: int = ASGI_MAX_CONCURRENT_REQUESTS) -> None:
+        """
+        :param app: The ASGI app to wrap, normally ``WsgiToAsgi(flask_app)``.
+        :param max_concurrent_requests: Requests served at once; further requests wait on the loop.
+        """
+        self.app = app
+        self.max_concurrent_requests = max_concurrent_requests
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        loop = asyncio.get_running_loop()
+        if _bound_loop is not loop:
+            bind_loop(loop)
+            self._slots = asyncio.Semaphore(self.max_concurrent_requests)
+        if scope["type"] != "http" or self._slots is None:
+            await self.app(scope, receive, send)
+            return
+        async with self._slots:
+            # asgiref gives each ThreadSensitiveContext its own thread for the WSGI call.
+            async with ThreadSensitiveContext():  # type: ignore[no-untyped-call]
+                await self.app(scope, receive, send)
@@ -0,0 +1,284 @@
+"""
+Hot-path instrumentation: database calls, external services, caches and a per-route breakdown.
+
+``PrometheusMetrics`` only times whole requests. The metrics here show where that time goes:
+
+* ``db_query_seconds`` and ``db_query_rows``, per operation, for every call made through the SurrealDB wrappers
+  (``lib.db.surreal``), so ``DbController.query``/``select``/``select_many`` and the async controller are covered.
+* ``db_slow_queries_total`` counts calls slower than ``SLOW_QUERY_THRESHOLD_MS``. A sample of them
+  (``SLOW_QUERY_LOG_SAMPLE_RATE``) is logged with the statement text and the route. Parameters are never logged.
+* ``external_call_seconds`` per service (umls, ner, openai, textract, webhook), operation and outcome.
+* ``cache_requests_total`` per cache and result; the hit ratio of a cache is
+  ``rate(cache_requests_total{result="hit"}[5m]) / rate(cache_requests_total[5m])``.
+* ``request_component_seconds`` and ``request_db_queries`` per route. They split each request's time into database
+  time and each external service, so a slow route can be told apart from a slow dependency.
+
+With ``TRACING_ENABLED`` and the opentelemetry packages installed, database and external calls also emit spans.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from typing import (TYPE_CHECKING, Any, Awaitable, Callable, ContextManager,
+                    Dict, Iterator, Optional, TypeVar)
+
+from prometheus_client import Counter, Histogram
+
+from settings import (SLOW_QUERY_LOG_SAMPLE_RATE, SLOW_QUERY_TEXT_LIMIT,
+                      SLOW_QUERY_THRESHOLD_MS, TRACING_ENABLED, logger)
+
+try:
+    from opentelemetry import trace  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover - opentelemetry is optional
+    trace = None  # type: ignore[assignment]
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+T = TypeVar("T")
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "Duration of SurrealDB calls",
+    ["operation"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_QUERY_ROWS = Histogram(
+    "db_query_rows",
+    "Rows returned by SurrealDB calls",
+    ["operation"],
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000),
+)
+DB_SLOW_QUERIES = Counter(
+    "db_slow_queries_total",
+    "SurrealDB calls slower than SLOW_QUERY_THRESHOLD_MS",
+    ["operation"],
+)
+EXTERNAL_CALL_SECONDS = Histogram(
+    "external_call_seconds",
+    "Duration of calls to external services",
+    ["service", "operation", "outcome"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "Cache lookups by result (hit or miss)",
+    ["cache", "result"],
+)
+REQUEST_COMPONENT_SECONDS = Histogram(
+    "request_component_seconds",
+    "Time one request spent in the database and in each external service",
+    ["endpoint", "component"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "request_db_queries",
+    "SurrealDB calls made while handling one request",
+    ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+
+
+class RequestProfile:
+    """
+    Time spent per component (``db`` or an external service) while handling one request.
+    """
+    __slots__ = ("endpoint", "seconds", "db_queries", "_lock")
+
+    def __init__(self, endpoint: Optional[str] = None) -> None:
+        self.endpoint = endpoint
+        self.seconds: Dict[str, float] = {}
+        self.db_queries = 0
+        # Async views and asyncio.to_thread share the request's profile across threads.
+        self._lock = threading.Lock()
+
+    def add(self, component: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[component] = self.seconds.get(component, 0.0) + seconds
+            if component == "db":
+                self.db_queries += 1
+
+
+_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def _span(name: str, **attributes: Any) -> ContextManager[Any]:
+    if trace is None or not TRACING_ENABLED:
+        return nullcontext()
+    return trace.get_tracer(__name__).start_as_current_span(name, attributes=attributes)
+
+
+def _db_span(operation: str, statement: str) -> ContextManager[Any]:
+    if trace is None or not TRACING_ENABLED:
+        return nullcontext()
+    return _span(f"surrealdb.{operation}", **{"db.system": "surrealdb", "db.statement": _statement_text(statement)})
+
+
+def _is_statement_results(items: Any) -> bool:
+    return isinstance(items, list) and bool(items) and all(
+        isinstance(item, dict) and "status" in item and "result" in item for item in items)
+
+
+def count_rows(result: Any) -> int:
+    """
+    Rows in a SurrealDB result: a list of rows, one record, or per-statement results (as from ``query_raw``).
+    """
+    if result is None:
+        return 0
+    if isinstance(result, dict) and _is_statement_results(result.get("result")):
+        result = result["result"]
+    if _is_statement_results(result):
+        return sum(len(item["result"]) if isinstance(item["result"], list) else 1 for item in result)
+    return len(result) if isinstance(result, list) else 1
+
+
+def _statement_text(statement: str) -> str:
+    text = " ".join(statement.split())
+    return text if len(text) <= SLOW_QUERY_TEXT_LIMIT else text[:SLOW_QUERY_TEXT_LIMIT] + "..."
+
+
+def record_query(operation: str, statement: str, seconds: float, rows: int) -> None:
+    """
+    Record one database call: metrics, the request's profile and, if it was slow, the slow-query log.
+    :param operation: Wrapper method (query, query_raw, select, create, update, delete).
+    :param statement: SurrealQL text, or the table or record for the other operations.
+    :param seconds: Duration.
+    :param rows: Rows returned.
+    """
+    DB_QUERY_SECONDS.labels(operation=operation).observe(seconds)
+    DB_QUERY_ROWS.labels(operation=operation).observe(rows)
+    profile = _profile.get()
+    if profile is not None:
+        profile.add("db", seconds)
+    if seconds * 1000 < SLOW_QUERY_THRESHOLD_MS:
+        return
+    DB_SLOW_QUERIES.labels(operation=operation).inc()
+    if random.random() < SLOW_QUERY_LOG_SAMPLE_RATE:
+        endpoint = profile.endpoint if profile is not None else None
+        logger.warning("Slow query: %s took %.0f ms, %d rows, route %s: %s",
+                       operation, seconds * 1000, rows, endpoint or "-", _statement_text(statement))
+
+
+def timed_query(operation: str, statement: str, call: Callable[..., T], *args: Any) -> T:
+    """
+    Call the SurrealDB client and record the call (failed calls as 0 rows); see ``record_query``.
+    """
+    result = None
+    with _db_span(operation, statement):
+        started = time.perf_counter()
+        try:
+            result = call(*args)
+            return result
+        finally:
+            record_query(operation, statement, time.perf_counter() - started, count_rows(result))
+
+
+async def timed_query_async(operation: str, statement: str, call: Callable[..., Awaitable[T]], *args: Any) -> T:
+    """
+    Await the async SurrealDB client and record the call (failed calls as 0 rows); see ``record_query``.
+    """
+    result = None
+    with _db_span(operation, statement):
+        started = time.perf_counter()
+        try:
+            result = await call(*args)
+            return result
+        finally:
+            record_query(operation, statement, time.perf_counter() - started, count_rows(result))
+
+
+class ExternalCall:
+    """
+    Outcome of a call timed by ``track_external``; set ``ok`` to False for a response that signals failure.
+    """
+    __slots__ = ("ok",)
+
+    def __init__(self) -> None:
+        self.ok = True
+
+
+@contextmanager
+def track_external(service: str, operation: str) -> Iterator[ExternalCall]:
+    """
+    Time a call to an external service: ``with track_external("umls", "search") as call: ...``
+
+    The call counts as failed if the block raises or sets ``call.ok = False``.
+    :param service: umls, ner, openai, textract, webhook, ...
+    :param operation: The endpoint or API method called.
+    """
+    call = ExternalCall()
+    started = time.perf_counter()
+    try:
+        with _span(f"{service}.{operation}", **{"peer.service": service}):
+            yield call
+    except BaseException:
+        call.ok = False
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        EXTERNAL_CALL_SECONDS.labels(service=service, operation=operation,
+                                     outcome="ok" if call.ok else "error").observe(seconds)
+        profile = _profile.get()
+        if profile is not None:
+            profile.add(service, seconds)
+
+
+def timed_external(service: str, operation: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """
+    Decorator form of ``track_external``.
+    """
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            with track_external(service, operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache: str, hit: bool, count: int = 1) -> None:
+    """
+    Count cache lookups.
+    :param cache: Cache name.
+    :param hit: Whether the lookups were answered from the cache.
+    :param count: Number of lookups, for batched lookups.
+    """
+    if count:
+        CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc(count)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """
+    The profile of the request being handled, if any.
+    """
+    return _profile.get()
+
+
+# Flask is imported by the hooks rather than at module level, so Celery workers do not load it for the DB metrics.
+def _start_request() -> None:
+    from flask import g, request
+    g.request_profile_token = _profile.set(RequestProfile(request.endpoint))
+
+
+def _end_request(error: Optional[BaseException]) -> None:
+    from flask import g
+    token = g.pop("request_profile_token", None)
+    if token is None:
+        return
+    profile = _profile.get()
+    _profile.reset(token)
+    if profile is None:
+        return
+    endpoint = profile.endpoint or "unknown"
+    REQUEST_DB_QUERIES.labels(endpoint=endpoint).observe(profile.db_queries)
+    for component, seconds in profile.seconds.items():
+        REQUEST_COMPONENT_SECONDS.labels(endpoint=endpoint, component=component).observe(seconds)
+
+
+def init_app(app: "Flask") -> None:
+    """
+    Profile every request of ``app`` and export the per-route breakdown.
+    """
+    app.before_request(_start_request)
+    app.teardown_request(_end_request)
@@ -0,0 +1,55 @@
+"""
+JSON provider for Flask responses.
+
+Rows from SurrealDB may still carry ``RecordID`` values (see ``lib.db.decoding``); the provider encodes them
+directly, so routes do not need to copy rows into plain dicts first. When orjson is installed it is used for
+encoding, otherwise the standard library is.
+"""
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+from lib.db.decoding import json_default
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None  # type: ignore[assignment]
+
+
+class SurrealJSONProvider(DefaultJSONProvider):
+    """
+    Flask's default JSON provider, aware of SurrealDB values and using orjson when available.
+    """
+
+    @staticmethod
+    def default(o: Any) -> Any:  # type: ignore[override]
+        value = json_default(o)
+        if value is not None:
+            return value
+        return DefaultJSONProvider.default(o)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """
+        Serialize data as JSON to a string.
+        :param obj: The data to serialize.
+        :param kwargs: Passed to :func:`json.dumps`; orjson is only used for ``indent`` of 2 and ``sort_keys``.
+        :return: str
+        """
+        indent = kwargs.pop("indent", None)
+        sort_keys = kwargs.pop("sort_keys", self.sort_keys)
+        if orjson is not None and not kwargs and indent in (None, 2):
+            # Datetimes are passed to ``default`` so they keep Flask's HTTP date format.
+            option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+            if sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(obj, default=self.default, option=option).decode()
+            except orjson.JSONEncodeError:
+                # For example integers beyond 64 bits; the standard library handles those.
+                pass
+        if indent is not None:
+            kwargs["indent"] = indent
+        return super().dumps(obj, sort_keys=sort_keys, **kwargs)
@@ -0,0 +1,158 @@
+"""
+Request-scoped database handle and service container.
+
+One authenticated request used to connect to SurrealDB several times. ``require_auth`` and ``require_role`` each made
+a UserService, and the route then made its own services, sometimes one per loop iteration. Now every service
+obtained through ``get_service`` during a request shares one ``ScopedDbController``:
+
+* The handle takes a pooled connection (``lib.db.pool``) the first time anything connects.
+* The services' own ``close()`` calls are no-ops.
+* The connection goes back to the pool when the request is torn down. After an unhandled error it is closed
+  instead.
+
+Services are cached per class, so decorators and nested calls get the same instance. Outside a request
+``get_service`` builds a service with its own controller, as before.
+
+``init_app`` also counts the connections each request opens, pooled or not. The counts go to the
+``db_connections_per_request`` histogram, so code paths that still connect on their own show up.
+"""
+from typing import Any, Callable, Dict, Optional, Type, TypeVar
+
+from flask import Flask, g, has_request_context, request
+from prometheus_client import Histogram
+
+from lib.db.pool import DbPool, get_db_pool
+from lib.db.surreal import (DbController, count_connections,
+                            stop_counting_connections)
+from settings import logger
+
+S = TypeVar("S")
+
+DB_CONNECTIONS_PER_REQUEST = Histogram(
+    "db_connections_per_request",
+    "SurrealDB connections opened while handling one request",
+    ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21),
+)
+
+
+class ScopedDbController(DbController):
+    """
+    DbController shared by everything in one request; it borrows a pooled connection and gives it back at teardown.
+    """
+    def __init__(self, pool: Optional[DbPool] = None) -> None:
+        """
+        :param pool: Pool to borrow from; the process-wide pool by default.
+        """
+        super().__init__()
+        self.pool = pool or get_db_pool()
+        self._lease: Optional[DbController] = None
+
+    def connect(self) -> str:
+        """
+        Borrow a connection on first use; later calls reuse it.
+        :return: Empty string (the signin happened when the pooled connection was opened)
+        """
+        if self._lease is None:
+            self._lease = self.pool.acquire()
+            self.db = self._lease.db
+        return ""
+
+    def close(self) -> None:
+        """
+        Kept open for the rest of the request; see ``release``.
+        """
+
+    def release(self, discard: bool = False) -> None:
+        """
+        Return the borrowed connection to the pool.
+        :param discard: Close it instead.
+        """
+        lease, self._lease = self._lease, None
+        self.db = None
+        if lease is not None:
+            self.pool.release(lease, discard=discard)
+
+
+class RequestServices:
+    """
+    Services of one request, all using one ScopedDbController.
+    """
+    def __init__(self, pool: Optional[DbPool] = None) -> None:
+        self.db = ScopedDbController(pool)
+        self._services: Dict[Callable[..., Any], Any] = {}
+
+    def get(self, service_cls: Callable[..., S]) -> S:
+        """
+        The request's instance of a service; it is created on first use with the shared controller.
+        :param service_cls: A service class taking the DbController as its first argument.
+        :return: The service
+        """
+        service: Optional[S] = self._services.get(service_cls)
+        if service is None:
+            service = self._services[service_cls] = service_cls(self.db)
+        return service
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """
+        Release the connection; after an error it is closed rather than reused.
+        """
+        self._services.clear()
+        self.db.release(discard=error is not None)
+
+
+def request_services() -> Optional[RequestServices]:
+    """
+    The current request's container, created on first use; None outside a request.
+    """
+    if not has_request_context():
+        return None
+    services = g.get("services")
+    if services is None:
+        services = g.services = RequestServices()
+    return services  # type: ignore[no-any-return]
+
+
+def get_service(service_cls: Type[S]) -> S:
+    """
+    A service for the current request, sharing its database handle; a standalone instance outside a request.
+    """
+    services = request_services()
+    if services is None:
+        return service_cls()
+    return services.get(service_cls)
+
+
+def get_db() -> DbController:
+    """
+    The current request's database handle; a new, unconnected DbController outside a request.
+    """
+    services = request_services()
+    return services.db if services is not None else DbController()
+
+
+def _start_request() -> None:
+    g.db_connections, g.db_connections_token = count_connections()
+
+
+def _end_request(error: Optional[BaseException]) -> None:
+    services = g.pop("services", None)
+    if services is not None:
+        services.close(error)
+    token = g.pop("db_connections_token", None)
+    counter = g.pop("db_connections", None)
+    if token is not None:
+        stop_counting_connections(token)
+    if counter is not None:
+        endpoint = request.endpoint or "unknown"
+        DB_CONNECTIONS_PER_REQUEST.labels(endpoint=endpoint).observe(counter.opened)
+        if counter.opened > 1:
+            logger.debug("%s opened %d database connections", endpoint, counter.opened)
+
+
+def init_app(app: Flask) -> None:
+    """
+    Give every request of ``app`` a service container and count its connections.
+    """
+    app.before_request(_start_request)
+    app.teardown_request(_end_request)
@@ -1,6 +1,7 @@
 """
 LLM Agent Module
 """
+import asyncio
 import enum
 import json
 from typing import (Any, Callable, Collection, Dict, List, Optional, Sequence,
@@ -10,6 +11,7 @@ from openai import OpenAI
 from openai.types.beta.threads.runs import ToolCall
 from openai.types.chat import ChatCompletionMessageToolCall
 
+from lib.infra.instrumentation import track_external
 from lib.llm.mcp_tools import fetch_mcp_tool_defs
 from lib.services.encryption import get_encryption_service
 from settings import logger
@@ -291,16 +293,19 @@ class LLMAgent:
         logger.debug(f"Making OpenAI API call with {len(self.tool_definitions)} tools")
         logger.debug(f"Tool definitions: {self.tool_definitions}")
         
-        completion = self.client.chat.completions.create(
-            model=self.model.value,
-            messages=messages,
-            tools=self.tool_definitions,
-            #tool_choice="auto",
-            #tool_choice='required',
-            extra_headers={
-                "x-user-pw": api_key
-            }
-        )
+        # The OpenAI client blocks; run it in a thread so the event loop keeps serving other requests meanwhile.
+        with track_external("openai", "chat.completions"):
+            completion = await asyncio.to_thread(
+                self.client.chat.completions.create,
+                model=self.model.value,
+                messages=messages,
+                tools=self.tool_definitions,
+                #tool_choice="auto",
+                #tool_choice='required',
+                extra_headers={
+                    "x-user-pw": api_key
+                }
+            )
 
         top_choice = completion.choices[0].message
 
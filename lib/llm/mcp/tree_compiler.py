@@ -0,0 +1,522 @@
+"""
+Decision tree compiler.
+
+Lowers the nested ``{'question': ..., 'branches': {...}}`` dictionaries used by the MCP clinical tools into a flat,
+array-based representation:
+
+* every question node gets a pre-resolved feature index (no substring matching of kwarg names at lookup time),
+* numeric comparisons and ``('in', range(...))`` branches become interval bounds stored in NumPy arrays,
+* everything else (Enums, set membership, regexes, callables) is kept as a Python predicate.
+
+A compiled tree can answer a single lookup (``CompiledTree.lookup``) or classify thousands of rows at once
+(``CompiledTree.classify_batch``) while still producing the same ``path_taken`` explanations as the interpreted
+``decision_tree_lookup``.
+"""
+import re
+from dataclasses import dataclass
+from typing import (Any, Callable, Dict, FrozenSet, List, Mapping, Optional,
+                    Sequence, Tuple, Union)
+
+import numpy as np
+from numpy.typing import NDArray
+
+compare_ops: dict[str, Callable[[Any, Any], bool]] = {}
+
+def register_compare_op(symbol: str, func: Callable[[Any, Any], bool]) -> None:
+    """Allow the tree author to plug‑in new binary operators at runtime."""
+    compare_ops[symbol] = func
+
+register_compare_op('==', lambda x, y: x == y)
+register_compare_op('!=', lambda x, y: x != y)
+register_compare_op('>',  lambda x, y: x >  y)
+register_compare_op('>=', lambda x, y: x >= y)
+register_compare_op('<',  lambda x, y: x <  y)
+register_compare_op('<=', lambda x, y: x <= y)
+register_compare_op('in',     lambda x, y: x in y)
+register_compare_op('not in', lambda x, y: x not in y)
+register_compare_op('regex',  lambda x, pattern: re.fullmatch(pattern, str(x)) is not None)
+
+BranchKey = Union[Tuple[str, Any], Callable[[Any], bool], Any]
+
+# Branch kinds
+NUMERIC = 0
+GENERIC = 1
+
+# Leaf codes for rows that did not reach a decision
+INVALID_VALUE = -1
+UNANSWERED = -2
+
+_NUMERIC_OPS = {'<', '<=', '>', '>=', '==', '!='}
+
+
+def _is_number(value: Any) -> bool:
+    """
+    Check whether a branch reference can be lowered to a numeric bound.
+    :param value: The branch reference value.
+    :return: True for ints and floats (including NumPy scalars).
+    """
+    return isinstance(value, (int, float, np.integer, np.floating))
+
+
+def _numeric_bounds(op: str, ref: Any) -> Optional[Tuple[float, float, bool, bool, bool, bool]]:
+    """
+    Lower a ``(op, ref)`` branch key to an interval test.
+    :param op: Comparison operator symbol.
+    :param ref: Reference value of the comparison.
+    :return: ``(lo, hi, lo_inclusive, hi_inclusive, integral, negate)`` or None if the branch is not numeric.
+    """
+    if op in _NUMERIC_OPS and _is_number(ref):
+        ref = float(ref)
+        if op == '<':
+            return -np.inf, ref, False, False, False, False
+        if op == '<=':
+            return -np.inf, ref, False, True, False, False
+        if op == '>':
+            return ref, np.inf, False, False, False, False
+        if op == '>=':
+            return ref, np.inf, True, False, False, False
+        return ref, ref, True, True, False, op == '!='
+    if op in ('in', 'not in') and isinstance(ref, range) and ref.step == 1:
+        # `x in range(a, b)` only holds for integral x, so keep that as part of the test.
+        return float(ref.start), float(ref.stop), True, False, True, op == 'not in'
+    return None
+
+
+def _make_predicate(key: BranchKey, ops: Mapping[str, Callable[[Any, Any], bool]]) -> Callable[[Any], bool]:
+    """
+    Build the scalar predicate for a branch key, mirroring ``_choose_branch`` in trees.py.
+    :param key: The branch key.
+    :param ops: Operator registry used for ``(op, ref)`` keys.
+    :return: A callable returning True when the branch matches.
+    """
+    if callable(key):
+        return key
+    if isinstance(key, tuple) and len(key) == 2:  # type: ignore
+        op, ref = key  # type: ignore
+        if op not in ops:
+            raise ValueError(f"Unsupported operator {op!r}. Register it first.")
+        func = ops[op]
+        return lambda x: bool(func(x, ref))
+    return lambda x: bool(x == key)
+
+
+def _describe(key: BranchKey, subterm: str, arg: Any) -> str:
+    """
+    Render a ``path_taken`` entry in the same format as the interpreted lookup.
+    :param key: The branch key that matched.
+    :param subterm: Human-readable feature name.
+    :param arg: The value that was tested.
+    :return: Explanation string.
+    """
+    if isinstance(arg, np.generic):
+        arg = arg.item()
+    if callable(key):
+        return f"Checked {subterm}: predicate {key.__name__} → True"
+    if isinstance(key, tuple) and len(key) == 2:  # type: ignore
+        op, ref = key  # type: ignore
+        return f"Checked {subterm}: {arg!r} {op} {ref!r}"
+    return f"Checked {subterm}: {arg!r} == {key!r}"
+
+
+def _split_leaf(leaf: Any) -> Tuple[str, str]:
+    """
+    Split a leaf string into its decision and reason parts.
+    :param leaf: The leaf value, e.g. "Approved - Auto loan".
+    :return: Tuple of (decision, reason).
+    """
+    decision, *rest = str(leaf).split(' - ', 1)
+    reason = rest[0] if rest else "No specific reason provided."
+    return decision, reason
+
+
+class CompiledTree:
+    """
+    Flat, array-backed representation of a decision tree.
+
+    Nodes are numbered so that a parent always has a lower index than its children, which lets the batch classifier
+    visit each node exactly once.
+    """
+    def __init__(
+            self,
+            feature_names: Sequence[str],
+            questions: List[str],
+            node_candidates: List[Tuple[int, ...]],
+            node_depth: List[int],
+            node_branch_start: List[int],
+            node_branch_end: List[int],
+            branch_keys: List[BranchKey],
+            branch_predicates: List[Callable[[Any], bool]],
+            branch_bounds: List[Optional[Tuple[float, float, bool, bool, bool, bool]]],
+            branch_target: List[int],
+            branch_is_leaf: List[bool],
+            leaves: List[Tuple[str, str]],
+        ) -> None:
+        """
+        Initialize the compiled tree. Use ``compile_tree`` rather than calling this directly.
+        :param feature_names: Names of the features (kwargs / columns) the tree was compiled against.
+        :param questions: Question text per node.
+        :param node_candidates: Feature indices whose name appears in each node's question, in priority order.
+        :param node_depth: Depth of each node (root is 0).
+        :param node_branch_start: Index of each node's first branch.
+        :param node_branch_end: One past the index of each node's last branch.
+        :param branch_keys: Original branch keys, kept for explanations.
+        :param branch_predicates: Scalar predicate per branch.
+        :param branch_bounds: Interval bounds per branch, or None for generic branches.
+        :param branch_target: Child node index, or leaf index when ``branch_is_leaf`` is set.
+        :param branch_is_leaf: Whether each branch terminates in a leaf.
+        :param leaves: ``(decision, reason)`` per leaf.
+        :return: None
+        """
+        self.feature_names: Tuple[str, ...] = tuple(feature_names)
+        self.subterms: Tuple[str, ...] = tuple(name.replace('_', ' ') for name in feature_names)
+        self.questions = questions
+        self.node_candidates = node_candidates
+        self.node_depth = np.asarray(node_depth, dtype=np.int32)
+        self.node_branch_start = np.asarray(node_branch_start, dtype=np.int32)
+        self.node_branch_end = np.asarray(node_branch_end, dtype=np.int32)
+        self.max_depth = int(self.node_depth.max()) + 1 if node_depth else 0
+
+        self.branch_keys = branch_keys
+        self.branch_predicates = branch_predicates
+        self.branch_kind = np.asarray(
+            [NUMERIC if bounds is not None else GENERIC for bounds in branch_bounds], dtype=np.int8
+        )
+        self.branch_lo = np.asarray([b[0] if b else np.nan for b in branch_bounds], dtype=np.float64)
+        self.branch_hi = np.asarray([b[1] if b else np.nan for b in branch_bounds], dtype=np.float64)
+        self.branch_lo_inclusive = np.asarray([b[2] if b else False for b in branch_bounds], dtype=bool)
+        self.branch_hi_inclusive = np.asarray([b[3] if b else False for b in branch_bounds], dtype=bool)
+        self.branch_integral = np.asarray([b[4] if b else False for b in branch_bounds], dtype=bool)
+        self.branch_negate = np.asarray([b[5] if b else False for b in branch_bounds], dtype=bool)
+        self.branch_target = np.asarray(branch_target, dtype=np.int32)
+        self.branch_is_leaf = np.asarray(branch_is_leaf, dtype=bool)
+
+        self.leaf_decisions = np.asarray([leaf[0] for leaf in leaves] + ["Error"], dtype=object)
+        self.leaf_reasons = np.asarray([leaf[1] for leaf in leaves] + [""], dtype=object)
+
+        self._feature_cache: Dict[FrozenSet[str], NDArray[np.int32]] = {}
+
+    @property
+    def n_nodes(self) -> int:
+        """
+        Number of question nodes in the tree.
+        :return: int
+        """
+        return len(self.questions)
+
+    def resolve_features(self, supplied: Sequence[str]) -> NDArray[np.int32]:
+        """
+        Resolve which supplied feature answers each node.
+        :param supplied: Names of the features available for this call.
+        :return: Array with one feature index per node, -1 where no supplied feature matches the question.
+        """
+        key = frozenset(supplied)
+        resolved = self._feature_cache.get(key)
+        if resolved is None:
+            resolved = np.full(self.n_nodes, -1, dtype=np.int32)
+            for node, candidates in enumerate(self.node_candidates):
+                for feature in candidates:
+                    if self.feature_names[feature] in key:
+                        resolved[node] = feature
+                        break
+            self._feature_cache[key] = resolved
+        return resolved
+
+    def _error(self, node: int, feature: int, value: Any, path: List[str]) -> Dict[str, Any]:
+        """
+        Build the error result for a row that could not be classified.
+        :param node: The node where classification stopped.
+        :param feature: The resolved feature index, or -1 if none matched.
+        :param value: The value that failed every branch.
+        :param path: The path taken so far.
+        :return: Result dictionary in the ``decision_tree_lookup`` format.
+        """
+        if feature < 0:
+            reason = f"Question {self.questions[node]!r} could not be answered with supplied arguments."
+        else:
+            if isinstance(value, np.generic):
+                value = value.item()
+            reason = f"Invalid value for {self.subterms[feature]}: {value!r}"
+        return {"decision": "Error", "reason": reason, "path_taken": path}
+
+    def lookup(self, **kwargs: Any) -> Dict[str, Any]:
+        """
+        Classify a single set of answers.
+        :param kwargs: Feature values keyed by feature name.
+        :return: A dictionary containing the final decision, reason and the logical path taken.
+        """
+        features = self.resolve_features(list(kwargs))
+        path_taken: List[str] = []
+        node = 0
+        while True:
+            feature = int(features[node])
+            if feature < 0:
+                return self._error(node, feature, None, path_taken)
+            value = kwargs[self.feature_names[feature]]
+            for branch in range(self.node_branch_start[node], self.node_branch_end[node]):
+                if self.branch_predicates[branch](value):
+                    path_taken.append(_describe(self.branch_keys[branch], self.subterms[feature], value))
+                    target = int(self.branch_target[branch])
+                    if self.branch_is_leaf[branch]:
+                        return {
+                            "decision": self.leaf_decisions[target],
+                            "reason": self.leaf_reasons[target],
+                            "path_taken": path_taken
+                        }
+                    node = target
+                    break
+            else:
+                return self._error(node, feature, value, path_taken)
+
+    def _match(self, branch: int, values: NDArray[Any]) -> NDArray[np.bool_]:
+        """
+        Evaluate one branch against a vector of values.
+        :param branch: Branch index.
+        :param values: Feature values for the rows currently at the branch's node.
+        :return: Boolean mask of matching rows.
+        """
+        if self.branch_kind[branch] == NUMERIC and values.dtype.kind in 'biuf':
+            lo = self.branch_lo[branch]
+            hi = self.branch_hi[branch]
+            mask = np.ones(values.shape, dtype=bool)
+            if lo > -np.inf:
+                mask &= values >= lo if self.branch_lo_inclusive[branch] else values > lo
+            if hi < np.inf:
+                mask &= values <= hi if self.branch_hi_inclusive[branch] else values < hi
+            if self.branch_integral[branch] and values.dtype.kind == 'f':
+                mask &= values == np.floor(values)
+            if self.branch_negate[branch]:
+                mask = ~mask
+            return mask
+        predicate = self.branch_predicates[branch]
+        return np.fromiter((predicate(v) for v in values), dtype=bool, count=len(values))
+
+    def classify_batch(self, columns: Mapping[str, Any]) -> 'BatchDecision':
+        """
+        Classify many rows at once.
+
+        Each column is converted to a NumPy array; numeric branches are evaluated with vectorized comparisons and
+        every node is visited once for all the rows that reach it.
+
+        :param columns: Feature values keyed by feature name, one equally sized sequence per feature.
+        :return: BatchDecision holding leaf codes and the branch taken at every depth for each row.
+        """
+        arrays: Dict[int, NDArray[Any]] = {}
+        n_rows: Optional[int] = None
+        for feature, name in enumerate(self.feature_names):
+            if name not in columns:
+                continue
+            array = np.asarray(columns[name])
+            if array.ndim != 1:
+                raise ValueError(f"Column {name!r} must be one-dimensional.")
+            if n_rows is None:
+                n_rows = len(array)
+            elif len(array) != n_rows:
+                raise ValueError(f"Column {name!r} has {len(array)} rows, expected {n_rows}.")
+            arrays[feature] = array
+        n_rows = n_rows or 0
+
+        features = self.resolve_features(list(columns))
+        current = np.zeros(n_rows, dtype=np.int32)
+        leaf = np.full(n_rows, INVALID_VALUE, dtype=np.int32)
+        stop_node = np.full(n_rows, -1, dtype=np.int32)
+        path = np.full((n_rows, self.max_depth), -1, dtype=np.int32)
+
+        for node in range(self.n_nodes):
+            rows = np.flatnonzero(current == node)
+            if rows.size == 0:
+                continue
+            current[rows] = -1
+            feature = int(features[node])
+            if feature < 0:
+                leaf[rows] = UNANSWERED
+                stop_node[rows] = node
+                continue
+
+            values = arrays[feature][rows]
+            pending = np.ones(rows.size, dtype=bool)
+            depth = self.node_depth[node]
+            for branch in range(self.node_branch_start[node], self.node_branch_end[node]):
+                mask = self._match(branch, values) & pending
+                if not mask.any():
+                    continue
+                selected = rows[mask]
+                path[selected, depth] = branch
+                if self.branch_is_leaf[branch]:
+                    leaf[selected] = self.branch_target[branch]
+                else:
+                    current[selected] = self.branch_target[branch]
+                pending &= ~mask
+                if not pending.any():
+                    break
+
+            unmatched = rows[pending]
+            leaf[unmatched] = INVALID_VALUE
+            stop_node[unmatched] = node
+
+        return BatchDecision(self, leaf, path, stop_node, features, arrays)
+
+
+@dataclass
+class BatchDecision:
+    """
+    Result of ``CompiledTree.classify_batch``.
+
+    ``leaf`` holds the leaf index per row (negative for errors), ``path`` the branch index taken at every depth.
+    Explanations are rendered on demand so the vectorized pass stays cheap.
+    """
+    tree: CompiledTree
+    leaf: NDArray[np.int32]
+    path: NDArray[np.int32]
+    stop_node: NDArray[np.int32]
+    features: NDArray[np.int32]
+    columns: Dict[int, NDArray[Any]]
+
+    def __len__(self) -> int:
+        return len(self.leaf)
+
+    @property
+    def decisions(self) -> NDArray[np.object_]:
+        """
+        Decision label per row ("Error" for rows that could not be classified).
+        :return: Object array of strings.
+        """
+        return self.tree.leaf_decisions[np.where(self.leaf >= 0, self.leaf, -1)]
+
+    @property
+    def reasons(self) -> NDArray[np.object_]:
+        """
+        Reason text per row (empty for error rows; see ``record`` for the error reason).
+        :return: Object array of strings.
+        """
+        return self.tree.leaf_reasons[np.where(self.leaf >= 0, self.leaf, -1)]
+
+    def explain(self, row: int) -> List[str]:
+        """
+        Render the ``path_taken`` for a single row.
+        :param row: Row index.
+        :return: List of explanation strings.
+        """
+        tree = self.tree
+        path_taken: List[str] = []
+        for branch in self.path[row]:
+            if branch < 0:
+                break
+            node = int(np.searchsorted(tree.node_branch_end, branch, side='right'))
+            feature = int(self.features[node])
+            path_taken.append(_describe(tree.branch_keys[branch], tree.subterms[feature], self.columns[feature][row]))
+        return path_taken
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """
+        Build the result for one row in the same shape as ``decision_tree_lookup``.
+        :param row: Row index.
+        :return: Dictionary with decision, reason and path_taken.
+        """
+        path_taken = self.explain(row)
+        leaf = int(self.leaf[row])
+        if leaf >= 0:
+            return {
+                "decision": self.tree.leaf_decisions[leaf],
+                "reason": self.tree.leaf_reasons[leaf],
+                "path_taken": path_taken
+            }
+        node = int(self.stop_node[row])
+        feature = int(self.features[node])
+        value = self.columns[feature][row] if feature >= 0 else None
+        return self.tree._error(node, feature, value, path_taken)
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """
+        Build results for every row.
+        :return: List of result dictionaries.
+        """
+        return [self.record(row) for row in range(len(self))]
+
+
+def compile_tree(
+        tree: Dict[str, Any],
+        features: Sequence[str],
+        ops: Optional[Mapping[str, Callable[[Any, Any], bool]]] = None
+    ) -> CompiledTree:
+    """
+    Compile a nested decision tree into a CompiledTree.
+
+    Each question is bound to the features whose name (with underscores replaced by spaces) appears in its text,
+    in the order given by ``features``. This is the same matching ``decision_tree_lookup`` does on every call, done
+    once up front.
+
+    :param tree: The decision tree structure, where each node is a dictionary with 'question' and 'branches'.
+    :param features: Feature names (the kwargs the tree is normally called with), in priority order.
+    :param ops: Operator registry for ``(op, ref)`` branch keys. Defaults to ``compare_ops``.
+    :return: CompiledTree
+    """
+    if ops is None:
+        ops = compare_ops
+    if not (isinstance(tree, dict) and 'question' in tree and 'branches' in tree):
+        raise ValueError("The root of a decision tree must be a question node.")
+
+    subterms = [name.replace('_', ' ') for name in features]
+
+    questions: List[str] = []
+    node_candidates: List[Tuple[int, ...]] = []
+    node_depth: List[int] = []
+    node_branch_start: List[int] = []
+    node_branch_end: List[int] = []
+    branch_keys: List[BranchKey] = []
+    branch_predicates: List[Callable[[Any], bool]] = []
+    branch_bounds: List[Optional[Tuple[float, float, bool, bool, bool, bool]]] = []
+    branch_target: List[int] = []
+    branch_is_leaf: List[bool] = []
+    leaves: List[Tuple[str, str]] = []
+
+    # Breadth-first so that children always get higher node indices than their parents.
+    queue: List[Tuple[Dict[str, Any], int]] = [(tree, 0)]
+    pending_children: List[Tuple[int, Dict[str, Any]]] = []
+    while queue:
+        node, depth = queue.pop(0)
+        question = str(node.get('question', ''))
+        questions.append(question)
+        node_candidates.append(tuple(i for i, subterm in enumerate(subterms) if subterm in question))
+        node_depth.append(depth)
+        node_branch_start.append(len(branch_keys))
+
+        branches: Dict[BranchKey, Any] = node['branches']
+        for key, child in branches.items():
+            branch = len(branch_keys)
+            branch_keys.append(key)
+            branch_predicates.append(_make_predicate(key, ops))
+            bounds = None
+            if isinstance(key, tuple) and len(key) == 2:  # type: ignore
+                bounds = _numeric_bounds(key[0], key[1])
+            branch_bounds.append(bounds)
+
+            if isinstance(child, dict) and 'question' in child and 'branches' in child:
+                branch_target.append(-1)
+                branch_is_leaf.append(False)
+                pending_children.append((branch, child))
+                queue.append((child, depth + 1))
+            else:
+                branch_target.append(len(leaves))
+                branch_is_leaf.append(True)
+                leaves.append(_split_leaf(child))
+
+        node_branch_end.append(len(branch_keys))
+
+    # Queue order is node order, so the n-th queued child is node n + 1.
+    for child_node, (branch, _) in enumerate(pending_children, start=1):
+        branch_target[branch] = child_node
+
+    return CompiledTree(
+        feature_names=features,
+        questions=questions,
+        node_candidates=node_candidates,
+        node_depth=node_depth,
+        node_branch_start=node_branch_start,
+        node_branch_end=node_branch_end,
+        branch_keys=branch_keys,
+        branch_predicates=branch_predicates,
+        branch_bounds=branch_bounds,
+        branch_target=branch_target,
+        branch_is_leaf=branch_is_leaf,
+        leaves=leaves,
+    )
@@ -3,33 +3,16 @@ Decision trees for various applications, including loan eligibility and medical
 """
 import asyncio
 import enum
-import re
-from typing import Annotated, Any, Callable, Dict, Tuple, Union
+from typing import Annotated, Any, Dict, List, Tuple
 
 from fastmcp import Context
 from mcp_init import mcp  # type: ignore
 from pydantic import Field
+from tree_compiler import (BranchKey, CompiledTree,  # type: ignore[import-not-found]
+                           compare_ops, compile_tree, register_compare_op)
 
 from settings import logger
 
-compare_ops: dict[str, Callable[[Any, Any], bool]] = {}
-
-def register_compare_op(symbol: str, func: Callable[[Any, Any], bool]) -> None:
-    """Allow the tree author to plug‑in new binary operators at runtime."""
-    compare_ops[symbol] = func
-
-register_compare_op('==', lambda x, y: x == y)
-register_compare_op('!=', lambda x, y: x != y)
-register_compare_op('>',  lambda x, y: x >  y)
-register_compare_op('>=', lambda x, y: x >= y)
-register_compare_op('<',  lambda x, y: x <  y)
-register_compare_op('<=', lambda x, y: x <= y)
-register_compare_op('in',     lambda x, y: x in y)
-register_compare_op('not in', lambda x, y: x not in y)
-register_compare_op('regex',  lambda x, pattern: re.fullmatch(pattern, str(x)) is not None)
-
-BranchKey = Union[Tuple[str, Any], Callable[[Any], bool], Any]
-
 
 def _choose_branch(
         branches: Dict[BranchKey, Any],
@@ -138,6 +121,12 @@ LOAN_DECISION_TREE: Dict[str, Any] = {
     }
 }
 
+# Flat-array version of the tree above; used by loan_decision_tree_lookup.
+COMPILED_LOAN_TREE: CompiledTree = compile_tree(
+    LOAN_DECISION_TREE,
+    features=('credit_score', 'income', 'requested_amount')
+)
+
 def loan_decision_tree_lookup(credit_score: int, income: int, requested_amount: int) -> Dict[str, Any]:
     """
     Looks up a loan decision from a deterministic decision tree.
@@ -150,8 +139,7 @@ def loan_decision_tree_lookup(credit_score: int, income: int, requested_amount:
     Returns:
         A dictionary containing the final decision and the logical path taken.
     """
-    return decision_tree_lookup(
-        LOAN_DECISION_TREE,
+    return COMPILED_LOAN_TREE.lookup(
         credit_score=credit_score,
         income=income,
         requested_amount=requested_amount
@@ -217,6 +205,12 @@ ENHANCED_TREE: Dict[str, Any] = {
     }
 }
 
+# Flat-array version of the tree above; used by enhanced_tree_lookup.
+COMPILED_ENHANCED_TREE: CompiledTree = compile_tree(
+    ENHANCED_TREE,
+    features=('purpose', 'credit_score', 'country')
+)
+
 def enhanced_tree_lookup(purpose: Purpose, credit_score: int, country: str) -> Dict[str, Any]:
     """
     Looks up a loan decision from an enhanced decision tree using Enum and membership tests.
@@ -229,8 +223,7 @@ def enhanced_tree_lookup(purpose: Purpose, credit_score: int, country: str) -> D
     Returns:
         A dictionary containing the final decision and the logical path taken.
     """
-    return decision_tree_lookup(
-        ENHANCED_TREE,
+    return COMPILED_ENHANCED_TREE.lookup(
         purpose=purpose,
         credit_score=credit_score,
         country=country
@@ -301,7 +294,13 @@ BP_DECISION_TREE: Dict[str, Any] = {
     }
 }
 
-@mcp.tool
+# Flat-array version of the tree above; used by the MCP tools for single and batch lookups.
+COMPILED_BP_TREE: CompiledTree = compile_tree(
+    BP_DECISION_TREE,
+    features=('systolic_blood_pressure', 'diastolic_blood_pressure')
+)
+
+@mcp.tool  # type: ignore[misc]
 async def blood_pressure_decision_tree_lookup(
         systolic_blood_pressure: Annotated[
             int, Field(description="The patient's systolic blood pressure, e.g., 128")
@@ -325,8 +324,7 @@ async def blood_pressure_decision_tree_lookup(
     logger.debug(f"Received systolic: {systolic_blood_pressure}, diastolic: {diastolic_blood_pressure}")
 
     result = await asyncio.to_thread(
-        decision_tree_lookup,
-        BP_DECISION_TREE,
+        COMPILED_BP_TREE.lookup,
         **dict(
             systolic_blood_pressure=systolic_blood_pressure,
             diastolic_blood_pressure=diastolic_blood_pressure
@@ -359,3 +357,55 @@ tool_definition_bp: Dict[str, Any] = {
         }
     }
 }
+
+
+def classify_blood_pressures(
+        systolic_blood_pressures: List[int],
+        diastolic_blood_pressures: List[int]
+    ) -> List[Dict[str, Any]]:
+    """
+    Classifies many blood pressure readings in one vectorized pass over the compiled tree.
+
+    Args:
+        systolic_blood_pressures: Systolic readings, one per patient.
+        diastolic_blood_pressures: Diastolic readings, in the same order.
+
+    Returns:
+        A list of dictionaries (one per reading) containing the classification and the logical path taken.
+    """
+    batch = COMPILED_BP_TREE.classify_batch({
+        'systolic_blood_pressure': systolic_blood_pressures,
+        'diastolic_blood_pressure': diastolic_blood_pressures,
+    })
+    return batch.to_records()
+
+@mcp.tool  # type: ignore[misc]
+async def blood_pressure_batch_lookup(
+        systolic_blood_pressures: Annotated[
+            List[int], Field(description="Systolic blood pressures, one per patient, e.g., [128, 145]")
+        ],
+        diastolic_blood_pressures: Annotated[
+            List[int], Field(description="Diastolic blood pressures in the same order, e.g., [78, 92]")
+        ],
+        ctx: Context,
+) -> List[Dict[str, Any]]:
+    """
+    Looks up blood pressure classifications for many patients at once.
+
+    Args:
+        systolic_blood_pressures: The patients' systolic blood pressures.
+        diastolic_blood_pressures: The patients' diastolic blood pressures.
+
+    Returns:
+        A list of dictionaries containing the final classification and the logical path taken for each patient.
+    """
+    if len(systolic_blood_pressures) != len(diastolic_blood_pressures):
+        raise ValueError("Systolic and diastolic readings must have the same length.")
+
+    logger.debug(f"Received {len(systolic_blood_pressures)} blood pressure readings")
+
+    result = await asyncio.to_thread(classify_blood_pressures, systolic_blood_pressures, diastolic_blood_pressures)
+
+    logger.debug("Batch lookup complete")
+
+    return result
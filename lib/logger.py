@@ -1,8 +1,25 @@
 """
 Custom Logger with Colored Output
+
+Messages are formatted only when their level is enabled: pass ``%``-style arguments
+(``logger.debug("result: %s", result)``) or a callable returning the message
+(``logger.debug(lambda: f"result: {result}")``) instead of an f-string.
+
+With ``use_queue`` the calling thread only enqueues the record; a ``QueueListener`` thread formats it and writes
+to stderr, so request handlers never block on I/O. ``json_format`` emits one JSON object per line.
 """
+import atexit
+import datetime
+import json
 import logging
-from typing import Any
+import os
+import queue
+import threading
+import weakref
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Dict, Optional, Union
+
+Message = Union[str, Callable[[], Any]]
 
 
 class CustomFormatter(logging.Formatter):
@@ -27,35 +44,118 @@ class CustomFormatter(logging.Formatter):
         logging.CRITICAL: bold_red + log_format + reset
     }
 
+    def __init__(self) -> None:
+        super().__init__(self.log_format)
+        self._formatters = {level: logging.Formatter(fmt) for level, fmt in self.FORMATS.items()}
+
     def format(self, record: logging.LogRecord) -> str:
         """
         Format the log record with the appropriate color based on its level.
         :param record: logging.LogRecord
         :return: str
         """
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
+        formatter = self._formatters.get(record.levelno)
+        if formatter is None:
+            return super().format(record)
         return formatter.format(record)
 
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record, including any ``extra`` fields passed to the log call.
+    """
+    RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Format the log record as a single JSON line.
+        :param record: logging.LogRecord
+        :return: str
+        """
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.datetime.fromtimestamp(record.created, tz=datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "file": record.filename,
+            "line": record.lineno,
+        }
+        for key, value in record.__dict__.items():
+            if key not in self.RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    The stock ``prepare`` formats on the calling thread; here only the message is merged with its arguments (so
+    mutable arguments can't change before the listener runs) and exception info is rendered to text.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_queued_loggers: "weakref.WeakSet[Logger]" = weakref.WeakSet()
+
+
+def _restart_listeners_after_fork() -> None:
+    # The listener thread does not survive fork() (gunicorn/Celery workers) and the queue's lock may have been held
+    # by another thread at that moment, so each child gets a fresh queue and listener.
+    for instance in list(_queued_loggers):
+        instance._lock = threading.Lock()
+        instance._start_queue()
+
+
+def _shutdown_listeners() -> None:
+    for instance in list(_queued_loggers):
+        instance.shutdown()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_listeners_after_fork)
+atexit.register(_shutdown_listeners)
+
+
 class Logger:
     """
     Custom logger class that uses the standard logging library with a custom formatter.
     """
-    def __init__(self, name: str = 'logger', level: int = logging.WARN) -> None:
+    def __init__(
+            self,
+            name: str = 'logger',
+            level: int = logging.WARN,
+            json_format: bool = False,
+            use_queue: bool = False
+    ) -> None:
         """
         Initialize the logger with a name and logging level.
         :param name: The name of the logger.
         :param level: The logging level (default is logging.WARN).
+        :param json_format: Emit one JSON object per line instead of colored text.
+        :param use_queue: Hand records to a background thread instead of writing them on the calling thread.
         :return: None
         """
         logging.basicConfig()
         self._name = name
         self._level = level
-        self._logger = logging.getLogger(name)
-        #self._logger = logging.getLogger(__name__)
+        self._json_format = json_format
+        self._use_queue = use_queue
         self._logger = logging.getLogger(name)
         self._logger.propagate = False
         self._handler = logging.StreamHandler()
+        self._listener: Optional[QueueListener] = None
+        self._lock = threading.Lock()
 
         self.configure()
 
@@ -64,58 +164,115 @@ class Logger:
         Configure the logger with a custom formatter and set the logging level.
         :return: None
         """
-        #formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        self._handler.setFormatter(CustomFormatter())
-        self._logger.handlers = [self._handler]
+        self._handler.setFormatter(JsonFormatter() if self._json_format else CustomFormatter())
         self._logger.setLevel(self._level)
+        if self._use_queue:
+            if self._listener is None:
+                self._start_queue()
+            _queued_loggers.add(self)
+        else:
+            self._logger.handlers = [self._handler]
         logging.basicConfig(level=self._level, format='%(message)s')
 
-    def debug(self, msg: str, *args: Any, **kwargs: Any) -> None:
+    def _start_queue(self) -> None:
+        """
+        (Re)create the record queue and start the listener thread that drains it.
+        :return: None
+        """
+        with self._lock:
+            records: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+            self._listener = QueueListener(records, self._handler, respect_handler_level=True)
+            self._listener.start()
+            self._logger.handlers = [_LazyQueueHandler(records)]
+
+    def shutdown(self) -> None:
+        """
+        Write any queued records and stop the listener thread.
+        :return: None
+        """
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+            self._logger.handlers = [self._handler]
+            _queued_loggers.discard(self)
+
+    def is_enabled_for(self, level: int) -> bool:
+        """
+        Whether messages at ``level`` would be emitted; use to guard building expensive log context.
+        :param level: The logging level.
+        :return: bool
+        """
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level: int, msg: Message, args: Any, kwargs: Dict[str, Any]) -> None:
+        if not self._logger.isEnabledFor(level):
+            return
+        if callable(msg):
+            msg = str(msg())
+        elif args and "%" not in msg:
+            # print-style call, e.g. logger.debug("Result:", result)
+            msg = " ".join(str(part) for part in (msg, *args))
+            args = ()
+        kwargs.setdefault("stacklevel", 3)
+        self._logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, msg: Message, *args: Any, **kwargs: Any) -> None:
         """
         Log a debug message.
-        :param msg: The message to log.
+        :param msg: The message to log, or a callable returning it.
         :param args: Additional arguments to format the message.
         :param kwargs: Additional keyword arguments for logging.
         :return: None
         """
-        self._logger.debug(msg, *args, **kwargs)
+        self._log(logging.DEBUG, msg, args, kwargs)
 
-    def info(self, msg: str, *args: Any, **kwargs: Any) -> None:
+    def info(self, msg: Message, *args: Any, **kwargs: Any) -> None:
         """
         Log an info message.
-        :param msg: The message to log.
+        :param msg: The message to log, or a callable returning it.
         :param args: Additional arguments to format the message.
         :param kwargs: Additional keyword arguments for logging.
         :return: None
         """
-        self._logger.info(msg, *args, **kwargs)
+        self._log(logging.INFO, msg, args, kwargs)
 
-    def warning(self, msg: str, *args: Any, **kwargs: Any) -> None:
+    def warning(self, msg: Message, *args: Any, **kwargs: Any) -> None:
         """
         Log a warning message.
-        :param msg: The message to log.
+        :param msg: The message to log, or a callable returning it.
         :param args: Additional arguments to format the message.
         :param kwargs: Additional keyword arguments for logging.
         :return: None
         """
-        self._logger.warning(msg, *args, **kwargs)
+        self._log(logging.WARNING, msg, args, kwargs)
 
-    def warn(self, msg: str, *args: Any, **kwargs: Any) -> None:
+    def warn(self, msg: Message, *args: Any, **kwargs: Any) -> None:
         """
         Log a warning message.
-        :param msg: The message to log.
+        :param msg: The message to log, or a callable returning it.
         :param args: Additional arguments to format the message.
         :param kwargs: Additional keyword arguments for logging.
         :return: None
         """
-        self._logger.warning(msg, *args, **kwargs)
+        self._log(logging.WARNING, msg, args, kwargs)
 
-    def error(self, msg: str, *args: Any, **kwargs: Any) -> None:
+    def error(self, msg: Message, *args: Any, **kwargs: Any) -> None:
         """
         Log an error message.
-        :param msg: The message to log.
+        :param msg: The message to log, or a callable returning it.
+        :param args: Additional arguments to format the message.
+        :param kwargs: Additional keyword arguments for logging.
+        :return: None
+        """
+        self._log(logging.ERROR, msg, args, kwargs)
+
+    def exception(self, msg: Message, *args: Any, **kwargs: Any) -> None:
+        """
+        Log an error message with the current exception's traceback.
+        :param msg: The message to log, or a callable returning it.
         :param args: Additional arguments to format the message.
         :param kwargs: Additional keyword arguments for logging.
         :return: None
         """
-        self._logger.error(msg, *args, **kwargs)
+        kwargs.setdefault("exc_info", True)
+        self._log(logging.ERROR, msg, args, kwargs)
@@ -0,0 +1,47 @@
+"""
+Migration script to define the clinic location fields and indexes used by clinic search, and to backfill the
+longitude/latitude fields of clinics created before they were stored alongside the GeoJSON location
+"""
+from lib.db.surreal import DbController
+from lib.models.clinic import Clinic
+from lib.services.clinic_locator import CLINIC_FIELDS, ClinicIndex
+from settings import logger
+
+WRITE_BATCH_SIZE = 500
+
+
+def setup_clinic_geo_index() -> bool:
+    """
+    Define the clinic fields and indexes, then fill in missing coordinate fields.
+    :return: True if successful, False otherwise
+    """
+    db = DbController()
+    try:
+        db.connect()
+
+        result = db.query(f"SELECT {CLINIC_FIELDS} FROM clinic WHERE latitude = NONE OR longitude = NONE", {})
+        records = result[0]['result'] if result and 'result' in result[0] else result
+        # ClinicIndex normalises GeoJSON locations and drops clinics without a usable one.
+        rows = [{'id': c['id'], 'longitude': c['longitude'], 'latitude': c['latitude']}
+                for c in ClinicIndex(records or []).clinics]
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            db.query(
+                "FOR $row IN $rows { UPDATE <record> $row.id MERGE "
+                "{ longitude: $row.longitude, latitude: $row.latitude }; };",
+                {'rows': rows[start:start + WRITE_BATCH_SIZE]}
+            )
+        logger.info(f"Backfilled coordinates for {len(rows)} clinics")
+
+        logger.info("Defining clinic location fields and indexes...")
+        for statement in Clinic.schema():
+            db.query(statement, {})
+        return True
+    except Exception as e:
+        logger.error(f"Error setting up clinic geo index: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    setup_clinic_geo_index()
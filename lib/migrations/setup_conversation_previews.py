@@ -0,0 +1,60 @@
+"""
+Migration script to index conversations for the inbox and backfill last_message_preview on existing conversations
+"""
+from lib.db.surreal import DbController
+from lib.models.conversation import Conversation, message_preview
+from settings import logger
+
+WRITE_BATCH_SIZE = 500
+
+
+def setup_conversation_previews() -> bool:
+    """
+    Define the conversation list indexes, then store the latest message preview on conversations that lack one.
+    :return: True if successful, False otherwise
+    """
+    db = DbController()
+    try:
+        db.connect()
+
+        logger.info("Defining conversation indexes...")
+        for statement in Conversation.schema():
+            db.query(statement, {})
+
+        result = db.query(
+            """
+            SELECT id, (
+                SELECT text, sender_id, created_at FROM Message
+                WHERE conversation_id IN [<string> $parent.id, <string> record::id($parent.id)]
+                ORDER BY created_at DESC LIMIT 1
+            )[0] AS latest
+            FROM Conversation WHERE last_message_preview = NONE
+            """,
+            {}
+        )
+        rows = result[0]['result'] if result and 'result' in result[0] else result
+        updates = [
+            {
+                "id": row['id'],
+                "last_message_preview": message_preview(row['latest'].get('text') or ''),
+                "last_message_sender_id": row['latest'].get('sender_id'),
+            }
+            for row in rows or [] if row.get('latest')
+        ]
+        for start in range(0, len(updates), WRITE_BATCH_SIZE):
+            db.query(
+                "FOR $row IN $rows { UPDATE $row.id MERGE { last_message_preview: $row.last_message_preview, "
+                "last_message_sender_id: $row.last_message_sender_id }; };",
+                {"rows": updates[start:start + WRITE_BATCH_SIZE]}
+            )
+        logger.info(f"Backfilled previews for {len(updates)} conversations")
+        return True
+    except Exception as e:
+        logger.error(f"Error setting up conversation previews: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    setup_conversation_previews()
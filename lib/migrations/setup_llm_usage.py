@@ -0,0 +1,23 @@
+"""
+Migration script to define the llm_usage table and index written by the batched OpenAI usage ledger
+"""
+from lib.services.openai_security import create_usage_ledger_schema
+from settings import logger
+
+
+def setup_llm_usage() -> bool:
+    """
+    Define the llm_usage table, its fields and the (user_id, created_at) index.
+    :return: True if successful, False otherwise
+    """
+    try:
+        logger.info("Defining llm_usage table...")
+        create_usage_ledger_schema()
+        return True
+    except Exception as e:
+        logger.error(f"Error setting up llm_usage table: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    setup_llm_usage()
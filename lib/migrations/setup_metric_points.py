@@ -0,0 +1,62 @@
+"""
+Migration script to set up the metric_point time-series table and backfill it from existing MetricSet records
+"""
+from lib.db.surreal import DbController
+from lib.models.metrics import Metric, MetricPoint, MetricSet
+from lib.services.metrics_service import record_metric_points
+from settings import logger
+
+PAGE_SIZE = 500
+
+
+def setup_metric_points(backfill: bool = True) -> bool:
+    """
+    Define the metric_point table and indexes, then copy every MetricSet's metrics into it.
+    :param backfill: Also convert existing MetricSet records
+    :return: True if successful, False otherwise
+    """
+    db = DbController()
+    try:
+        db.connect()
+
+        logger.info("Creating metric_point table...")
+        for statement in MetricPoint.schema() + MetricSet.schema():
+            db.query(statement, {})
+
+        if not backfill:
+            return True
+
+        converted = 0
+        start = 0
+        while True:
+            result = db.query(
+                "SELECT user_id, date, metrics FROM MetricSet ORDER BY id LIMIT $limit START $start",
+                {"limit": PAGE_SIZE, "start": start}
+            )
+            rows = result[0]['result'] if result and 'result' in result[0] else result
+            if not rows:
+                break
+            for row in rows:
+                try:
+                    metric_set = MetricSet(
+                        user_id=row['user_id'],
+                        date=row['date'],
+                        metrics=[Metric(**m) for m in row.get('metrics') or []]
+                    )
+                    converted += record_metric_points(metric_set, db=db)
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f"Skipping MetricSet for {row.get('user_id')} on {row.get('date')}: {e}")
+            start += len(rows)
+
+        logger.info(f"Backfilled {converted} metric points from {start} metric sets")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error setting up metric_point table: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    setup_metric_points()
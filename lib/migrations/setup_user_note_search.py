@@ -0,0 +1,50 @@
+"""
+Migration script to set up full-text search on UserNote and backfill the typeahead field of existing notes
+"""
+from lib.db.surreal import DbController
+from lib.models.user.user_notes import UserNote
+from settings import logger
+
+PAGE_SIZE = 500
+
+
+def setup_user_note_search() -> bool:
+    """
+    Define the UserNote analyzers and search indexes, then fill in ``search_prefix`` for notes that lack it.
+    :return: True if successful, False otherwise
+    """
+    db = DbController()
+    try:
+        db.connect()
+
+        logger.info("Defining UserNote search indexes...")
+        for statement in UserNote.schema():
+            db.query(statement, {})
+
+        updated = 0
+        while True:
+            result = db.query(
+                "SELECT id, title, tags FROM UserNote WHERE search_prefix = NONE LIMIT $limit",
+                {"limit": PAGE_SIZE}
+            )
+            rows = result[0]['result'] if result and 'result' in result[0] else result
+            if not rows:
+                break
+            db.query(
+                "FOR $row IN $rows { UPDATE $row.id SET search_prefix = $row.search_prefix; };",
+                {"rows": [{"id": row['id'],
+                           "search_prefix": UserNote.prefix_text(row.get('title') or '', row.get('tags') or [])}
+                          for row in rows]}
+            )
+            updated += len(rows)
+        logger.info(f"Backfilled search_prefix for {updated} notes")
+        return True
+    except Exception as e:
+        logger.error(f"Error setting up UserNote search: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    setup_user_note_search()
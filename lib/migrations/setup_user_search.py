@@ -0,0 +1,29 @@
+"""
+Migration script to define the User indexes used to load the user search index
+"""
+from lib.db.surreal import DbController
+from lib.models.user.user import User
+from settings import logger
+
+
+def setup_user_search() -> bool:
+    """
+    Define the User indexes.
+    :return: True if successful, False otherwise
+    """
+    db = DbController()
+    try:
+        db.connect()
+        logger.info("Defining User search indexes...")
+        for statement in User.schema():
+            db.query(statement, {})
+        return True
+    except Exception as e:
+        logger.error(f"Error setting up User search indexes: {e}")
+        return False
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    setup_user_search()
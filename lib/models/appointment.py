@@ -276,5 +276,8 @@ class Appointment:
         statements.append('DEFINE INDEX idx_appointment_patient ON appointment FIELDS patient_id;')
         statements.append('DEFINE INDEX idx_appointment_status ON appointment FIELDS status;')
         statements.append('DEFINE INDEX idx_appointment_datetime ON appointment FIELDS appointment_date, start_time;')
+        # Composite indexes for the provider calendar and patient history listings
+        statements.append('DEFINE INDEX idx_appointment_provider_day ON appointment FIELDS provider_id, appointment_date, start_time;')
+        statements.append('DEFINE INDEX idx_appointment_patient_day ON appointment FIELDS patient_id, appointment_date;')
         
         return statements 
\ No newline at end of file
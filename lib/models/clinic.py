@@ -2,7 +2,8 @@
 This module defines a Clinic class and provides functions to interact with a SurrealDB database.
 """
 import json
-from typing import Any, Dict, List, TypedDict
+import math
+from typing import Any, Dict, List, Optional, TypedDict
 
 from lib.db.surreal import AsyncDbController
 from settings import logger
@@ -38,6 +39,7 @@ class ClinicType(TypedDict):
     longitude: float
     latitude: float
     organization_id: str
+    specialties: List[str]
 
 
 class Clinic:
@@ -54,7 +56,8 @@ class Clinic:
             country: str,
             longitude: float,
             latitude: float,
-            organization_id: str = ""
+            organization_id: str = "",
+            specialties: Optional[List[str]] = None
     ) -> None:
         """
         Initializes a Clinic object.
@@ -68,6 +71,8 @@ class Clinic:
             country (str): The country.
             longitude (float): The longitude of the clinic's location.
             latitude (float): The latitude of the clinic's location.
+            organization_id (str): The organization the clinic belongs to.
+            specialties (List[str]): Specialties offered at the clinic.
         """
         self.name = name
         self.street = street
@@ -78,6 +83,7 @@ class Clinic:
         self.longitude = longitude
         self.latitude = latitude
         self.organization_id = organization_id
+        self.specialties = specialties or []
 
     @staticmethod
     def from_db(data: dict[str, Any]) -> 'Clinic':
@@ -99,7 +105,8 @@ class Clinic:
             country=data.get('address', {}).get('country', ''),
             longitude=data.get('location', {}).get('coordinates', [0, 0])[0],
             latitude=data.get('location', {}).get('coordinates', [0, 0])[1],
-            organization_id=data.get('organization_id', '')
+            organization_id=data.get('organization_id', ''),
+            specialties=data.get('specialties') or []
         )
 
 
@@ -133,9 +140,28 @@ class Clinic:
             "location": self.to_geojson_point(),
             "longitude": self.longitude,
             "latitude": self.latitude,
-            "organization_id": self.organization_id
+            "organization_id": self.organization_id,
+            "specialties": self.specialties
         }
 
+    @staticmethod
+    def schema() -> List[str]:
+        """
+        Field and index definitions for the clinic table.
+
+        SurrealDB has no spatial index type, so radius searches are narrowed with the ``latitude`` index before
+        ``geo::distance`` is evaluated (see lib/services/clinic_locator.py).
+        :return: List of SurrealQL statements.
+        """
+        return [
+            'DEFINE FIELD location ON clinic TYPE geometry<point>;',
+            'DEFINE FIELD longitude ON clinic TYPE number;',
+            'DEFINE FIELD latitude ON clinic TYPE number;',
+            'DEFINE FIELD specialties ON clinic TYPE array<string> DEFAULT [];',
+            'DEFINE INDEX idx_clinic_latitude ON clinic FIELDS latitude;',
+            'DEFINE INDEX idx_clinic_organization ON clinic FIELDS organization_id;',
+        ]
+
     def __repr__(self) -> str:
         """
         Provides a string representation of the Clinic object.
@@ -163,7 +189,11 @@ def generate_surrealql_create_query(clinic: Clinic, table_name: str = "clinic")
             "zip": clinic.zip_code,
             "country": clinic.country
         },
-        "location": clinic.to_geojson_point()
+        "location": clinic.to_geojson_point(),
+        "longitude": clinic.longitude,
+        "latitude": clinic.latitude,
+        "organization_id": clinic.organization_id,
+        "specialties": clinic.specialties
     }
 
     # SurrealDB's query language can often take JSON directly for the SET clause.
@@ -253,7 +283,9 @@ if __name__ == '__main__':
 client = AsyncDbController()
 
 
-from typing import Optional
+def _invalidate_clinic_index() -> None:
+    from lib.services.clinic_locator import invalidate_clinic_index
+    invalidate_clinic_index()
 
 
 async def create_clinic(clinic: Clinic) -> Optional[str]:
@@ -269,6 +301,7 @@ async def create_clinic(clinic: Clinic) -> Optional[str]:
     query = generate_surrealql_create_query(clinic)
     result = await client.query(query)
     logger.debug('result', type(result), result)
+    _invalidate_clinic_index()
     return result[0]['id'] if result else None
 
 
@@ -311,12 +344,21 @@ async def search_clinics_by_location(longitude: float, latitude: float, radius:
     Returns:
         list: A list of clinics within the specified radius.
     """
-    query = f"""
-    SELECT name, address, location, geo::distance(location, ({longitude}, {latitude})) AS distance
+    query = """
+    SELECT name, address, location, geo::distance(location, <geometry<point>> $point) AS distance
     FROM clinic
-    WHERE geo::distance(location, ({longitude}, {latitude})) < {radius};
+    WHERE latitude >= $min_latitude AND latitude <= $max_latitude
+        AND geo::distance(location, <geometry<point>> $point) < $radius
+    ORDER BY distance;
     """
-    result = await client.query(query)
+    from lib.services.clinic_locator import EARTH_RADIUS_M
+    band = math.degrees(radius / EARTH_RADIUS_M)
+    result = await client.query(query, {
+        "point": [longitude, latitude],
+        "radius": radius,
+        "min_latitude": latitude - band,
+        "max_latitude": latitude + band,
+    })
     return result if result else []
 
 
@@ -341,10 +383,14 @@ async def update_clinic(clinic_id: str, clinic: Clinic) -> bool:
             zip: '{clinic.zip_code}',
             country: '{clinic.country}'
         }},
-        location = {json.dumps(clinic.to_geojson_point())}
+        location = {json.dumps(clinic.to_geojson_point())},
+        longitude = {clinic.longitude},
+        latitude = {clinic.latitude},
+        specialties = {json.dumps(clinic.specialties)}
     ;
     """
     result = await client.query(query)
+    _invalidate_clinic_index()
     return len(result) > 0
 
 
@@ -360,6 +406,7 @@ async def delete_clinic(clinic_id: str) -> bool:
     """
     query = f"DELETE FROM clinic WHERE id = '{clinic_id}';"
     result = await client.query(query)
+    _invalidate_clinic_index()
     return len(result) > 0
 
 
@@ -4,6 +4,20 @@ This module defines the Conversation and Message classes for managing conversati
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
+# Characters of the latest message kept on the conversation for inbox previews
+PREVIEW_LENGTH = 120
+
+
+def message_preview(text: str) -> str:
+    """
+    Shorten a message for display in the conversation list
+
+    :param text: Full message text
+    :return: The text on one line, cut to PREVIEW_LENGTH characters with an ellipsis if longer
+    """
+    text = " ".join(text.split())
+    return text if len(text) <= PREVIEW_LENGTH else text[:PREVIEW_LENGTH - 1].rstrip() + "…"
+
 
 class Conversation:
     """
@@ -15,7 +29,9 @@ class Conversation:
             conversation_type: str = "user_to_user",
             created_at: Optional[str] = None,
             id: Optional[str] = None,
-            last_message_at: Optional[str] = None
+            last_message_at: Optional[str] = None,
+            last_message_preview: Optional[str] = None,
+            last_message_sender_id: Optional[str] = None
     ) -> None:
         """
         Initialize a Conversation object
@@ -25,11 +41,15 @@ class Conversation:
         :param created_at: Creation timestamp
         :param id: Database record ID
         :param last_message_at: Timestamp of last message
+        :param last_message_preview: Shortened text of the last message, kept up to date by add_message
+        :param last_message_sender_id: ID of the user who sent the last message
         """
         self.participants = participants
         self.conversation_type = conversation_type
         self.created_at = created_at or datetime.now(timezone.utc).isoformat()
         self.last_message_at = last_message_at or self.created_at
+        self.last_message_preview = last_message_preview
+        self.last_message_sender_id = last_message_sender_id
         self.id = id
     
     def to_dict(self) -> Dict[str, Any]:
@@ -42,7 +62,9 @@ class Conversation:
             'participants': self.participants,
             'conversation_type': self.conversation_type,
             'created_at': self.created_at,
-            'last_message_at': self.last_message_at
+            'last_message_at': self.last_message_at,
+            'last_message_preview': self.last_message_preview,
+            'last_message_sender_id': self.last_message_sender_id
         }
     
     @classmethod
@@ -63,8 +85,22 @@ class Conversation:
             conversation_type=data.get('conversation_type', 'user_to_user'),
             created_at=data.get('created_at'),
             id=conv_id,
-            last_message_at=data.get('last_message_at')
+            last_message_at=data.get('last_message_at'),
+            last_message_preview=data.get('last_message_preview'),
+            last_message_sender_id=data.get('last_message_sender_id')
         )
+
+    @staticmethod
+    def schema() -> List[str]:
+        """
+        Indexes used by the conversation list
+
+        :return: List of SurrealQL statements
+        """
+        return [
+            'DEFINE INDEX idx_conversation_participants ON Conversation FIELDS participants;',
+            'DEFINE INDEX idx_message_conversation_created ON Message FIELDS conversation_id, created_at;',
+        ]
     
     def is_participant(self, user_id: str) -> bool:
         """
@@ -1,10 +1,10 @@
 """
 Graph Schema for SurrealDB
 """
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from lib.db.surreal import DbController
-from lib.db.surreal_graph import GraphController
+from lib.db.surreal_graph import Edge, GraphController
 from settings import (SURREALDB_NAMESPACE, SURREALDB_PASS, SURREALDB_URL,
                       SURREALDB_USER, logger)
 
@@ -30,16 +30,35 @@ Edges:
 That will be our starting point at least and we can expand on it later.
 '''
 
-db = DbController(url=SURREALDB_URL, namespace=SURREALDB_NAMESPACE, database='graph', user=SURREALDB_USER, password=SURREALDB_PASS)
-db.connect()
+_db: Optional[DbController] = None
 
 
-graph_db = GraphController(db)
-
+def get_graph_db() -> DbController:
+    """
+    Connect to the graph database on first use.
+    :return: DbController - The connected controller.
+    """
+    global _db
+    if _db is None:
+        _db = DbController(url=SURREALDB_URL, namespace=SURREALDB_NAMESPACE, database='graph', user=SURREALDB_USER, password=SURREALDB_PASS)
+        _db.connect()
+    return _db
 
 
 """ NODES """
 
+# (node_type, node_id, name)
+NODES = [
+    ('symptom', 'loss_of_appetite', 'Loss of appetite'),
+    ('symptom', 'fatigue', 'Fatigue'),
+    ('diagnosis', 'depression', 'Depression'),
+    ('diagnosis', 'flu', 'Influenza (Flu)'),
+    ('medication', 'prozac', 'Prozac'),
+    ('medication', 'ibuprofen', 'Ibuprofen'),
+    ('medication', 'warfarin', 'Warfarin'),
+]
+
+
 def create_node(node_type: str, node_id: str, node_name: str, **fields: Dict[str, Any]) -> None:
     """
     Create a node in the graph database.
@@ -49,7 +68,19 @@ def create_node(node_type: str, node_id: str, node_name: str, **fields: Dict[str
     :param fields: dict - Additional fields to set on the node.
     :return: None
     """
-    db.create(f'{node_type}:{node_id}', dict(name=node_name, **fields))
+    get_graph_db().create(f'{node_type}:{node_id}', dict(name=node_name, **fields))
+
+def create_nodes(nodes: List[Tuple[str, str, str]]) -> None:
+    """
+    Create many nodes, with one INSERT per node type; existing nodes are left untouched.
+    :param nodes: list - (node_type, node_id, name) tuples.
+    :return: None
+    """
+    by_type: Dict[str, List[Dict[str, Any]]] = {}
+    for node_type, node_id, node_name in nodes:
+        by_type.setdefault(node_type, []).append({'id': node_id, 'name': node_name})
+    for node_type, rows in by_type.items():
+        get_graph_db().query(f"INSERT IGNORE INTO {node_type} $rows", {'rows': rows})
 
 def query_node(node_type: str, node_id: str) -> List[Dict[str, Any]]:
     """
@@ -58,89 +89,36 @@ def query_node(node_type: str, node_id: str) -> List[Dict[str, Any]]:
     :param node_id: str - Unique identifier for the node.
     :return: dict - The node record from the database.
     """
-    return db.query(f"SELECT * FROM {node_type}:{node_id}")
-
-
-
-
-# -- Create some symptoms
-# CREATE symptom:loss_of_appetite SET name = "Loss of appetite";
-# CREATE symptom:fatigue          SET name = "Fatigue";
-
-create_node('symptom', 'loss_of_appetite', 'Loss of appetite')
-create_node('symptom', 'fatigue', 'Fatigue')
-
-
-# -- Create some diagnoses
-# CREATE diagnosis:depression SET name = "Depression";
-# CREATE diagnosis:flu        SET name = "Influenza (Flu)";
-
-create_node('diagnosis', 'depression', 'Depression')
-create_node('diagnosis', 'flu', 'Influenza (Flu)')
-
-
-# -- Create some medications
-# CREATE medication:prozac    SET name = "Prozac";
-# CREATE medication:ibuprofen SET name = "Ibuprofen";
-# CREATE medication:warfarin  SET name = "Warfarin";
-
-create_node('medication', 'prozac', 'Prozac')
-create_node('medication', 'ibuprofen', 'Ibuprofen')
-create_node('medication', 'warfarin', 'Warfarin')
-
-
-
-# Query a single node (just to verify that it exists - or to get its attributes)
-
-# SELECT * FROM symptom:loss_of_appetite
-symptom = query_node('symptom', 'loss_of_appetite')
-logger.debug(str(symptom))
-
-
+    return get_graph_db().query(f"SELECT * FROM {node_type}:{node_id}")
 
 
 """ EDGES """
 
 # RELATE <record> -> <edge_name> -> <record> SET <fields>;
 
+EDGES: List[Edge] = [
+    # A. Diagnosis -> HAS_SYMPTOM -> Symptom
+    ('diagnosis:depression', 'HAS_SYMPTOM', 'symptom:loss_of_appetite', dict(note='Common symptom in depression')),
+    ('diagnosis:depression', 'HAS_SYMPTOM', 'symptom:fatigue', dict(note='Patients often report feeling very tired')),
+    ('diagnosis:flu', 'HAS_SYMPTOM', 'symptom:fatigue', dict(note='Fatigue is frequently reported in flu')),
 
-''' A. Diagnosis -> HAS_SYMPTOM -> Symptom '''
-
-graph_db.relate(
-    'diagnosis:depression',
-    'HAS_SYMPTOM',
-    'symptom:loss_of_appetite',
-    dict(note='Common symptom in depression')
-)
-
-graph_db.relate(
-    'diagnosis:depression',
-    'HAS_SYMPTOM',
-    'symptom:fatigue',
-    dict(note='Patients often report feeling very tired')
-)
-
-graph_db.relate(
-    'diagnosis:flu',
-    'HAS_SYMPTOM',
-    'symptom:fatigue',
-    dict(note='Fatigue is frequently reported in flu')
-)
-
+    # B. Medication -> TREATS -> Diagnosis
+    ('medication:prozac', 'TREATS', 'diagnosis:depression', dict(note='Used for major depressive disorder')),
+    ('medication:ibuprofen', 'TREATS', 'diagnosis:flu', dict(note='Helps reduce fever and pain')),
 
-# Get outgoing connections (symptoms of depression)
-# SELECT ->HAS_SYMPTOM->symptom FROM diagnosis:depression
-symptoms = graph_db.get_relations('diagnosis:depression', 'HAS_SYMPTOM', 'symptom')
-logger.debug(symptoms)
+    # C. Symptom -> CONTRAINDICATED_FOR -> Medication
+    ('symptom:fatigue', 'CONTRAINDICATED_FOR', 'medication:prozac',
+     dict(reason='Prozac can worsen sedation in some patients (example)')),
+    ('symptom:fatigue', 'CONTRAINDICATED_FOR', 'medication:warfarin',
+     dict(reason='Increases risk of bleeding when taken concurrently.')),
 
+    # D. Medication -> CONTRAINDICATED_FOR -> Medication
+    ('medication:warfarin', 'CONTRAINDICATED_FOR', 'medication:ibuprofen',
+     dict(reason='Increases risk of bleeding when taken concurrently.')),
+    ('medication:warfarin', 'CONTRAINDICATED_FOR', 'medication:prozac',
+     dict(reason='Increases risk of bleeding when taken concurrently.')),
+]
 
-# Get incoming connections (diagnoses that have loss of appetite)
-# SELECT <-HAS_SYMPTOM-<diagnosis FROM symptom:loss_of_appetite
-diagnoses = graph_db.get_relations('symptom:loss_of_appetite', 'HAS_SYMPTOM', 'diagnosis', direction='<-')
-logger.debug(diagnoses)
-
-
-# Query a single edge (just to verify that it exists - or to get its attributes)
 
 # SELECT * FROM ->HAS_SYMPTOM->symptom:loss_of_appetite
 def query_edges(from_node: str, from_id: str, edge_name: str) -> Dict[str, Any]:
@@ -151,113 +129,58 @@ def query_edges(from_node: str, from_id: str, edge_name: str) -> Dict[str, Any]:
     :param edge_name: str - Name of the edge (e.g., 'HAS_SYMPTOM').
     :return: dict - The edge record from the database.
     """
-    return db.query(f'SELECT ->{edge_name}.* FROM {from_node}:{from_id}')[0]
-
-edge = query_edges('diagnosis', 'depression', 'HAS_SYMPTOM')
-
-
-
-''' B. Medication -> TREATS -> Diagnosis '''
-
-graph_db.relate(
-    'medication:prozac',
-    'TREATS',
-    'diagnosis:depression',
-    dict(note='Used for major depressive disorder')
-)
-
-graph_db.relate(
-    'medication:ibuprofen',
-    'TREATS',
-    'diagnosis:flu',
-    dict(note='Helps reduce fever and pain')
-)
-
-
-
-''' C. Symptom -> CONTRAINDICATED_FOR -> Medication '''
-
-graph_db.relate(
-    'symptom:fatigue',
-    'CONTRAINDICATED_FOR',
-    'medication:prozac',
-    dict(reason='Prozac can worsen sedation in some patients (example)')
-)
-
-graph_db.relate(
-    'symptom:fatigue',
-    'CONTRAINDICATED_FOR',
-    'medication:warfarin',
-    dict(reason='Increases risk of bleeding when taken concurrently.')
-)
-
-
-
-''' D. Medication -> CONTRAINDICATED_FOR -> Medication '''
-
-graph_db.relate(
-    'medication:warfarin',
-    'CONTRAINDICATED_FOR',
-    'medication:ibuprofen',
-    dict(reason='Increases risk of bleeding when taken concurrently.')
-)
-
-graph_db.relate(
-    'medication:warfarin',
-    'CONTRAINDICATED_FOR',
-    'medication:prozac',
-    dict(reason='Increases risk of bleeding when taken concurrently.')
-)
+    return get_graph_db().query(f'SELECT ->{edge_name}.* FROM {from_node}:{from_id}')[0]
 
 
+def seed_graph() -> None:
+    """
+    Create the example nodes, then all edges in one transaction.
+    :return: None
+    """
+    create_nodes(NODES)
+    GraphController(get_graph_db()).relate_many(EDGES)
 
 
-# -- List all diagnoses and see their edges:
-# SELECT * FROM diagnosis;
+def demo() -> None:
+    """
+    Seed the graph and log a few example queries.
+    :return: None
+    """
+    seed_graph()
+    graph_db = GraphController(get_graph_db())
 
-diagnoses = db.query('SELECT * FROM diagnosis')
+    # SELECT * FROM symptom:loss_of_appetite
+    logger.debug(str(query_node('symptom', 'loss_of_appetite')))
 
-for diagnosis in diagnoses:
-    logger.debug(str(diagnosis))
     # Get outgoing connections (symptoms of depression)
-    symptoms = graph_db.get_relations(diagnosis['id'], 'HAS_SYMPTOM', 'symptom')
-    logger.debug(symptoms)
-
-
-# -- For a specific diagnosis, find its related symptoms:
-# SELECT ->HAS_SYMPTOM.* FROM diagnosis:depression;
-
-depression_symptoms_result = db.query('SELECT ->HAS_SYMPTOM.* FROM diagnosis:depression')
-depression_symptoms = depression_symptoms_result[0]['->HAS_SYMPTOM']
-logger.debug(depression_symptoms)
-
-for symptom in depression_symptoms:
-    # symptom: dict_keys(['id', 'in', 'note', 'out'])
-    logger.debug(f"Symptom: {symptom['id']}. Note: {symptom['note']}. In: {symptom['in']}. Out: {symptom['out']}")
-
+    # SELECT ->HAS_SYMPTOM->symptom FROM diagnosis:depression
+    logger.debug(graph_db.get_relations('diagnosis:depression', 'HAS_SYMPTOM', 'symptom'))
 
-# -- For a medication, see which diagnoses it treats and what it might be contraindicated for:
-# SELECT ->TREATS.* FROM medication:prozac;
-# SELECT ->CONTRAINDICATED_FOR.* FROM medication:warfarin;
+    # Get incoming connections (diagnoses that have loss of appetite)
+    # SELECT <-HAS_SYMPTOM<-diagnosis FROM symptom:loss_of_appetite
+    logger.debug(graph_db.get_relations('symptom:loss_of_appetite', 'HAS_SYMPTOM', 'diagnosis', direction='<-'))
 
-prozac_diagnoses = db.query('SELECT ->TREATS.* FROM medication:prozac')
-prozac_diagnoses = prozac_diagnoses[0]['->TREATS']
-logger.debug(prozac_diagnoses)
+    # Everything within two hops of fatigue, in either direction
+    logger.debug(graph_db.traverse('symptom:fatigue', direction='<->', max_depth=2))
 
+    # Edge counts for every diagnosis
+    diagnoses = [node_id for node_type, node_id, _ in NODES if node_type == 'diagnosis']
+    logger.debug(graph_db.count_connections([f'diagnosis:{d}' for d in diagnoses]))
 
-for diagnosis in prozac_diagnoses:
-    # Get incoming connections (medications that are contraindicated for Prozac)
+    # How is ibuprofen connected to depression?
+    logger.debug(graph_db.find_path('medication:ibuprofen', 'diagnosis:depression', direction='<->'))
 
-    direction = '<-'
-    medications = graph_db.get_relations('medication:prozac', 'CONTRAINDICATED_FOR', 'medication', direction=direction)
-    medications = medications[0]['<-CONTRAINDICATED_FOR']['<-medication']
-    for medication in medications:
-        logger.debug(medication)
+    # Score diagnoses from the in-memory adjacency lists
+    cache = graph_db.load_cache(['HAS_SYMPTOM', 'TREATS'])
+    logger.debug(cache.candidate_diagnoses(['symptom:fatigue', 'symptom:loss_of_appetite']))
 
-    direction = '->'
-    medications = graph_db.get_relations('medication:prozac', 'CONTRAINDICATED_FOR', 'medication', direction=direction)
-    medications = medications[0]['->CONTRAINDICATED_FOR']['->medication']
-    for medication in medications:
-        logger.debug(medication)
+    # For a specific diagnosis, find its related symptoms:
+    # SELECT ->HAS_SYMPTOM.* FROM diagnosis:depression;
+    edge = query_edges('diagnosis', 'depression', 'HAS_SYMPTOM')
+    for symptom in edge['->HAS_SYMPTOM']:
+        # symptom: dict_keys(['id', 'in', 'note', 'out'])
+        logger.debug(f"Symptom: {symptom['id']}. Note: {symptom['note']}. In: {symptom['in']}. Out: {symptom['out']}")
 
 
+if __name__ == '__main__':
+    demo()
@@ -4,8 +4,44 @@ This module contains the models for the metrics.
 Metrics are KPIs that are tracked for a given date.
 
 This is an abstract model that can be used to track any metric, whether that's patient lab results, patient health tracking KPIs, clinic management KPIs, etc.
+
+Besides the per-day ``MetricSet`` documents, every metric is also stored as a ``MetricPoint`` in the ``metric_point``
+time-series table: one row per (user, metric, timestamp), keyed by that triple, with the value as a number so it can
+be aggregated in the database.
 """
-from typing import Dict, Any, List, Optional, Tuple
+import datetime
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+
+def parse_metric_value(value: Any) -> Optional[float]:
+    """
+    Numeric value of a metric, or None for values that aren't a plain number (e.g. "120/80", "positive").
+    :param value: The recorded value
+    :return: float or None
+    """
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip().replace(",", ""))
+    except ValueError:
+        return None
+
+
+def to_timestamp(value: Union[str, datetime.date, datetime.datetime]) -> str:
+    """
+    Normalise a date or datetime (or its ISO string) to an RFC 3339 UTC timestamp.
+    :param value: Date, datetime, or ISO string ("2024-03-04", "2024-03-04T08:30:00+02:00")
+    :return: str, e.g. "2024-03-04T00:00:00Z"
+    """
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value.isoformat(timespec="seconds") + "Z"
 
 
 class Metric:
@@ -35,3 +71,69 @@ class MetricSet:
             'date': self.date,
             'metrics': [metric.to_dict() for metric in self.metrics]
         }
+
+    def to_points(self) -> List['MetricPoint']:
+        return [MetricPoint.from_metric(self.user_id, self.date, metric) for metric in self.metrics]
+
+    @staticmethod
+    def schema() -> List[str]:
+        return [
+            'DEFINE INDEX idx_metric_set_user_date ON MetricSet FIELDS user_id, date;',
+        ]
+
+
+class MetricPoint:
+    """
+    One value of one metric for one user at one time.
+    """
+    def __init__(self, user_id: str, metric_name: str, timestamp: str, value: Optional[float],
+                 text_value: Optional[str] = None, unit: Optional[str] = None,
+                 range: Optional[Tuple[float, float]] = None):
+        self.user_id = user_id
+        self.metric_name = metric_name
+        self.timestamp = to_timestamp(timestamp)
+        self.value = value
+        self.text_value = text_value
+        self.unit = unit
+        self.range = range
+
+    @classmethod
+    def from_metric(cls, user_id: str, date: str, metric: Metric) -> 'MetricPoint':
+        value = parse_metric_value(metric.metric_value)
+        return cls(
+            user_id=user_id,
+            metric_name=metric.metric_name,
+            timestamp=date,
+            value=value,
+            text_value=None if value is not None or metric.metric_value is None else str(metric.metric_value),
+            unit=metric.metric_unit,
+            range=metric.range,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        low, high = (self.range[0], self.range[1]) if self.range and len(self.range) == 2 else (None, None)
+        return {
+            'user_id': self.user_id,
+            'metric_name': self.metric_name,
+            'timestamp': self.timestamp,
+            'value': self.value,
+            'text_value': self.text_value,
+            'unit': self.unit,
+            'range_low': parse_metric_value(low),
+            'range_high': parse_metric_value(high),
+        }
+
+    @staticmethod
+    def schema() -> List[str]:
+        return [
+            'DEFINE TABLE metric_point SCHEMAFULL;',
+            'DEFINE FIELD user_id ON metric_point TYPE string;',
+            'DEFINE FIELD metric_name ON metric_point TYPE string;',
+            'DEFINE FIELD timestamp ON metric_point TYPE datetime;',
+            'DEFINE FIELD value ON metric_point TYPE option<float>;',
+            'DEFINE FIELD text_value ON metric_point TYPE option<string>;',
+            'DEFINE FIELD unit ON metric_point TYPE option<string>;',
+            'DEFINE FIELD range_low ON metric_point TYPE option<float>;',
+            'DEFINE FIELD range_high ON metric_point TYPE option<float>;',
+            'DEFINE INDEX idx_metric_point_series ON metric_point FIELDS user_id, metric_name, timestamp UNIQUE;',
+        ]
@@ -0,0 +1,68 @@
+"""
+Caching module for OCR results in SurrealDB, keyed by document content hash.
+"""
+import datetime
+from typing import Any, Dict, Optional
+
+from lib.db.surreal import DbController
+from lib.infra.instrumentation import record_cache
+from settings import logger
+
+
+def get_ocr_cache(db: DbController, content_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve cached OCR output for a document.
+
+    :param db: DbController instance connected to SurrealDB
+    :param content_hash: Hash of the document content
+    :return: Cached OCR data if found, None otherwise
+    """
+    try:
+        result = db.query(
+            "SELECT * FROM type::thing('ocr_cache', $content_hash)",
+            {"content_hash": content_hash}
+        )
+        for row in result or []:
+            if isinstance(row, dict) and row.get("result"):
+                row = row["result"][0]
+            if isinstance(row, dict) and "text" in row:
+                logger.debug(f"Retrieved OCR cache for hash: {content_hash}")
+                record_cache("ocr", hit=True)
+                return row
+        record_cache("ocr", hit=False)
+        return None
+    except Exception as e:
+        logger.error(f"Error retrieving OCR cache: {e}")
+        return None
+
+
+def store_ocr_cache(db: DbController, content_hash: str, text: str, block_count: int = 0, source: str = "textract") -> bool:
+    """
+    Store OCR output for a document.
+
+    :param db: DbController instance connected to SurrealDB
+    :param content_hash: Hash of the document content
+    :param text: Extracted text
+    :param block_count: Number of Textract blocks the text was built from
+    :param source: Which OCR backend produced the text
+    :return: True if successful, False otherwise
+    """
+    try:
+        db.query(
+            "UPSERT type::thing('ocr_cache', $content_hash) CONTENT $data",
+            {
+                "content_hash": content_hash,
+                "data": {
+                    "content_hash": content_hash,
+                    "text": text,
+                    "block_count": block_count,
+                    "source": source,
+                    "created_at": datetime.datetime.utcnow().isoformat(),
+                }
+            }
+        )
+        logger.debug(f"Stored OCR cache for hash: {content_hash}")
+        return True
+    except Exception as e:
+        logger.error(f"Error storing OCR cache: {e}")
+        return False
@@ -5,6 +5,7 @@ import datetime
 from typing import Any, Dict, List, Optional, Union
 
 from lib.db.surreal import AsyncDbController, DbController
+from lib.infra.instrumentation import record_cache
 from settings import logger
 
 
@@ -73,8 +74,10 @@ def get_entity_cache(db: Union[DbController, AsyncDbController], text_hash: str)
         if result and len(result) > 0 and result[0].get("result"):
             cache_data = result[0]["result"][0]
             logger.debug(f"Retrieved entity cache for hash: {text_hash}")
+            record_cache("entity", hit=True)
             return cache_data
         
+        record_cache("entity", hit=False)
         return None
         
     except Exception as e:
@@ -82,6 +85,76 @@ def get_entity_cache(db: Union[DbController, AsyncDbController], text_hash: str)
         return None
 
 
+def get_entity_caches(db: DbController, text_hashes: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Retrieve cached entity results for many texts in one query.
+
+    :param db: DbController instance connected to SurrealDB
+    :param text_hashes: SHA256 hashes of the texts
+    :return: Cached entity data keyed by text hash (misses are absent)
+    """
+    if not text_hashes:
+        return {}
+    try:
+        result = db.query(
+            "SELECT text_hash, entities FROM entity_cache WHERE text_hash IN $text_hashes",
+            {"text_hashes": text_hashes}
+        )
+        rows: List[Dict[str, Any]] = []
+        for row in result or []:
+            if isinstance(row, dict) and isinstance(row.get("result"), list):
+                rows.extend(row["result"])
+            elif isinstance(row, dict):
+                rows.append(row)
+        found = {row["text_hash"]: row for row in rows if row.get("text_hash")}
+        record_cache("entity", hit=True, count=len(found))
+        record_cache("entity", hit=False, count=len(set(text_hashes)) - len(found))
+        return found
+    except Exception as e:
+        logger.error(f"Error retrieving entity caches: {e}")
+        return {}
+
+
+def store_entity_caches(db: DbController, entries: Dict[str, List[Dict[str, Any]]], note_type: str = 'text') -> bool:
+    """
+    Store entity results for many texts with a single INSERT.
+
+    :param db: DbController instance connected to SurrealDB
+    :param entries: Entities keyed by text hash
+    :param note_type: Type of note (soap or text)
+    :return: True if successful, False otherwise
+    """
+    if not entries:
+        return True
+    created_at = datetime.datetime.utcnow().isoformat()
+    rows = [
+        {
+            "text_hash": text_hash,
+            "entities": [
+                {
+                    "text": entity.get("text", ""),
+                    "label": entity.get("label", ""),
+                    "cui": entity.get("cui"),
+                    "icd10cm": entity.get("icd10cm"),
+                    "icd10cm_name": entity.get("icd10cm_name")
+                }
+                for entity in entities
+            ],
+            "note_type": note_type,
+            "created_at": created_at,
+            "entity_count": len(entities)
+        }
+        for text_hash, entities in entries.items()
+    ]
+    try:
+        db.query("INSERT INTO entity_cache $rows", {"rows": rows})
+        logger.debug(f"Stored {len(rows)} entity cache entries")
+        return True
+    except Exception as e:
+        logger.error(f"Error storing entity caches: {e}")
+        return False
+
+
 def create_text_hash(text: str) -> str:
     """
     Create a SHA256 hash of the text for cache key.
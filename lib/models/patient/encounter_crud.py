@@ -5,8 +5,7 @@ import ast
 import json
 from typing import Any, Dict, List, Union, cast
 
-from surrealdb import RecordID  # type: ignore[import-untyped]
-
+from lib.db.decoding import decode_rows, decode_value
 from lib.db.surreal import AsyncDbController, DbController
 from lib.models.patient.common import EncounterDict, PatientDict
 from lib.models.patient.encounter_model import Encounter, SOAPNotes
@@ -15,6 +14,10 @@ from lib.models.patient.patient_crud import \
 from settings import logger
 
 
+ENCOUNTER_BY_ID_QUERY = "SELECT * FROM encounter WHERE note_id = $encounter_id"
+ENCOUNTERS_BY_PATIENT_QUERY = "SELECT * FROM encounter WHERE patient.demographic_no = $patient_id ORDER BY date_created DESC"
+
+
 def store_encounter(db: Union[DbController, AsyncDbController], encounter: Encounter, patient_id: str) -> Dict[str, Any]:
     """
     Stores an Encounter instance in SurrealDB as encounter:<note_id>,
@@ -77,6 +80,31 @@ def store_encounter(db: Union[DbController, AsyncDbController], encounter: Encou
         return {}
 
 
+SOAP_KEYS = ('subjective', 'objective', 'assessment', 'plan')
+
+
+def parse_soap_notes(note_text: str) -> Union[Dict[str, Any], None]:
+    """
+    Parses note text stored as a JSON or Python dict string into SOAP notes.
+    :param note_text: str - The stored note text.
+    :return: dict - The SOAP sections, or None if the text is not SOAP notes.
+    """
+    # Only text that looks like a dict is worth parsing; most notes are plain text.
+    if not note_text.lstrip().startswith('{'):
+        return None
+    try:
+        parsed = json.loads(note_text)
+    except (json.JSONDecodeError, TypeError):
+        try:
+            parsed = ast.literal_eval(note_text)
+        except (ValueError, SyntaxError, TypeError) as e:
+            logger.debug("Note text is not SOAP notes: %s", e)
+            return None
+    if isinstance(parsed, dict) and all(k in parsed for k in SOAP_KEYS):
+        return parsed
+    return None
+
+
 def serialize_encounter(encounter: Any) -> EncounterDict:
     """
     Serializes an encounter dictionary to ensure all IDs are strings and handles RecordID types.
@@ -90,53 +118,25 @@ def serialize_encounter(encounter: Any) -> EncounterDict:
         else:
             return cast(EncounterDict, {})
     
-    # Create a copy to avoid modifying the original
-    result: Dict[str, Any] = {}
-    
-    # convert encounter['id'] to string...
+    # Rows are converted in place: they come fresh from the database and are not used again unserialized.
+    decode_value(encounter)
+    note_type = None
     for key, value in encounter.items():
-        logger.debug('key [encounter]', key, value)
         if isinstance(value, list):
-            result[key] = [str(item) if isinstance(item, int) else item for item in value]
+            if any(isinstance(item, int) for item in value):
+                encounter[key] = [str(item) if isinstance(item, int) else item for item in value]
         elif isinstance(value, int):
-            result[key] = str(value)
+            encounter[key] = str(value)
         elif key == 'patient' and isinstance(value, dict):
-            result[key] = serialize_patient(value)
-        elif key == 'patient' and isinstance(value, RecordID):
-            result[key] = str(value)
-        elif key == 'id' and isinstance(value, RecordID):
-            result[key] = str(value)
+            serialize_patient(value)
         elif key == 'note_text' and isinstance(value, str):
-            logger.debug(f"Processing note_text: {value[:100]}...")  # Log first 100 chars
-            # Check if this is a JSON string or Python dict string that should be parsed as SOAP notes
-            try:
-                # First try JSON parsing
-                parsed = json.loads(value)
-                if isinstance(parsed, dict) and all(k in parsed for k in ['subjective', 'objective', 'assessment', 'plan']):
-                    logger.debug("Successfully parsed as JSON SOAP notes")
-                    result[key] = parsed
-                    result['note_type'] = 'soap'
-                    return result
-            except (json.JSONDecodeError, TypeError) as e:
-                logger.debug(f"JSON parsing failed: {e}")
-                pass
-            
-            # If JSON parsing failed, try Python literal_eval for Python dict strings
-            try:
-                parsed = ast.literal_eval(value)
-                if isinstance(parsed, dict) and all(k in parsed for k in ['subjective', 'objective', 'assessment', 'plan']):
-                    logger.debug("Successfully parsed as Python dict SOAP notes")
-                    result[key] = parsed
-                    result['note_type'] = 'soap'
-                else:
-                    logger.debug("Parsed as dict but not SOAP notes")
-                    result[key] = value
-            except (ValueError, SyntaxError, TypeError) as e:
-                logger.debug(f"Python literal_eval failed: {e}")
-                result[key] = value
-        else:
-            result[key] = value
-    return cast(EncounterDict, result)
+            soap = parse_soap_notes(value)
+            if soap is not None:
+                encounter[key] = soap
+                note_type = 'soap'
+    if note_type is not None:
+        encounter['note_type'] = note_type
+    return cast(EncounterDict, encounter)
 
 def search_patient_history(search_term: str) -> List[PatientDict]:
     """
@@ -237,7 +237,7 @@ def get_all_encounters() -> List[EncounterDict]:
     try:
         logger.debug("Getting all encounters from database...")
         results = db.select_many('encounter')
-        logger.debug(f"Raw encounter results: {results}")
+        logger.debug("Raw encounter results: %d rows", len(results or []))
         
         # Handle different result structures
         if results and len(results) > 0:
@@ -247,11 +247,9 @@ def get_all_encounters() -> List[EncounterDict]:
             else:
                 encounters = results
             
-            logger.debug(f"Processed encounters: {encounters}")
-            
             if isinstance(encounters, list):
                 serialized_encounters = [serialize_encounter(encounter) for encounter in encounters]
-                logger.debug(f"Serialized encounters: {serialized_encounters}")
+                logger.debug("Serialized %d encounters", len(serialized_encounters))
                 return serialized_encounters
             else:
                 logger.debug("Encounters is not a list")
@@ -278,7 +276,7 @@ def get_encounter_by_id(encounter_id: str) -> EncounterDict:
     db.connect()
     
     try:
-        query = "SELECT * FROM encounter WHERE note_id = $encounter_id"
+        query = ENCOUNTER_BY_ID_QUERY
         params = {"encounter_id": encounter_id}
         
         logger.debug(f"Executing encounter query: {query} with params: {params}")
@@ -320,7 +318,7 @@ def get_encounters_by_patient(patient_id: str) -> List[EncounterDict]:
     db.connect()
     
     try:
-        query = "SELECT * FROM encounter WHERE patient.demographic_no = $patient_id ORDER BY date_created DESC"
+        query = ENCOUNTERS_BY_PATIENT_QUERY
         params = {"patient_id": patient_id}
         
         logger.debug(f"Executing query: {query} with params: {params}")
@@ -522,3 +520,27 @@ def delete_encounter(encounter_id: str) -> bool:
         return False
     finally:
         db.close()
+
+
+async def get_encounter_by_id_async(db: AsyncDbController, encounter_id: str) -> EncounterDict:
+    """
+    Async get_encounter_by_id on a connected controller, for async views
+
+    :param db: Connected AsyncDbController (see lib.db.async_pool).
+    :param encounter_id: The note_id of the encounter to retrieve.
+    :return: Serialized encounter data or empty dict if not found.
+    """
+    rows = decode_rows(await db.query(ENCOUNTER_BY_ID_QUERY, {"encounter_id": encounter_id}))
+    return serialize_encounter(rows[0]) if rows else cast(EncounterDict, {})
+
+
+async def get_encounters_by_patient_async(db: AsyncDbController, patient_id: str) -> List[EncounterDict]:
+    """
+    Async get_encounters_by_patient on a connected controller, for async views
+
+    :param db: Connected AsyncDbController (see lib.db.async_pool).
+    :param patient_id: The demographic_no of the patient to retrieve encounters for.
+    :return: List of serialized Encounter objects.
+    """
+    rows = decode_rows(await db.query(ENCOUNTERS_BY_PATIENT_QUERY, {"patient_id": patient_id}))
+    return [serialize_encounter(row) for row in rows]
@@ -105,6 +105,10 @@ class Encounter:
         statements.append('DEFINE FIELD note_text ON encounter TYPE any;')
         statements.append('DEFINE FIELD note_type ON encounter TYPE string;')
         statements.append('DEFINE FIELD diagnostic_codes ON encounter TYPE array;')
+        # Suggested codes from the ICD autocoder, kept apart from the provider-entered diagnostic_codes.
+        statements.append('DEFINE FIELD icd_autocodes ON encounter TYPE option<array>;')
+        statements.append('DEFINE FIELD icd_autocodes[*] ON encounter FLEXIBLE TYPE object;')
+        statements.append('DEFINE FIELD icd_autocoded_at ON encounter TYPE option<string>;')
 
         statements.append('DEFINE FIELD patient ON encounter TYPE record<patient> ASSERT $value != none;')
 
@@ -3,23 +3,32 @@ CRUD operations for Patient model.
 """
 from typing import Any, Dict, List, Union, cast
 
-from lib.db.surreal import AsyncDbController, DbController
+from lib.db.decoding import decode_rows, decode_value
+from lib.db.surreal import AsyncDbController, DbController, Transaction
 from lib.models.patient.common import PatientDict
 from lib.models.patient.patient_model import Patient
 from settings import logger
 
+# Next free demographic number, taken from a counter record. The counter starts above the highest numeric
+# demographic_no already stored (or at 1000), so numbering continues from patients created before it existed.
+NEXT_DEMOGRAPHIC_NO = """
+LET $next = (UPSERT ONLY counter:patient_demographic_no SET value = IF value = NONE THEN
+    math::max(array::concat([999], (SELECT VALUE <int> demographic_no FROM patient
+                                    WHERE string::is::numeric(demographic_no ?? '')))) + 1
+ELSE value + 1 END RETURN VALUE value)
+"""
 
-def store_patient(db: Union[DbController, AsyncDbController], patient: Patient) -> Dict[str, Any]:
-    """
-    Stores a Patient instance in SurrealDB as patient:<demographic_no>.
+PATIENT_BY_ID_QUERY = "SELECT * FROM patient WHERE demographic_no = $patient_id"
 
-    :param db: DbController instance connected to SurrealDB.
-    :param patient: Patient instance to store.
-    :return: Result of the store operation.
+
+def patient_content(patient: Patient) -> Dict[str, Any]:
     """
-    record_id = f"patient:{patient.demographic_no}"
+    The stored fields of a patient record.
 
-    content_data: Dict[str, Any] = {
+    :param patient: Patient instance.
+    :return: Record content.
+    """
+    return {
         "demographic_no": str(patient.demographic_no),
         "first_name": patient.first_name,
         "last_name": patient.last_name,
@@ -31,8 +40,19 @@ def store_patient(db: Union[DbController, AsyncDbController], patient: Patient)
         "location": list(patient.location) if patient.location is not None else []
     }
 
+
+def store_patient(db: Union[DbController, AsyncDbController], patient: Patient) -> Dict[str, Any]:
+    """
+    Stores a Patient instance in SurrealDB as patient:<demographic_no>.
+
+    :param db: DbController instance connected to SurrealDB.
+    :param patient: Patient instance to store.
+    :return: Result of the store operation.
+    """
+    record_id = f"patient:{patient.demographic_no}"
+
     query = f"CREATE {record_id} CONTENT $data"
-    params = {"data": content_data}
+    params = {"data": patient_content(patient)}
 
     # If the patient record might already exist, consider UPDATE or UPSERT logic instead.
     # For simplicity, we’ll just CREATE each time:
@@ -60,6 +80,7 @@ def store_patient(db: Union[DbController, AsyncDbController], patient: Patient)
 def serialize_patient(patient: Any) -> PatientDict:
     """
     Serializes a patient dictionary to ensure all IDs are strings and handles RecordID types.
+    The dictionary is updated in place and returned.
     :param patient: dict - The patient data to serialize.
     :return: PatientDict - The serialized patient data with all IDs as strings.
     """
@@ -70,19 +91,15 @@ def serialize_patient(patient: Any) -> PatientDict:
         else:
             return cast(PatientDict, {})
     
-    # Create a copy to avoid modifying the original
-    result: Dict[str, Any] = {}
-    
-    # convert patient['id'] to string...
+    # Rows are converted in place: they come fresh from the database and are not used again unserialized.
+    decode_value(patient)
     for key, value in patient.items():
-        logger.debug('key', key, value)
         if isinstance(value, list):
-            result[key] = [str(item) if isinstance(item, int) else item for item in value]
+            if any(isinstance(item, int) for item in value):
+                patient[key] = [str(item) if isinstance(item, int) else item for item in value]
         elif isinstance(value, int):
-            result[key] = str(value)
-        else:
-            result[key] = value
-    return cast(PatientDict, result)
+            patient[key] = str(value)
+    return cast(PatientDict, patient)
 
 
 def get_patient_by_id(patient_id: str) -> PatientDict:
@@ -98,7 +115,7 @@ def get_patient_by_id(patient_id: str) -> PatientDict:
     
     try:
         # Use a direct query instead of select method
-        query = "SELECT * FROM patient WHERE demographic_no = $patient_id"
+        query = PATIENT_BY_ID_QUERY
         params = {"patient_id": patient_id}
         
         logger.debug(f"Executing query: {query} with params: {params}")
@@ -245,24 +262,9 @@ def create_patient(patient_data: Dict[str, Any]) -> PatientDict:
     db.connect()
     
     try:
-        # Generate a new demographic_no if not provided
-        if not patient_data.get("demographic_no"):
-            logger.debug("No demographic_no provided, generating new one...")
-            # Get the highest existing demographic_no and increment
-            results = db.select_many('patient')
-            if results and len(results) > 0:
-                existing_ids = [int(p.get('demographic_no', 0)) for p in results if p.get('demographic_no')]
-                new_id = max(existing_ids) + 1 if existing_ids else 1000
-            else:
-                new_id = 1000
-            patient_data["demographic_no"] = str(new_id)
-            logger.debug(f"Generated demographic_no: {new_id}")
-        
-        # Create Patient object
         loc = patient_data.get("location", [])
-
         patient = Patient(
-            demographic_no=patient_data["demographic_no"],
+            demographic_no=patient_data.get("demographic_no") or "",
             first_name=patient_data.get("first_name"),
             last_name=patient_data.get("last_name"),
             date_of_birth=patient_data.get("date_of_birth"),
@@ -271,9 +273,22 @@ def create_patient(patient_data: Dict[str, Any]) -> PatientDict:
             phone=patient_data.get("phone"),
             email=patient_data.get("email")
         )
-        
         logger.debug(f"Created Patient object: {patient}")
-        result = store_patient(db, patient)
+
+        if patient.demographic_no:
+            result = store_patient(db, patient)
+        else:
+            # Allocate the next demographic_no and create the record in one transaction, so concurrent
+            # registrations never receive the same number
+            content = patient_content(patient)
+            fields = ", ".join(f"{name}: $data.{name}" for name in content if name != "demographic_no")
+            tx = Transaction()
+            tx.add(NEXT_DEMOGRAPHIC_NO)
+            created_index = tx.add(
+                f"CREATE type::thing('patient', $next) CONTENT {{ demographic_no: <string> $next, {fields} }}",
+                {"data": content}
+            )
+            result = db.execute(tx)[created_index]
         logger.debug(f"Store patient result: {result}")
         
         # Handle different result structures
@@ -311,7 +326,7 @@ def get_all_patients() -> List[PatientDict]:
     try:
         logger.debug("Getting all patients from database...")
         results = db.select_many('patient')
-        logger.debug(f"Raw results: {results}")
+        logger.debug("Raw patient results: %d rows", len(results or []))
         
         # Handle different result structures
         if results and len(results) > 0:
@@ -321,11 +336,9 @@ def get_all_patients() -> List[PatientDict]:
             else:
                 patients = results
             
-            logger.debug(f"Processed patients: {patients}")
-            
             if isinstance(patients, list):
                 serialized_patients = [serialize_patient(patient) for patient in patients]
-                logger.debug(f"Serialized patients: {serialized_patients}")
+                logger.debug("Serialized %d patients", len(serialized_patients))
                 return serialized_patients
             else:
                 logger.debug("Patients is not a list")
@@ -338,3 +351,27 @@ def get_all_patients() -> List[PatientDict]:
         return []
     finally:
         db.close()
+
+
+async def get_patient_by_id_async(db: AsyncDbController, patient_id: str) -> PatientDict:
+    """
+    Async get_patient_by_id on a connected controller, for async views
+
+    :param db: Connected AsyncDbController (see lib.db.async_pool).
+    :param patient_id: The demographic_no of the patient to retrieve.
+    :return: Serialized patient data or empty dict if not found.
+    """
+    rows = decode_rows(await db.query(PATIENT_BY_ID_QUERY, {"patient_id": patient_id}))
+    return serialize_patient(rows[0]) if rows else cast(PatientDict, {})
+
+
+async def get_all_patients_async(db: AsyncDbController) -> List[PatientDict]:
+    """
+    Async get_all_patients on a connected controller, for async views
+
+    :param db: Connected AsyncDbController (see lib.db.async_pool).
+    :return: List of serialized Patient objects.
+    """
+    patients = await db.select_many('patient')
+    logger.debug("Serializing %d patients", len(patients))
+    return [serialize_patient(patient) for patient in patients]
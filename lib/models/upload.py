@@ -8,7 +8,6 @@ import uuid
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
-import boto3 # type: ignore
 from werkzeug.datastructures import FileStorage
 
 from lib.data_types import UserID
@@ -54,6 +53,7 @@ class Upload:
             s3_key: str = "",
             processed_text: str = "",
             task_id: str = "",
+            content_hash: str = "",
     ) -> None:
         """
         Initialize the Upload model.
@@ -68,6 +68,7 @@ class Upload:
         :param s3_key: str - The S3 key for the uploaded file.
         :param processed_text: str - The extracted text from the file.
         :param task_id: str - The Celery task ID for processing.
+        :param content_hash: str - Hex SHA-256 of the file contents.
         """
         self.uploader = uploader
         self.file_name = file_name
@@ -80,6 +81,7 @@ class Upload:
         self.s3_key = s3_key
         self.processed_text = processed_text
         self.task_id = task_id
+        self.content_hash = content_hash
 
     def to_dict(self) -> Dict[str, Any]:
         """
@@ -97,6 +99,7 @@ class Upload:
             "s3_key": self.s3_key,
             "processed_text": self.processed_text,
             "task_id": self.task_id,
+            "content_hash": self.content_hash,
         }
 
     def upload_file_to_s3(self, file: FileStorage, s3_key: str) -> None:
@@ -106,6 +109,7 @@ class Upload:
         :param s3_key: str - The key under which to store the file in S3.
         """
         try:
+            import boto3  # type: ignore[import-untyped]
             s3 = boto3.client(
                 's3',
                 aws_access_key_id=S3_AWS_ACCESS_KEY_ID,
@@ -249,13 +253,20 @@ def get_uploads_by_user(user_id: UserID) -> List[Dict[str, Any]]:
     finally:
         db.close()
 
-def update_upload_status(upload_id: str, status: UploadStatus, processed_text: str = "", task_id: str = "") -> bool:
+def update_upload_status(
+        upload_id: str,
+        status: UploadStatus,
+        processed_text: str = "",
+        task_id: str = "",
+        extra: Optional[Dict[str, Any]] = None
+) -> bool:
     """
     Update the status of an upload, merging with existing fields to avoid overwriting other attributes.
     :param upload_id: str - The ID of the upload to update.
     :param status: UploadStatus - The new status.
     :param processed_text: str - The processed text (optional).
     :param task_id: str - The task ID (optional).
+    :param extra: Optional[Dict[str, Any]] - Additional fields to merge (e.g. the Textract job ID).
     :return: bool - True if successful, False otherwise.
     """
     # Normalize upload_id to just the ID part (strip any prefix like 'upload:')
@@ -271,6 +282,8 @@ def update_upload_status(upload_id: str, status: UploadStatus, processed_text: s
             patch["processed_text"] = processed_text
         if task_id:
             patch["task_id"] = task_id
+        if extra:
+            patch.update(extra)
 
         # MERGE keeps everything else intact
         sql = "UPDATE type::thing('upload', $rid) MERGE $data"
@@ -284,6 +297,34 @@ def update_upload_status(upload_id: str, status: UploadStatus, processed_text: s
     finally:
         db.close()
 
+def find_completed_upload_by_hash(user_id: UserID, content_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    Find a completed upload of the same content by the same user, so its processed text can be reused.
+    Lookups are scoped to the uploader so the response never reveals what other users have uploaded.
+    :param user_id: UserID - The uploader.
+    :param content_hash: str - Hex SHA-256 of the file contents.
+    :return: Optional[Dict[str, Any]] - The most recent matching upload record or None.
+    """
+    if not content_hash:
+        return None
+    db = DbController()
+    try:
+        db.connect()
+        id_part = str(user_id)
+        if ":" in id_part:
+            id_part = id_part.split(":")[-1]
+        res = db.query(
+            "SELECT * FROM upload WHERE uploader = $uid AND content_hash = $hash AND status = $status "
+            "ORDER BY date_uploaded DESC LIMIT 1",
+            {"uid": f"user:{id_part}", "hash": content_hash, "status": UploadStatus.COMPLETED.value}
+        )
+        return parse_upload(dict(res[0])) if res else None
+    except Exception as e:
+        logger.error(f"Error looking up upload by content hash: {e}")
+        return None
+    finally:
+        db.close()
+
 def get_upload_by_id(upload_id: str) -> Optional[Dict[str, Any]]:
     """
     Get an upload by its ID.
@@ -5,7 +5,7 @@ import hashlib
 import re
 import secrets
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from settings import logger
 
@@ -143,6 +143,18 @@ class User:
             'organization_id': self.organization_id
         }
     
+    @staticmethod
+    def schema() -> List[str]:
+        """
+        Index definitions for the User table
+
+        The user search index is loaded from active users only.
+        :return: List of SurrealQL statements
+        """
+        return [
+            'DEFINE INDEX idx_user_active ON User FIELDS is_active;',
+        ]
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'User':
         """
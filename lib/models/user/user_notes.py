@@ -176,8 +176,40 @@ class UserNote:
             'note_type': self.note_type,
             'tags': self.tags,
             'date_created': self.date_created,
-            'date_updated': self.date_updated
+            'date_updated': self.date_updated,
+            'search_prefix': self.prefix_text(self.title, self.tags)
         }
+
+    @staticmethod
+    def prefix_text(title: str, tags: List[str]) -> str:
+        """
+        Text indexed for typeahead search: the title followed by the tags
+
+        :param title: Note title
+        :param tags: Note tags
+        :return: Space-separated text
+        """
+        return " ".join([title, *tags])
+
+    @staticmethod
+    def schema() -> List[str]:
+        """
+        Full-text search definitions for the UserNote table
+
+        Title and content are indexed with BM25 ranking and stemming. ``search_prefix`` (title and tags) is indexed as
+        edge n-grams so that partial words match while the user is typing. SurrealDB keeps all of these indexes up to
+        date as notes are created, updated and deleted.
+        :return: List of SurrealQL statements
+        """
+        return [
+            'DEFINE ANALYZER user_note_analyzer TOKENIZERS blank, class FILTERS lowercase, ascii, snowball(english);',
+            'DEFINE ANALYZER user_note_prefix_analyzer TOKENIZERS blank, class FILTERS lowercase, ascii, edgengram(1, 15);',
+            'DEFINE FIELD search_prefix ON UserNote TYPE string DEFAULT "";',
+            'DEFINE INDEX idx_user_note_title_search ON UserNote FIELDS title SEARCH ANALYZER user_note_analyzer BM25 HIGHLIGHTS;',
+            'DEFINE INDEX idx_user_note_content_search ON UserNote FIELDS content SEARCH ANALYZER user_note_analyzer BM25 HIGHLIGHTS;',
+            'DEFINE INDEX idx_user_note_prefix_search ON UserNote FIELDS search_prefix SEARCH ANALYZER user_note_prefix_analyzer BM25;',
+            'DEFINE INDEX idx_user_note_tags ON UserNote FIELDS tags;',
+        ]
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'UserNote':
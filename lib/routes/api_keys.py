@@ -5,6 +5,7 @@ from typing import Tuple
 
 from flask import Response, g, jsonify, request
 
+from lib.infra.request_services import get_service
 from lib.services.api_key_service import APIKeyService
 from settings import logger
 
@@ -38,7 +39,7 @@ def create_api_key_route() -> Tuple[Response, int]:
             return jsonify({"error": "User authentication required"}), 401
         
         # Create API key
-        api_key_service = APIKeyService()
+        api_key_service = get_service(APIKeyService)
         success, message, api_key = api_key_service.create_api_key(
             user_id=user_id,
             name=name,
@@ -80,7 +81,7 @@ def list_api_keys_route() -> Tuple[Response, int]:
             return jsonify({"error": "User authentication required"}), 401
         
         # Get API keys
-        api_key_service = APIKeyService()
+        api_key_service = get_service(APIKeyService)
         api_keys = api_key_service.get_api_keys_for_user(user_id)
         
         return jsonify({
@@ -111,7 +112,7 @@ def delete_api_key_route(key_id: str) -> Tuple[Response, int]:
             return jsonify({"error": "User authentication required"}), 401
         
         # Delete API key
-        api_key_service = APIKeyService()
+        api_key_service = get_service(APIKeyService)
         success, message = api_key_service.delete_api_key(key_id, user_id)
         
         if success:
@@ -142,7 +143,7 @@ def deactivate_api_key_route(key_id: str) -> Tuple[Response, int]:
             return jsonify({"error": "User authentication required"}), 401
         
         # Deactivate API key
-        api_key_service = APIKeyService()
+        api_key_service = get_service(APIKeyService)
         success, message = api_key_service.deactivate_api_key(key_id, user_id)
         
         if success:
@@ -173,7 +174,7 @@ def get_api_key_usage_route(key_id: str) -> Tuple[Response, int]:
             return jsonify({"error": "User authentication required"}), 401
         
         # Get API key and usage stats
-        api_key_service = APIKeyService()
+        api_key_service = get_service(APIKeyService)
         
         # First get the API key to validate ownership
         api_keys = api_key_service.get_api_keys_for_user(user_id)
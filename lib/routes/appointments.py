@@ -5,8 +5,10 @@ from typing import Any, Dict, Tuple
 
 from flask import Response, jsonify, request
 
+from lib.db.async_pool import async_db
+from lib.infra.request_services import get_service
 from lib.services.auth_decorators import get_current_user
-from lib.services.scheduling import SchedulingService
+from lib.services.scheduling import AsyncSchedulingService, SchedulingService
 from settings import logger
 
 
@@ -70,7 +72,7 @@ def create_appointment_route() -> Tuple[Response, int]:
             return jsonify({"error": "Missing required fields"}), 400
         
         # Create appointment
-        scheduling_service = SchedulingService()
+        scheduling_service = get_service(SchedulingService)
         scheduling_service.connect()
         try:
             success, message, appointment = scheduling_service.create_appointment(
@@ -115,7 +117,7 @@ def create_appointment_route() -> Tuple[Response, int]:
         return jsonify({"error": "Internal server error"}), 500
 
 
-def get_appointments_route() -> Tuple[Response, int]:
+async def get_appointments_route() -> Tuple[Response, int]:
     """
     Get appointments based on filters
 
@@ -125,10 +127,16 @@ def get_appointments_route() -> Tuple[Response, int]:
     Returns a JSON response with the list of appointments and their details.
     HTTP Status Codes:
     - 200 OK: Successfully retrieved appointments
+    - 400 Bad Request: Invalid dates or date range
     - 401 Unauthorized: User not authenticated
     - 500 Internal Server Error: An unexpected error occurred
     Example Request:
     GET /appointments?date=2023-10-01&patient_id=Patient:12345&provider_id=Provider:67890&status=scheduled
+    Query parameters:
+    - date: A single day, or start_date and end_date for a range (default: the next 31 days, at most 366)
+    - patient_id, provider_id: Filters (without either, provider_id defaults to the current user)
+    - status: One status or a comma-separated list
+    - page, page_size: Pagination (default: 1, 100)
     Example Response:
     HTTP/1.1 200 OK
     {
@@ -149,7 +157,10 @@ def get_appointments_route() -> Tuple[Response, int]:
                 "updated_at": "2023-09-01T12:00:00Z"
             }
         ],
-        "total": 1
+        "total": 1,
+        "page": 1,
+        "page_size": 100,
+        "has_more": false
     }
 
     :return: JSON response with appointments or error message
@@ -164,62 +175,66 @@ def get_appointments_route() -> Tuple[Response, int]:
         
         # Get query parameters
         date = request.args.get('date')
+        start_date = request.args.get('start_date', date)
+        end_date = request.args.get('end_date', date)
         patient_id = request.args.get('patient_id')
-        provider_id = request.args.get('provider_id', current_user.user_id)
+        # A patient's appointments are listed across providers unless one is named
+        provider_id = request.args.get('provider_id') or (None if patient_id else current_user.user_id)
         status = request.args.get('status')
+        statuses = [s.strip() for s in status.split(',') if s.strip()] if status else None
+        page = request.args.get('page', 1, type=int)
+        page_size = request.args.get('page_size', 100, type=int)
         
         logger.debug(f"Query params - date: {date}, patient_id: {patient_id}, provider_id: {provider_id}, status: {status}")
         
-        scheduling_service = SchedulingService()
-        scheduling_service.connect()
         try:
-            appointments = []
-            
-            # For debugging, get ALL appointments regardless of provider
-            logger.debug("Getting ALL appointments for debugging...")
-            appointments = scheduling_service.get_all_appointments()
-            logger.debug(f"Found {len(appointments)} total appointments")
-            
-            # Filter by status if specified
-            if status:
-                appointments = [apt for apt in appointments if apt.status == status]
-                logger.debug(f"After status filter: {len(appointments)} appointments")
-            
-            # Convert to JSON-serializable format
-            appointment_list: list[Dict[str, Any]] = []
-            for appointment in appointments:
-                logger.debug(f"Processing appointment: {appointment.id} - provider: {appointment.provider_id}, patient: {appointment.patient_id}")
-                appointment_list.append({
-                    "id": appointment.id,
-                    "patient_id": appointment.patient_id,
-                    "provider_id": appointment.provider_id,
-                    "appointment_date": appointment.appointment_date,
-                    "start_time": appointment.start_time,
-                    "end_time": appointment.end_time,
-                    "appointment_type": appointment.appointment_type,
-                    "status": appointment.status,
-                    "notes": appointment.notes,
-                    "location": appointment.location,
-                    "created_at": appointment.created_at,
-                    "updated_at": appointment.updated_at
-                })
-            
-            logger.debug(f"Returning {len(appointment_list)} appointments")
-            return jsonify({
-                "success": True,
-                "appointments": appointment_list,
-                "total": len(appointment_list)
-            }), 200
-            
-        finally:
-            scheduling_service.close()
+            async with async_db() as db:
+                appointments, has_more = await AsyncSchedulingService(db).query_appointments(
+                    provider_id=provider_id,
+                    patient_id=patient_id,
+                    start_date=start_date,
+                    end_date=end_date,
+                    statuses=statuses,
+                    page=page,
+                    page_size=page_size
+                )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        # Convert to JSON-serializable format
+        appointment_list: list[Dict[str, Any]] = []
+        for appointment in appointments:
+            appointment_list.append({
+                "id": appointment.id,
+                "patient_id": appointment.patient_id,
+                "provider_id": appointment.provider_id,
+                "appointment_date": appointment.appointment_date,
+                "start_time": appointment.start_time,
+                "end_time": appointment.end_time,
+                "appointment_type": appointment.appointment_type,
+                "status": appointment.status,
+                "notes": appointment.notes,
+                "location": appointment.location,
+                "created_at": appointment.created_at,
+                "updated_at": appointment.updated_at
+            })
+        
+        logger.debug(f"Returning {len(appointment_list)} appointments")
+        return jsonify({
+            "success": True,
+            "appointments": appointment_list,
+            "total": len(appointment_list),
+            "page": max(1, page),
+            "page_size": page_size,
+            "has_more": has_more
+        }), 200
             
     except Exception as e:
         logger.error(f"Error getting appointments: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
 
-def get_appointment_route(appointment_id: str) -> Tuple[Response, int]:
+async def get_appointment_route(appointment_id: str) -> Tuple[Response, int]:
     """
     Get a specific appointment
 
@@ -263,38 +278,33 @@ def get_appointment_route(appointment_id: str) -> Tuple[Response, int]:
         if not current_user:
             return jsonify({"error": "Authentication required"}), 401
         
-        scheduling_service = SchedulingService()
-        scheduling_service.connect()
-        try:
-            appointment = scheduling_service.get_appointment(appointment_id)
-            
-            if not appointment:
-                return jsonify({"error": "Appointment not found"}), 404
-            
-            # Check if user has access to this appointment
-            if appointment.provider_id != current_user.user_id and appointment.patient_id != current_user.user_id:
-                return jsonify({"error": "Access denied"}), 403
-            
-            return jsonify({
-                "success": True,
-                "appointment": {
-                    "id": appointment.id,
-                    "patient_id": appointment.patient_id,
-                    "provider_id": appointment.provider_id,
-                    "appointment_date": appointment.appointment_date,
-                    "start_time": appointment.start_time,
-                    "end_time": appointment.end_time,
-                    "appointment_type": appointment.appointment_type,
-                    "status": appointment.status,
-                    "notes": appointment.notes,
-                    "location": appointment.location,
-                    "created_at": appointment.created_at,
-                    "updated_at": appointment.updated_at
-                }
-            }), 200
-            
-        finally:
-            scheduling_service.close()
+        async with async_db() as db:
+            appointment = await AsyncSchedulingService(db).get_appointment(appointment_id)
+        
+        if not appointment:
+            return jsonify({"error": "Appointment not found"}), 404
+        
+        # Check if user has access to this appointment
+        if appointment.provider_id != current_user.user_id and appointment.patient_id != current_user.user_id:
+            return jsonify({"error": "Access denied"}), 403
+        
+        return jsonify({
+            "success": True,
+            "appointment": {
+                "id": appointment.id,
+                "patient_id": appointment.patient_id,
+                "provider_id": appointment.provider_id,
+                "appointment_date": appointment.appointment_date,
+                "start_time": appointment.start_time,
+                "end_time": appointment.end_time,
+                "appointment_type": appointment.appointment_type,
+                "status": appointment.status,
+                "notes": appointment.notes,
+                "location": appointment.location,
+                "created_at": appointment.created_at,
+                "updated_at": appointment.updated_at
+            }
+        }), 200
             
     except Exception as e:
         logger.error(f"Error getting appointment: {e}")
@@ -349,7 +359,7 @@ def update_appointment_route(appointment_id: str) -> Tuple[Response, int]:
         if not current_user:
             return jsonify({"error": "Authentication required"}), 401
         
-        scheduling_service = SchedulingService()
+        scheduling_service = get_service(SchedulingService)
         scheduling_service.connect()
         try:
             # Get current appointment to check access
@@ -420,7 +430,7 @@ def cancel_appointment_route(appointment_id: str) -> Tuple[Response, int]:
         if not current_user:
             return jsonify({"error": "Authentication required"}), 401
         
-        scheduling_service = SchedulingService()
+        scheduling_service = get_service(SchedulingService)
         scheduling_service.connect()
         try:
             # Get current appointment to check access
@@ -483,7 +493,7 @@ def confirm_appointment_route(appointment_id: str) -> Tuple[Response, int]:
         if not current_user:
             return jsonify({"error": "Authentication required"}), 401
         
-        scheduling_service = SchedulingService()
+        scheduling_service = get_service(SchedulingService)
         scheduling_service.connect()
         try:
             # Get current appointment to check access
@@ -557,7 +567,7 @@ def get_available_slots_route() -> Tuple[Response, int]:
         if not date:
             return jsonify({"error": "Date parameter is required"}), 400
         
-        scheduling_service = SchedulingService()
+        scheduling_service = get_service(SchedulingService)
         scheduling_service.connect()
         try:
             slots = scheduling_service.get_available_slots(provider_id, date, duration)
@@ -578,6 +588,75 @@ def get_available_slots_route() -> Tuple[Response, int]:
         return jsonify({"error": "Internal server error"}), 500
 
 
+def get_first_available_slot_route() -> Tuple[Response, int]:
+    """
+    Find the earliest free slot across providers
+
+    This endpoint searches several providers over a date range for the first free slot of a given length,
+    e.g. "first free 45-minute slot with any cardiologist this week".
+    Providers are given either as a comma-separated provider_ids list or by specialty.
+    HTTP Status Codes:
+    - 200 OK: Search completed (the slot is null if nothing is free)
+    - 400 Bad Request: Missing or invalid parameters
+    - 401 Unauthorized: User not authenticated
+    - 500 Internal Server Error: An unexpected error occurred
+    Example Request:
+    GET /appointments/first-available?specialty=Cardiology&start_date=2023-10-02&end_date=2023-10-06&duration=45
+    Example Response:
+    HTTP/1.1 200 OK
+    {
+        "success": true,
+        "duration_minutes": 45,
+        "slot": {
+            "provider_id": "User:67890",
+            "date": "2023-10-02",
+            "start_time": "10:30",
+            "end_time": "11:15"
+        }
+    }
+    :return: JSON response with the first available slot or error message
+    """
+    try:
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({"error": "Authentication required"}), 401
+
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date', start_date)
+        duration = request.args.get('duration', 30, type=int)
+        specialty = request.args.get('specialty')
+        provider_ids = [p for p in request.args.get('provider_ids', '').split(',') if p]
+
+        if not start_date or not end_date:
+            return jsonify({"error": "start_date parameter is required"}), 400
+        if not provider_ids and not specialty:
+            return jsonify({"error": "Either provider_ids or specialty is required"}), 400
+        if not duration or duration <= 0:
+            return jsonify({"error": "duration must be a positive number of minutes"}), 400
+
+        scheduling_service = get_service(SchedulingService)
+        scheduling_service.connect()
+        try:
+            if specialty:
+                provider_ids += scheduling_service.get_provider_ids_by_specialty(specialty)
+            slot = scheduling_service.find_first_available_slot(provider_ids, start_date, end_date, duration)
+
+            return jsonify({
+                "success": True,
+                "duration_minutes": duration,
+                "slot": slot
+            }), 200
+
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        finally:
+            scheduling_service.close()
+
+    except Exception as e:
+        logger.error(f"Error finding first available slot: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
+
 def get_appointment_types_route() -> Tuple[Response, int]:
     """
     Get available appointment types
@@ -11,6 +11,7 @@ import requests
 from flask import Response, jsonify, redirect, request, session, url_for
 from werkzeug.wrappers.response import Response as BaseResponse
 
+from lib.infra.request_services import get_service
 from lib.services.user_service import UserService
 from settings import (APP_URL, CLIENT_ID, CLIENT_SECRET, COGNITO_DOMAIN,
                       LOGOUT_URI, REDIRECT_URI, logger)
@@ -166,7 +167,7 @@ def cognito_login_route() -> Union[Tuple[Response, int], BaseResponse]:
                 role_from_query = state
                 intent = 'signin'
 
-            user_service = UserService()
+            user_service = get_service(UserService)
             user_service.connect()
             try:
                 user = user_service.get_user_by_email(email)
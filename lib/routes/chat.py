@@ -6,8 +6,12 @@ from typing import Any, Dict, List, Tuple
 from flask import Response, jsonify, request
 
 from lib.data_types import UserID
+from lib.db.async_pool import async_db
+from lib.infra.request_services import get_service
+from lib.models.user.user import User
 from lib.services.auth_decorators import get_current_user
-from lib.services.conversation_service import ConversationService
+from lib.services.conversation_service import (AsyncConversationService,
+                                               ConversationService)
 from lib.services.notifications import publish_event_with_buffer
 from lib.services.user_service import UserService
 from settings import logger
@@ -80,7 +84,7 @@ def create_conversation_route() -> Tuple[Response, int]:
     if len(participants) < 2:
         return jsonify({"error": "At least 2 participants are required"}), 400
 
-    conversation_service = ConversationService()
+    conversation_service = get_service(ConversationService)
     conversation_service.connect()
     try:
         success, message, conversation = conversation_service.create_conversation(participants, conversation_type)
@@ -162,7 +166,7 @@ def send_message_route(conversation_id: str) -> Tuple[Response, int]:
 
     message_text = data['text']
 
-    conversation_service = ConversationService()
+    conversation_service = get_service(ConversationService)
     conversation_service.connect()
     try:
         # Verify conversation exists and user is a participant
@@ -183,18 +187,15 @@ def send_message_route(conversation_id: str) -> Tuple[Response, int]:
         if success and msg_obj:
             logger.debug(f"Message sent successfully: {msg_obj.id}")
             
+            # Get sender info for the notifications
+            user_service = get_service(UserService)
+            user_service.connect()
+            sender = user_service.get_user_by_id(current_user_id)
+            sender_name = sender.get_full_name() if sender else "Unknown User"
+
             # Publish notification to all other participants
             for participant_id in conversation.participants:
                 if participant_id != current_user_id:
-                    # Get sender info for notification
-                    user_service = UserService()
-                    user_service.connect()
-                    try:
-                        sender = user_service.get_user_by_id(current_user_id)
-                        sender_name = sender.get_full_name() if sender else "Unknown User"
-                    finally:
-                        user_service.close()
-
                     from lib.services.notifications import \
                         EventData  # Ensure EventData is imported
 
@@ -219,7 +220,7 @@ def send_message_route(conversation_id: str) -> Tuple[Response, int]:
     finally:
         conversation_service.close()
 
-def get_conversation_messages_route(conversation_id: str) -> Tuple[Response, int]:
+async def get_conversation_messages_route(conversation_id: str) -> Tuple[Response, int]:
     """
     Get messages for a specific conversation
 
@@ -265,11 +266,10 @@ def get_conversation_messages_route(conversation_id: str) -> Tuple[Response, int
     
     current_user_id = current_user.user_id
 
-    conversation_service = ConversationService()
-    conversation_service.connect()
-    try:
+    async with async_db() as db:
+        conversation_service = AsyncConversationService(db)
         # Verify user is a participant in this conversation
-        conversation = conversation_service.get_conversation_by_id(conversation_id)
+        conversation = await conversation_service.get_conversation_by_id(conversation_id)
         if not conversation:
             return jsonify({"error": "Conversation not found"}), 404
 
@@ -277,37 +277,32 @@ def get_conversation_messages_route(conversation_id: str) -> Tuple[Response, int
             return jsonify({"error": "Access denied"}), 403
 
         # Get messages
-        messages = conversation_service.get_conversation_messages(conversation_id, limit=100)
+        messages = await conversation_service.get_conversation_messages(conversation_id, limit=100)
 
         # Mark messages as read
-        conversation_service.mark_messages_as_read(conversation_id, current_user_id)
+        await conversation_service.mark_messages_as_read(conversation_id, current_user_id)
 
-        # Convert to frontend format
-        message_list: List[Dict[str, Any]] = []
-        for msg in messages:
-            # Get sender info
-            user_service = UserService()
-            user_service.connect()
-            try:
-                sender = user_service.get_user_by_id(msg.sender_id)
-                sender_name = sender.get_full_name() if sender else "Unknown User"
-            finally:
-                user_service.close()
-
-            message_list.append({
-                "id": msg.id,
-                "sender": sender_name if msg.sender_id != current_user_id else "Me",
-                "text": msg.text,
-                "timestamp": msg.created_at,
-                "is_read": msg.is_read
-            })
-
-        return jsonify({"messages": message_list}), 200
+        # Get sender info for all senders at once
+        senders = await conversation_service.get_users(
+            [msg.sender_id for msg in messages if msg.sender_id and msg.sender_id != current_user_id])
 
-    finally:
-        conversation_service.close()
+    # Convert to frontend format
+    message_list: List[Dict[str, Any]] = []
+    for msg in messages:
+        sender = senders.get(msg.sender_id)
+        sender_name = User.from_dict(sender).get_full_name() if sender else "Unknown User"
+
+        message_list.append({
+            "id": msg.id,
+            "sender": sender_name if msg.sender_id != current_user_id else "Me",
+            "text": msg.text,
+            "timestamp": msg.created_at,
+            "is_read": msg.is_read
+        })
 
-def get_user_conversations_route() -> Tuple[Response, int]:
+    return jsonify({"messages": message_list}), 200
+
+async def get_user_conversations_route() -> Tuple[Response, int]:
     """
     Get all conversations for the current user
 
@@ -350,53 +345,27 @@ def get_user_conversations_route() -> Tuple[Response, int]:
 
     logger.debug(f"Getting conversations for user: {current_user_id}")
 
-    conversation_service = ConversationService()
-    conversation_service.connect()
-    try:
-        conversations = conversation_service.get_user_conversations(current_user_id)
-        logger.debug(f"Found {len(conversations)} conversations")
-        for conv in conversations:
-            logger.debug(f"Conversation: {conv.id} - {conv.participants} - {conv.conversation_type}")
-
-        # Convert to frontend format
-        conversation_list: List[Dict[str, Any]] = []
-        for conv in conversations:
-            # Get the other participant's name for display
-            other_participant_id = None
-            for participant_id in conv.participants:
-                if participant_id != current_user_id:
-                    other_participant_id = participant_id
-                    break
-
-            # Get user info for the other participant
-            user_service = UserService()
-            user_service.connect()
-            try:
-                other_user = user_service.get_user_by_id(other_participant_id) if other_participant_id else None
-                display_name = other_user.get_full_name() if other_user else "Unknown User"
-                avatar = f"https://ui-avatars.com/api/?name={display_name}&background=random"
-            finally:
-                user_service.close()
-
-            # Get last message for preview
-            if conv.id is not None:
-                messages = conversation_service.get_conversation_messages(conv.id, limit=1)
-                last_message = messages[-1].text if messages else "No messages yet"
-            else:
-                last_message = "No messages yet"
-
-            conversation_list.append({
-                "id": conv.id,
-                "name": display_name,
-                "lastMessage": last_message,
-                "avatar": avatar,
-                "participantId": other_participant_id,
-                "isAI": conv.conversation_type == "ai_assistant",
-                "last_message_at": conv.last_message_at
-            })
-
-        return jsonify(conversation_list), 200
-
-    finally:
-        conversation_service.close()
+    async with async_db() as db:
+        summaries = await AsyncConversationService(db).get_conversation_summaries(current_user_id)
+    logger.debug("Found %d conversations", len(summaries))
+
+    # Convert to frontend format
+    conversation_list: List[Dict[str, Any]] = []
+    for summary in summaries:
+        conv = summary["conversation"]
+        other_user = summary["other_participant"]
+        display_name = User.from_dict(other_user).get_full_name() if other_user else "Unknown User"
+        avatar = f"https://ui-avatars.com/api/?name={display_name}&background=random"
+
+        conversation_list.append({
+            "id": conv.id,
+            "name": display_name,
+            "lastMessage": summary["last_message"] or "No messages yet",
+            "avatar": avatar,
+            "participantId": summary["other_participant_id"],
+            "isAI": conv.conversation_type == "ai_assistant",
+            "last_message_at": conv.last_message_at
+        })
+
+    return jsonify(conversation_list), 200
 
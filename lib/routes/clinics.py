@@ -0,0 +1,75 @@
+from typing import Tuple
+
+from flask import Blueprint, Response, jsonify, request
+
+from lib.services.auth_decorators import require_auth
+from lib.services.clinic_locator import (assign_nearest_clinics,
+                                         find_clinics_within,
+                                         find_nearest_clinics,
+                                         validate_coordinates)
+
+clinics_bp = Blueprint('clinics', __name__)
+
+MAX_NEAREST = 100
+MAX_ASSIGN_PATIENTS = 50000
+
+# GET: k nearest clinics, e.g. ?longitude=-118.41&latitude=34.08&k=5&organization_id=&specialty=&max_distance_m=
+@clinics_bp.route('/api/clinics/nearest', methods=['GET'])
+@require_auth
+def get_nearest_clinics() -> Tuple[Response, int]:
+    k = request.args.get('k', default=5, type=int)
+    if not 1 <= k <= MAX_NEAREST:
+        return jsonify({'error': f'k must be between 1 and {MAX_NEAREST}'}), 400
+    try:
+        longitude, latitude = validate_coordinates(request.args.get('longitude'), request.args.get('latitude'))
+        clinics = find_nearest_clinics(
+            longitude, latitude, k,
+            organization_id=request.args.get('organization_id'),
+            specialty=request.args.get('specialty'),
+            max_distance_m=request.args.get('max_distance_m', type=float),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'clinics': clinics}), 200
+
+# GET: Clinics within a radius, nearest first, e.g. ?longitude=-118.41&latitude=34.08&radius_m=5000
+# The radius is evaluated by the database, so newly added clinics are visible before the in-process index reloads.
+@clinics_bp.route('/api/clinics/within', methods=['GET'])
+@require_auth
+def get_clinics_within() -> Tuple[Response, int]:
+    radius_m = request.args.get('radius_m', type=float)
+    if radius_m is None or radius_m < 0:
+        return jsonify({'error': 'radius_m must be a non-negative number'}), 400
+    try:
+        longitude, latitude = validate_coordinates(request.args.get('longitude'), request.args.get('latitude'))
+        clinics = find_clinics_within(
+            longitude, latitude, radius_m,
+            organization_id=request.args.get('organization_id'),
+            specialty=request.args.get('specialty'),
+            limit=request.args.get('limit', type=int),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'clinics': clinics}), 200
+
+# POST: Assign patients to their nearest clinic
+# Body: {"patients": [{"id", "longitude", "latitude"}, ...], "organization_id", "specialty", "max_distance_m"}
+@clinics_bp.route('/api/clinics/assign', methods=['POST'])
+@require_auth
+def assign_patients_to_clinics() -> Tuple[Response, int]:
+    data = request.get_json() or {}
+    patients = data.get('patients') or []
+    if not isinstance(patients, list) or not patients:
+        return jsonify({'error': 'Missing patients'}), 400
+    if len(patients) > MAX_ASSIGN_PATIENTS:
+        return jsonify({'error': f'At most {MAX_ASSIGN_PATIENTS} patients per request'}), 400
+    try:
+        assignments = assign_nearest_clinics(
+            patients,
+            organization_id=data.get('organization_id'),
+            specialty=data.get('specialty'),
+            max_distance_m=data.get('max_distance_m'),
+        )
+    except (ValueError, AttributeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'assignments': assignments}), 200
@@ -7,16 +7,19 @@ from typing import Any, Dict, Optional, Tuple
 from flask import Response, jsonify, request, session
 
 from lib.data_types import UserID
-from lib.llm.agent import LLMAgent, LLMModel
+from lib.db.async_pool import async_db
 from lib.services.auth_decorators import get_current_user
-from lib.services.llm_chat_service import LLMChatService
+from lib.services.llm_chat_service import AsyncLLMChatService
 from lib.services.openai_security import get_openai_security_service
 from settings import MCP_URL, logger
 
 
-def llm_agent_endpoint_route() -> Tuple[Response, int]:
+async def llm_agent_endpoint_route() -> Tuple[Response, int]:
     """
     Route for the LLM agent endpoint.
+
+    Runs on the shared event loop (see lib.infra.async_runtime): the MCP and OpenAI calls and the chat reads and
+    writes wait on the loop, so other requests are served meanwhile.
     :return: Response object with JSON data or error message.
     """
     logger.debug('[DEBUG] /api/llm_chat called')
@@ -30,11 +33,13 @@ def llm_agent_endpoint_route() -> Tuple[Response, int]:
     current_user_id = current_user.user_id
     logger.debug('[DEBUG] User authenticated: %s', current_user_id)
 
-    llm_chat_service = LLMChatService()
-    llm_chat_service.connect()
+    # openai and fastmcp take about a second to import; load them with the first chat rather than at startup.
+    from lib.llm.agent import LLMAgent, LLMModel
+
     try:
         if request.method == 'GET':
-            chats = llm_chat_service.get_llm_chats_for_user(UserID(current_user_id))
+            async with async_db() as db:
+                chats = await AsyncLLMChatService(db).get_llm_chats_for_user(UserID(current_user_id))
             return jsonify([chat.to_dict() for chat in chats]), 200
         elif request.method == 'POST':
             data: Optional[Dict[str, Any]] = request.json
@@ -46,43 +51,40 @@ def llm_agent_endpoint_route() -> Tuple[Response, int]:
             if not prompt:
                 return jsonify({"error": "No prompt provided"}), 400
 
-            # Get user's OpenAI API key with security validation
+            # Get user's OpenAI API key with security validation (Redis and database calls, so off the loop)
             security_service = get_openai_security_service()
-            openai_api_key, error = security_service.get_user_api_key_with_validation(str(current_user_id))
+            openai_api_key, error = await asyncio.to_thread(
+                security_service.get_user_api_key_with_validation, str(current_user_id))
             
             if not openai_api_key:
                 return jsonify({"error": error}), 400
 
-            # Add user message to persistent chat
-            chat = llm_chat_service.add_message(UserID(current_user_id), assistant_id, 'Me', prompt)
+            # Add user message to persistent chat; the connection is not held while the model runs
+            async with async_db() as db:
+                chat = await AsyncLLMChatService(db).add_message(UserID(current_user_id), assistant_id, 'Me', prompt)
 
-            agent = asyncio.run(
-                LLMAgent.from_mcp(
-                    mcp_url=MCP_URL,
-                    api_key=openai_api_key,
-                    model=LLMModel.GPT_4_1_NANO,
-                )
+            agent = await LLMAgent.from_mcp(
+                mcp_url=MCP_URL,
+                api_key=openai_api_key,
+                model=LLMModel.GPT_4_1_NANO,
             )
 
-            # Use the persistent chat history as context
-            history: list[Dict[str, Any]] = chat.messages
-            print(f"History: {history}")  # Debugging line to check history content
-            # You may want to format this for your LLM
-            response = asyncio.run(agent.complete(prompt))  # Remove history parameter as it's not supported
-            logger.debug('response', type(response), response)
+            response = await agent.complete(prompt)  # Remove history parameter as it's not supported
+            logger.debug('LLM response: %s', response)
 
             # Log API usage
-            security_service.log_api_usage(str(current_user_id), str(LLMModel.GPT_4_1_NANO))
+            await asyncio.to_thread(security_service.log_api_usage, str(current_user_id), str(LLMModel.GPT_4_1_NANO))
 
             # Add assistant response to persistent chat
             used_tools = response.get('used_tools', [])
-            chat = llm_chat_service.add_message(
-                UserID(current_user_id), 
-                assistant_id, 
-                'AI Assistant',
-                response.get('response', ''),
-                used_tools
-            )
+            async with async_db() as db:
+                chat = await AsyncLLMChatService(db).add_message(
+                    UserID(current_user_id),
+                    assistant_id,
+                    'AI Assistant',
+                    response.get('response', ''),
+                    used_tools
+                )
 
             # Save updated agent state to session
             session['agent_data'] = agent.to_dict()
@@ -97,5 +99,3 @@ def llm_agent_endpoint_route() -> Tuple[Response, int]:
     except Exception as e:
         logger.error(f"Error in llm_agent_endpoint: {e}")
         return jsonify({"error": str(e)}), 500
-    finally:
-        llm_chat_service.close()
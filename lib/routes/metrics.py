@@ -1,7 +1,11 @@
-from flask import Blueprint, jsonify, request
+from typing import Tuple
+
+from flask import Blueprint, Response, jsonify, request
 
 from lib.services.auth_decorators import require_auth
-from lib.services.metrics_service import (get_user_metric_set_by_date,
+from lib.services.metrics_service import (RESOLUTIONS, export_metric_columns,
+                                          get_metric_series,
+                                          get_user_metric_set_by_date,
                                           get_user_metric_sets,
                                           save_user_metric_set,
                                           upsert_user_metric_set_by_date)
@@ -20,13 +24,47 @@ def post_user_metrics(user_id: str):
     save_user_metric_set(user_id, date, metrics)
     return jsonify({'status': 'success'}), 201
 
-# GET: Get all metric sets for a user
+# GET: Get metric sets for a user, newest first (optional ?start=&end= dates and ?limit=)
 @metrics_bp.route('/api/metrics/users/<user_id>', methods=['GET'])
 @require_auth
 def get_user_metrics(user_id: str):
-    metric_sets = get_user_metric_sets(user_id)
+    limit = request.args.get('limit', type=int)
+    metric_sets = get_user_metric_sets(user_id, start=request.args.get('start'), end=request.args.get('end'), limit=limit)
     return jsonify({'metrics': metric_sets})
 
+# GET: Time series for one or more metrics, e.g. ?metrics=weight,glucose&start=2020-01-01&end=2025-01-01&resolution=week
+@metrics_bp.route('/api/metrics/users/<user_id>/series', methods=['GET'])
+@require_auth
+def get_user_metric_series(user_id: str) -> Tuple[Response, int]:
+    metric_names = [m for m in request.args.get('metrics', '').split(',') if m]
+    start = request.args.get('start')
+    end = request.args.get('end')
+    resolution = request.args.get('resolution', 'raw')
+    if not metric_names or not start or not end:
+        return jsonify({'error': 'Missing metrics, start or end'}), 400
+    if resolution not in RESOLUTIONS:
+        return jsonify({'error': f"resolution must be one of {', '.join(RESOLUTIONS)}"}), 400
+    try:
+        series = get_metric_series(user_id, metric_names, start, end, resolution)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'resolution': resolution, 'series': series}), 200
+
+# GET: Columnar export of all points in a range (optional ?metrics=a,b)
+@metrics_bp.route('/api/metrics/users/<user_id>/export', methods=['GET'])
+@require_auth
+def export_user_metrics(user_id: str) -> Tuple[Response, int]:
+    start = request.args.get('start')
+    end = request.args.get('end')
+    if not start or not end:
+        return jsonify({'error': 'Missing start or end'}), 400
+    metric_names = [m for m in request.args.get('metrics', '').split(',') if m] or None
+    try:
+        columns = export_metric_columns(user_id, start, end, metric_names)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'columns': columns}), 200
+
 # GET: Get metrics for a user on a specific date
 @metrics_bp.route('/api/metrics/user/<user_id>/date/<date>', methods=['GET'])
 @require_auth
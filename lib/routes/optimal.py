@@ -6,7 +6,7 @@ from typing import Tuple
 
 from flask import Response, jsonify, request
 
-from lib.opt.hypertension import main
+from lib.infra.request_services import get_service
 from lib.services.optimal import OptimalService
 from lib.services.user_service import UserService
 from lib.services.auth_decorators import get_current_user_id
@@ -25,7 +25,7 @@ def call_optimal_route() -> Tuple[Response, int]:
             return jsonify({"error": "Authentication required"}), 401
         
         # Get user's Optimal API key
-        user_service = UserService()
+        user_service = get_service(UserService)
         user_service.connect()
         try:
             api_key = user_service.get_optimal_api_key(user_id)
@@ -41,7 +41,8 @@ def call_optimal_route() -> Tuple[Response, int]:
         
         table_data = data['tableData']
         
-        # Create hypertension optimization schema
+        # Create hypertension optimization schema (pandas is only imported for this route)
+        from lib.opt.hypertension import main
         hypertension_schema = main()
         
         # Create Optimal service instance with user's API key
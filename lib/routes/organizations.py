@@ -304,12 +304,10 @@ def get_organization_clinics_route(org_id: str) -> Tuple[Response, int]:
         
         org = Organization.from_dict(org_data)
         
-        # Fetch all clinics for this organization
-        clinics = []
-        for clinic_id in org.clinic_ids:
-            clinic_data = db.select(f'clinic:{clinic_id}')
-            if clinic_data:
-                clinics.append(clinic_data)
+        # Fetch all clinics for this organization in one query
+        clinics, missing = db.fetch_batch(org.clinic_ids, table='clinic')
+        if missing:
+            logger.warning(f"Organization {org_id} lists clinics that do not exist: {missing}")
         
         return jsonify({"clinics": clinics}), 200
     except Exception as e:
@@ -1,24 +1,28 @@
 """
 Patient routes for managing patient data and encounters.
 """
+import asyncio
 import json
 from typing import Any, Dict, List, Tuple, Union
 
 from flask import Response, jsonify, request
 
 from lib.data_types import PatientID
+from lib.db.async_pool import async_db
 from lib.db.surreal import DbController
 from lib.models.patient.main import (create_encounter, create_patient,
                                      delete_encounter, delete_patient,
-                                     get_all_encounters, get_all_patients,
-                                     get_encounter_by_id,
-                                     get_encounters_by_patient,
-                                     get_patient_by_id,
+                                     get_all_encounters,
+                                     get_all_patients_async,
+                                     get_encounter_by_id_async,
+                                     get_encounters_by_patient_async,
+                                     get_patient_by_id_async,
                                      search_encounter_history,
-                                     search_patient_history, serialize_patient,
-                                     update_encounter, update_patient)
+                                     search_patient_history, update_encounter,
+                                     update_patient)
 from lib.services.auth_decorators import get_current_user
-from lib.services.icd_autocoder_service import ICDAutoCoderService
+from lib.services.icd_autocoder_service import (ICDAutoCoderService,
+                                                note_text_to_plain)
 from settings import logger
 
 
@@ -73,9 +77,10 @@ def search_encounters_route() -> Tuple[Response, int]:
     return jsonify(results), 200
 
 
-def patient_endpoint_route(patient_id: PatientID) -> Tuple[Response, int]:
+async def patient_endpoint_route(patient_id: PatientID) -> Tuple[Response, int]:
     """
     API endpoint to handle patient-related operations.
+    Reads use a pooled async connection; writes still use the sync CRUD functions, in a worker thread.
     :param patient_id: The ID of the patient to operate on, formatted as 'Patient:{patient_id}'.
     :return: Response with patient data or error message.
     """
@@ -85,10 +90,9 @@ def patient_endpoint_route(patient_id: PatientID) -> Tuple[Response, int]:
     if request.method == 'GET':
         # Get a specific patient
         logger.debug(f"Getting patient with ID: {patient_id}")
-        patient = get_patient_by_id(patient_id)
-        logger.debug(f"Patient result: {patient}")
+        async with async_db() as db:
+            patient = await get_patient_by_id_async(db, patient_id)
         if patient:
-            patient = serialize_patient(patient)
             return jsonify(patient), 200
         else:
             return jsonify({"error": "Patient not found"}), 404
@@ -99,7 +103,7 @@ def patient_endpoint_route(patient_id: PatientID) -> Tuple[Response, int]:
         if not data:
             return jsonify({"error": "No data provided"}), 400
 
-        patient = update_patient(patient_id, data)
+        patient = await asyncio.to_thread(update_patient, patient_id, data)
         if patient:
             return jsonify(patient), 200
         else:
@@ -107,7 +111,7 @@ def patient_endpoint_route(patient_id: PatientID) -> Tuple[Response, int]:
 
     elif request.method == 'DELETE':
         # Delete a patient
-        result = delete_patient(patient_id)
+        result = await asyncio.to_thread(delete_patient, patient_id)
         if result:
             return jsonify({"message": "Patient deleted successfully"}), 200
         else:
@@ -118,14 +122,15 @@ def patient_endpoint_route(patient_id: PatientID) -> Tuple[Response, int]:
         return jsonify({"error": "Method not allowed"}), 405
 
 
-def patients_endpoint_route() -> Tuple[Response, int]:
+async def patients_endpoint_route() -> Tuple[Response, int]:
     """
     API endpoint to handle patient-related operations.
     :return: JSON response with patient data or error message.
     """
     if request.method == 'GET':
         # Get all patients
-        patients = get_all_patients()
+        async with async_db() as db:
+            patients = await get_all_patients_async(db)
         return jsonify(patients), 200
     elif request.method == 'POST':
         # Create a new patient
@@ -139,7 +144,7 @@ def patients_endpoint_route() -> Tuple[Response, int]:
             if not data.get(field):
                 return jsonify({"error": f"Missing required field: {field}"}), 400
 
-        patient = create_patient(data)
+        patient = await asyncio.to_thread(create_patient, data)
         if patient:
             return jsonify(patient), 201
         else:
@@ -162,7 +167,7 @@ def get_all_encounters_route() -> Tuple[Response, int]:
         return jsonify({"error": str(e)}), 500
 
 
-def get_encounters_by_patient_route(patient_id: PatientID) -> Tuple[Response, int]:
+async def get_encounters_by_patient_route(patient_id: PatientID) -> Tuple[Response, int]:
     """
     API endpoint to get all encounters for a specific patient
 
@@ -170,13 +175,14 @@ def get_encounters_by_patient_route(patient_id: PatientID) -> Tuple[Response, in
     :return: JSON response with encounters or error message.
     """
     try:
-        encounters = get_encounters_by_patient(patient_id)
+        async with async_db() as db:
+            encounters = await get_encounters_by_patient_async(db, patient_id)
         return jsonify(encounters), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-def get_encounter_by_id_route(encounter_id: str) -> Tuple[Response, int]:
+async def get_encounter_by_id_route(encounter_id: str) -> Tuple[Response, int]:
     """
     API endpoint to get a specific encounter by ID
 
@@ -184,7 +190,8 @@ def get_encounter_by_id_route(encounter_id: str) -> Tuple[Response, int]:
     :return: JSON response with the encounter or error message.
     """
     try:
-        encounter = get_encounter_by_id(encounter_id)
+        async with async_db() as db:
+            encounter = await get_encounter_by_id_async(db, encounter_id)
         if encounter:
             return jsonify(encounter), 200
         else:
@@ -290,23 +297,7 @@ def extract_entities_from_notes_route() -> Tuple[Response, int]:
         note_type = data.get('note_type', 'text')
         
         # Convert SOAP notes to plain text if needed
-        if note_type == 'soap' and isinstance(note_text, dict):
-            # Extract text from SOAP notes
-            soap_sections = []
-            if note_text.get('subjective'):
-                soap_sections.append(f"Subjective: {note_text['subjective']}")
-            if note_text.get('objective'):
-                soap_sections.append(f"Objective: {note_text['objective']}")
-            if note_text.get('assessment'):
-                soap_sections.append(f"Assessment: {note_text['assessment']}")
-            if note_text.get('plan'):
-                soap_sections.append(f"Plan: {note_text['plan']}")
-            
-            # Join all sections with newlines
-            text_to_process = '\n\n'.join(soap_sections)
-        else:
-            # Use plain text as is
-            text_to_process = str(note_text) if note_text else ""
+        text_to_process = note_text_to_plain(note_text, note_type)
         
         if not text_to_process.strip():
             return jsonify({"error": "No text content to process"}), 400
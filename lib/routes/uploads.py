@@ -1,22 +1,68 @@
 """
 Uploads API Routes
 """
-from typing import Tuple
+import json
+import re
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
 
-import boto3  # type: ignore
+import requests
 from flask import Blueprint, Response, jsonify, request
 from werkzeug.datastructures import FileStorage
 
 from lib.data_types import UserID
 from lib.models.upload import (FileType, Upload, UploadStatus, create_upload,
+                               find_completed_upload_by_hash,
                                get_upload_by_id, get_uploads_by_user,
                                update_upload_status)
+from lib.models.user.user_session import UserSession
 from lib.services.auth_decorators import get_current_user, require_auth
-from lib.services.upload_service import process_upload_task
-from settings import BUCKET_NAME, logger
+from lib.services.object_storage import (HashingReader, create_presigned_put,
+                                         get_s3_client, stream_to_s3)
+from lib.services.sns import verify_sns_message
+from lib.services.upload_service import (collect_textract_result_task,
+                                         process_upload_task)
+from settings import BUCKET_NAME, TEXTRACT_SNS_TOPIC_ARN, logger
 
 uploads_bp = Blueprint('uploads', __name__)
 
+SHA256_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+def _uploader_id(user: UserSession) -> UserID:
+    """
+    Normalise the current user's ID.
+    """
+    return UserID(user.user_id) if not isinstance(user.user_id, UserID) else user.user_id
+
+def _start_processing(upload_id: str, upload: Upload) -> None:
+    """
+    Trigger the Celery task for file types that need processing, otherwise mark the upload completed.
+    """
+    if upload.file_type in (FileType.PDF, FileType.IMAGE, FileType.AUDIO):
+        task = process_upload_task.apply_async(  # type: ignore
+            args=[upload_id, upload.file_type.value, upload.s3_key, upload.content_hash]
+        )
+        update_upload_status(upload_id, UploadStatus.PENDING, task_id=task.id)
+    else:
+        update_upload_status(upload_id, UploadStatus.COMPLETED)
+
+def _save_upload(upload: Upload, duplicate: Optional[Dict[str, Any]] = None) -> Tuple[Response, int]:
+    """
+    Create the Upload record; reuse a duplicate's processed text or start processing.
+    :param upload: Upload - The upload to save.
+    :param duplicate: Optional[Dict[str, Any]] - A completed upload with the same content hash, if any.
+    """
+    if duplicate:
+        upload.status = UploadStatus.COMPLETED
+        upload.processed_text = duplicate.get("processed_text", "")
+        logger.info(f"Reusing processed text of upload {duplicate.get('id')} for {upload.file_name}")
+    upload_id = create_upload(upload)
+    if not upload_id:
+        return jsonify({"error": "Failed to create upload record"}), 500
+    if not duplicate:
+        _start_processing(upload_id, upload)
+    return jsonify({"id": upload_id, **upload.to_dict(), "deduplicated": bool(duplicate)}), 201
+
 @uploads_bp.route('/api/uploads', methods=['POST'])
 @require_auth
 def upload_file_route() -> Tuple[Response, int]:
@@ -35,16 +81,14 @@ def upload_file_route() -> Tuple[Response, int]:
         return jsonify({"error": "No selected file"}), 400
 
     file_type = Upload.get_file_type_from_extension(filename)
-    uploader_id: UserID = UserID(user.user_id) if not isinstance(user.user_id, UserID) else user.user_id
+    uploader_id = _uploader_id(user)
     s3_key = Upload.generate_s3_key(uploader_id, filename)
-    file_size = 0
+    reader = HashingReader(file.stream)
     try:
-        # Upload to S3
+        # Upload to S3, hashing the content as boto3 reads it
+        import boto3  # type: ignore[import-untyped]
         s3 = boto3.client('s3')
-        file.seek(0, 2)  # Seek to end to get size
-        file_size = file.tell()
-        file.seek(0)
-        s3.upload_fileobj(file, BUCKET_NAME, s3_key)
+        s3.upload_fileobj(reader, BUCKET_NAME, s3_key)
         logger.info(f"Uploaded file to S3: {BUCKET_NAME}/{s3_key}")
     except Exception as e:
         logger.error(f"Failed to upload file to S3: {e}")
@@ -58,21 +102,155 @@ def upload_file_route() -> Tuple[Response, int]:
         file_type=file_type,
         bucket_name=BUCKET_NAME,
         status=UploadStatus.PENDING,
-        file_size=file_size,
+        file_size=reader.size,
+        s3_key=s3_key,
+        content_hash=reader.sha256,
+    )
+    return _save_upload(upload, find_completed_upload_by_hash(uploader_id, reader.sha256))
+
+@uploads_bp.route('/api/uploads/stream', methods=['PUT'])
+@require_auth
+def stream_upload_route() -> Tuple[Response, int]:
+    """
+    Upload a file sent as the raw request body, streaming it to S3 with multipart upload.
+
+    The file name comes from the ``filename`` query parameter. Only one part is held in memory at a time. If the user
+    already uploaded identical content, the multipart upload is aborted and the earlier object and text are reused.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    filename = request.args.get('filename', '')
+    if filename == '':
+        return jsonify({"error": "Missing filename"}), 400
+
+    uploader_id = _uploader_id(user)
+    s3_key = Upload.generate_s3_key(uploader_id, filename)
+    duplicates: Dict[str, Dict[str, Any]] = {}
+
+    def keep_unless_duplicate(sha256: str, size: int) -> bool:
+        duplicate = find_completed_upload_by_hash(uploader_id, sha256)
+        if duplicate:
+            duplicates["match"] = duplicate
+        return duplicate is None
+
+    try:
+        result = stream_to_s3(
+            request.stream, BUCKET_NAME, s3_key,
+            before_commit=keep_unless_duplicate,
+            content_type=request.mimetype or None,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Failed to stream file to S3: {e}")
+        return jsonify({"error": "Failed to upload file to S3"}), 500
+
+    duplicate = duplicates.get("match")
+    if not result.committed and duplicate:
+        s3_key = duplicate.get("s3_key") or s3_key
+
+    upload = Upload(
+        uploader=uploader_id,
+        file_name=filename,
+        file_path=s3_key,
+        file_type=Upload.get_file_type_from_extension(filename),
+        bucket_name=BUCKET_NAME,
+        status=UploadStatus.PENDING,
+        file_size=result.size,
+        s3_key=s3_key,
+        content_hash=result.sha256,
+    )
+    return _save_upload(upload, duplicate)
+
+@uploads_bp.route('/api/uploads/presign', methods=['POST'])
+@require_auth
+def presign_upload_route() -> Tuple[Response, int]:
+    """
+    Create an Upload record and a presigned PUT URL so the client uploads straight to the bucket.
+
+    Body: ``{"filename": ..., "sha256": <hex, optional>, "content_type": <optional>}``. A declared SHA-256 is bound
+    into the URL, so S3 rejects a mismatching body; if it matches an earlier upload no URL is issued at all.
+    The client calls ``/api/uploads/<id>/complete`` after the PUT succeeds.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename', '')
+    if not filename:
+        return jsonify({"error": "Missing filename"}), 400
+    sha256 = (data.get('sha256') or '').lower()
+    if sha256 and not SHA256_PATTERN.fullmatch(sha256):
+        return jsonify({"error": "sha256 must be 64 hex characters"}), 400
+
+    uploader_id = _uploader_id(user)
+    duplicate = find_completed_upload_by_hash(uploader_id, sha256)
+    s3_key = (duplicate or {}).get("s3_key") or Upload.generate_s3_key(uploader_id, filename)
+    upload = Upload(
+        uploader=uploader_id,
+        file_name=filename,
+        file_path=s3_key,
+        file_type=Upload.get_file_type_from_extension(filename),
+        bucket_name=BUCKET_NAME,
+        status=UploadStatus.PENDING,
+        file_size=(duplicate or {}).get("file_size", 0),
         s3_key=s3_key,
+        content_hash=sha256,
     )
+    if duplicate:
+        return _save_upload(upload, duplicate)
+
     upload_id = create_upload(upload)
     if not upload_id:
         return jsonify({"error": "Failed to create upload record"}), 500
+    try:
+        presigned = create_presigned_put(BUCKET_NAME, s3_key, sha256=sha256 or None,
+                                         content_type=data.get('content_type'))
+    except Exception as e:
+        logger.error(f"Failed to presign upload {upload_id}: {e}")
+        update_upload_status(upload_id, UploadStatus.FAILED)
+        return jsonify({"error": "Failed to create upload URL"}), 500
+    return jsonify({"id": upload_id, **upload.to_dict(), "deduplicated": False, "upload": presigned}), 201
 
-    # Trigger Celery task if needed
-    if file_type in (FileType.PDF, FileType.IMAGE, FileType.AUDIO):
-        task = process_upload_task.apply_async(args=[upload_id, file_type.value, s3_key])  # type: ignore
-        update_upload_status(upload_id, UploadStatus.PENDING, task_id=task.id)
-    else:
-        update_upload_status(upload_id, UploadStatus.COMPLETED)
+@uploads_bp.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@require_auth
+def complete_presigned_upload_route(upload_id: str) -> Tuple[Response, int]:
+    """
+    Confirm a presigned upload has landed in the bucket and start processing it.
+    """
+    user = get_current_user()
+    if not user:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    record = get_upload_by_id(upload_id)
+    uploader_id = str(_uploader_id(user)).split(':')[-1]
+    if not record or record.get("uploader", "").split(':')[-1] != uploader_id:
+        return jsonify({"error": "Upload not found"}), 404
+    if record.get("status") != UploadStatus.PENDING.value or record.get("task_id"):
+        return jsonify({"error": "Upload already completed"}), 409
+
+    try:
+        head = get_s3_client().head_object(Bucket=record.get("bucket_name", BUCKET_NAME), Key=record["s3_key"])
+    except Exception as e:
+        logger.warning(f"Presigned upload {upload_id} not found in S3: {e}")
+        return jsonify({"error": "File has not been uploaded"}), 409
 
-    return jsonify({"id": upload_id, **upload.to_dict()}), 201
+    upload = Upload(
+        uploader=UserID(record["uploader"]),
+        file_name=record["file_name"],
+        file_path=record["file_path"],
+        file_type=FileType(record["file_type"]),
+        bucket_name=record.get("bucket_name", BUCKET_NAME),
+        file_size=head.get("ContentLength", 0),
+        s3_key=record["s3_key"],
+        content_hash=record.get("content_hash", ""),
+    )
+    update_upload_status(upload_id, UploadStatus.PENDING, extra={"file_size": upload.file_size})
+    _start_processing(upload_id, upload)
+    return jsonify({"id": upload_id, **upload.to_dict()}), 200
 
 @uploads_bp.route('/api/uploads', methods=['GET'])
 @require_auth
@@ -97,3 +275,45 @@ def get_upload_route(upload_id: str) -> Tuple[Response, int]:
     if not upload:
         return jsonify({"error": "Upload not found"}), 404
     return jsonify(upload), 200
+
+@uploads_bp.route('/api/uploads/textract-notifications', methods=['POST'])
+def textract_notification_route() -> Tuple[Response, int]:
+    """
+    SNS endpoint for Textract job completion notifications.
+
+    Confirms the topic subscription, and for completion messages hands the job to ``collect_textract_result_task``.
+    The upload ID travels in the job's JobTag. Messages whose SNS signature does not verify are rejected before
+    either happens.
+    """
+    try:
+        envelope = json.loads(request.get_data(as_text=True) or "{}")
+    except ValueError:
+        return jsonify({"error": "Invalid notification body"}), 400
+
+    if not TEXTRACT_SNS_TOPIC_ARN or envelope.get('TopicArn') != TEXTRACT_SNS_TOPIC_ARN:
+        return jsonify({"error": "Unknown topic"}), 403
+    if not verify_sns_message(envelope):
+        return jsonify({"error": "Invalid signature"}), 403
+
+    message_type = envelope.get('Type')
+    if message_type == 'SubscriptionConfirmation':
+        subscribe_url = envelope.get('SubscribeURL', '')
+        parsed = urlparse(subscribe_url)
+        if parsed.scheme != 'https' or not (parsed.hostname or '').endswith('.amazonaws.com'):
+            return jsonify({"error": "Invalid SubscribeURL"}), 400
+        requests.get(subscribe_url, timeout=10)
+        logger.info("Confirmed Textract SNS subscription")
+        return jsonify({"status": "subscribed"}), 200
+
+    if message_type == 'Notification':
+        try:
+            message = json.loads(envelope.get('Message') or "{}")
+        except ValueError:
+            return jsonify({"error": "Invalid notification message"}), 400
+        job_id = message.get('JobId')
+        upload_id = message.get('JobTag')
+        if job_id and upload_id:
+            logger.debug(f"Textract job {job_id} for upload {upload_id} finished with status {message.get('Status')}")
+            collect_textract_result_task.apply_async(args=[upload_id, job_id])  # type: ignore
+
+    return jsonify({"status": "ok"}), 200
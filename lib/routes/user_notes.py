@@ -5,6 +5,7 @@ from typing import Tuple
 
 from flask import Response, jsonify, request
 
+from lib.infra.request_services import get_service
 from lib.services.auth_decorators import get_current_user_id
 from lib.services.user_notes_service import UserNotesService
 from settings import logger
@@ -22,7 +23,10 @@ def get_user_notes_route() -> Tuple[Response, int]:
     GET /api/user-notes?include_shared=true&search=query
     Query parameters:
     - include_shared: Whether to include shared notes from other users (default: true)
-    - search: Search query to filter notes by title, content, or tags
+    - search: Full-text search over title and content, best match first
+    - tags: Comma-separated tags a note must all carry
+    - prefix: Match words starting with the search terms, for typeahead (default: false)
+    - page, page_size: Pagination of search results (default: 1, 20)
 
     Example response:
     {
@@ -50,16 +54,44 @@ def get_user_notes_route() -> Tuple[Response, int]:
         # Get query parameters
         include_shared = request.args.get('include_shared', 'true').lower() == 'true'
         search_query = request.args.get('search', '').strip()
+        tags = [t.strip() for t in request.args.get('tags', '').split(',') if t.strip()]
 
-        user_notes_service = UserNotesService()
+        user_notes_service = get_service(UserNotesService)
         user_notes_service.connect()
         
         try:
-            if search_query:
-                notes = user_notes_service.search_notes(user_id, search_query, include_shared)
-            else:
-                notes = user_notes_service.get_user_notes(user_id, include_shared)
+            if search_query or tags:
+                results = user_notes_service.search_notes_page(
+                    user_id,
+                    search_query,
+                    include_shared,
+                    tags=tags,
+                    prefix=request.args.get('prefix', 'false').lower() == 'true',
+                    page=request.args.get('page', 1, type=int),
+                    page_size=request.args.get('page_size', 20, type=int)
+                )
+                return jsonify({
+                    "success": True,
+                    "notes": [
+                        {
+                            "id": note.id,
+                            "title": note.title,
+                            "content": note.content,
+                            "note_type": note.note_type,
+                            "tags": note.tags,
+                            "date_created": note.date_created,
+                            "date_updated": note.date_updated,
+                            "score": score,
+                            "highlight": highlight
+                        }
+                        for note, score, highlight in zip(results["notes"], results["scores"], results["highlights"])
+                    ],
+                    "page": results["page"],
+                    "page_size": results["page_size"],
+                    "has_more": results["has_more"]
+                }), 200
 
+            notes = user_notes_service.get_user_notes(user_id, include_shared)
             return jsonify({
                 "success": True,
                 "notes": [
@@ -115,7 +147,7 @@ def get_note_by_id_route(note_id: str) -> Tuple[Response, int]:
         if not user_id:
             return jsonify({"error": "Authentication required"}), 401
 
-        user_notes_service = UserNotesService()
+        user_notes_service = get_service(UserNotesService)
         user_notes_service.connect()
         
         try:
@@ -195,7 +227,7 @@ def create_note_route() -> Tuple[Response, int]:
         if not title or not content:
             return jsonify({"error": "Title and content are required"}), 400
 
-        user_notes_service = UserNotesService()
+        user_notes_service = get_service(UserNotesService)
         user_notes_service.connect()
         
         try:
@@ -275,7 +307,7 @@ def update_note_route(note_id: str) -> Tuple[Response, int]:
         if not data:
             return jsonify({"error": "No data provided"}), 400
 
-        user_notes_service = UserNotesService()
+        user_notes_service = get_service(UserNotesService)
         user_notes_service.connect()
         
         try:
@@ -335,7 +367,7 @@ def delete_note_route(note_id: str) -> Tuple[Response, int]:
         if not user_id:
             return jsonify({"error": "Authentication required"}), 401
 
-        user_notes_service = UserNotesService()
+        user_notes_service = get_service(UserNotesService)
         user_notes_service.connect()
         
         try:
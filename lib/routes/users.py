@@ -1,13 +1,15 @@
 """
 User management routes for the application.
 """
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Tuple
 
 from flask import Response, jsonify, request, session
 
+from lib.infra.request_services import get_service
 from lib.models.user.user import User
 from lib.services.auth_decorators import get_current_user, get_current_user_id
 from lib.services.openai_security import get_openai_security_service
+from lib.services.user_search import search_users
 from lib.services.user_service import UserService
 from settings import logger
 
@@ -38,49 +40,14 @@ def search_users_route() -> Tuple[Response, int]:
     query = request.args.get('q', '').strip()
     logger.debug(f"Search query: '{query}'")
 
-    user_service = UserService()
-    user_service.connect()
-    try:
-        # Get all users and filter by search query
-        all_users = user_service.get_all_users()
-
-        # Filter users based on search query
-        filtered_users: List[Dict[str, str]] = []
-        for user in all_users:
-            # Skip inactive users
-            if not user.is_active:
-                continue
-
-            # Skip the current user
-            current_user = get_current_user()
-            if current_user and user.id == current_user.user_id:
-                continue
-
-            # Search in username, first_name, last_name, and email
-            searchable_text = f"{user.username} {user.first_name or ''} {user.last_name or ''} {user.email or ''}".lower()
-
-            if not query or query.lower() in searchable_text:
-                filtered_users.append({
-                    "id": str(user.id) if user.id is not None else "",
-                    "username": user.username or "",
-                    "email": user.email or "",
-                    "first_name": user.first_name or "",
-                    "last_name": user.last_name or "",
-                    "role": user.role or "",
-                    "display_name": (f"{user.first_name or ''} {user.last_name or ''}".strip() or (user.username or "")),
-                    "avatar": f"https://ui-avatars.com/api/?name={user.first_name or user.username or ''}&background=random"
-                })
-
-        # Limit results to 20 users
-        filtered_users = filtered_users[:20]
+    # Inactive users and the limit are handled by the index; the current user is left out
+    current_user = get_current_user()
+    users = search_users(query, limit=20, exclude_id=current_user.user_id if current_user else None)
 
-        return jsonify({
-            "users": filtered_users,
-            "total": len(filtered_users)
-        }), 200
-
-    finally:
-        user_service.close()
+    return jsonify({
+        "users": users,
+        "total": len(users)
+    }), 200
 
 def check_users_exist_route() -> Tuple[Response, int]:
     """
@@ -98,7 +65,7 @@ def check_users_exist_route() -> Tuple[Response, int]:
 
     :return: Response object containing a JSON indicating if users exist and the count of users.
     """
-    user_service = UserService()
+    user_service = get_service(UserService)
     user_service.connect()
     try:
         users = user_service.get_all_users()
@@ -125,7 +92,7 @@ def setup_default_admin_route() -> Tuple[Response, int]:
 
     :return: Response object containing a JSON message indicating success or failure.
     """
-    user_service = UserService()
+    user_service = get_service(UserService)
     user_service.connect()
     try:
         success, message = user_service.create_default_admin()
@@ -153,7 +120,7 @@ def activate_user_route(user_id: str) -> Tuple[Response, int]:
     :param user_id: The ID of the user to activate.
     :return: Response object containing a JSON message indicating success or failure.
     """
-    user_service = UserService()
+    user_service = get_service(UserService)
     user_service.connect()
     try:
         success, message = user_service.activate_user(user_id)
@@ -181,7 +148,7 @@ def deactivate_user_route(user_id: str) -> Tuple[Response, int]:
     :param user_id: The ID of the user to deactivate.
     :return: Response object containing a JSON message indicating success or failure.
     """
-    user_service = UserService()
+    user_service = get_service(UserService)
     user_service.connect()
     try:
         success, message = user_service.deactivate_user(user_id)
@@ -206,7 +173,7 @@ def get_all_users_route() -> Tuple[Response, int]:
 
     :return: Response object containing a JSON list of all users.
     """
-    user_service = UserService()
+    user_service = get_service(UserService)
     user_service.connect()
     try:
         users = user_service.get_all_users()
@@ -257,7 +224,7 @@ def change_password_route() -> Tuple[Response, int]:
     if not all([current_password, new_password]):
         return jsonify({"error": "Current password and new password are required"}), 400
 
-    user_service = UserService()
+    user_service = get_service(UserService)
     user_service.connect()
     try:
         user_id = get_current_user_id()
@@ -292,7 +259,7 @@ def get_current_user_info_route() -> Tuple[Response, int]:
 
     :return: Response object containing a JSON representation of the current user's information.
     """
-    user_service = UserService()
+    user_service = get_service(UserService)
     user_service.connect()
     try:
         current_user = get_current_user()
@@ -343,7 +310,7 @@ def logout_route() -> Tuple[Response, int]:
     token = session.get('auth_token', '')
     token_str: Optional[str] = str(token) if token is not None else None
     if token_str:
-        user_service = UserService()
+        user_service = get_service(UserService)
         user_service.connect()
         try:
             user_service.logout(token_str)
@@ -385,7 +352,7 @@ def login_route() -> Tuple[Response, int]:
     if not all([username, password]):
         return jsonify({"error": "Username and password are required"}), 400
 
-    user_service = UserService()
+    user_service = get_service(UserService)
     user_service.connect()
     try:
         success, message, user_session = user_service.authenticate_user(username, password)
@@ -449,7 +416,7 @@ def register_route() -> Tuple[Response, int]:
     if not all([username, email, password]):
         return jsonify({"error": "Username, email, and password are required"}), 400
 
-    user_service = UserService()
+    user_service = get_service(UserService)
     user_service.connect()
     try:
         logger.debug("Calling user_service.create_user")
@@ -551,7 +518,7 @@ def get_user_settings() -> Tuple[Response, int]:
         if not user_id:
             return jsonify({"error": "Authentication required"}), 401
 
-        user_service = UserService()
+        user_service = get_service(UserService)
         user_service.connect()
         try:
             settings = user_service.get_user_settings(user_id)
@@ -609,7 +576,7 @@ def update_user_settings() -> Tuple[Response, int]:
         logger.debug(f"Updating settings for user: {user_id}")
         logger.debug(f"Request data: {data}")
 
-        user_service = UserService()
+        user_service = get_service(UserService)
         user_service.connect()
         try:
             # Handle OpenAI API key update
@@ -717,7 +684,7 @@ def get_user_profile_route() -> Tuple[Response, int]:
             logger.debug("No user_id found")
             return jsonify({"error": "Authentication required"}), 401
 
-        user_service = UserService()
+        user_service = get_service(UserService)
         user_service.connect()
         try:
             logger.debug(f"Getting user by ID: {user_id}")
@@ -794,7 +761,7 @@ def update_user_profile_route() -> Tuple[Response, int]:
         logger.debug(f"Updating profile for user: {user_id}")
         logger.debug(f"Request data: {data}")
 
-        user_service = UserService()
+        user_service = get_service(UserService)
         user_service.connect()
         try:
             # Prepare updates
@@ -7,7 +7,7 @@ from typing import Any, Dict, List, Union
 from lib.db.surreal import AsyncDbController, DbController
 from lib.models.clinic import Clinic, ClinicType
 from lib.models.organization import Organization
-from lib.services.user_service import UserService
+from lib.models.user.user import User
 
 
 class AdminService:
@@ -87,6 +87,21 @@ class AdminService:
                 patients.append(patient_data)
         return patients
 
+    def _users_with_role(self, organization_id: str, role: str) -> List[Dict[str, Any]]:
+        """
+        Users of an organization with the given role, filtered by the database.
+        """
+        if isinstance(self.db, AsyncDbController):
+            raise TypeError("Async not yet supported in AdminService")
+
+        results = self.db.query(
+            "SELECT * OMIT password_hash FROM User WHERE organization_id = $organization_id AND role = $role",
+            {"organization_id": organization_id, "role": role}
+        )
+        if results and 'result' in results[0]:
+            results = results[0]['result']
+        return [User.from_dict(user_data).to_dict() for user_data in results or []]
+
     def get_providers(self, organization_id: str) -> List[Dict[str, Any]]:
         """
         Fetch all users with role 'provider' for a specific organization.
@@ -95,11 +110,7 @@ class AdminService:
             raise TypeError("Async not yet supported in AdminService")
 
         self.db.connect()
-        user_service = UserService(self.db)
-        user_service.connect()
-        users = user_service.get_all_users()
-        providers = [u.to_dict() for u in users if getattr(u, 'role', None) == 'provider' and getattr(u, 'organization_id', None) == organization_id]
-        return providers
+        return self._users_with_role(organization_id, 'provider')
 
     def get_administrators(self, organization_id: str) -> List[Dict[str, Any]]:
         """
@@ -109,8 +120,4 @@ class AdminService:
             raise TypeError("Async not yet supported in AdminService")
 
         self.db.connect()
-        user_service = UserService(self.db)
-        user_service.connect()
-        users = user_service.get_all_users()
-        admins = [u.to_dict() for u in users if getattr(u, 'role', None) == 'admin' and getattr(u, 'organization_id', None) == organization_id]
-        return admins
\ No newline at end of file
+        return self._users_with_role(organization_id, 'admin')
\ No newline at end of file
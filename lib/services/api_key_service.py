@@ -16,11 +16,12 @@ class APIKeyService:
     Service for managing API keys, including creation, validation, rate limiting, and usage tracking
     """
     
-    def __init__(self) -> None:
+    def __init__(self, db_controller: Optional[DbController] = None) -> None:
         """
         Initialize the API key service
+        :param db_controller: Optional DbController instance. If None, a new DbController is created.
         """
-        self.db = DbController()
+        self.db = db_controller or DbController()
         self.rate_limit_cache: Dict[str, Dict[str, Any]] = {}
         self.rate_limit_window = 3600  # 1 hour
     
@@ -0,0 +1,156 @@
+"""
+Silence-based audio chunking for long recordings.
+
+Splits a mono PCM signal into chunks of roughly ``target_seconds`` by cutting in the middle of silent stretches, so
+that chunks can be transcribed independently (and in parallel) without cutting words in half.
+"""
+import wave
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+@dataclass(frozen=True)
+class AudioChunk:
+    """
+    A contiguous slice of a recording, addressed by sample offsets.
+    """
+    index: int
+    start: int
+    end: int
+    sample_rate: int
+
+    @property
+    def start_seconds(self) -> float:
+        """
+        Offset of the chunk from the start of the recording, in seconds.
+        :return: float
+        """
+        return self.start / self.sample_rate
+
+    @property
+    def end_seconds(self) -> float:
+        """
+        End of the chunk from the start of the recording, in seconds.
+        :return: float
+        """
+        return self.end / self.sample_rate
+
+
+def read_wav_mono(path: str) -> Tuple[NDArray[np.float32], int]:
+    """
+    Read a PCM WAV file into a float32 mono array in the range [-1, 1].
+    :param path: Path to the WAV file.
+    :return: Tuple of (samples, sample_rate).
+    """
+    with wave.open(path, 'rb') as wav:
+        n_channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        sample_rate = wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif sample_width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {sample_width} bytes")
+
+    if n_channels > 1:
+        samples = samples.reshape(-1, n_channels).mean(axis=1)
+    return samples, sample_rate
+
+
+def frame_energy_db(samples: NDArray[np.float32], sample_rate: int, frame_ms: int = 30) -> NDArray[np.float32]:
+    """
+    Compute the RMS energy of consecutive frames in dBFS.
+    :param samples: Mono float samples.
+    :param sample_rate: Sample rate in Hz.
+    :param frame_ms: Frame length in milliseconds.
+    :return: One energy value per full frame.
+    """
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[:n_frames * frame].reshape(n_frames, frame).astype(np.float32)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def split_on_silence(
+        samples: NDArray[np.float32],
+        sample_rate: int,
+        target_seconds: float = 30.0,
+        max_seconds: float = 60.0,
+        min_silence_ms: int = 300,
+        silence_db: Optional[float] = None,
+        frame_ms: int = 30,
+    ) -> List[AudioChunk]:
+    """
+    Split a recording into chunks at silent points.
+
+    Cuts are placed in the middle of silent stretches at least ``min_silence_ms`` long, choosing the one closest to
+    ``target_seconds`` after the previous cut. If no silence is found within ``max_seconds`` the chunk is cut there.
+    Chunks that contain no frame above the silence threshold are dropped.
+
+    :param samples: Mono float samples.
+    :param sample_rate: Sample rate in Hz.
+    :param target_seconds: Preferred chunk length.
+    :param max_seconds: Hard upper bound on chunk length.
+    :param min_silence_ms: Minimum length of a silent stretch to be used as a cut point.
+    :param silence_db: Energy threshold in dBFS; estimated from the recording's noise floor when None.
+    :param frame_ms: Analysis frame length in milliseconds.
+    :return: List of AudioChunk in recording order.
+    """
+    total = len(samples)
+    if total == 0:
+        return []
+
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    energy = frame_energy_db(samples, sample_rate, frame_ms)
+    if energy.size == 0:
+        return [AudioChunk(0, 0, total, sample_rate)]
+
+    if silence_db is None:
+        # Noise floor estimate: the quietest 10% of frames, plus some headroom.
+        silence_db = float(np.percentile(energy, 10)) + 10.0
+    silent = energy < silence_db
+
+    # Midpoints (in samples) of silent runs that are long enough to cut in.
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    min_run = max(1, int(np.ceil(min_silence_ms / frame_ms)))
+    long_runs = (run_ends - run_starts) >= min_run
+    cut_points = ((run_starts[long_runs] + run_ends[long_runs]) // 2) * frame
+
+    target = int(target_seconds * sample_rate)
+    limit = int(max_seconds * sample_rate)
+
+    bounds: List[Tuple[int, int]] = []
+    start = 0
+    while start < total:
+        if total - start <= limit:
+            bounds.append((start, total))
+            break
+        window = cut_points[(cut_points > start + target // 2) & (cut_points <= start + limit)]
+        if window.size:
+            end = int(window[np.argmin(np.abs(window - (start + target)))])
+        else:
+            end = start + limit
+        bounds.append((start, end))
+        start = end
+
+    chunks: List[AudioChunk] = []
+    for start, end in bounds:
+        first_frame = start // frame
+        last_frame = max(first_frame + 1, -(-end // frame))
+        if silent[first_frame:last_frame].all():
+            continue
+        chunks.append(AudioChunk(len(chunks), start, end, sample_rate))
+    return chunks
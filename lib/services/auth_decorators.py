@@ -4,8 +4,9 @@ Authentication decorators for Flask routes.
 from functools import wraps
 from typing import Any, Callable, List, Optional, TypeVar, cast
 
-from flask import g, jsonify, request, session
+from flask import current_app, g, jsonify, request, session
 
+from lib.infra.request_services import get_service
 from lib.models.user.user_session import UserSession
 from lib.services.user_service import UserService
 from settings import logger
@@ -21,7 +22,7 @@ def require_auth(f: Callable[..., Any]) -> Callable[..., Any]:
     If a valid token is found, it validates the session and adds user information to the request context.
     If no valid token is found, it returns a 401 Unauthorized response.
 
-    :param: f: The function to decorate (Flask route handler).
+    :param: f: The function to decorate (Flask route handler, sync or async).
     :return: The decorated function that checks authentication.
     """
     @wraps(f)
@@ -57,7 +58,7 @@ def require_auth(f: Callable[..., Any]) -> Callable[..., Any]:
 
             logger.debug(f"No token, but user_id found in session: {user_id}")
             g.user_id = str(user_id)
-            user_service = UserService()
+            user_service = get_service(UserService)
             user_service.connect()
             try:
                 user = user_service.get_user_by_id(str(user_id))
@@ -67,7 +68,7 @@ def require_auth(f: Callable[..., Any]) -> Callable[..., Any]:
                 g.user_session = user
                 g.user_role = user.role
                 logger.debug("Returning early from session-based auth")
-                return f(*args, **kwargs)
+                return current_app.ensure_sync(f)(*args, **kwargs)
             except Exception as e:
                 logger.error(f"Error in session-based auth: {e}")
                 return jsonify({"error": "Internal server error"}), 500
@@ -75,7 +76,7 @@ def require_auth(f: Callable[..., Any]) -> Callable[..., Any]:
                 user_service.close()
 
         # TOKEN-BASED AUTH: If token is present, validate as before
-        user_service = UserService()
+        user_service = get_service(UserService)
         user_service.connect()
         try:
             logger.debug(f"Validating session token: {token[:10]}...")
@@ -90,7 +91,7 @@ def require_auth(f: Callable[..., Any]) -> Callable[..., Any]:
             g.user_role = user_session.role
 
             logger.debug("Returning early from token-based auth")
-            return f(*args, **kwargs)
+            return current_app.ensure_sync(f)(*args, **kwargs)
         except Exception as e:
             logger.error(f"Error in token-based auth: {e}")
             return jsonify({"error": "Internal server error"}), 500
@@ -134,14 +135,14 @@ def require_role(required_role: str) -> Callable[[F], F]:
                 return jsonify({"error": "Authentication required"}), 401
             
             # Check if user has required role
-            user_service = UserService()
+            user_service = get_service(UserService)
             user_service.connect()
             try:
                 user = user_service.get_user_by_id(user_session.user_id)
                 if not user or not user.has_role(required_role):
                     return jsonify({"error": f"Role '{required_role}' required"}), 403
                 
-                return f(*args, **kwargs)
+                return current_app.ensure_sync(f)(*args, **kwargs)
             finally:
                 user_service.close()
         
@@ -212,7 +213,7 @@ def optional_auth(f: F) -> F:
         
         if token:
             # Try to validate session
-            user_service = UserService()
+            user_service = get_service(UserService)
             user_service.connect()
             try:
                 user_session = user_service.validate_session(token) # type: ignore
@@ -224,7 +225,7 @@ def optional_auth(f: F) -> F:
             finally:
                 user_service.close()
 
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
 
     return cast(F, decorated_function)
 
@@ -244,7 +245,7 @@ def require_api_key(f: Callable[..., Any]) -> Callable[..., Any]:
             return jsonify({"error": "API key required"}), 401
 
         from lib.services.api_key_service import APIKeyService
-        api_key_service = APIKeyService()
+        api_key_service = get_service(APIKeyService)
         is_valid, error, api_key_obj = api_key_service.validate_api_key(api_key)
         if not is_valid or not api_key_obj:
             logger.debug(f"API key validation failed: {error}")
@@ -261,7 +262,7 @@ def require_api_key(f: Callable[..., Any]) -> Callable[..., Any]:
         g.api_key_user_id = api_key_obj.user_id
         g.api_key_permissions = api_key_obj.permissions
 
-        return f(*args, **kwargs)
+        return current_app.ensure_sync(f)(*args, **kwargs)
     return cast(Callable[..., Any], decorated_function)
 
 
@@ -285,7 +286,7 @@ def require_api_permission(required_permission: str) -> Callable[[Callable[...,
                 logger.debug(f"API key missing required permission: {required_permission}")
                 return jsonify({"error": f"Permission '{required_permission}' required"}), 403
             
-            return f(*args, **kwargs)
+            return current_app.ensure_sync(f)(*args, **kwargs)
         return decorated_function
     return decorator
 
@@ -318,7 +319,7 @@ def require_api_permissions(required_permissions: List[str], require_all: bool =
                 logger.debug(f"API key missing required permissions ({permission_text}): {required_permissions}")
                 return jsonify({"error": f"Permissions required ({permission_text}): {', '.join(required_permissions)}"}), 403
             
-            return f(*args, **kwargs)
+            return current_app.ensure_sync(f)(*args, **kwargs)
         return decorated_function
     return decorator
 
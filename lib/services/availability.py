@@ -0,0 +1,324 @@
+"""
+In-memory provider availability engine.
+
+Each provider's booked time for a day is kept as a bitset of minutes (a Python int with bit ``m`` set when minute
+``m`` after midnight is booked) alongside the booked intervals themselves. Conflict checks are a single AND against
+the range mask, and "free slots for N minutes" is a run-length search on the free bits, so no times are parsed or
+compared pairwise at query time.
+
+Days are loaded from the database on demand, in one query per search, and are kept in sync incrementally from the
+appointment domain events. Entries older than ``AVAILABILITY_TTL_SECONDS`` are reloaded so that changes made by other
+processes are picked up.
+"""
+import threading
+import time
+from datetime import date as date_cls
+from datetime import timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from lib.events import (AppointmentCancelled, AppointmentCompleted,
+                        AppointmentCreated, AppointmentUpdated)
+from lib.models.appointment import AppointmentStatus
+from settings import AVAILABILITY_TTL_SECONDS, logger
+
+BUSINESS_START = 9 * 60
+BUSINESS_END = 17 * 60
+SLOT_STEP_MINUTES = 30
+MINUTES_PER_DAY = 24 * 60
+
+# Appointments in these states no longer occupy the provider's time.
+NON_BLOCKING_STATUSES = frozenset({AppointmentStatus.CANCELLED.value, AppointmentStatus.COMPLETED.value})
+
+Fetcher = Callable[[List[str], str, str], Iterable[Dict[str, Any]]]
+
+
+def to_minutes(hhmm: str) -> Optional[int]:
+    """
+    Convert "HH:MM" to minutes after midnight.
+    :param hhmm: Time string.
+    :return: Minutes, or None if the string is not a valid time.
+    """
+    try:
+        hours, minutes = hhmm.split(':')
+        h, m = int(hours), int(minutes)
+    except (AttributeError, ValueError):
+        return None
+    if 0 <= h < 24 and 0 <= m < 60:
+        return h * 60 + m
+    if h == 24 and m == 0:
+        return MINUTES_PER_DAY
+    return None
+
+def format_minutes(minutes: int) -> str:
+    """
+    Convert minutes after midnight to "HH:MM".
+    :param minutes: Minutes after midnight.
+    :return: Time string.
+    """
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def range_mask(start: int, end: int) -> int:
+    """
+    Bitset with minutes [start, end) set.
+    :param start: First minute.
+    :param end: Minute after the last one.
+    :return: int
+    """
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+def run_starts(free: int, length: int) -> int:
+    """
+    Bitset of the minutes at which ``length`` consecutive free minutes begin.
+
+    Shift-and-AND doubling: after each step bit ``i`` stays set only if bits ``i .. i+k-1`` were all free, so this
+    takes O(log length) big-int operations.
+    :param free: Bitset of free minutes.
+    :param length: Run length in minutes.
+    :return: int
+    """
+    if length <= 0:
+        return free
+    runs, covered = free, 1
+    while covered < length:
+        shift = min(covered, length - covered)
+        runs &= runs >> shift
+        covered += shift
+    return runs
+
+def date_range(start_date: str, end_date: str) -> List[str]:
+    """
+    All dates from start_date to end_date inclusive, as YYYY-MM-DD.
+    :param start_date: YYYY-MM-DD
+    :param end_date: YYYY-MM-DD
+    :return: List[str]
+    """
+    first, last = date_cls.fromisoformat(start_date), date_cls.fromisoformat(end_date)
+    return [(first + timedelta(days=n)).isoformat() for n in range((last - first).days + 1)]
+
+
+class DaySchedule:
+    """
+    Booked intervals of one provider on one day.
+    """
+    def __init__(self) -> None:
+        self.bookings: Dict[str, Tuple[int, int]] = {}
+        self.mask = 0
+        self.loaded_at = time.monotonic()
+
+    def add(self, appointment_id: str, start: int, end: int) -> None:
+        """
+        Book [start, end) for an appointment.
+        """
+        self.bookings[appointment_id] = (start, end)
+        self.mask |= range_mask(start, end)
+
+    def remove(self, appointment_id: str) -> None:
+        """
+        Release an appointment's interval; the mask is rebuilt because bookings may overlap.
+        """
+        if self.bookings.pop(appointment_id, None) is not None:
+            self.mask = 0
+            for start, end in self.bookings.values():
+                self.mask |= range_mask(start, end)
+
+    def conflict(self, start: int, end: int, exclude_id: Optional[str] = None) -> Optional[Tuple[int, int]]:
+        """
+        Find a booking overlapping [start, end).
+        :param start: First minute.
+        :param end: Minute after the last one.
+        :param exclude_id: Appointment to ignore (the one being moved).
+        :return: The conflicting interval, or None.
+        """
+        if not self.mask & range_mask(start, end):
+            return None
+        overlapping = [
+            interval for appointment_id, interval in self.bookings.items()
+            if appointment_id != exclude_id and interval[0] < end and start < interval[1]
+        ]
+        return min(overlapping) if overlapping else None
+
+    def free_starts(self, duration: int, day_start: int, day_end: int, step: int) -> List[int]:
+        """
+        Start minutes on the ``step`` grid from ``day_start`` where ``duration`` free minutes fit before ``day_end``.
+        """
+        runs = run_starts(range_mask(day_start, day_end) & ~self.mask, duration)
+        return [minute for minute in range(day_start, day_end - duration + 1, step) if runs >> minute & 1]
+
+
+class AvailabilityEngine:
+    """
+    Process-wide index of booked intervals per (provider, date).
+    """
+    def __init__(self, ttl_seconds: float = AVAILABILITY_TTL_SECONDS) -> None:
+        """
+        :param ttl_seconds: Age after which a loaded day is reloaded from the database.
+        """
+        self.ttl_seconds = ttl_seconds
+        self._days: Dict[Tuple[str, str], DaySchedule] = {}
+        self._locations: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.RLock()
+        self._subscribed = False
+
+    def _is_fresh(self, key: Tuple[str, str]) -> bool:
+        day = self._days.get(key)
+        return day is not None and time.monotonic() - day.loaded_at < self.ttl_seconds
+
+    def ensure_loaded(self, fetch: Fetcher, provider_ids: List[str], start_date: str, end_date: str,
+                      refresh: bool = False) -> None:
+        """
+        Load every (provider, date) in the range that is missing or stale, with a single fetch.
+        :param fetch: Returns appointment records for (provider_ids, start_date, end_date).
+        :param provider_ids: Providers to load.
+        :param start_date: First date, YYYY-MM-DD.
+        :param end_date: Last date, YYYY-MM-DD.
+        :param refresh: Reload even if the cached days are fresh.
+        :return: None
+        """
+        dates = date_range(start_date, end_date)
+        with self._lock:
+            stale = [p for p in provider_ids if refresh or not all(self._is_fresh((p, d)) for d in dates)]
+        if not stale:
+            return
+        records = list(fetch(stale, start_date, end_date))
+        with self._lock:
+            for provider_id in stale:
+                for day in dates:
+                    old = self._days.get((provider_id, day))
+                    if old is not None:
+                        for appointment_id in old.bookings:
+                            self._locations.pop(appointment_id, None)
+                    self._days[(provider_id, day)] = DaySchedule()
+            for record in records:
+                self.apply(record)
+
+    def apply(self, record: Dict[str, Any]) -> None:
+        """
+        Insert, move or release one appointment.
+        :param record: Appointment fields (id, provider_id, appointment_date, start_time, end_time, status).
+        :return: None
+        """
+        appointment_id = str(record.get('id') or record.get('appointment_id') or '')
+        if not appointment_id:
+            return
+        with self._lock:
+            self.remove(appointment_id)
+            if record.get('status') in NON_BLOCKING_STATUSES:
+                return
+            key = (str(record.get('provider_id')), str(record.get('appointment_date')))
+            day = self._days.get(key)
+            if day is None:
+                # Not loaded yet; it will be read in full on first use.
+                return
+            start, end = to_minutes(record.get('start_time', '')), to_minutes(record.get('end_time', ''))
+            if start is None or end is None or end <= start:
+                logger.warning(f"Ignoring appointment {appointment_id} with invalid times")
+                return
+            day.add(appointment_id, start, end)
+            self._locations[appointment_id] = key
+
+    def remove(self, appointment_id: str) -> None:
+        """
+        Release an appointment wherever it is booked.
+        :param appointment_id: Appointment ID.
+        :return: None
+        """
+        with self._lock:
+            key = self._locations.pop(appointment_id, None)
+            if key is not None and key in self._days:
+                self._days[key].remove(appointment_id)
+
+    def invalidate(self) -> None:
+        """
+        Drop everything; days are reloaded on next use.
+        :return: None
+        """
+        with self._lock:
+            self._days.clear()
+            self._locations.clear()
+
+    def find_conflict(self, provider_id: str, date: str, start_time: str, end_time: str,
+                      exclude_id: Optional[str] = None) -> Optional[Tuple[str, str]]:
+        """
+        Return the (start, end) of a booking overlapping the given time, if any. The day must be loaded.
+        """
+        start, end = to_minutes(start_time), to_minutes(end_time)
+        if start is None or end is None:
+            return None
+        with self._lock:
+            day = self._days.get((provider_id, date))
+            interval = day.conflict(start, end, exclude_id) if day else None
+        return (format_minutes(interval[0]), format_minutes(interval[1])) if interval else None
+
+    def free_slots(self, provider_id: str, date: str, duration_minutes: int, day_start: int = BUSINESS_START,
+                   day_end: int = BUSINESS_END, step: int = SLOT_STEP_MINUTES) -> List[Dict[str, str]]:
+        """
+        Free slots of ``duration_minutes`` for a provider on a loaded day.
+        :return: List of {'start_time', 'end_time'}
+        """
+        with self._lock:
+            day = self._days.get((provider_id, date)) or DaySchedule()
+            starts = day.free_starts(duration_minutes, day_start, day_end, step)
+        return [
+            {'start_time': format_minutes(s), 'end_time': format_minutes(s + duration_minutes)} for s in starts
+        ]
+
+    def first_free_slot(self, provider_ids: List[str], start_date: str, end_date: str, duration_minutes: int,
+                        day_start: int = BUSINESS_START, day_end: int = BUSINESS_END,
+                        step: int = SLOT_STEP_MINUTES) -> Optional[Dict[str, str]]:
+        """
+        Earliest free slot across several providers and days (all must be loaded).
+        Ties on the same start time go to the first provider in ``provider_ids``.
+        :return: {'provider_id', 'date', 'start_time', 'end_time'} or None
+        """
+        for day in date_range(start_date, end_date):
+            best: Optional[Tuple[int, str]] = None
+            with self._lock:
+                for provider_id in provider_ids:
+                    schedule = self._days.get((provider_id, day)) or DaySchedule()
+                    starts = schedule.free_starts(duration_minutes, day_start, day_end, step)
+                    if starts and (best is None or starts[0] < best[0]):
+                        best = (starts[0], provider_id)
+            if best is not None:
+                return {
+                    'provider_id': best[1],
+                    'date': day,
+                    'start_time': format_minutes(best[0]),
+                    'end_time': format_minutes(best[0] + duration_minutes),
+                }
+        return None
+
+    def on_created(self, event: AppointmentCreated) -> None:
+        self.apply({
+            'id': event.appointment_id, 'provider_id': event.provider_id,
+            'appointment_date': event.appointment_date, 'start_time': event.start_time,
+            'end_time': event.end_time, 'status': AppointmentStatus.SCHEDULED.value,
+        })
+
+    def on_updated(self, event: AppointmentUpdated) -> None:
+        self.apply({
+            'id': event.appointment_id, 'provider_id': event.provider_id,
+            'appointment_date': event.appointment_date, 'start_time': event.start_time,
+            'end_time': event.end_time, 'status': event.status,
+        })
+
+    def on_released(self, event: Any) -> None:
+        self.remove(event.appointment_id)
+
+    def subscribe(self, bus: Any) -> None:
+        """
+        Keep the index in sync with appointment events published on ``bus``.
+        :param bus: EventBus
+        :return: None
+        """
+        if self._subscribed:
+            return
+        bus.subscribe(AppointmentCreated, self.on_created)
+        bus.subscribe(AppointmentUpdated, self.on_updated)
+        bus.subscribe(AppointmentCancelled, self.on_released)
+        bus.subscribe(AppointmentCompleted, self.on_released)
+        self._subscribed = True
+
+
+availability_engine = AvailabilityEngine()
@@ -0,0 +1,495 @@
+"""
+Nearest-clinic and radius search.
+
+Clinics are mirrored in process as unit vectors on the sphere and indexed with a small KD-tree, so k-nearest and
+radius queries (optionally restricted to an organization or specialty) never scan the table. Straight-line distance
+between unit vectors is monotonic in great-circle distance, so the tree can prune on chord length and only the
+returned clinics need their haversine distance computed. Answers for repeated query points are memoised per index
+build.
+
+The mirror is reloaded when it is older than ``CLINIC_INDEX_TTL_SECONDS`` or after ``invalidate_clinic_index()``.
+Each process holds its own mirror and invalidation only reaches the process that calls it, so other web and Celery
+workers can answer from their old snapshot for up to ``CLINIC_INDEX_TTL_SECONDS`` after a clinic changes.
+``find_clinics_within`` runs the same radius search in SurrealDB for callers that need the authoritative answer; the
+``latitude`` index from ``Clinic.schema()`` narrows it to a band before ``geo::distance`` is evaluated.
+
+``assign_nearest_clinics`` matches many patients at once: a chunked matrix product picks each patient's nearest
+clinic and haversine is evaluated only for the winners.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import (Any, Callable, Dict, Iterable, List, Optional, Sequence,
+                    Tuple)
+
+import numpy as np
+from numpy.typing import NDArray
+
+from lib.db.surreal import DbController
+from lib.infra.instrumentation import record_cache
+from settings import CLINIC_INDEX_TTL_SECONDS, CLINIC_QUERY_CACHE_SIZE, logger
+
+# Mean Earth radius in metres, the same value SurrealDB's geo::distance uses.
+EARTH_RADIUS_M = 6371008.8
+
+LEAF_SIZE = 16
+ASSIGN_CHUNK_SIZE = 2048
+
+CLINIC_FIELDS = "id, name, address, location, longitude, latitude, organization_id, specialties"
+
+
+def _rows(result: Any) -> List[Dict[str, Any]]:
+    if result and isinstance(result, list) and isinstance(result[0], dict) and 'result' in result[0]:
+        return result[0]['result'] or []
+    return result or []
+
+
+def validate_coordinates(longitude: Any, latitude: Any) -> Tuple[float, float]:
+    """
+    Coerce a longitude/latitude pair to floats and check that it is on the globe.
+    :param longitude: Degrees east, -180..180.
+    :param latitude: Degrees north, -90..90.
+    :return: (longitude, latitude) as floats.
+    :raises ValueError: If either value is missing, not a number or out of range.
+    """
+    try:
+        lon, lat = float(longitude), float(latitude)
+    except (TypeError, ValueError):
+        raise ValueError("longitude and latitude must be numbers")
+    if not (-180.0 <= lon <= 180.0 and -90.0 <= lat <= 90.0):
+        raise ValueError("longitude must be within [-180, 180] and latitude within [-90, 90]")
+    return lon, lat
+
+
+def haversine_m(lon1: Any, lat1: Any, lon2: Any, lat2: Any) -> NDArray[np.float64]:
+    """
+    Great-circle distance in metres; arguments are degrees and broadcast like numpy arrays.
+    """
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def to_unit_vectors(longitude: Any, latitude: Any) -> NDArray[np.float64]:
+    """
+    Degrees to points on the unit sphere, shape (n, 3).
+    """
+    lon = np.radians(np.asarray(longitude, dtype=np.float64))
+    lat = np.radians(np.asarray(latitude, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_for_distance(distance_m: float) -> float:
+    """
+    Straight-line distance between unit vectors that are ``distance_m`` apart along the surface.
+    """
+    return 2.0 * math.sin(min(distance_m / EARTH_RADIUS_M, math.pi) / 2.0)
+
+
+def _clinic_coordinates(record: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    location = record.get('location')
+    if isinstance(location, dict) and location.get('coordinates'):
+        lon, lat = location['coordinates'][:2]
+    else:
+        lon, lat = record.get('longitude'), record.get('latitude')
+    try:
+        return validate_coordinates(lon, lat)
+    except ValueError:
+        return None
+
+
+class ClinicIndex:
+    """
+    Immutable in-memory spatial index over a snapshot of the clinic table.
+    """
+    def __init__(self, clinics: Iterable[Dict[str, Any]], leaf_size: int = LEAF_SIZE,
+                 cache_size: int = CLINIC_QUERY_CACHE_SIZE) -> None:
+        """
+        :param clinics: Clinic records as stored (GeoJSON ``location`` or ``longitude``/``latitude``).
+        :param leaf_size: Maximum clinics per KD-tree leaf.
+        :param cache_size: Number of query answers to memoise.
+        """
+        self.clinics: List[Dict[str, Any]] = []
+        coordinates = []
+        for record in clinics:
+            point = _clinic_coordinates(record)
+            if point is None:
+                logger.warning("Clinic %s has no usable location; it is left out of the index", record.get('id'))
+                continue
+            coordinates.append(point)
+            self.clinics.append({
+                'id': str(record.get('id', '')),
+                'name': record.get('name', ''),
+                'address': record.get('address') or {},
+                'organization_id': record.get('organization_id') or '',
+                'specialties': list(record.get('specialties') or []),
+                'longitude': point[0],
+                'latitude': point[1],
+            })
+
+        coords = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        self.longitude = coords[:, 0]
+        self.latitude = coords[:, 1]
+        self.points = to_unit_vectors(self.longitude, self.latitude).reshape(-1, 3)
+
+        self._organization_codes: Dict[str, int] = {}
+        self.organization = np.array(
+            [self._organization_codes.setdefault(c['organization_id'], len(self._organization_codes))
+             for c in self.clinics], dtype=np.int32)
+        self._specialty_masks: Dict[str, NDArray[np.bool_]] = {}
+        for i, clinic in enumerate(self.clinics):
+            for specialty in clinic['specialties']:
+                mask = self._specialty_masks.setdefault(specialty.lower(), np.zeros(len(self.clinics), dtype=bool))
+                mask[i] = True
+
+        self._leaf_size = max(1, leaf_size)
+        self._order = np.arange(len(self.clinics))
+        self._start: List[int] = []
+        self._end: List[int] = []
+        self._children: List[Tuple[int, int]] = []
+        self._box_lo: List[NDArray[np.float64]] = []
+        self._box_hi: List[NDArray[np.float64]] = []
+        if len(self.clinics):
+            self._build(0, len(self.clinics))
+
+        self._cache: 'OrderedDict[Tuple[Any, ...], List[Dict[str, Any]]]' = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.clinics)
+
+    def _build(self, start: int, end: int) -> int:
+        node = len(self._start)
+        members = self.points[self._order[start:end]]
+        self._start.append(start)
+        self._end.append(end)
+        self._children.append((-1, -1))
+        self._box_lo.append(members.min(axis=0))
+        self._box_hi.append(members.max(axis=0))
+        if end - start > self._leaf_size:
+            axis = int(np.argmax(self._box_hi[node] - self._box_lo[node]))
+            middle = (end - start) // 2
+            split = np.argpartition(members[:, axis], middle)
+            self._order[start:end] = self._order[start:end][split]
+            left = self._build(start, start + middle)
+            right = self._build(start + middle, end)
+            self._children[node] = (left, right)
+        return node
+
+    def _box_distance2(self, node: int, query: NDArray[np.float64]) -> float:
+        gap = np.maximum(np.maximum(self._box_lo[node] - query, query - self._box_hi[node]), 0.0)
+        return float(gap @ gap)
+
+    def candidate_mask(self, organization_id: Optional[str] = None,
+                       specialty: Optional[str] = None) -> Optional[NDArray[np.bool_]]:
+        """
+        Boolean mask of clinics passing the filters, or None when there are no filters.
+        """
+        mask = None
+        if organization_id:
+            code = self._organization_codes.get(organization_id)
+            mask = self.organization == code if code is not None else np.zeros(len(self), dtype=bool)
+        if specialty:
+            specialty_mask = self._specialty_masks.get(specialty.lower(), np.zeros(len(self), dtype=bool))
+            mask = specialty_mask if mask is None else mask & specialty_mask
+        return mask
+
+    def _search(self, query: NDArray[np.float64], k: Optional[int], max_chord: float,
+                mask: Optional[NDArray[np.bool_]]) -> Tuple[NDArray[np.int64], NDArray[np.float64]]:
+        bound = max_chord * max_chord
+        found_idx: NDArray[np.int64] = np.empty(0, dtype=np.int64)
+        found_d2: NDArray[np.float64] = np.empty(0, dtype=np.float64)
+        if not len(self) or (mask is not None and not mask.any()):
+            return found_idx, found_d2
+
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._box_distance2(node, query) > bound:
+                continue
+            left, right = self._children[node]
+            if left < 0:
+                idx = self._order[self._start[node]:self._end[node]]
+                if mask is not None:
+                    idx = idx[mask[idx]]
+                diff = self.points[idx] - query
+                d2 = np.einsum('ij,ij->i', diff, diff)
+                keep = d2 <= bound
+                found_idx = np.concatenate([found_idx, idx[keep]])
+                found_d2 = np.concatenate([found_d2, d2[keep]])
+                if k is not None and len(found_d2) >= k:
+                    if len(found_d2) > k:
+                        best = np.argpartition(found_d2, k - 1)[:k]
+                        found_idx, found_d2 = found_idx[best], found_d2[best]
+                    bound = min(bound, float(found_d2.max()))
+                continue
+            # Visit the nearer child first so the k-th distance tightens quickly.
+            if self._box_distance2(left, query) <= self._box_distance2(right, query):
+                stack.extend((right, left))
+            else:
+                stack.extend((left, right))
+
+        order = np.argsort(found_d2, kind='stable')
+        return found_idx[order], found_d2[order]
+
+    def _results(self, longitude: float, latitude: float, idx: NDArray[np.int64]) -> List[Dict[str, Any]]:
+        distances = haversine_m(longitude, latitude, self.longitude[idx], self.latitude[idx])
+        return [dict(self.clinics[i], distance_m=float(d)) for i, d in zip(idx.tolist(), distances.tolist())]
+
+    def _cached(self, key: Tuple[Any, ...], compute: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Memoised answer for ``key``. Callers get their own copies, so changing a result leaves the cache intact.
+        """
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        record_cache("clinic_query", hit=cached is not None)
+        if cached is None:
+            cached = compute()
+            with self._cache_lock:
+                self._cache[key] = cached
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+        return [dict(clinic) for clinic in cached]
+
+    def nearest(self, longitude: float, latitude: float, k: int = 5, organization_id: Optional[str] = None,
+                specialty: Optional[str] = None, max_distance_m: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        The ``k`` clinics closest to a point, nearest first.
+        :param longitude: Degrees east.
+        :param latitude: Degrees north.
+        :param k: Number of clinics to return.
+        :param organization_id: Only clinics of this organization.
+        :param specialty: Only clinics offering this specialty (case-insensitive).
+        :param max_distance_m: Ignore clinics further away than this.
+        :return: Clinic summaries with ``distance_m``.
+        """
+        longitude, latitude = validate_coordinates(longitude, latitude)
+        if k < 1:
+            raise ValueError("k must be at least 1")
+        key = ('nearest', longitude, latitude, k, organization_id, specialty, max_distance_m)
+
+        def compute() -> List[Dict[str, Any]]:
+            max_chord = 2.0 if max_distance_m is None else chord_for_distance(max_distance_m)
+            query = to_unit_vectors(longitude, latitude)
+            idx, _ = self._search(query, k, max_chord, self.candidate_mask(organization_id, specialty))
+            return self._results(longitude, latitude, idx)
+
+        return self._cached(key, compute)
+
+    def within(self, longitude: float, latitude: float, radius_m: float, organization_id: Optional[str] = None,
+               specialty: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Clinics within ``radius_m`` of a point, nearest first.
+        :param longitude: Degrees east.
+        :param latitude: Degrees north.
+        :param radius_m: Search radius in metres.
+        :param organization_id: Only clinics of this organization.
+        :param specialty: Only clinics offering this specialty (case-insensitive).
+        :param limit: Return at most this many.
+        :return: Clinic summaries with ``distance_m``.
+        """
+        longitude, latitude = validate_coordinates(longitude, latitude)
+        if radius_m < 0:
+            raise ValueError("radius_m must not be negative")
+        key = ('within', longitude, latitude, radius_m, organization_id, specialty, limit)
+
+        def compute() -> List[Dict[str, Any]]:
+            query = to_unit_vectors(longitude, latitude)
+            idx, _ = self._search(query, limit, chord_for_distance(radius_m),
+                                  self.candidate_mask(organization_id, specialty))
+            results = self._results(longitude, latitude, idx)
+            # Chord pruning is exact up to rounding; keep the haversine distance authoritative at the boundary.
+            return [r for r in results if r['distance_m'] <= radius_m]
+
+        return self._cached(key, compute)
+
+    def assign(self, longitude: Any, latitude: Any, organization_id: Optional[str] = None,
+               specialty: Optional[str] = None, max_distance_m: Optional[float] = None,
+               chunk_size: int = ASSIGN_CHUNK_SIZE) -> Tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """
+        Nearest clinic for each of many points.
+        :param longitude: Array of degrees east.
+        :param latitude: Array of degrees north.
+        :param organization_id: Only clinics of this organization.
+        :param specialty: Only clinics offering this specialty.
+        :param max_distance_m: Points with no clinic this close are left unassigned.
+        :param chunk_size: Points per matrix product, bounding memory to ``chunk_size * len(self)`` floats.
+        :return: (clinic positions in ``self.clinics`` with -1 for unassigned, distances in metres with NaN for
+            unassigned).
+        """
+        longitude = np.asarray(longitude, dtype=np.float64).ravel()
+        latitude = np.asarray(latitude, dtype=np.float64).ravel()
+        assigned = np.full(len(longitude), -1, dtype=np.int64)
+        distances: NDArray[np.float64] = np.full(len(longitude), np.nan)
+
+        mask = self.candidate_mask(organization_id, specialty)
+        candidates = np.arange(len(self)) if mask is None else np.flatnonzero(mask)
+        if not len(candidates) or not len(longitude):
+            return assigned, distances
+
+        clinic_points = self.points[candidates].T
+        queries = to_unit_vectors(longitude, latitude).reshape(-1, 3)
+        for start in range(0, len(queries), chunk_size):
+            stop = start + chunk_size
+            # The largest dot product is the smallest angle, i.e. the nearest clinic.
+            assigned[start:stop] = candidates[np.argmax(queries[start:stop] @ clinic_points, axis=1)]
+
+        distances = haversine_m(longitude, latitude, self.longitude[assigned], self.latitude[assigned])
+        if max_distance_m is not None:
+            too_far = distances > max_distance_m
+            assigned[too_far] = -1
+            distances[too_far] = np.nan
+        return assigned, distances
+
+
+_index: Optional[ClinicIndex] = None
+_index_loaded_at = 0.0
+_index_lock = threading.Lock()
+
+
+def load_clinics(db: DbController) -> List[Dict[str, Any]]:
+    """
+    Read the fields the index needs for every clinic.
+    """
+    return _rows(db.query(f"SELECT {CLINIC_FIELDS} FROM clinic", {}))
+
+
+def get_clinic_index(db: Optional[DbController] = None, refresh: bool = False) -> ClinicIndex:
+    """
+    The process-wide clinic index, rebuilt when it is missing, stale or ``refresh`` is set.
+    :param db: Connected controller to load from; a short-lived one is opened otherwise.
+    :param refresh: Rebuild even if the current index is fresh.
+    :return: ClinicIndex
+    """
+    global _index, _index_loaded_at
+    with _index_lock:
+        if not refresh and _index is not None and time.monotonic() - _index_loaded_at < CLINIC_INDEX_TTL_SECONDS:
+            return _index
+        started = time.perf_counter()
+        if db is not None:
+            records = load_clinics(db)
+        else:
+            db = DbController()
+            try:
+                db.connect()
+                records = load_clinics(db)
+            finally:
+                db.close()
+        _index = ClinicIndex(records)
+        _index_loaded_at = time.monotonic()
+        logger.debug("Clinic index built with %d clinics in %.1f ms", len(_index),
+                     (time.perf_counter() - started) * 1000)
+        return _index
+
+
+def invalidate_clinic_index() -> None:
+    """
+    Drop the in-process index so the next query reloads it; call after creating, moving or deleting a clinic.
+    Other processes keep their index until it expires (``CLINIC_INDEX_TTL_SECONDS``).
+    """
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def find_nearest_clinics(longitude: float, latitude: float, k: int = 5, organization_id: Optional[str] = None,
+                         specialty: Optional[str] = None,
+                         max_distance_m: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    The ``k`` nearest clinics from the in-process index; see ``ClinicIndex.nearest``.
+    """
+    return get_clinic_index().nearest(longitude, latitude, k, organization_id, specialty, max_distance_m)
+
+
+def find_clinics_within(longitude: float, latitude: float, radius_m: float, organization_id: Optional[str] = None,
+                        specialty: Optional[str] = None, limit: Optional[int] = None,
+                        db: Optional[DbController] = None) -> List[Dict[str, Any]]:
+    """
+    Radius search evaluated by SurrealDB, nearest first.
+
+    The latitude band is derived from the radius so the indexed ``latitude`` range can discard most rows before
+    ``geo::distance`` runs on the rest.
+    :param longitude: Degrees east.
+    :param latitude: Degrees north.
+    :param radius_m: Search radius in metres.
+    :param organization_id: Only clinics of this organization.
+    :param specialty: Only clinics listing this specialty (case-insensitive, like the in-process index).
+    :param limit: Return at most this many.
+    :param db: Connected controller; a short-lived one is opened otherwise.
+    :return: Clinic records with ``distance_m``.
+    """
+    longitude, latitude = validate_coordinates(longitude, latitude)
+    band = math.degrees(radius_m / EARTH_RADIUS_M)
+    conditions = [
+        "latitude >= $min_latitude",
+        "latitude <= $max_latitude",
+        "geo::distance(location, <geometry<point>> $point) <= $radius",
+    ]
+    params: Dict[str, Any] = {
+        'point': [longitude, latitude],
+        'radius': float(radius_m),
+        'min_latitude': max(-90.0, latitude - band),
+        'max_latitude': min(90.0, latitude + band),
+    }
+    if organization_id:
+        conditions.append("organization_id = $organization_id")
+        params['organization_id'] = organization_id
+    if specialty:
+        conditions.append("$specialty IN array::map(specialties ?? [], |$s| string::lowercase($s))")
+        params['specialty'] = specialty.lower()
+    statement = (
+        f"SELECT {CLINIC_FIELDS}, geo::distance(location, <geometry<point>> $point) AS distance_m FROM clinic "
+        f"WHERE {' AND '.join(conditions)} ORDER BY distance_m"
+    )
+    if limit is not None:
+        statement += " LIMIT $limit"
+        params['limit'] = int(limit)
+
+    if db is not None:
+        return _rows(db.query(statement, params))
+    db = DbController()
+    try:
+        db.connect()
+        return _rows(db.query(statement, params))
+    finally:
+        db.close()
+
+
+def assign_nearest_clinics(patients: Sequence[Dict[str, Any]], organization_id: Optional[str] = None,
+                           specialty: Optional[str] = None,
+                           max_distance_m: Optional[float] = None) -> List[Dict[str, Any]]:
+    """
+    Match each patient to their nearest clinic.
+    :param patients: Dicts with ``id``, ``longitude`` and ``latitude``.
+    :param organization_id: Only clinics of this organization.
+    :param specialty: Only clinics offering this specialty.
+    :param max_distance_m: Leave patients with no clinic this close unassigned.
+    :return: One ``{patient_id, clinic_id, clinic_name, distance_m}`` per patient, in input order; the clinic fields
+        are None when unassigned.
+    :raises ValueError: If a patient's coordinates are missing or out of range.
+    """
+    coordinates = np.empty((len(patients), 2), dtype=np.float64)
+    for row, patient in enumerate(patients):
+        try:
+            coordinates[row] = validate_coordinates(patient.get('longitude'), patient.get('latitude'))
+        except ValueError as e:
+            raise ValueError(f"Patient {patient.get('id')}: {e}")
+
+    index = get_clinic_index()
+    assigned, distances = index.assign(coordinates[:, 0], coordinates[:, 1], organization_id, specialty,
+                                       max_distance_m)
+    results = []
+    for patient, position, distance in zip(patients, assigned.tolist(), distances.tolist()):
+        clinic = index.clinics[position] if position >= 0 else None
+        results.append({
+            'patient_id': patient.get('id'),
+            'clinic_id': clinic['id'] if clinic else None,
+            'clinic_name': clinic['name'] if clinic else None,
+            'distance_m': distance if clinic else None,
+        })
+    return results
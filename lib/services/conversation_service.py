@@ -1,12 +1,128 @@
 """
 Conversation Service
 """
-from typing import Any, Dict, List, Optional, Tuple, Union, cast
+from typing import Any, Dict, List, Optional, Tuple
 
-from lib.db.surreal import DbController
-from lib.models.conversation import Conversation, Message
+from surrealdb import RecordID  # type: ignore[import-untyped]
+
+from lib.db.surreal import (AsyncDbController, DbController, Transaction,
+                            TransactionError)
+from lib.models.conversation import Conversation, Message, message_preview
 from settings import logger
 
+# Conversations for a user, newest activity first. Conversations written before last_message_preview existed get
+# their latest message from a subquery in the same statement (messages may store either form of the conversation id).
+CONVERSATION_SUMMARIES_QUERY = """
+    SELECT *,
+        IF last_message_preview = NONE THEN (
+            SELECT VALUE text FROM Message
+            WHERE conversation_id IN [<string> $parent.id, <string> record::id($parent.id)]
+            ORDER BY created_at DESC LIMIT 1
+        )[0] END AS latest_message_text
+    FROM Conversation
+    WHERE $user_id IN participants
+    ORDER BY last_message_at DESC
+"""
+
+MESSAGES_QUERY = "SELECT * FROM Message WHERE conversation_id = $conversation_id ORDER BY created_at DESC LIMIT $limit"
+MARK_READ_QUERY = "UPDATE Message SET is_read = true WHERE conversation_id = $conversation_id AND sender_id != $user_id"
+
+CONVERSATION_NOT_FOUND = "Conversation not found"
+NOT_A_PARTICIPANT = "User is not a participant in this conversation"
+
+# First statement of every write that needs the caller to be a participant; a THROW rolls the transaction back.
+PARTICIPANT_GUARD = f"""
+    IF $conversation.participants = NONE {{ THROW "{CONVERSATION_NOT_FOUND}" }}
+    ELSE IF $user_id NOTINSIDE $conversation.participants {{ THROW "{NOT_A_PARTICIPANT}" }}
+"""
+
+
+def _guard_failure(error: TransactionError) -> Optional[str]:
+    """
+    The participant check that rejected a transaction, if any
+    """
+    for reason in (CONVERSATION_NOT_FOUND, NOT_A_PARTICIPANT):
+        if reason in str(error):
+            return reason
+    return None
+
+
+def _record_id(table: str, value: str) -> RecordID:
+    """
+    Build a RecordID from an ID with or without its table prefix
+
+    :param table: Table name, e.g. "User"
+    :param value: "User:abc" or "abc"
+    :return: RecordID
+    """
+    value = str(value)
+    prefix = f"{table}:"
+    return RecordID(table, value[len(prefix):] if value.startswith(prefix) else value)
+
+
+def _conversation_by_id_query(conversation_id: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Query for one conversation, by ID with or without the table prefix
+    """
+    record_id = _record_id('Conversation', conversation_id)
+    logger.debug(f"Looking for conversation with record id: {record_id}")
+    return "SELECT * FROM Conversation WHERE id = $id", {"id": record_id}
+
+
+def _users_query(user_ids: List[str]) -> Tuple[str, Dict[str, Any]]:
+    """
+    Query for the name fields of several users in one round trip
+    """
+    return ("SELECT id, username, first_name, last_name FROM $users",
+            {"users": [_record_id('User', user_id) for user_id in user_ids]})
+
+
+def _users_by_id(users: Optional[List[Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Index user rows by both "User:abc" and "abc"
+    """
+    by_id: Dict[str, Dict[str, Any]] = {}
+    for user in users or []:
+        by_id[str(user.get('id'))] = user
+        by_id[str(user.get('id')).split(':', 1)[-1]] = user
+    return by_id
+
+
+def _summaries_from_rows(rows: Optional[List[Dict[str, Any]]], user_id: str) -> List[Dict[str, Any]]:
+    """
+    Conversation summaries from CONVERSATION_SUMMARIES_QUERY rows, without the other participant's profile yet
+    """
+    summaries: List[Dict[str, Any]] = []
+    for row in rows or []:
+        conversation = Conversation.from_dict(row)
+        other_id = next((p for p in conversation.participants if p != user_id), None)
+        summaries.append({
+            "conversation": conversation,
+            "other_participant_id": other_id,
+            "other_participant": None,
+            "last_message": conversation.last_message_preview or (
+                message_preview(row['latest_message_text']) if row.get('latest_message_text') else None),
+        })
+    return summaries
+
+
+def _attach_participants(summaries: List[Dict[str, Any]], users: Optional[List[Dict[str, Any]]]) -> None:
+    """
+    Fill in other_participant from the rows of a _users_query
+    """
+    by_id = _users_by_id(users)
+    for summary in summaries:
+        summary["other_participant"] = by_id.get(summary["other_participant_id"])
+
+
+def _messages_from_rows(rows: Optional[List[Dict[str, Any]]]) -> List[Message]:
+    """
+    Messages from MESSAGES_QUERY rows, in chronological order
+    """
+    messages = [Message.from_dict(row) for row in rows or []]
+    messages.reverse()
+    return messages
+
 
 class ConversationService:
     """
@@ -57,51 +173,25 @@ class ConversationService:
             if len(participants) < 2:
                 return False, "At least 2 participants are required", None
             
-            # Check if conversation already exists between these participants
-            existing_conv = self.get_conversation_by_participants(participants)
-            if existing_conv:
+            # Reuse an existing conversation between these participants, or create one, in a single transaction
+            conversation = Conversation(sorted(participants), conversation_type)
+            tx = Transaction()
+            tx.add("LET $existing = (SELECT * FROM Conversation WHERE participants = $participants LIMIT 1)",
+                   {"participants": conversation.participants})
+            created_index = tx.add("IF array::len($existing) = 0 { CREATE Conversation CONTENT $conversation }",
+                                   {"conversation": conversation.to_dict()})
+            existing_index = tx.add("RETURN $existing")
+            results = self.db.execute(tx)
+
+            if results[existing_index]:
+                existing_conv = Conversation.from_dict(results[existing_index][0])
                 logger.debug(f"Found existing conversation: {existing_conv.id}")
                 return True, "Conversation already exists", existing_conv
-            
-            # Create new conversation
-            conversation = Conversation(participants, conversation_type)
-            logger.debug(f"Creating conversation in DB with data: {conversation.to_dict()}")
-            logger.debug(f"Created conversation object: {conversation.to_dict()}")
-            
-            # Save to database
-            result = self.db.create('Conversation', conversation.to_dict())
-            logger.debug(f"Database create result: {result}")
-            if result:
-                conversation.id = result.get('id')
-                logger.debug(f"Set conversation ID to: {conversation.id}")
-                
-                # Verify the conversation was saved by trying to retrieve it
-                logger.debug(f"Verifying conversation was saved...")
-                verification = None
-                if conversation.id is not None:
-                    verification = self.get_conversation_by_id(conversation.id)
-                if verification:
-                    logger.debug(f"Conversation verification successful: {verification.id}")
-                else:
-                    logger.debug(f"Conversation verification failed - could not retrieve saved conversation")
-                    
-                    # Let's check what's actually in the database
-                    logger.debug(f"Checking all conversations in database...")
-                    all_conversations = self.db.query("SELECT * FROM Conversation")
-                    logger.debug(f"All conversations: {all_conversations}")
-                    
-                    # Also try to get conversations by participants
-                    logger.debug(f"Checking conversations by participants...")
-                    participant_conversations = self.db.query(
-                        "SELECT * FROM Conversation WHERE $user_id IN participants",
-                        {"user_id": participants[0]}
-                    )
-                    logger.debug(f"Conversations for participant {participants[0]}: {participant_conversations}")
-                
+            if results[created_index]:
+                conversation.id = str(results[created_index][0]['id'])
+                logger.debug(f"Created conversation: {conversation.id}")
                 return True, "Conversation created successfully", conversation
-            else:
-                logger.debug(f"Database create failed: {result}")
-                return False, "Failed to create conversation", None
+            return False, "Failed to create conversation", None
                 
         except Exception as e:
             logger.debug(f"Exception in create_conversation: {e}")
@@ -115,18 +205,7 @@ class ConversationService:
         :return: Conversation object or None if not found
         """
         try:
-            # Extract the record_id part from the conversation_id
-            if conversation_id.startswith('Conversation:'):
-                record_id = conversation_id.split(':', 1)[1]
-            else:
-                record_id = conversation_id
-
-            record_id_expr = f"Conversation:{record_id}"
-            logger.debug(f"Looking for conversation with record_id_expr: {record_id_expr}")
-
-            # Use SurrealQL RecordID syntax (no quotes)
-            query = f"SELECT * FROM Conversation WHERE id = {record_id_expr}"
-            query_result = self.db.query(query)
+            query_result = self.db.query(*_conversation_by_id_query(conversation_id))
             logger.debug(f"Query result: {query_result}")
 
             if query_result and len(query_result) > 0:
@@ -190,6 +269,25 @@ class ConversationService:
             logger.error(f"Error getting user conversations: {e}")
             return []
     
+    def get_conversation_summaries(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        Conversations for a user with the other participant's profile and the latest message, in two queries
+
+        :param user_id: ID of the user
+        :return: [{"conversation": Conversation, "other_participant_id": str or None,
+                   "other_participant": user row or None, "last_message": str or None}], newest activity first
+        """
+        try:
+            summaries = _summaries_from_rows(self.db.query(CONVERSATION_SUMMARIES_QUERY, {"user_id": user_id}), user_id)
+            other_ids = sorted({s["other_participant_id"] for s in summaries if s["other_participant_id"]})
+            if other_ids:
+                _attach_participants(summaries, self.db.query(*_users_query(other_ids)))
+            return summaries
+
+        except Exception as e:
+            logger.error(f"Error getting conversation summaries: {e}")
+            return []
+
     def add_message(self, conversation_id: str, sender_id: str, text: str) -> Tuple[bool, str, Optional[Message]]:
         """
         Add a message to a conversation
@@ -200,44 +298,34 @@ class ConversationService:
         :return: (success, message, message_object)
         """
         try:
-            # Verify conversation exists and user is a participant
-            conversation = self.get_conversation_by_id(conversation_id)
-            if not conversation:
-                return False, "Conversation not found", None
-            
-            if not conversation.is_participant(sender_id):
-                return False, "User is not a participant in this conversation", None
-            
-            # Create message
             message = Message(conversation_id, sender_id, text)
-            
-            # Save message to database
-            result: Optional[Union[Dict[str, Any], List[Any], Tuple[Any, ...]]] = self.db.create('Message', message.to_dict())
-            logger.debug(f"Message create result: {result}")
-            if result:
-                # Handle different result types safely
-                if isinstance(result, list) and len(result) > 0:
-                    first_result = cast(Dict[str, Any], result[0])
-                    message.id = first_result.get('id')  # type: ignore[assignment]
-                elif isinstance(result, dict):
-                    message.id = result.get('id')  # type: ignore[assignment]
-                else:
-                    logger.warning(f"Unexpected result type: {type(result)}")
-
-                # Merge update: fetch full conversation, update last_message_at, write back
-                conv_data = self.db.select(f"Conversation:{conversation_id}")
-                logger.debug(f"Conversation data before update: {conv_data}")
-                if conv_data:
-                    conv_data["last_message_at"] = message.created_at
-                    update_result = self.db.update(f"Conversation:{conversation_id}", conv_data)
-                    logger.debug(f"Conversation update result: {update_result}")
-                else:
-                    logger.debug(f"Could not fetch conversation for safe update, skipping merge update.")
-                
-                return True, "Message sent successfully", message
-            else:
+            conversation = _record_id('Conversation', conversation_id)
+
+            # Check the sender, save the message and denormalise it onto the conversation in one transaction,
+            # so the inbox never reads Message
+            tx = Transaction()
+            tx.add(PARTICIPANT_GUARD, {"conversation": conversation, "user_id": sender_id})
+            created_index = tx.add("CREATE Message CONTENT $message", {"message": message.to_dict()})
+            tx.add("UPDATE $conversation MERGE $changes", {
+                "conversation": conversation,
+                "changes": {
+                    "last_message_at": message.created_at,
+                    "last_message_preview": message_preview(text),
+                    "last_message_sender_id": sender_id,
+                },
+            })
+            results = self.db.execute(tx)
+
+            if not results[created_index]:
                 return False, "Failed to send message", None
-                
+            message.id = str(results[created_index][0]['id'])
+            return True, "Message sent successfully", message
+
+        except TransactionError as e:
+            reason = _guard_failure(e)
+            if reason:
+                return False, reason, None
+            return False, f"Error sending message: {str(e)}", None
         except Exception as e:
             return False, f"Error sending message: {str(e)}", None
     
@@ -250,19 +338,8 @@ class ConversationService:
         :return: List of Message objects
         """
         try:
-            result = self.db.query(
-                "SELECT * FROM Message WHERE conversation_id = $conversation_id ORDER BY created_at DESC LIMIT $limit",
-                {"conversation_id": conversation_id, "limit": limit}
-            )
-
-            messages: List[Message] = []
-            if result:
-                for msg_data in result:
-                    messages.append(Message.from_dict(msg_data))
-
-            # Reverse to get chronological order
-            messages.reverse()
-            return messages
+            result = self.db.query(MESSAGES_QUERY, {"conversation_id": conversation_id, "limit": limit})
+            return _messages_from_rows(result)
             
         except Exception as e:
             logger.error(f"Error getting conversation messages: {e}")
@@ -278,8 +355,7 @@ class ConversationService:
         """
         try:
             result: Optional[List[Dict[str, Any]]] = self.db.query(
-                "UPDATE Message SET is_read = true WHERE conversation_id = $conversation_id AND sender_id != $user_id",
-                {"conversation_id": conversation_id, "user_id": user_id}
+                MARK_READ_QUERY, {"conversation_id": conversation_id, "user_id": user_id}
             )
             logger.debug(f"Mark messages as read result: {result}")
             return True
@@ -297,23 +373,106 @@ class ConversationService:
         :return: (success, message)
         """
         try:
-            conversation = self.get_conversation_by_id(conversation_id)
-            if not conversation:
-                return False, "Conversation not found"
-            
-            if not conversation.is_participant(user_id):
-                return False, "User is not a participant in this conversation"
-            
-            # Delete all messages first
-            self.db.query(
-                "DELETE FROM Message WHERE conversation_id = $conversation_id",
-                {"conversation_id": conversation_id}
-            )
-            
-            # Delete conversation
-            self.db.delete(f"Conversation:{conversation_id}")
+            conversation = _record_id('Conversation', conversation_id)
+
+            # Delete the messages and the conversation together, only if the user is a participant
+            tx = Transaction()
+            tx.add(PARTICIPANT_GUARD, {"conversation": conversation, "user_id": user_id})
+            tx.add("DELETE FROM Message WHERE conversation_id = $conversation_id", {"conversation_id": conversation_id})
+            tx.add("DELETE $conversation", {"conversation": conversation})
+            self.db.execute(tx)
             
             return True, "Conversation deleted successfully"
             
+        except TransactionError as e:
+            reason = _guard_failure(e)
+            if reason:
+                return False, reason
+            return False, f"Error deleting conversation: {str(e)}"
+        except Exception as e:
+            return False, f"Error deleting conversation: {str(e)}"
+
+
+class AsyncConversationService:
+    """
+    Conversation reads for async views, on a pooled AsyncDbController; see ConversationService
+    """
+    def __init__(self, db: AsyncDbController) -> None:
+        """
+        :param db: Connected AsyncDbController (see lib.db.async_pool)
+        :return: None
+        """
+        self.db = db
+
+    async def get_conversation_by_id(self, conversation_id: str) -> Optional[Conversation]:
+        """
+        Get conversation by ID
+
+        :param conversation_id: ID of the conversation
+        :return: Conversation object or None if not found
+        """
+        try:
+            rows = await self.db.query(*_conversation_by_id_query(conversation_id))
+            return Conversation.from_dict(rows[0]) if rows else None
         except Exception as e:
-            return False, f"Error deleting conversation: {str(e)}" 
\ No newline at end of file
+            logger.error(f"Error getting conversation by ID: {e}")
+            return None
+
+    async def get_conversation_summaries(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        Conversations for a user with the other participant's profile and the latest message, in two queries
+
+        :param user_id: ID of the user
+        :return: See ConversationService.get_conversation_summaries
+        """
+        try:
+            summaries = _summaries_from_rows(await self.db.query(CONVERSATION_SUMMARIES_QUERY, {"user_id": user_id}),
+                                             user_id)
+            other_ids = sorted({s["other_participant_id"] for s in summaries if s["other_participant_id"]})
+            if other_ids:
+                _attach_participants(summaries, await self.db.query(*_users_query(other_ids)))
+            return summaries
+        except Exception as e:
+            logger.error(f"Error getting conversation summaries: {e}")
+            return []
+
+    async def get_conversation_messages(self, conversation_id: str, limit: int = 50) -> List[Message]:
+        """
+        Get messages for a conversation
+
+        :param conversation_id: ID of the conversation
+        :param limit: Maximum number of messages to retrieve
+        :return: List of Message objects, oldest first
+        """
+        try:
+            return _messages_from_rows(
+                await self.db.query(MESSAGES_QUERY, {"conversation_id": conversation_id, "limit": limit}))
+        except Exception as e:
+            logger.error(f"Error getting conversation messages: {e}")
+            return []
+
+    async def mark_messages_as_read(self, conversation_id: str, user_id: str) -> bool:
+        """
+        Mark all messages in a conversation as read for a user
+
+        :param conversation_id: ID of the conversation
+        :param user_id: ID of the user marking messages as read
+        :return: True if successful, False otherwise
+        """
+        try:
+            await self.db.query(MARK_READ_QUERY, {"conversation_id": conversation_id, "user_id": user_id})
+            return True
+        except Exception as e:
+            logger.error(f"Error marking messages as read: {e}")
+            return False
+
+    async def get_users(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Name fields of several users in one query
+
+        :param user_ids: User IDs, with or without the "User:" prefix
+        :return: Rows keyed by both forms of the ID
+        """
+        if not user_ids:
+            return {}
+        return _users_by_id(await self.db.query(*_users_query(sorted(set(user_ids)))))
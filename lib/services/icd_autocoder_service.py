@@ -1,13 +1,23 @@
 """
 ICD Autocoder Service.
 """
+import threading
 from typing import Any, Dict, List, Optional, TypedDict, Union
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 from lib.db.surreal import DbController
+from lib.infra.instrumentation import track_external
 from lib.models.patient.caching import (create_text_hash, get_entity_cache,
                                         store_entity_cache)
 from lib.services.umls_api_service import UMLSApiService
-from settings import UMLS_API_KEY, logger
+from settings import (NER_CLIENT_BATCH_SIZE, NER_TIMEOUT_SECONDS, NER_URL,
+                      UMLS_API_KEY, logger)
+
+_ner_session: Optional[requests.Session] = None
+_ner_session_lock = threading.Lock()
 
 
 class Entity(TypedDict, total=False):
@@ -47,17 +57,102 @@ def deduplicate(entities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return deduped
 
 
+def note_text_to_plain(note_text: Any, note_type: str = 'text') -> str:
+    """
+    Flatten a note to the plain text sent to NER; SOAP notes become labelled sections.
+    :param note_text: The stored note (a string, or a dict of SOAP sections).
+    :param note_type: 'soap' or 'text'.
+    :return: str
+    """
+    if note_type == 'soap' and isinstance(note_text, dict):
+        soap_sections = []
+        for section in ('subjective', 'objective', 'assessment', 'plan'):
+            if note_text.get(section):
+                soap_sections.append(f"{section.capitalize()}: {note_text[section]}")
+        return '\n\n'.join(soap_sections)
+    return str(note_text) if note_text else ""
+
+
+def get_ner_session() -> requests.Session:
+    """
+    Shared HTTP session for the NER service, so connections (and TLS handshakes) are reused across calls.
+    Retries transient failures with backoff; POSTs are retried because extraction is idempotent.
+    :return: requests.Session
+    """
+    global _ner_session
+    if _ner_session is None:
+        with _ner_session_lock:
+            if _ner_session is None:
+                retry = Retry(
+                    total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                    allowed_methods=frozenset({"GET", "POST"}),
+                )
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Content-Type": "application/json"})
+                _ner_session = session
+    return _ner_session
+
+
+def _to_entities(entities: List[Dict[str, Any]]) -> List[Entity]:
+    """
+    Convert NER service output to Entity dicts.
+    """
+    return [
+        Entity(
+            text=entity["text"],
+            label=entity["label"],
+            start_char=entity["start_char"],
+            end_char=entity["end_char"]
+        )
+        for entity in entities
+    ]
+
+
+def ner_extract_batch(texts: List[str], batch_size: int = NER_CLIENT_BATCH_SIZE) -> List[List[Entity]]:
+    """
+    Extract named entities from many texts through the NER service's batch endpoint.
+    :param texts: List of texts.
+    :param batch_size: Texts per request.
+    :return: One list of entities per text, in order.
+    :raises RuntimeError: If a request fails or returns a different number of results than texts sent.
+    """
+    session = get_ner_session()
+    results: List[List[Entity]] = []
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        with track_external("ner", "extract_batch") as call:
+            response = session.post(f"{NER_URL}/extract_batch", json={"texts": batch}, timeout=NER_TIMEOUT_SECONDS)
+            call.ok = response.status_code == 200
+        if response.status_code != 200:
+            raise RuntimeError(f"NER batch extraction failed: {response.text}")
+        batch_results = response.json().get("results", [])
+        if len(batch_results) != len(batch):
+            raise RuntimeError(f"NER batch extraction returned {len(batch_results)} results for {len(batch)} texts")
+        results.extend(_to_entities(r.get("entities", [])) for r in batch_results)
+    return results
+
+
 class ICDAutoCoderService:
     """
     A service for extracting named entities from text using an external NER API and then normalizing them using UMLS.
     The service also performs ICD code matching.
     """
-    def __init__(self, text: str) -> None:
+    def __init__(self, text: str, db: Optional[DbController] = None, umls_service: Optional[UMLSApiService] = None) -> None:
+        """
+        :param text: The note text to code.
+        :param db: Connected DbController to reuse; a new connection is opened if not given.
+        :param umls_service: UMLSApiService to reuse (and share its HTTP session).
+        """
         self.text = text
 
-        self.umls_service = UMLSApiService(api_key=UMLS_API_KEY)
-        self.db = DbController()
-        self.db.connect()
+        self.umls_service = umls_service or UMLSApiService(api_key=UMLS_API_KEY)
+        if db is None:
+            db = DbController()
+            db.connect()
+        self.db = db
 
     def ner_concept_extraction(self, text: str) -> List[Entity]:
         """
@@ -67,13 +162,9 @@ class ICDAutoCoderService:
 
         Returns: {"entities":[{"text":"Patient","label":"ENTITY","start_char":0,"end_char":7},{"text":"Type 2 diabetes mellitus","label":"ENTITY","start_char":22,"end_char":46},{"text":"essential hypertension","label":"ENTITY","start_char":51,"end_char":73}]}
         """
-        import requests
-
-        url = "https://demo.arsmedicatech.com/ner/extract"
-        headers = {"Content-Type": "application/json"}
-        payload = {"text": text}
-
-        response = requests.post(url, json=payload, headers=headers)
+        with track_external("ner", "extract") as call:
+            response = get_ner_session().post(f"{NER_URL}/extract", json={"text": text}, timeout=NER_TIMEOUT_SECONDS)
+            call.ok = response.status_code == 200
         if response.status_code != 200:
             raise RuntimeError(f"NER extraction failed: {response.text}")
 
@@ -82,17 +173,7 @@ class ICDAutoCoderService:
         if not entities:
             raise ValueError("No entities found in the response.")
 
-        ner_output = [
-            Entity(
-                text=entity["text"],
-                label=entity["label"],
-                start_char=entity["start_char"],
-                end_char=entity["end_char"]
-            )
-            for entity in entities
-        ]
-
-        return ner_output
+        return _to_entities(entities)
 
     def normalize_entities(self, ner_entities: List[Entity]) -> List[Entity]:
         """
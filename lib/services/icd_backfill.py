@@ -0,0 +1,394 @@
+"""
+Bulk ICD autocoding of historical encounters.
+
+Streams the encounter table in ID order and, for each page:
+
+1. flattens the note text and groups encounters by ``create_text_hash`` so identical notes are coded once;
+2. serves already-coded texts from ``entity_cache`` in one query and sends the rest to the NER batch endpoint;
+3. looks up each distinct entity string and CUI in UMLS at most once per job (``UMLSLookupCache``);
+4. writes the codes back to every encounter of the page in one statement, stores new cache entries with one INSERT,
+   and checkpoints the last encounter ID so an interrupted run resumes where it stopped.
+
+Per-stage timings are reported as throughput so workers can be sized.
+
+Usage:
+    python -m lib.services.icd_backfill [--batch-size 200] [--limit N] [--restart] [--all]
+"""
+import argparse
+import datetime
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import (Any, Callable, Dict, Iterator, List, Optional, Tuple,
+                    Union)
+
+from celery import shared_task  # type: ignore[import-untyped]
+from surrealdb import RecordID  # type: ignore[import-untyped]
+
+from lib.db.surreal import DbController
+from lib.infra.instrumentation import record_cache
+from lib.models.patient.caching import (create_text_hash, get_entity_caches,
+                                        store_entity_caches)
+from lib.services.icd_autocoder_service import (Entity, deduplicate,
+                                                ner_extract_batch,
+                                                note_text_to_plain)
+from lib.services.umls_api_service import UMLSApiService
+from settings import UMLS_API_KEY, logger
+
+JOB_NAME = "icd_backfill"
+DISEASE_LABEL = "DISEASE"
+DEFAULT_BATCH_SIZE = 200
+
+NerBatchFn = Callable[[List[str]], List[List[Entity]]]
+
+
+def _rows(result: Any) -> List[Dict[str, Any]]:
+    """
+    Flatten query results, accepting both plain rows and the nested ``{'result': [...]}`` shape.
+    """
+    rows: List[Dict[str, Any]] = []
+    for row in result or []:
+        if isinstance(row, dict) and isinstance(row.get("result"), list):
+            rows.extend(row["result"])
+        elif isinstance(row, dict):
+            rows.append(row)
+    return rows
+
+
+def _term_key(text: str) -> str:
+    """
+    Normalise an entity string the same way ``deduplicate`` does.
+    """
+    return text.lower().strip(" .,:;")
+
+
+@dataclass
+class BackfillStats:
+    """
+    Counters and per-stage wall time for a backfill run.
+    """
+    encounters: int = 0
+    unique_texts: int = 0
+    cache_hits: int = 0
+    ner_texts: int = 0
+    entities: int = 0
+    umls_lookups: int = 0
+    written: int = 0
+    pages: int = 0
+    seconds: Dict[str, float] = field(default_factory=lambda: defaultdict(float))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time a block of work under ``name``.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - started
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Summarise the run, with items per second for each stage.
+        :return: Dict[str, Any]
+        """
+        def rate(count: int, stage: str) -> Optional[float]:
+            seconds = self.seconds.get(stage, 0.0)
+            return round(count / seconds, 1) if seconds > 0 else None
+
+        return {
+            "pages": self.pages,
+            "encounters": self.encounters,
+            "unique_texts": self.unique_texts,
+            "cache_hits": self.cache_hits,
+            "ner_texts": self.ner_texts,
+            "entities": self.entities,
+            "umls_lookups": self.umls_lookups,
+            "written": self.written,
+            "seconds": {stage: round(seconds, 3) for stage, seconds in self.seconds.items()},
+            "throughput_per_second": {
+                "fetch": rate(self.encounters, "fetch"),
+                "cache": rate(self.unique_texts, "cache"),
+                "ner": rate(self.ner_texts, "ner"),
+                "umls": rate(self.umls_lookups, "umls"),
+                "write": rate(self.written, "write"),
+            },
+        }
+
+
+class UMLSLookupCache:
+    """
+    Memoises UMLS term-to-concept and CUI-to-ICD-10-CM lookups for the lifetime of a job.
+
+    UMLS is rate limited to 20 requests per second, so each distinct term and CUI is looked up once no matter how
+    many notes mention it.
+    """
+    def __init__(self, umls: UMLSApiService) -> None:
+        self.umls = umls
+        self._concepts: Dict[str, Optional[str]] = {}
+        self._icd: Dict[str, Optional[Tuple[str, str]]] = {}
+        self.lookups = 0
+
+    def cui(self, term: str) -> Optional[str]:
+        """
+        CUI of the best UMLS match for a term.
+        """
+        key = _term_key(term)
+        record_cache("umls_concept", hit=key in self._concepts)
+        if key not in self._concepts:
+            self.lookups += 1
+            concept = self.umls.search_concept(term, sabs=["SNOMEDCT_US", "ICD10CM"])
+            self._concepts[key] = str(concept["cui"]) if concept and concept.get("cui") else None
+        return self._concepts[key]
+
+    def icd10cm(self, cui: str) -> Optional[Tuple[str, str]]:
+        """
+        First ICD-10-CM (code, name) mapped from a CUI.
+        """
+        record_cache("umls_icd10cm", hit=cui in self._icd)
+        if cui not in self._icd:
+            self.lookups += 1
+            matches = self.umls.get_icd10cm_from_cui(cui)
+            self._icd[cui] = (str(matches[0]["code"]), str(matches[0]["name"])) if matches else None
+        return self._icd[cui]
+
+    def code(self, entities: List[Entity]) -> List[Entity]:
+        """
+        Add cui, icd10cm and icd10cm_name to entities.
+        """
+        coded: List[Entity] = []
+        for entity in entities:
+            cui = self.cui(entity["text"])  # type: ignore
+            icd = self.icd10cm(cui) if cui else None
+            coded.append(Entity(
+                text=entity["text"],  # type: ignore
+                label=entity["label"],  # type: ignore
+                start_char=entity.get("start_char", 0),
+                end_char=entity.get("end_char", 0),
+                cui=cui,
+                icd10cm=icd[0] if icd else None,
+                icd10cm_name=icd[1] if icd else None,
+            ))
+        return coded
+
+
+class ICDBackfillJob:
+    """
+    Codes the encounter table page by page, with checkpoints.
+    """
+    def __init__(
+            self,
+            db: DbController,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            only_missing: bool = True,
+            umls: Optional[UMLSApiService] = None,
+            ner: NerBatchFn = ner_extract_batch,
+            job_name: str = JOB_NAME,
+    ) -> None:
+        """
+        :param db: Connected DbController.
+        :param batch_size: Encounters per page.
+        :param only_missing: Skip encounters that were already autocoded.
+        :param umls: UMLS client; one is created from settings if not given.
+        :param ner: Batch NER function.
+        :param job_name: Checkpoint name, so independent runs don't share progress.
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.only_missing = only_missing
+        self.umls_cache = UMLSLookupCache(umls or UMLSApiService(api_key=UMLS_API_KEY))
+        self.ner = ner
+        self.job_name = job_name
+        self.stats = BackfillStats()
+
+    def load_checkpoint(self) -> Optional[str]:
+        """
+        ID of the last encounter a previous run finished, if any.
+        """
+        rows = _rows(self.db.query("SELECT * FROM type::thing('job_checkpoint', $name)", {"name": self.job_name}))
+        return rows[0].get("last_id") if rows else None
+
+    def save_checkpoint(self, last_id: str) -> None:
+        self.db.query(
+            "UPSERT type::thing('job_checkpoint', $name) CONTENT $data",
+            {"name": self.job_name, "data": {
+                "last_id": last_id,
+                "stats": self.stats.report(),
+                "updated_at": datetime.datetime.utcnow().isoformat(),
+            }}
+        )
+
+    def clear_checkpoint(self) -> None:
+        self.db.query("DELETE type::thing('job_checkpoint', $name)", {"name": self.job_name})
+
+    def fetch_page(self, after: Optional[str]) -> List[Dict[str, Any]]:
+        """
+        Next page of encounters after the given ID, in ID order.
+        """
+        conditions = []
+        params: Dict[str, Any] = {"limit": self.batch_size}
+        if after:
+            conditions.append("id > $after")
+            params["after"] = RecordID.parse(after)
+        if self.only_missing:
+            conditions.append("icd_autocoded_at = NONE")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return _rows(self.db.query(
+            f"SELECT id, note_text, note_type FROM encounter{where} ORDER BY id LIMIT $limit", params
+        ))
+
+    def code_texts(self, texts: Dict[str, str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Code distinct texts: cache first, then batched NER and memoised UMLS for the misses.
+        :param texts: Plain text keyed by text hash.
+        :return: Coded entities keyed by text hash.
+        """
+        with self.stats.stage("cache"):
+            cached = get_entity_caches(self.db, list(texts))
+        coded: Dict[str, List[Dict[str, Any]]] = {h: row.get("entities", []) for h, row in cached.items()}
+        self.stats.cache_hits += len(coded)
+
+        missing = [h for h in texts if h not in coded]
+        if not missing:
+            return coded
+
+        with self.stats.stage("ner"):
+            extracted = self.ner([texts[h] for h in missing])
+        self.stats.ner_texts += len(missing)
+
+        fresh: Dict[str, List[Dict[str, Any]]] = {}
+        lookups_before = self.umls_cache.lookups
+        with self.stats.stage("umls"):
+            for text_hash, entities in zip(missing, extracted):
+                diseases = deduplicate([
+                    dict(e) for e in entities if e.get("label") == DISEASE_LABEL
+                ])
+                fresh[text_hash] = [dict(e) for e in self.umls_cache.code(diseases)]  # type: ignore[arg-type]
+        self.stats.umls_lookups += self.umls_cache.lookups - lookups_before
+
+        with self.stats.stage("write"):
+            store_entity_caches(self.db, fresh)
+        coded.update(fresh)
+        return coded
+
+    def write_back(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Write codes to many encounters in one statement.
+        :param rows: [{'id': RecordID, 'codes': [...]}]
+        """
+        self.db.query(
+            "FOR $row IN $rows { UPDATE $row.id MERGE { icd_autocodes: $row.codes, icd_autocoded_at: $now }; };",
+            {"rows": rows, "now": datetime.datetime.utcnow().isoformat()}
+        )
+
+    def process_page(self, encounters: List[Dict[str, Any]]) -> None:
+        """
+        Code one page of encounters and write the results back.
+        """
+        texts: Dict[str, str] = {}
+        hashes: List[Tuple[Any, Optional[str]]] = []
+        for encounter in encounters:
+            text = note_text_to_plain(encounter.get("note_text"), encounter.get("note_type", "text"))
+            if text.strip():
+                text_hash = create_text_hash(text)
+                texts.setdefault(text_hash, text)
+                hashes.append((encounter["id"], text_hash))
+            else:
+                hashes.append((encounter["id"], None))
+        self.stats.unique_texts += len(texts)
+
+        coded = self.code_texts(texts)
+        rows = []
+        for encounter_id, encounter_hash in hashes:
+            entities = coded.get(encounter_hash, []) if encounter_hash else []
+            self.stats.entities += len(entities)
+            rows.append({
+                "id": encounter_id,
+                "codes": [
+                    {key: e.get(key) for key in ("text", "cui", "icd10cm", "icd10cm_name")}
+                    for e in entities if e.get("icd10cm")
+                ],
+            })
+        with self.stats.stage("write"):
+            self.write_back(rows)
+        self.stats.written += len(rows)
+
+    def run(
+            self,
+            limit: Optional[int] = None,
+            restart: bool = False,
+            progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Code encounters until the table (or ``limit``) is exhausted.
+        :param limit: Stop after about this many encounters (whole pages).
+        :param restart: Ignore and clear any saved checkpoint.
+        :param progress: Called with the report after every page.
+        :return: Final report.
+        """
+        if restart:
+            self.clear_checkpoint()
+        last_id = None if restart else self.load_checkpoint()
+        if last_id:
+            logger.info(f"Resuming {self.job_name} after {last_id}")
+
+        while limit is None or self.stats.encounters < limit:
+            with self.stats.stage("fetch"):
+                page = self.fetch_page(last_id)
+            if not page:
+                break
+            self.stats.encounters += len(page)
+            self.process_page(page)
+            self.stats.pages += 1
+            last_id = str(page[-1]["id"])
+            self.save_checkpoint(last_id)
+            report = self.stats.report()
+            logger.info(f"{self.job_name}: {json.dumps(report)}")
+            if progress:
+                progress(report)
+
+        return self.stats.report()
+
+
+@shared_task(bind=True)  # type: ignore[misc]
+def backfill_icd_codes_task(self: Any, batch_size: int = DEFAULT_BATCH_SIZE, limit: Optional[int] = None,
+                            restart: bool = False, only_missing: bool = True) -> Dict[str, Any]:
+    """
+    Celery task running ICDBackfillJob; progress is published as task state.
+    """
+    def publish(report: Dict[str, Any]) -> None:
+        if self.request.id:
+            self.update_state(state="PROGRESS", meta=report)
+
+    db = DbController()
+    db.connect()
+    try:
+        job = ICDBackfillJob(db, batch_size=batch_size, only_missing=only_missing)
+        return job.run(limit=limit, restart=restart, progress=publish)
+    finally:
+        db.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Backfill ICD-10-CM autocodes on existing encounters")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Encounters per page")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after about this many encounters")
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+    parser.add_argument("--all", action="store_true", help="Recode encounters that already have autocodes")
+    args = parser.parse_args(argv)
+
+    db = DbController()
+    db.connect()
+    try:
+        job = ICDBackfillJob(db, batch_size=args.batch_size, only_missing=not args.all)
+        report = job.run(limit=args.limit, restart=args.restart)
+    finally:
+        db.close()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+"""
+Vectorized evaluation of lab results.
+
+Results for any number of patients, analytes and dates are loaded into columnar NumPy arrays (analyte and patient
+as integer codes, values and reference limits converted to each analyte's canonical unit) and flagged in a single
+pass:
+
+- ``LOW`` / ``HIGH``: outside the reference range (an upper bound of ``INF`` means unbounded);
+- ``CRITICAL_LOW`` / ``CRITICAL_HIGH``: beyond the analyte's critical limits;
+- ``DELTA``: relative change from the same patient's previous result for that analyte above the analyte's threshold;
+- ``UNIT_MISMATCH``: the result's unit could not be converted, so it was not evaluated.
+
+Usage:
+    python -m lib.services.lab_evaluation --benchmark 1000000
+"""
+import argparse
+import datetime
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from lib.services.lab_results import (BIL_PER_LITER, G_PER_LITER, INF,
+                                      LITER_PER_LITER, MMOL_PER_LITER,
+                                      PERCENT, TRIL_PER_LITER, UMOL_PER_LITER,
+                                      LabResults, differential_hematology,
+                                      general_chemistry, hematology,
+                                      serum_proteins)
+
+LOW = 1
+HIGH = 2
+CRITICAL_LOW = 4
+CRITICAL_HIGH = 8
+DELTA = 16
+UNIT_MISMATCH = 32
+
+FLAG_NAMES = {
+    LOW: "low",
+    HIGH: "high",
+    CRITICAL_LOW: "critical_low",
+    CRITICAL_HIGH: "critical_high",
+    DELTA: "delta",
+    UNIT_MISMATCH: "unit_mismatch",
+}
+ABNORMAL = LOW | HIGH | CRITICAL_LOW | CRITICAL_HIGH
+
+# Reference ranges and canonical units, taken from the panels in lab_results
+REFERENCE_CATALOGUE: LabResults = {
+    name: result
+    for panel in (hematology, differential_hematology, general_chemistry, serum_proteins)
+    for name, result in panel.items()
+}
+
+# Critical (panic) limits in the canonical unit; None means no limit on that side
+CRITICAL_LIMITS: Dict[str, Tuple[Optional[float], Optional[float]]] = {
+    "WBC": (2.0, 30.0),
+    "Hemoglobin": (70, 200),
+    "Platelet Count": (20, 1000),
+    "Neutrophils": (0.5, None),
+    "Sodium": (120, 160),
+    "Creatinine": (None, 500),
+    "Estimated GFR": (15, None),
+    "Total Bilirubin": (None, 250),
+}
+
+# Relative change from the previous result that triggers a delta flag
+DEFAULT_DELTA_THRESHOLD = 0.5
+DELTA_THRESHOLDS: Dict[str, float] = {
+    "Hemoglobin": 0.2,
+    "Platelet Count": 0.5,
+    "Sodium": 0.05,
+    "Creatinine": 0.5,
+    "Estimated GFR": 0.25,
+}
+
+# Unit families: factor to the family's base unit (g/L, mmol/L, 10*9/L, 10*12/L, L/L)
+MASS_UNITS = {G_PER_LITER: 1.0, "g/dL": 10.0, "mg/dL": 0.01, "mg/L": 0.001, "ug/L": 1e-6}
+MOLAR_UNITS = {MMOL_PER_LITER: 1.0, UMOL_PER_LITER: 0.001, "nmol/L": 1e-6, "mol/L": 1000.0}
+UNIT_FAMILIES = [
+    MASS_UNITS,
+    MOLAR_UNITS,
+    {BIL_PER_LITER: 1.0, "10^9/L": 1.0, "10^3/uL": 1.0, "K/uL": 1.0},
+    {TRIL_PER_LITER: 1.0, "10^12/L": 1.0, "10^6/uL": 1.0, "M/uL": 1.0},
+    {LITER_PER_LITER: 1.0, PERCENT: 0.01},
+]
+
+# Molar masses (g/mol) bridging g/L and mmol/L for analytes reported either way
+MOLAR_MASS: Dict[str, float] = {
+    "Hemoglobin": 16114.5,  # per haem monomer, as used for mmol/L reporting
+    "Creatinine": 113.12,
+    "Total Bilirubin": 584.66,
+    "Conjugated Bilirubin": 584.66,
+    "Sodium": 22.99,
+    "Albumin": 66500.0,
+}
+
+# Results that are relative counts ("%") rather than volume fractions
+PERCENT_NOT_FRACTION = {"RDW"}
+
+
+def conversion_factor(analyte: str, from_unit: Optional[str], to_unit: Optional[str]) -> Optional[float]:
+    """
+    Multiplier converting a value of ``analyte`` from one unit to another.
+    :param analyte: Analyte name (used for molar-mass conversions)
+    :param from_unit: Unit of the value
+    :param to_unit: Target unit
+    :return: float, or None if the units can't be converted
+    """
+    if from_unit == to_unit or from_unit is None or to_unit is None:
+        return 1.0
+    if analyte in PERCENT_NOT_FRACTION and PERCENT in (from_unit, to_unit):
+        return None
+    for family in UNIT_FAMILIES:
+        if from_unit in family and to_unit in family:
+            return family[from_unit] / family[to_unit]
+    molar_mass = MOLAR_MASS.get(analyte)
+    if molar_mass:
+        if from_unit in MASS_UNITS and to_unit in MOLAR_UNITS:
+            return MASS_UNITS[from_unit] * 1000.0 / molar_mass / MOLAR_UNITS[to_unit]
+        if from_unit in MOLAR_UNITS and to_unit in MASS_UNITS:
+            return MOLAR_UNITS[from_unit] * molar_mass / 1000.0 / MASS_UNITS[to_unit]
+    return None
+
+
+def _bound(value: Any, missing: float) -> float:
+    if value is None:
+        return missing
+    value = float(value)
+    return np.inf if value >= INF else value
+
+
+class LabColumns:
+    """
+    Lab results as parallel arrays, with values and limits in each analyte's canonical unit.
+    """
+    def __init__(
+            self,
+            patients: Sequence[str],
+            analytes: Sequence[str],
+            patient: NDArray[np.int32],
+            analyte: NDArray[np.int32],
+            collected: NDArray[np.int64],
+            value: NDArray[np.float64],
+            low: NDArray[np.float64],
+            high: NDArray[np.float64],
+            unconverted: Optional[NDArray[np.bool_]] = None,
+    ) -> None:
+        """
+        :param patients: Patient IDs; ``patient`` holds indices into this list
+        :param analytes: Analyte names; ``analyte`` holds indices into this list
+        :param patient: int32 patient code per result
+        :param analyte: int32 analyte code per result
+        :param collected: int64 collection time per result (any monotonic unit, e.g. epoch seconds)
+        :param value: float64 result
+        :param low: float64 lower reference limit (-inf if none)
+        :param high: float64 upper reference limit (inf if none)
+        :param unconverted: bool per result whose unit could not be converted
+        """
+        self.patients = list(patients)
+        self.analytes = list(analytes)
+        self.patient = patient
+        self.analyte = analyte
+        self.collected = collected
+        self.value = value
+        self.low = low
+        self.high = high
+        self.unconverted = unconverted if unconverted is not None else np.zeros(len(value), dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]]) -> 'LabColumns':
+        """
+        Build columns from result dicts.
+        :param records: Dicts with patient_id, analyte, collected_at (ISO string, datetime or number), result,
+                        and optionally units and reference_range ([low, high]); missing ranges and units come from
+                        REFERENCE_CATALOGUE
+        :return: LabColumns
+        """
+        patient_codes: Dict[str, int] = {}
+        analyte_codes: Dict[str, int] = {}
+        unit_pairs: Dict[Tuple[int, Optional[str]], int] = {}
+        patient, analyte, collected, value, low, high, pair, own_range = [], [], [], [], [], [], [], []
+
+        for record in records:
+            name = record["analyte"]
+            reference = REFERENCE_CATALOGUE.get(name, {})
+            units = record.get("units", reference.get("units"))
+            reference_range = record.get("reference_range")
+            own_range.append(bool(reference_range))
+            if not reference_range:
+                reference_range = reference.get("reference_range") or [None, None]
+            analyte_code = analyte_codes.setdefault(name, len(analyte_codes))
+
+            patient.append(patient_codes.setdefault(str(record["patient_id"]), len(patient_codes)))
+            analyte.append(analyte_code)
+            collected.append(_epoch_seconds(record.get("collected_at")))
+            result = record.get("result")
+            value.append(np.nan if result is None else float(result))
+            low.append(_bound(reference_range[0], -np.inf))
+            high.append(_bound(reference_range[1], np.inf))
+            pair.append(unit_pairs.setdefault((analyte_code, units), len(unit_pairs)))
+
+        analytes = sorted(analyte_codes, key=analyte_codes.__getitem__)
+        factors = np.empty(len(unit_pairs), dtype=np.float64)
+        for (analyte_code, units), index in unit_pairs.items():
+            name = analytes[analyte_code]
+            factor = conversion_factor(name, units, REFERENCE_CATALOGUE.get(name, {}).get("units", units))
+            factors[index] = np.nan if factor is None else factor
+
+        row_factor = factors[np.asarray(pair, dtype=np.int64)] if pair else np.empty(0)
+        # Ranges given with a result are in its unit; catalogue ranges are already canonical.
+        range_factor = np.where(np.asarray(own_range, dtype=bool), row_factor, 1.0)
+        return cls(
+            patients=sorted(patient_codes, key=patient_codes.__getitem__),
+            analytes=analytes,
+            patient=np.asarray(patient, dtype=np.int32),
+            analyte=np.asarray(analyte, dtype=np.int32),
+            collected=np.asarray(collected, dtype=np.int64),
+            value=np.asarray(value, dtype=np.float64) * row_factor,
+            low=np.asarray(low, dtype=np.float64) * range_factor,
+            high=np.asarray(high, dtype=np.float64) * range_factor,
+            unconverted=np.isnan(row_factor),
+        )
+
+    @classmethod
+    def from_panels(cls, patient_id: str, collected_at: Any, **panels: LabResults) -> 'LabColumns':
+        """
+        Build columns from nested panel dicts (as in lab_results) for one patient and collection time.
+        """
+        return cls.from_records(
+            {"patient_id": patient_id, "collected_at": collected_at, "analyte": name, **result}
+            for panel in panels.values()
+            for name, result in panel.items()
+        )
+
+
+def _epoch_seconds(value: Any) -> int:
+    """
+    Seconds since the epoch for an ISO string, date, datetime (naive means UTC) or number.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp())
+
+
+def _per_analyte(analytes: Sequence[str], values: Dict[str, Any], pick: int, default: float) -> NDArray[np.float64]:
+    table = np.full(len(analytes), default, dtype=np.float64)
+    for code, name in enumerate(analytes):
+        limit = values.get(name)
+        if isinstance(limit, tuple):
+            limit = limit[pick]
+        if limit is not None:
+            table[code] = limit
+    return table
+
+
+def _series_order(columns: LabColumns) -> NDArray[np.intp]:
+    """
+    Row order sorted by (patient, analyte, collection time).
+    """
+    k = max(len(columns.analytes), 1)
+    start = int(columns.collected.min())
+    span = int(columns.collected.max()) - start
+    if len(columns.patients) * k < 2 ** 31 and span < 2 ** 32:
+        # Pack the three keys into one int64: a single argsort is several times faster than lexsort.
+        key = (columns.patient.astype(np.int64) * k + columns.analyte) << 32 | (columns.collected - start)
+        return np.argsort(key, kind="stable")
+    return np.lexsort((columns.collected, columns.analyte, columns.patient))
+
+
+class LabEvaluation:
+    """
+    Flags and deltas for every result in a LabColumns.
+    """
+    def __init__(self, columns: LabColumns, flags: NDArray[np.uint8], previous: NDArray[np.float64]) -> None:
+        self.columns = columns
+        self.flags = flags
+        self.previous = previous
+
+    def summary(self) -> Dict[str, Dict[str, int]]:
+        """
+        Population-level counts per analyte: results, each flag, and distinct patients with an abnormal result.
+        :return: {analyte: {'results': n, 'low': n, ..., 'patients_flagged': n}}
+        """
+        cols = self.columns
+        k = len(cols.analytes)
+        totals = {"results": np.bincount(cols.analyte, minlength=k)}
+        for bit, name in FLAG_NAMES.items():
+            totals[name] = np.bincount(cols.analyte[(self.flags & bit) != 0], minlength=k)
+
+        abnormal = (self.flags & ABNORMAL) != 0
+        pairs = np.unique(cols.patient[abnormal].astype(np.int64) * k + cols.analyte[abnormal])
+        totals["patients_flagged"] = np.bincount(pairs % k, minlength=k) if k else np.zeros(0, dtype=np.intp)
+
+        return {
+            name: {key: int(counts[code]) for key, counts in totals.items()}
+            for code, name in enumerate(cols.analytes)
+        }
+
+    def to_records(self, flagged_only: bool = True, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Results as dicts with their flag names, for display.
+        :param flagged_only: Only include results with at least one flag
+        :param limit: Maximum number of results
+        :return: List of dicts
+        """
+        cols = self.columns
+        rows = np.flatnonzero(self.flags) if flagged_only else np.arange(len(cols))
+        if limit is not None:
+            rows = rows[:limit]
+        return [
+            {
+                "patient_id": cols.patients[cols.patient[i]],
+                "analyte": cols.analytes[cols.analyte[i]],
+                "collected_at": int(cols.collected[i]),
+                "result": None if np.isnan(cols.value[i]) else float(cols.value[i]),
+                "previous": None if np.isnan(self.previous[i]) else float(self.previous[i]),
+                "flags": [name for bit, name in FLAG_NAMES.items() if self.flags[i] & bit],
+            }
+            for i in rows
+        ]
+
+
+def evaluate(
+        columns: LabColumns,
+        critical_limits: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+        delta_thresholds: Optional[Dict[str, float]] = None,
+) -> LabEvaluation:
+    """
+    Flag every result in one vectorized pass.
+    :param columns: LabColumns to evaluate
+    :param critical_limits: Critical limits per analyte (defaults to CRITICAL_LIMITS)
+    :param delta_thresholds: Relative delta thresholds per analyte (defaults to DELTA_THRESHOLDS)
+    :return: LabEvaluation
+    """
+    critical_limits = CRITICAL_LIMITS if critical_limits is None else critical_limits
+    delta_thresholds = DELTA_THRESHOLDS if delta_thresholds is None else delta_thresholds
+    analytes = columns.analytes
+    value = columns.value
+    n = len(columns)
+
+    flags = np.zeros(n, dtype=np.uint8)
+    with np.errstate(invalid="ignore"):
+        flags |= (value < columns.low).astype(np.uint8) * LOW
+        flags |= (value > columns.high).astype(np.uint8) * HIGH
+        flags |= (value < _per_analyte(analytes, critical_limits, 0, -np.inf)[columns.analyte]).astype(np.uint8) \
+            * CRITICAL_LOW
+        flags |= (value > _per_analyte(analytes, critical_limits, 1, np.inf)[columns.analyte]).astype(np.uint8) \
+            * CRITICAL_HIGH
+    flags |= columns.unconverted.astype(np.uint8) * UNIT_MISMATCH
+
+    # Previous result of the same patient and analyte: sort by (patient, analyte, time) and shift by one.
+    previous = np.full(n, np.nan)
+    if n > 1:
+        order = _series_order(columns)
+        p = columns.patient[order]
+        a = columns.analyte[order]
+        same_series = (p[1:] == p[:-1]) & (a[1:] == a[:-1])
+        shifted = np.full(n, np.nan)
+        shifted[1:] = np.where(same_series, value[order][:-1], np.nan)
+        previous[order] = shifted
+
+    thresholds = _per_analyte(analytes, delta_thresholds, 0, DEFAULT_DELTA_THRESHOLD)[columns.analyte]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = np.abs(value - previous) / np.abs(previous)
+        change = np.where((previous == 0) & (value != 0), np.inf, change)
+        flags |= (change > thresholds).astype(np.uint8) * DELTA
+
+    return LabEvaluation(columns, flags, previous)
+
+
+def synthetic_columns(n: int, patients: int = 20000, seed: int = 0) -> LabColumns:
+    """
+    Random results for the catalogue's analytes, for benchmarking.
+    :param n: Number of results
+    :param patients: Number of distinct patients
+    :param seed: Random seed
+    :return: LabColumns
+    """
+    rng = np.random.default_rng(seed)
+    analytes = list(REFERENCE_CATALOGUE)
+    low = np.array([_bound(REFERENCE_CATALOGUE[a]["reference_range"][0], -np.inf) for a in analytes])
+    high = np.array([_bound(REFERENCE_CATALOGUE[a]["reference_range"][1], np.inf) for a in analytes])
+    centre = np.where(np.isfinite(high), (low + high) / 2, low * 1.5)
+    spread = np.where(np.isfinite(high), (high - low) / 2, low / 2)
+
+    analyte = rng.integers(0, len(analytes), n, dtype=np.int32)
+    return LabColumns(
+        patients=[f"patient:{i}" for i in range(patients)],
+        analytes=analytes,
+        patient=rng.integers(0, patients, n, dtype=np.int32),
+        analyte=analyte,
+        collected=rng.integers(1_500_000_000, 1_700_000_000, n, dtype=np.int64),
+        value=centre[analyte] + rng.normal(0, 1.2, n) * spread[analyte],
+        low=low[analyte],
+        high=high[analyte],
+    )
+
+
+def benchmark(n: int = 1_000_000, patients: int = 20000, repeat: int = 3) -> Dict[str, float]:
+    """
+    Time ``evaluate`` and ``summary`` over synthetic results.
+    :return: Best wall time in seconds and results per second
+    """
+    columns = synthetic_columns(n, patients)
+    best_evaluate = best_summary = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        evaluation = evaluate(columns)
+        best_evaluate = min(best_evaluate, time.perf_counter() - started)
+        started = time.perf_counter()
+        evaluation.summary()
+        best_summary = min(best_summary, time.perf_counter() - started)
+    return {
+        "results": n,
+        "evaluate_seconds": round(best_evaluate, 4),
+        "summary_seconds": round(best_summary, 4),
+        "results_per_second": round(n / best_evaluate),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark vectorized lab-result evaluation")
+    parser.add_argument("--benchmark", type=int, default=1_000_000, help="Number of synthetic results")
+    parser.add_argument("--patients", type=int, default=20000, help="Number of distinct patients")
+    args = parser.parse_args(argv)
+    print(benchmark(args.benchmark, args.patients))
+
+
+if __name__ == "__main__":
+    main()
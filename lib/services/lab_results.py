@@ -85,3 +85,20 @@ class LabResultsService:
             lab_results: A dictionary of lab results.
         """
         self.lab_results = lab_results
+
+    def flagged(self, patient_id: str = "", collected_at: Any = 0) -> Dict[str, LabResults]:
+        """
+        The lab results with a list of ``flags`` (see lab_evaluation.FLAG_NAMES) added to each result.
+
+        Args:
+            patient_id: Patient the results belong to.
+            collected_at: Collection time of the results.
+        """
+        from lib.services.lab_evaluation import LabColumns, evaluate
+
+        columns = LabColumns.from_panels(patient_id, collected_at, **self.lab_results)
+        rows = iter(evaluate(columns).to_records(flagged_only=False))
+        return {
+            panel_name: {name: {**result, "flags": next(rows)["flags"]} for name, result in panel.items()}
+            for panel_name, panel in self.lab_results.items()
+        }
@@ -1,13 +1,35 @@
 """
 LLM Chat Service
 """
-from typing import List, Optional
+from typing import Any, List, Optional
 
 from lib.data_types import UserID
-from lib.db.surreal import DbController
+from lib.db.surreal import AsyncDbController, DbController
 from lib.models.llm_chat import LLMChat
 from settings import logger
 
+USER_CHATS_QUERY = "SELECT * FROM LLMChat WHERE user_id = $user_id"
+CHAT_QUERY = "SELECT * FROM LLMChat WHERE user_id = $user_id AND assistant_id = $assistant_id"
+
+
+def _chats(result: Any) -> List[LLMChat]:
+    """
+    LLMChat objects from query rows
+    """
+    if not result or not isinstance(result, list):
+        return []
+    return [LLMChat.from_dict(chat_data) for chat_data in result if isinstance(chat_data, dict)]
+
+
+def _chat_record(chat: LLMChat) -> str:
+    """
+    Record ID of a saved chat
+    """
+    chat_id: str = chat.id or ""
+    if not chat_id:
+        raise ValueError("Chat ID is not set")
+    return f"LLMChat:{chat_id.split(':', 1)[1]}"
+
 
 class LLMChatService:
     """
@@ -46,16 +68,7 @@ class LLMChatService:
         :param user_id: UserID - The ID of the user for whom to retrieve chats.
         :return: List[LLMChat] - A list of LLMChat objects for the specified user.
         """
-        result = self.db.query(
-            "SELECT * FROM LLMChat WHERE user_id = $user_id",
-            {"user_id": user_id}
-        )
-        chats = []
-        if result and isinstance(result, list):
-            for chat_data in result:
-                if isinstance(chat_data, dict):
-                    chats.append(LLMChat.from_dict(chat_data))
-        return chats
+        return _chats(self.db.query(USER_CHATS_QUERY, {"user_id": user_id}))
 
     def get_llm_chat(self, user_id: UserID, assistant_id: str) -> Optional[LLMChat]:
         """
@@ -65,13 +78,8 @@ class LLMChatService:
         :param assistant_id: str - The ID of the assistant.
         :return: Optional[LLMChat] - The LLMChat object if found, otherwise None.
         """
-        result = self.db.query(
-            "SELECT * FROM LLMChat WHERE user_id = $user_id AND assistant_id = $assistant_id",
-            {"user_id": user_id, "assistant_id": assistant_id}
-        )
-        if result and isinstance(result, list) and len(result) > 0:
-            return LLMChat.from_dict(result[0])
-        return None
+        chats = _chats(self.db.query(CHAT_QUERY, {"user_id": user_id, "assistant_id": assistant_id}))
+        return chats[0] if chats else None
 
     def create_llm_chat(self, user_id: UserID, assistant_id: str) -> LLMChat:
         """
@@ -103,9 +111,59 @@ class LLMChatService:
             chat = self.create_llm_chat(user_id, assistant_id)
         chat.add_message(sender, text, used_tools)
         # Save updated chat
-        chat_id: str = chat.id or ""
-        if not chat_id:
-            raise ValueError("Chat ID is not set")
-        
-        self.db.update(f"LLMChat:{chat_id.split(':', 1)[1]}", chat.to_dict())
-        return chat 
\ No newline at end of file
+        self.db.update(_chat_record(chat), chat.to_dict())
+        return chat 
+
+
+class AsyncLLMChatService:
+    """
+    LLMChatService for async views, on a pooled AsyncDbController
+    """
+    def __init__(self, db: AsyncDbController) -> None:
+        """
+        :param db: AsyncDbController - Connected controller (see lib.db.async_pool).
+        :return: None
+        """
+        self.db = db
+
+    async def get_llm_chats_for_user(self, user_id: UserID) -> List[LLMChat]:
+        """
+        Get all LLM chats for a user
+
+        :param user_id: UserID - The ID of the user for whom to retrieve chats.
+        :return: List[LLMChat] - A list of LLMChat objects for the specified user.
+        """
+        return _chats(await self.db.query(USER_CHATS_QUERY, {"user_id": user_id}))
+
+    async def get_llm_chat(self, user_id: UserID, assistant_id: str) -> Optional[LLMChat]:
+        """
+        Get a specific LLM chat for a user and assistant
+
+        :param user_id: UserID - The ID of the user.
+        :param assistant_id: str - The ID of the assistant.
+        :return: Optional[LLMChat] - The LLMChat object if found, otherwise None.
+        """
+        chats = _chats(await self.db.query(CHAT_QUERY, {"user_id": user_id, "assistant_id": assistant_id}))
+        return chats[0] if chats else None
+
+    async def add_message(self, user_id: UserID, assistant_id: str, sender: str, text: str,
+                          used_tools: Optional[List[str]] = None) -> LLMChat:
+        """
+        Add a message to the LLM chat, creating the chat if needed
+
+        :param user_id: UserID - The ID of the user.
+        :param assistant_id: str - The ID of the assistant.
+        :param sender: str - The sender of the message (e.g., 'user' or 'assistant').
+        :param text: str - The content of the message.
+        :param used_tools: Optional list of tools used in this message.
+        :return: LLMChat - The updated LLMChat object with the new message added.
+        """
+        chat = await self.get_llm_chat(user_id, assistant_id)
+        if not chat:
+            chat = LLMChat(user_id=user_id, assistant_id=assistant_id)
+            result = await self.db.create('LLMChat', chat.to_dict())
+            if result and isinstance(result, dict):
+                chat.id = result.get('id')
+        chat.add_message(sender, text, used_tools)
+        await self.db.update(_chat_record(chat), chat.to_dict())
+        return chat
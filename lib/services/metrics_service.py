@@ -1,33 +1,154 @@
 """
 Service for handling user health metrics (KPI) persistence and retrieval using SurrealDB.
+
+Metric sets are stored as per-day ``MetricSet`` documents and, for trends, as typed points in the ``metric_point``
+time-series table. Points are keyed by (user, metric, timestamp), so writes are idempotent upserts, and series are
+read with one range query that can be downsampled to daily, weekly or monthly aggregates in the database.
+"""
+import datetime
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from lib.db.surreal import DbController, Transaction
+from lib.models.metrics import Metric, MetricSet, to_timestamp
+from settings import logger
+
+RESOLUTIONS = ('raw', 'day', 'week', 'month')
+
+# Bucket start for each resolution. Weeks start on Monday: the Unix epoch was a Thursday, so shift by 3 days
+# before flooring to a week and back afterwards.
+BUCKET_EXPRESSIONS = {
+    'day': 'time::floor(timestamp, 1d)',
+    'week': 'time::floor(timestamp + 3d, 1w) - 3d',
+    'month': "time::group(timestamp, 'month')",
+}
+
+UPSERT_POINTS = """
+FOR $point IN $points {
+    UPSERT type::thing('metric_point', [$point.user_id, $point.metric_name, <datetime>$point.timestamp]) CONTENT {
+        user_id: $point.user_id,
+        metric_name: $point.metric_name,
+        timestamp: <datetime>$point.timestamp,
+        value: $point.value,
+        text_value: $point.text_value,
+        unit: $point.unit,
+        range_low: $point.range_low,
+        range_high: $point.range_high
+    };
+};
 """
-from typing import Any, Dict, List
 
-from lib.db.surreal import DbController
-from lib.models.metrics import Metric, MetricSet
+# A replaced set's points all share its timestamp; points of metrics no longer in the set are removed with it.
+DELETE_DROPPED_POINTS = (
+    "DELETE metric_point WHERE user_id = $user_id AND timestamp = <datetime>$timestamp "
+    "AND metric_name NOTINSIDE $metric_names"
+)
+
+SERIES_FILTER = (
+    "user_id = $user_id AND metric_name IN $metric_names "
+    "AND timestamp >= <datetime>$start AND timestamp < <datetime>$end"
+)
+
+
+@contextmanager
+def metrics_db(db: Optional[DbController] = None) -> Iterator[DbController]:
+    """
+    Yield a connected DbController: the given one, or a new connection that is closed afterwards.
+    :param db: Optional connected DbController to reuse
+    """
+    if db is not None:
+        yield db
+        return
+    db = DbController()
+    db.connect()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def _rows(result: Any) -> List[Dict[str, Any]]:
+    """
+    Flatten query results, accepting both plain rows and the nested ``{'result': [...]}`` shape.
+    """
+    rows: List[Dict[str, Any]] = []
+    for row in result or []:
+        if isinstance(row, dict) and isinstance(row.get('result'), list):
+            rows.extend(row['result'])
+        elif isinstance(row, dict):
+            rows.append(row)
+    return rows
+
+
+def _iso(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return to_timestamp(value)
+    return str(value) if value is not None and not isinstance(value, (int, float, str)) else value
 
-# Initialize DB controller (ensure connect is called once at startup)
-db = DbController()
-db.connect()
 
-def save_user_metric_set(user_id: str, date: str, metrics: List[Dict[str, Any]]) -> None:
+def _metric_set_transaction(metric_set: MetricSet, replace_existing: bool) -> Transaction:
+    # The MetricSet and its points are written in one round trip, without reading the set first.
+    tx = Transaction()
+    if replace_existing:
+        tx.add("LET $existing = (SELECT VALUE id FROM MetricSet WHERE user_id = $user_id AND date = $date LIMIT 1)",
+               {"user_id": metric_set.user_id, "date": metric_set.date})
+        tx.add("IF array::len($existing) > 0 { UPDATE $existing[0] CONTENT $metric_set } "
+               "ELSE { CREATE MetricSet CONTENT $metric_set }", {"metric_set": metric_set.to_dict()})
+        tx.add(DELETE_DROPPED_POINTS, {"user_id": metric_set.user_id, "timestamp": to_timestamp(metric_set.date),
+                                       "metric_names": [metric.metric_name for metric in metric_set.metrics]})
+    else:
+        tx.add("CREATE MetricSet CONTENT $metric_set", {"metric_set": metric_set.to_dict()})
+    points = [point.to_dict() for point in metric_set.to_points()]
+    if points:
+        tx.add(UPSERT_POINTS, {"points": points})
+    return tx
+
+
+def save_user_metric_set(user_id: str, date: str, metrics: List[Dict[str, Any]], db: Optional[DbController] = None) -> None:
     """
     Save a metric set for a user for a given date.
     :param user_id: The user's ID
     :param date: The date for the metric set (ISO string)
     :param metrics: List of metric dicts
+    :param db: Optional connected DbController to reuse
     """
     metric_objs = [Metric(**m) for m in metrics]
     metric_set = MetricSet(user_id=user_id, date=date, metrics=metric_objs)
-    db.create('MetricSet', metric_set.to_dict())
+    with metrics_db(db) as conn:
+        conn.execute(_metric_set_transaction(metric_set, replace_existing=False))
 
-def get_user_metric_sets(user_id: str) -> List[Dict[str, Any]]:
+
+def get_user_metric_sets(
+        user_id: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: Optional[int] = None,
+        db: Optional[DbController] = None
+) -> List[Dict[str, Any]]:
     """
-    Retrieve all metric sets for a user.
+    Retrieve metric sets for a user, newest first.
     :param user_id: The user's ID
+    :param start: Optional first date to include (ISO string)
+    :param end: Optional last date to include (ISO string)
+    :param limit: Optional maximum number of sets
+    :param db: Optional connected DbController to reuse
     :return: List of metric set dicts
     """
-    results = db.query("SELECT * FROM MetricSet WHERE user_id = $user_id", {"user_id": user_id})
+    conditions = ["user_id = $user_id"]
+    params: Dict[str, Any] = {"user_id": user_id}
+    if start:
+        conditions.append("date >= $start")
+        params["start"] = start
+    if end:
+        conditions.append("date <= $end")
+        params["end"] = end
+    statement = f"SELECT * FROM MetricSet WHERE {' AND '.join(conditions)} ORDER BY date DESC"
+    if limit:
+        statement += " LIMIT $limit"
+        params["limit"] = int(limit)
+
+    with metrics_db(db) as conn:
+        results = _rows(conn.query(statement, params))
 
     # Convert RecordID to string
     for result in results:
@@ -36,33 +157,146 @@ def get_user_metric_sets(user_id: str) -> List[Dict[str, Any]]:
 
     return results
 
-def get_user_metric_set_by_date(user_id: str, date: str) -> Dict[str, Any]:
+def get_user_metric_set_by_date(user_id: str, date: str, db: Optional[DbController] = None) -> Dict[str, Any]:
     """
     Retrieve the metric set for a user on a specific date.
     :param user_id: The user's ID
     :param date: The date (ISO string)
+    :param db: Optional connected DbController to reuse
     :return: Metric set dict or empty dict
     """
-    results = db.query(
-        "SELECT * FROM MetricSet WHERE user_id = $user_id AND date = $date",
-        {"user_id": user_id, "date": date}
-    )
+    with metrics_db(db) as conn:
+        results = conn.query(
+            "SELECT * FROM MetricSet WHERE user_id = $user_id AND date = $date LIMIT 1",
+            {"user_id": user_id, "date": date}
+        )
     if results and 'result' in results[0]:
         result_list = results[0]['result']
         return result_list[0] if result_list else {}
     return results[0] if results else {}
 
-def upsert_user_metric_set_by_date(user_id: str, date: str, metrics: List[Dict[str, Any]]) -> None:
+def upsert_user_metric_set_by_date(user_id: str, date: str, metrics: List[Dict[str, Any]], db: Optional[DbController] = None) -> None:
     """
-    Create or update the metric set for a user on a specific date.
+    Create or update the metric set for a user on a specific date. Points of metrics missing from the new set are
+    deleted, so the time series matches the set.
     :param user_id: The user's ID
     :param date: The date (ISO string)
     :param metrics: List of metric dicts
+    :param db: Optional connected DbController to reuse
     """
-    existing = get_user_metric_set_by_date(user_id, date)
     metric_objs = [Metric(**m) for m in metrics]
     metric_set = MetricSet(user_id=user_id, date=date, metrics=metric_objs)
-    if existing and existing.get('id'):
-        db.update(f"MetricSet:{existing['id']}", metric_set.to_dict())
+    with metrics_db(db) as conn:
+        conn.execute(_metric_set_transaction(metric_set, replace_existing=True))
+
+
+def record_metric_points(metric_set: MetricSet, db: Optional[DbController] = None) -> int:
+    """
+    Write a metric set's values to the time-series table (idempotent per user, metric and timestamp).
+    :param metric_set: MetricSet to record
+    :param db: Optional connected DbController to reuse
+    :return: Number of points written
+    """
+    points = [point.to_dict() for point in metric_set.to_points()]
+    if not points:
+        return 0
+    with metrics_db(db) as conn:
+        conn.query(UPSERT_POINTS, {"points": points})
+    return len(points)
+
+
+def _series_params(user_id: str, metric_names: List[str], start: str, end: str) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "metric_names": list(metric_names),
+        "start": to_timestamp(start),
+        "end": to_timestamp(end),
+    }
+
+
+def get_metric_series(
+        user_id: str,
+        metric_names: List[str],
+        start: str,
+        end: str,
+        resolution: str = 'raw',
+        db: Optional[DbController] = None
+) -> Dict[str, Dict[str, List[Any]]]:
+    """
+    Values of several metrics over a time range, as columns per metric, in one query.
+
+    With a resolution other than ``raw`` the points are aggregated per day, week (starting Monday) or month in the
+    database, so multi-year charts transfer one row per bucket. Non-numeric values are ignored by the aggregates.
+
+    :param user_id: The user's ID
+    :param metric_names: Metrics to load
+    :param start: Start of the range, inclusive (ISO date or datetime)
+    :param end: End of the range, exclusive (ISO date or datetime)
+    :param resolution: 'raw', 'day', 'week' or 'month'
+    :param db: Optional connected DbController to reuse
+    :return: {metric_name: {'timestamp': [...], 'value': [...]}} for raw, or
+             {metric_name: {'timestamp': [...], 'avg': [...], 'min': [...], 'max': [...], 'count': [...]}}
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    if not metric_names:
+        return {}
+
+    if resolution == 'raw':
+        statement = (
+            f"SELECT metric_name, timestamp, value, text_value FROM metric_point WHERE {SERIES_FILTER} "
+            "ORDER BY metric_name, timestamp"
+        )
+        columns: Tuple[str, ...] = ('value', 'text_value')
     else:
-        db.create('MetricSet', metric_set.to_dict())
+        statement = (
+            "SELECT metric_name, bucket AS timestamp, math::mean(value) AS avg, math::min(value) AS min, "
+            "math::max(value) AS max, count() AS count "
+            f"FROM (SELECT metric_name, value, {BUCKET_EXPRESSIONS[resolution]} AS bucket FROM metric_point "
+            f"WHERE {SERIES_FILTER} AND value != NONE) "
+            "GROUP BY metric_name, bucket ORDER BY metric_name, timestamp"
+        )
+        columns = ('avg', 'min', 'max', 'count')
+
+    with metrics_db(db) as conn:
+        rows = _rows(conn.query(statement, _series_params(user_id, metric_names, start, end)))
+
+    series: Dict[str, Dict[str, List[Any]]] = {
+        name: {column: [] for column in ('timestamp',) + columns} for name in metric_names
+    }
+    for row in rows:
+        target = series.get(row.get('metric_name') or '')
+        if target is None:
+            continue
+        target['timestamp'].append(_iso(row.get('timestamp')))
+        for column in columns:
+            target[column].append(row.get(column))
+    return series
+
+
+def export_metric_columns(
+        user_id: str,
+        start: str,
+        end: str,
+        metric_names: Optional[List[str]] = None,
+        db: Optional[DbController] = None
+) -> Dict[str, List[Any]]:
+    """
+    Export a user's points as parallel columns, ordered by metric and time.
+    :param user_id: The user's ID
+    :param start: Start of the range, inclusive (ISO date or datetime)
+    :param end: End of the range, exclusive (ISO date or datetime)
+    :param metric_names: Optional metrics to include (all by default)
+    :param db: Optional connected DbController to reuse
+    :return: {'metric_name': [...], 'timestamp': [...], 'value': [...], 'text_value': [...], 'unit': [...]}
+    """
+    columns = ('metric_name', 'timestamp', 'value', 'text_value', 'unit')
+    params = _series_params(user_id, metric_names or [], start, end)
+    where = SERIES_FILTER if metric_names else SERIES_FILTER.replace("AND metric_name IN $metric_names ", "")
+    with metrics_db(db) as conn:
+        rows = _rows(conn.query(
+            f"SELECT {', '.join(columns)} FROM metric_point WHERE {where} ORDER BY metric_name, timestamp",
+            params
+        ))
+    logger.debug("Exporting %d metric points for %s", len(rows), user_id)
+    return {column: [_iso(row.get(column)) for row in rows] for column in columns}
@@ -1,12 +1,113 @@
 """
 Notifications Service
+
+Buffered events are appended to a per-user Redis Stream (``user:{id}:event_stream``) so reconnecting clients can
+resume from their Last-Event-ID with XRANGE, and are then published on the user's ``user:{id}`` channel. Published
+messages carry the stream ID in front of the JSON payload (``"<stream-id> <json>"``); unbuffered events are published
+as plain JSON.
 """
 import json
-from typing import Any
+from typing import Any, List, Optional, Tuple
 
 from lib.data_types import EventData, UserID
 from lib.services.redis_client import get_redis_connection
 
+EVENT_TTL_SECONDS = 60 * 60  # Keep messages for 1 hour
+EVENT_STREAM_MAXLEN = 500
+REPLAY_LIMIT = 500
+
+
+def event_channel(user_id: UserID) -> str:
+    """
+    Pub/sub channel for a user's live events.
+    :param user_id: UserID - The ID of the user.
+    :return: str
+    """
+    return f"user:{user_id}"
+
+def event_stream_key(user_id: UserID) -> str:
+    """
+    Redis Stream key holding a user's recent events for replay.
+    :param user_id: UserID - The ID of the user.
+    :return: str
+    """
+    return f"user:{user_id}:event_stream"
+
+def encode_live_message(stream_id: str, payload: str) -> str:
+    """
+    Prefix a published payload with its stream ID.
+    :param stream_id: str - The ID returned by XADD.
+    :param payload: str - The event JSON.
+    :return: str
+    """
+    return f"{stream_id} {payload}"
+
+def decode_live_message(message: str) -> Tuple[Optional[str], str]:
+    """
+    Split a published message into its stream ID (if any) and JSON payload.
+    :param message: str - The raw pub/sub message data.
+    :return: Tuple[Optional[str], str]
+    """
+    if message.startswith("{") or " " not in message:
+        return None, message
+    stream_id, payload = message.split(" ", 1)
+    return stream_id, payload
+
+def parse_stream_id(stream_id: str) -> Tuple[int, int]:
+    """
+    Parse a Redis Stream ID into a comparable (milliseconds, sequence) tuple.
+    :param stream_id: str - e.g. "1718000000000-3".
+    :return: Tuple[int, int]
+    """
+    ms, _, seq = stream_id.partition("-")
+    return int(ms), int(seq or 0)
+
+def replay_start_id(last_event_id: Optional[str] = None, since: Optional[str] = None) -> Optional[str]:
+    """
+    Work out the first stream ID a reconnecting client still needs.
+
+    ``last_event_id`` wins; otherwise a legacy ``since`` timestamp (seconds) is mapped onto the millisecond part of
+    stream IDs. A client that sends neither (such as on its first connection) gets the whole retained buffer.
+    Returns None when the cursor cannot be parsed, in which case nothing is replayed.
+    :param last_event_id: Optional[str] - The Last-Event-ID the client saw.
+    :param since: Optional[str] - Unix timestamp in seconds of the last event the client saw.
+    :return: Optional[str] - Inclusive XRANGE start.
+    """
+    if last_event_id:
+        try:
+            ms, seq = parse_stream_id(last_event_id)
+        except ValueError:
+            return None
+        return f"{ms}-{seq + 1}"
+    if since:
+        try:
+            return f"{int(float(since) * 1000) + 1}-0"
+        except ValueError:
+            return None
+    return "-"
+
+def format_sse(payload: str, event_id: Optional[str] = None) -> str:
+    """
+    Format one Server-Sent Events frame.
+    :param payload: str - The event JSON.
+    :param event_id: Optional[str] - The stream ID to send as the SSE id.
+    :return: str
+    """
+    if event_id:
+        return f"id: {event_id}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+def replay_events(redis: Any, user_id: UserID, start_id: str, limit: int = REPLAY_LIMIT) -> List[Tuple[str, str]]:
+    """
+    Read buffered events from ``start_id`` onwards.
+    :param redis: redis.Redis - Connection with decoded responses.
+    :param user_id: UserID - The ID of the user.
+    :param start_id: str - Inclusive start stream ID.
+    :param limit: int - Maximum number of events to return.
+    :return: List[Tuple[str, str]] - (stream ID, event JSON) pairs.
+    """
+    entries = redis.xrange(event_stream_key(user_id), min=start_id, max="+", count=limit)
+    return [(entry_id, fields["data"]) for entry_id, fields in entries]
 
 def publish_event(user_id: UserID, event_data: EventData) -> None:
     """
@@ -16,29 +117,35 @@ def publish_event(user_id: UserID, event_data: EventData) -> None:
     :return: None
     """
     redis: Any = get_redis_connection()
-    channel: str = f"user:{user_id}"
+    channel: str = event_channel(user_id)
     message: str = json.dumps(event_data)
     redis.publish(channel, message)
 
-def store_event(user_id: UserID, event_data: EventData) -> None:
+def store_event(user_id: UserID, event_data: EventData) -> str:
     """
     Store an event in Redis for a specific user.
     :param user_id: UserID - The ID of the user to whom the event is being stored.
     :param event_data: EventData - The data of the event to be stored.
-    :return: None
+    :return: str - The stream ID of the stored event.
     """
-    redis = get_redis_connection()
-    key = f"user:{user_id}:events"
-    redis.rpush(key, json.dumps(event_data))
-    redis.expire(key, 60 * 60)  # Keep messages for 1 hour
+    redis: Any = get_redis_connection()
+    key = event_stream_key(user_id)
+    stream_id: str = redis.xadd(key, {"data": json.dumps(event_data)}, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+    redis.expire(key, EVENT_TTL_SECONDS)
+    return stream_id
 
 def publish_event_with_buffer(user_id: UserID, event_data: EventData) -> None:
     """
     Publish an event to a user's Redis channel and store it in a buffer.
-    :param user_id: UserID - The ID of the user to whom the event is being published.
+    :param user_id: UserID - The ID of the user to whom the event is being published and stored.
     :param event_data: EventData - The data of the event to be published and stored.
     :return: None
     """
     redis: Any = get_redis_connection()
-    redis.publish(f"user:{user_id}", json.dumps(event_data))
-    store_event(user_id, event_data)
+    payload = json.dumps(event_data)
+    key = event_stream_key(user_id)
+    stream_id = redis.xadd(key, {"data": payload}, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+    pipe = redis.pipeline(transaction=False)
+    pipe.expire(key, EVENT_TTL_SECONDS)
+    pipe.publish(event_channel(user_id), encode_live_message(stream_id, payload))
+    pipe.execute()
@@ -0,0 +1,199 @@
+"""
+Object storage helpers for streaming uploads to S3/MinIO.
+
+Uploads are piped straight from the request body to the bucket with S3 multipart upload, so at most one part is held
+in memory at a time, and the content is hashed on the fly so duplicate files can be detected before the object is
+even committed.
+"""
+import base64
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import IO, Any, Callable, Dict, Optional, Protocol
+
+from settings import S3_AWS_ACCESS_KEY_ID, S3_AWS_SECRET_ACCESS_KEY, logger
+
+# S3 requires every part but the last to be at least 5 MiB.
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+
+PRESIGNED_URL_EXPIRY = 15 * 60
+
+
+def get_s3_client() -> Any:
+    """
+    Create an S3 client; S3_ENDPOINT_URL points it at MinIO or another S3-compatible store.
+    :return: boto3 S3 client
+    """
+    import boto3  # type: ignore[import-untyped]
+    return boto3.client(
+        's3',
+        endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+        aws_access_key_id=S3_AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=S3_AWS_SECRET_ACCESS_KEY,
+    )
+
+
+class Readable(Protocol):
+    """
+    Anything with a binary ``read``, such as a file, ``request.stream`` or HashingReader.
+    """
+    def read(self, size: int = -1, /) -> bytes: ...
+
+
+class HashingReader:
+    """
+    File-like wrapper that hashes and counts bytes as they are read.
+    """
+    def __init__(self, stream: IO[bytes]) -> None:
+        """
+        :param stream: The underlying binary stream.
+        """
+        self._stream = stream
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self._hash.update(data)
+        self.size += len(data)
+        return data
+
+    @property
+    def sha256(self) -> str:
+        """
+        Hex SHA-256 of everything read so far.
+        :return: str
+        """
+        return self._hash.hexdigest()
+
+
+@dataclass
+class StreamUploadResult:
+    """
+    Outcome of ``stream_to_s3``.
+
+    ``committed`` is False when ``before_commit`` vetoed the upload, in which case no object was created.
+    """
+    size: int
+    sha256: str
+    committed: bool
+    etag: str = ""
+
+
+def _read_part(stream: Readable, part_size: int) -> bytes:
+    """
+    Read up to ``part_size`` bytes, looping over short reads.
+    :param stream: Binary stream.
+    :param part_size: Number of bytes wanted.
+    :return: bytes (shorter than part_size only at end of stream)
+    """
+    buffer = bytearray()
+    while len(buffer) < part_size:
+        data = stream.read(part_size - len(buffer))
+        if not data:
+            break
+        buffer += data
+    return bytes(buffer)
+
+
+def stream_to_s3(
+        stream: IO[bytes],
+        bucket: str,
+        key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        before_commit: Optional[Callable[[str, int], bool]] = None,
+        content_type: Optional[str] = None,
+        client: Optional[Any] = None,
+) -> StreamUploadResult:
+    """
+    Stream a body to S3 with multipart upload in bounded memory.
+
+    :param stream: Binary stream to read (e.g. ``request.stream``).
+    :param bucket: Target bucket.
+    :param key: Target object key.
+    :param part_size: Bytes per part (at least 5 MiB).
+    :param before_commit: Called with (sha256, size) once the whole body has been read; returning False aborts the
+        multipart upload so no object is created (used to drop duplicates).
+    :param content_type: Optional Content-Type for the object.
+    :param client: Optional S3 client; one is created from settings if not given.
+    :return: StreamUploadResult
+    """
+    if part_size < MIN_PART_SIZE:
+        raise ValueError(f"part_size must be at least {MIN_PART_SIZE} bytes")
+    s3 = client if client is not None else get_s3_client()
+    reader = HashingReader(stream)
+
+    create_args: Dict[str, Any] = {'Bucket': bucket, 'Key': key, 'ACL': 'private'}
+    if content_type:
+        create_args['ContentType'] = content_type
+    upload_id = s3.create_multipart_upload(**create_args)['UploadId']
+
+    try:
+        parts = []
+        part_number = 1
+        while True:
+            data = _read_part(reader, part_size)
+            if not data and part_number > 1:
+                break
+            if not data:
+                raise ValueError("Upload body is empty")
+            response = s3.upload_part(
+                Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=data
+            )
+            parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+            part_number += 1
+            if len(data) < part_size:
+                break
+
+        if before_commit is not None and not before_commit(reader.sha256, reader.size):
+            s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+            logger.debug(f"Multipart upload of {key} aborted before commit ({reader.size} bytes)")
+            return StreamUploadResult(size=reader.size, sha256=reader.sha256, committed=False)
+
+        completed = s3.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts}
+        )
+        logger.info(f"Streamed {reader.size} bytes to {bucket}/{key} in {len(parts)} parts")
+        return StreamUploadResult(
+            size=reader.size, sha256=reader.sha256, committed=True, etag=completed.get('ETag', '')
+        )
+    except Exception:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+
+def create_presigned_put(
+        bucket: str,
+        key: str,
+        sha256: Optional[str] = None,
+        content_type: Optional[str] = None,
+        expires_in: int = PRESIGNED_URL_EXPIRY,
+        client: Optional[Any] = None,
+) -> Dict[str, Any]:
+    """
+    Create a presigned PUT so clients can upload directly to the bucket.
+
+    When ``sha256`` is given the URL is bound to that checksum: S3 rejects a body that does not match, which makes
+    the client-declared hash trustworthy for deduplication.
+
+    :param bucket: Target bucket.
+    :param key: Target object key.
+    :param sha256: Optional hex SHA-256 the body must match.
+    :param content_type: Optional Content-Type the client must send.
+    :param expires_in: URL lifetime in seconds.
+    :param client: Optional S3 client.
+    :return: Dict with the URL, method and the headers the client must send.
+    """
+    s3 = client if client is not None else get_s3_client()
+    params: Dict[str, Any] = {'Bucket': bucket, 'Key': key}
+    headers: Dict[str, str] = {}
+    if sha256:
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode('ascii')
+        params['ChecksumSHA256'] = checksum
+        headers['x-amz-checksum-sha256'] = checksum
+    if content_type:
+        params['ContentType'] = content_type
+        headers['Content-Type'] = content_type
+    url = s3.generate_presigned_url('put_object', Params=params, ExpiresIn=expires_in)
+    return {"url": url, "method": "PUT", "headers": headers, "expires_in": expires_in}
@@ -1,17 +1,22 @@
 """
 OCR service for calling AWS Textract.
 """
-from typing import List, Dict, Any, Tuple
+import uuid
+from typing import List, Dict, Any, Optional, Tuple
 
-import boto3 # type: ignore
 from werkzeug.datastructures import FileStorage
 
+from lib.infra.instrumentation import track_external
 from settings import BUCKET_NAME, TEXTRACT_AWS_ACCESS_KEY_ID, TEXTRACT_AWS_SECRET_ACCESS_KEY
+from settings import TEXTRACT_SNS_ROLE_ARN, TEXTRACT_SNS_TOPIC_ARN, TEXTRACT_STUB
 from settings import logger
 
 
 import json
 
+# Largest page size Textract accepts for get_document_text_detection.
+TEXTRACT_MAX_RESULTS = 1000
+
 def extract_text_from_blocks(blocks: List[Dict[str, Any]]) -> str:
     """
     Extract and return plain text from Textract-style OCR output.
@@ -38,28 +43,138 @@ def extract_text_from_blocks(blocks: List[Dict[str, Any]]) -> str:
 
 
 
+class LocalTextractStub:
+    """
+    In-process stand-in for the Textract client, for local development and tests.
+
+    Implements the subset of the Textract API used by OCRService. Documents are looked up by S3 key in
+    ``documents`` (a list of text lines each); unknown keys produce a single placeholder line. Async jobs report
+    IN_PROGRESS until they have been polled ``polls_until_done`` times, and results are paginated in pages of
+    ``page_size`` blocks.
+
+    Jobs are held in the memory of the process that started them, so the stub only works when the web app and the
+    Celery worker run in a single process (tests, or a worker with ``task_always_eager``). With separate processes
+    every poll fails with InvalidJobIdException.
+    """
+    def __init__(
+            self,
+            documents: Optional[Dict[str, List[str]]] = None,
+            polls_until_done: int = 1,
+            page_size: int = TEXTRACT_MAX_RESULTS,
+            failing_keys: Tuple[str, ...] = (),
+    ) -> None:
+        """
+        Initialize the stub.
+        :param documents: Mapping of S3 key to the lines of text in that document.
+        :param polls_until_done: Number of status polls before a job reports completion.
+        :param page_size: Maximum number of blocks returned per result page.
+        :param failing_keys: S3 keys whose jobs should end in FAILED.
+        """
+        self.documents = documents or {}
+        self.polls_until_done = polls_until_done
+        self.page_size = page_size
+        self.failing_keys = failing_keys
+        self.calls: List[str] = []
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    def _blocks(self, name: str) -> List[Dict[str, Any]]:
+        """
+        Build Textract-style PAGE and LINE blocks for a document.
+        :param name: S3 key of the document.
+        :return: List of blocks.
+        """
+        lines = self.documents.get(name, [f"[stub OCR] {name}"])
+        blocks: List[Dict[str, Any]] = [{"BlockType": "PAGE", "Id": "page-1"}]
+        for i, line in enumerate(lines):
+            blocks.append({
+                "BlockType": "LINE",
+                "Id": f"line-{i}",
+                "Text": line,
+                "Geometry": {"BoundingBox": {"Top": i / max(len(lines), 1), "Left": 0.0}},
+            })
+        return blocks
+
+    def detect_document_text(self, Document: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls.append("detect_document_text")
+        name = Document.get("S3Object", {}).get("Name", "bytes")
+        return {"Blocks": self._blocks(name)}
+
+    def start_document_text_detection(self, DocumentLocation: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:
+        self.calls.append("start_document_text_detection")
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = {"name": DocumentLocation["S3Object"]["Name"], "polls": 0, "tag": kwargs.get("JobTag")}
+        return {"JobId": job_id}
+
+    def get_document_text_detection(self, JobId: str, MaxResults: int = TEXTRACT_MAX_RESULTS, NextToken: Optional[str] = None) -> Dict[str, Any]:
+        self.calls.append("get_document_text_detection")
+        job = self._jobs.get(JobId)
+        if job is None:
+            raise ValueError(f"InvalidJobIdException: {JobId}")
+        if NextToken is None:
+            job["polls"] += 1
+        if job["polls"] < self.polls_until_done:
+            return {"JobStatus": "IN_PROGRESS"}
+        if job["name"] in self.failing_keys:
+            return {"JobStatus": "FAILED", "StatusMessage": "Stub failure"}
+
+        blocks = self._blocks(job["name"])
+        offset = int(NextToken or 0)
+        page = blocks[offset:offset + min(MaxResults, self.page_size)]
+        response: Dict[str, Any] = {"JobStatus": "SUCCEEDED", "Blocks": page, "DocumentMetadata": {"Pages": 1}}
+        if offset + len(page) < len(blocks):
+            response["NextToken"] = str(offset + len(page))
+        return response
+
+
+_stub_client: Optional[LocalTextractStub] = None
+
+
+def get_textract_client() -> Any:
+    """
+    Create the Textract client, or return the shared local stub when TEXTRACT_STUB is set.
+    :return: A boto3 Textract client or LocalTextractStub.
+    """
+    global _stub_client
+    if TEXTRACT_STUB:
+        if _stub_client is None:
+            _stub_client = LocalTextractStub()
+        return _stub_client
+    import boto3  # type: ignore[import-untyped]
+    return boto3.client(
+        'textract',
+        aws_access_key_id=TEXTRACT_AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=TEXTRACT_AWS_SECRET_ACCESS_KEY,
+    )
+
+
 class OCRService:
     """
     A service for performing OCR using AWS Textract.
     """
-    def __init__(self, bucket_name: str = BUCKET_NAME) -> None:
+    def __init__(self, bucket_name: str = BUCKET_NAME, client: Optional[Any] = None) -> None:
         """
         Initializes the OCRService with a Textract client.
+        :param bucket_name: str - Name of the S3 bucket documents are read from.
+        :param client: Optional Textract client (e.g. LocalTextractStub); created from settings if not given.
         """
-        self.client = boto3.client(
-            'textract',
-            aws_access_key_id=TEXTRACT_AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=TEXTRACT_AWS_SECRET_ACCESS_KEY,
-        )
+        self.client = client if client is not None else get_textract_client()
         self.bucket_name = bucket_name
 
+    @property
+    def notifications_enabled(self) -> bool:
+        """
+        Whether async jobs report completion through SNS rather than having to be polled.
+        :return: bool
+        """
+        return bool(TEXTRACT_SNS_TOPIC_ARN and TEXTRACT_SNS_ROLE_ARN) and not isinstance(self.client, LocalTextractStub)
+
     def ocr(self, image_path: str) -> List[Dict[str, Any]]:
         """
         Perform OCR on an image file using AWS Textract.
         :param image_path: str - Path to the image file.
         :return: list - List of detected text blocks.
         """
-        with open(image_path, 'rb') as image:
+        with open(image_path, 'rb') as image, track_external("textract", "detect_document_text"):
             response = self.client.detect_document_text(Document={'Bytes': image.read()})
             return response['Blocks']
 
@@ -86,7 +201,7 @@ class OCRService:
         :param pdf_path: str - Path to the PDF file.
         :return: str - Extracted text from the PDF.
         """
-        with open(pdf_path, 'rb') as pdf:
+        with open(pdf_path, 'rb') as pdf, track_external("textract", "detect_document_text"):
             response = self.client.detect_document_text(Document={'Bytes': pdf.read()})
             return response['Blocks']
 
@@ -100,32 +215,81 @@ class OCRService:
             raise ValueError("PDF file must have a filename.")
         return self.get_text_from_pdf(pdf_file.filename)
 
-    def get_text_from_pdf_s3(self, pdf_key: str) -> str:
+    def start_pdf_text_detection(self, pdf_key: str, job_tag: Optional[str] = None) -> str:
         """
-        Get text from a PDF file stored in S3.
-        :param bucket_name: str - Name of the S3 bucket.
+        Start an asynchronous Textract text detection job for a PDF stored in S3.
+        :param pdf_key: str - Key of the PDF file in S3.
+        :param job_tag: Optional[str] - Tag echoed back in the completion notification (e.g. the upload ID).
+        :return: str - The Textract job ID.
+        """
+        kwargs: Dict[str, Any] = {
+            'DocumentLocation': {'S3Object': {'Bucket': self.bucket_name, 'Name': pdf_key}}
+        }
+        if job_tag:
+            kwargs['JobTag'] = job_tag
+        if self.notifications_enabled:
+            kwargs['NotificationChannel'] = {'SNSTopicArn': TEXTRACT_SNS_TOPIC_ARN, 'RoleArn': TEXTRACT_SNS_ROLE_ARN}
+        with track_external("textract", "start_document_text_detection"):
+            response: Dict[str, Any] = self.client.start_document_text_detection(**kwargs)
+        logger.debug(f"Started Textract job {response['JobId']} for {pdf_key}")
+        return response['JobId']
+
+    def get_job_page(self, job_id: str, next_token: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Fetch one page of a text detection job's results (also reports the job status).
+        :param job_id: str - The Textract job ID.
+        :param next_token: Optional[str] - Pagination token from the previous page.
+        :return: Dict[str, Any] - The raw get_document_text_detection response.
+        """
+        kwargs: Dict[str, Any] = {'JobId': job_id, 'MaxResults': TEXTRACT_MAX_RESULTS}
+        if next_token:
+            kwargs['NextToken'] = next_token
+        with track_external("textract", "get_document_text_detection"):
+            return self.client.get_document_text_detection(**kwargs)
+
+    def get_all_blocks(self, job_id: str, first_page: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Fetch every result page of a finished text detection job.
+
+        Pages are requested at the maximum page size. Each NextToken is only known once the previous page has
+        arrived, so the pages of a single job are necessarily fetched in sequence.
+        :param job_id: str - The Textract job ID.
+        :param first_page: Optional[Dict[str, Any]] - An already fetched first page, to avoid requesting it twice.
+        :return: List[Dict[str, Any]] - Blocks from all pages.
+        """
+        page = first_page if first_page is not None else self.get_job_page(job_id)
+        blocks: List[Dict[str, Any]] = list(page.get('Blocks', []))
+        pages = 1
+        while page.get('NextToken'):
+            page = self.get_job_page(job_id, page['NextToken'])
+            blocks.extend(page.get('Blocks', []))
+            pages += 1
+        logger.debug(f"Textract job {job_id}: {len(blocks)} blocks in {pages} result pages")
+        return blocks
+
+    def get_text_from_pdf_s3(self, pdf_key: str, poll_interval: float = 2.0) -> str:
+        """
+        Get text from a PDF file stored in S3, blocking until the Textract job finishes.
+
+        Intended for scripts; Celery tasks should use the non-blocking flow in upload_service instead.
         :param pdf_key: str - Key of the PDF file in S3.
+        :param poll_interval: float - Seconds between status checks.
         :return: str - Extracted text from the PDF.
         """
-        # Start async job
-        response: Dict[str, Any] = self.client.start_document_text_detection(
-            DocumentLocation={'S3Object': {'Bucket': self.bucket_name, 'Name': pdf_key}}
-        )
-        job_id: str = response['JobId']
+        job_id = self.start_pdf_text_detection(pdf_key)
 
         # Poll for job completion
         import time
         while True:
-            result: Dict[str, Any] = self.client.get_document_text_detection(JobId=job_id)
+            result: Dict[str, Any] = self.get_job_page(job_id)
             status: str = result['JobStatus']
-            logger.warning(f"Textract job status: {status}")
-            if status in ['SUCCEEDED', 'FAILED']:
+            logger.debug(f"Textract job status: {status}")
+            if status != 'IN_PROGRESS':
                 break
-            time.sleep(2)
+            time.sleep(poll_interval)
 
-        if status == 'SUCCEEDED':
-            blocks: List[Dict[str, Any]] = result['Blocks']
-            logger.warning(f"Textract job completed: {len(blocks)} blocks")
+        if status in ('SUCCEEDED', 'PARTIAL_SUCCESS'):
+            blocks = self.get_all_blocks(job_id, first_page=result)
             return extract_text_from_blocks(blocks)
         else:
             logger.error(f"Textract job failed: {result}")
@@ -1,45 +1,237 @@
 """
 OpenAI Security Service
+
+Decrypted API keys are cached in process memory only (``CredentialCache``), bounded by a TTL and a size limit.
+Workers agree on when a cached key is stale through a per-user version counter in Redis, which
+``update_openai_api_key`` bumps; the counter is read in the same round trip as the Redis rate-limit counter, so a
+request with a warm cache costs one Redis call and no database read or decryption. Key validation results are
+shared through Redis under a hash of the key, never the key itself.
+
+API usage is appended to the ``llm_usage`` table by ``UsageLedger`` in batches from a background thread.
 """
+import atexit
+import datetime
+import hashlib
+import os
+import threading
 import time
-from typing import Any, Dict, Optional, Tuple
-
-from openai import AuthenticationError, OpenAI, RateLimitError
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 
+from lib.db.surreal import DbController
+from lib.infra.instrumentation import record_cache
+from lib.services.redis_client import get_redis_connection
 from lib.services.user_service import UserService
-from settings import logger
+from settings import (OPENAI_KEY_CACHE_SIZE, OPENAI_KEY_CACHE_TTL_SECONDS,
+                      OPENAI_RATE_LIMIT_PER_HOUR, USAGE_LEDGER_BATCH_SIZE,
+                      USAGE_LEDGER_FLUSH_SECONDS, logger)
+
+VALIDATION_TTL_SECONDS = 3600
+
+
+def key_fingerprint(api_key: str) -> str:
+    """
+    Stable, non-reversible identifier for an API key.
+    :param api_key: The API key
+    :return: SHA-256 hex digest
+    """
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class CredentialCache:
+    """
+    Thread-safe, TTL-bounded LRU cache of decrypted API keys, held in process memory only.
+    """
+    def __init__(self, ttl_seconds: float = OPENAI_KEY_CACHE_TTL_SECONDS, max_entries: int = OPENAI_KEY_CACHE_SIZE) -> None:
+        """
+        :param ttl_seconds: Seconds an entry is trusted even if its version can't be checked
+        :param max_entries: Least recently used entries are evicted beyond this size
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, Optional[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, version: Optional[str]) -> Optional[str]:
+        """
+        Cached key for a user, if it was loaded at ``version`` and hasn't expired.
+        :param user_id: User ID
+        :param version: Current credential version from Redis (None if unknown)
+        :return: The decrypted key, or None
+        """
+        api_key: Optional[str] = None
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                api_key, cached_version, expires_at = entry
+                if time.monotonic() >= expires_at or (version is not None and version != cached_version):
+                    del self._entries[user_id]
+                    api_key = None
+                else:
+                    self._entries.move_to_end(user_id)
+        record_cache("openai_key", hit=api_key is not None)
+        return api_key
+
+    def put(self, user_id: str, api_key: str, version: Optional[str]) -> None:
+        with self._lock:
+            self._entries[user_id] = (api_key, version, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class UsageLedger:
+    """
+    Append-only API usage log, written to the ``llm_usage`` table in batches by a background thread.
+    """
+    def __init__(self, batch_size: int = USAGE_LEDGER_BATCH_SIZE, flush_seconds: float = USAGE_LEDGER_FLUSH_SECONDS) -> None:
+        """
+        :param batch_size: Flush as soon as this many entries are waiting
+        :param flush_seconds: Flush waiting entries at least this often
+        """
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, user_id: str, model: str, tokens_used: int = 0) -> None:
+        """
+        Queue a usage entry; never blocks on the database.
+        """
+        entry = {
+            "user_id": user_id,
+            "model": model,
+            "tokens_used": int(tokens_used),
+            "created_at": datetime.datetime.utcnow().isoformat() + "Z",
+        }
+        with self._lock:
+            self._pending.append(entry)
+            full = len(self._pending) >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """
+        Write all waiting entries with one INSERT; entries are put back if the write fails.
+        :return: Number of entries written
+        """
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        db = DbController()
+        try:
+            db.connect()
+            db.query("INSERT INTO llm_usage $rows", {"rows": batch})
+            return len(batch)
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} usage entries: {e}")
+            with self._lock:
+                self._pending = batch + self._pending
+            return 0
+        finally:
+            try:
+                db.close()
+            except Exception:
+                pass
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="usage-ledger", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def _after_fork(self) -> None:
+        # Entries queued by the parent are the parent's to write; the thread does not survive fork().
+        self._lock = threading.Lock()
+        self._pending = []
+        self._thread = None
+
+    @staticmethod
+    def schema() -> List[str]:
+        return [
+            'DEFINE TABLE llm_usage SCHEMAFULL PERMISSIONS FOR select, create FULL FOR update, delete NONE;',
+            'DEFINE FIELD user_id ON llm_usage TYPE string;',
+            'DEFINE FIELD model ON llm_usage TYPE string;',
+            'DEFINE FIELD tokens_used ON llm_usage TYPE int;',
+            'DEFINE FIELD created_at ON llm_usage TYPE datetime VALUE <datetime>$value;',
+            'DEFINE INDEX idx_llm_usage_user_time ON llm_usage FIELDS user_id, created_at;',
+        ]
 
 
 class OpenAISecurityService:
     """
     Service for managing OpenAI API security, validation, and rate limiting
     """
-    
-    def __init__(self) -> None:
+
+    def __init__(self, redis: Any = None, credential_cache: Optional[CredentialCache] = None,
+                 usage_ledger: Optional[UsageLedger] = None) -> None:
         """
         Initialize the OpenAI security service
+        :param redis: Redis client (defaults to the shared connection)
+        :param credential_cache: In-memory cache of decrypted keys
+        :param usage_ledger: Usage ledger for log_api_usage
         """
-        self.rate_limit_cache: Dict[str, Dict[str, Any]] = {}
-        self.api_key_cache: Dict[str, Dict[str, Any]] = {}
+        self._redis = redis
+        self.credential_cache = credential_cache or CredentialCache()
+        self.usage_ledger = usage_ledger or UsageLedger()
         self.rate_limit_window = 3600  # 1 hour
-        self.max_requests_per_hour = 100  # Adjust based on your needs
-    
+        self.max_requests_per_hour = OPENAI_RATE_LIMIT_PER_HOUR
+
+    @property
+    def redis(self) -> Any:
+        if self._redis is None:
+            self._redis = get_redis_connection()
+        return self._redis
+
+    def _window(self, now: Optional[float] = None) -> int:
+        return int((now if now is not None else time.time()) // self.rate_limit_window)
+
+    def _rate_key(self, user_id: str, window: int) -> str:
+        return f"openai_rate:{user_id}:{window}"
+
+    @staticmethod
+    def _version_key(user_id: str) -> str:
+        return f"openai_key_version:{user_id}"
+
     def validate_api_key(self, api_key: str) -> Tuple[bool, str]:
         """
         Validate an OpenAI API key by making a test request
-        
+
         :param api_key: The API key to validate
         :return: (is_valid, error_message)
         """
         if not api_key or not api_key.startswith('sk-'):
             return False, "Invalid API key format"
-        
+
+        # The OpenAI client is slow to import; only key validation needs it here.
+        from openai import AuthenticationError, OpenAI, RateLimitError
+
         try:
             client = OpenAI(api_key=api_key)
             # Make a minimal test request to validate the key
             logger.debug("About to validate API key")
             response = client.models.list()
-            logger.debug(f"OpenAI API key validation response: {response}")
+            logger.debug("OpenAI API key validation response: %s", response)
             return True, ""
         except AuthenticationError:
             return False, "Invalid API key"
@@ -47,120 +239,127 @@ class OpenAISecurityService:
             return False, "API key rate limit exceeded"
         except Exception as e:
             return False, f"API key validation failed: {str(e)}"
-    
+
+    def _count_request(self, user_id: str) -> Tuple[int, Optional[str]]:
+        """
+        Increment the user's request counter for this window and read their credential version, in one round trip.
+        :return: (requests in this window, credential version); (0, None) if Redis is unavailable
+        """
+        key = self._rate_key(user_id, self._window())
+        try:
+            pipe = self.redis.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, self.rate_limit_window)
+            pipe.get(self._version_key(user_id))
+            count, _, version = pipe.execute()
+            return int(count), str(version or 0)
+        except Exception as e:
+            # Fail open: an unavailable Redis shouldn't take the assistant down with it.
+            logger.warning(f"Rate limit check unavailable for {user_id}: {e}")
+            return 0, None
+
     def check_rate_limit(self, user_id: str) -> Tuple[bool, str]:
         """
         Check if user has exceeded rate limits
-        
+
         :param user_id: User ID to check
         :return: (within_limit, error_message)
         """
-        current_time = time.time()
-        user_key = f"rate_limit:{user_id}"
-        
-        if user_key not in self.rate_limit_cache:
-            self.rate_limit_cache[user_key] = {
-                'requests': 0,
-                'window_start': current_time
-            }
-        
-        user_data = self.rate_limit_cache[user_key]
-        
-        # Reset window if expired
-        if current_time - user_data['window_start'] > self.rate_limit_window:
-            user_data['requests'] = 0
-            user_data['window_start'] = current_time
-        
-        # Check if limit exceeded
-        if user_data['requests'] >= self.max_requests_per_hour:
+        count, _ = self._count_request(user_id)
+        if count > self.max_requests_per_hour:
             return False, "Rate limit exceeded. Please try again later."
-        
-        # Increment request count
-        user_data['requests'] += 1
         return True, ""
-    
+
+    def _cached_validation(self, api_key: str) -> Tuple[bool, str]:
+        """
+        Validate a key, sharing the result across workers for an hour under the key's fingerprint.
+        """
+        cache_key = f"openai_key_valid:{key_fingerprint(api_key)}"
+        try:
+            cached = self.redis.get(cache_key)
+        except Exception:
+            cached = None
+        if cached is not None:
+            return (True, "") if cached == "" else (False, str(cached))
+
+        is_valid, error = self.validate_api_key(api_key)
+        try:
+            self.redis.setex(cache_key, VALIDATION_TTL_SECONDS, "" if is_valid else (error or "invalid"))
+        except Exception:
+            pass
+        return is_valid, error
+
+    def _load_api_key(self, user_id: str) -> str:
+        user_service = UserService()
+        user_service.connect()
+        try:
+            return user_service.get_openai_api_key(user_id)
+        finally:
+            user_service.close()
+
     def get_user_api_key_with_validation(self, user_id: str) -> Tuple[Optional[str], str]:
         """
         Get user's API key with validation and rate limiting
-        
+
         :param user_id: User ID
         :return: (api_key, error_message)
         """
         # Check rate limit first
-        within_limit, rate_error = self.check_rate_limit(user_id)
-        if not within_limit:
-            return None, rate_error
-        
-        # Get API key from user service
-        user_service = UserService()
-        user_service.connect()
-        try:
-            api_key = user_service.get_openai_api_key(user_id)
+        count, version = self._count_request(user_id)
+        if count > self.max_requests_per_hour:
+            return None, "Rate limit exceeded. Please try again later."
+
+        api_key = self.credential_cache.get(user_id, version)
+        if api_key is None:
+            api_key = self._load_api_key(user_id)
             if not api_key:
                 return None, "OpenAI API key not configured. Please add your API key in Settings."
-            
-            # Validate API key (with caching to avoid repeated validation)
-            cache_key = f"validation:{user_id}"
-            current_time = time.time()
-            
-            if cache_key in self.api_key_cache:
-                cached_data = self.api_key_cache[cache_key]
-                # Cache validation for 1 hour
-                if current_time - cached_data['timestamp'] < 3600:
-                    if cached_data['is_valid']:
-                        return api_key, ""
-                    else:
-                        return None, cached_data['error']
-            
-            # Validate API key
-            is_valid, error = self.validate_api_key(api_key)
-            
-            # Cache result
-            self.api_key_cache[cache_key] = {
-                'is_valid': is_valid,
-                'error': error,
-                'timestamp': current_time
-            }
-            
-            if is_valid:
-                return api_key, ""
-            else:
-                return None, f"API key validation failed: {error}"
-                
-        finally:
-            user_service.close()
-    
+            self.credential_cache.put(user_id, api_key, version)
+
+        is_valid, error = self._cached_validation(api_key)
+        if is_valid:
+            return api_key, ""
+        return None, f"API key validation failed: {error}"
+
+    def invalidate_user(self, user_id: str) -> None:
+        """
+        Drop a user's cached key here and make every other worker reload it.
+        :param user_id: User ID
+        :return: None
+        """
+        self.credential_cache.invalidate(user_id)
+        try:
+            self.redis.incr(self._version_key(user_id))
+        except Exception as e:
+            logger.warning(f"Could not publish credential change for {user_id}: {e}")
+
     def log_api_usage(self, user_id: str, model: str, tokens_used: int = 0) -> None:
         """
         Log API usage for monitoring and billing
-        
+
         :param user_id: User ID
         :param model: Model used
         :param tokens_used: Number of tokens used
         :return: None
         """
-        # TODO: Implement usage logging to database
-        logger.debug(f"[USAGE] User {user_id} used {model} with {tokens_used} tokens")
+        self.usage_ledger.record(user_id, model, tokens_used)
 
     def get_usage_stats(self, user_id: str) -> Dict[str, Any]:
         """
         Get usage statistics for a user
-        
+
         :param user_id: User ID
         :return: Usage statistics
         """
-        user_key = f"rate_limit:{user_id}"
-        if user_key in self.rate_limit_cache:
-            user_data = self.rate_limit_cache[user_key]
-            return {
-                'requests_this_hour': user_data['requests'],
-                'max_requests_per_hour': self.max_requests_per_hour,
-                'window_start': user_data['window_start']
-            }
+        window = self._window()
+        try:
+            requests = int(self.redis.get(self._rate_key(user_id, window)) or 0)
+        except Exception:
+            requests = 0
         return {
-            'requests_this_hour': 0,
+            'requests_this_hour': requests,
             'max_requests_per_hour': self.max_requests_per_hour,
-            'window_start': time.time()
+            'window_start': window * self.rate_limit_window
         }
 
 
@@ -176,4 +375,35 @@ def get_openai_security_service() -> OpenAISecurityService:
     global _openai_security_service
     if _openai_security_service is None:
         _openai_security_service = OpenAISecurityService()
-    return _openai_security_service 
\ No newline at end of file
+    return _openai_security_service
+
+
+def create_usage_ledger_schema() -> None:
+    """
+    Creates the schema for the llm_usage table in SurrealDB.
+    :return: None
+    """
+    db = DbController()
+    db.connect()
+    try:
+        for stmt in UsageLedger.schema():
+            db.query(stmt)
+    finally:
+        db.close()
+
+
+def _flush_usage_at_exit() -> None:
+    if _openai_security_service is not None:
+        _openai_security_service.usage_ledger.flush()
+
+
+def _reset_after_fork() -> None:
+    if _openai_security_service is not None:
+        _openai_security_service.usage_ledger._after_fork()
+        _openai_security_service.credential_cache = CredentialCache()
+        _openai_security_service._redis = None
+
+
+atexit.register(_flush_usage_at_exit)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,8 +1,9 @@
 """
 Scheduling service for managing appointments
 """
+from datetime import date as date_cls
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 from lib.events import (
     AppointmentCreated,
@@ -13,22 +14,122 @@ from lib.events import (
 )
 from lib.infra.event_bus import event_bus
 
-from lib.db.surreal import DbController
+from lib.db.surreal import AsyncDbController, DbController
 from lib.models.appointment import Appointment, AppointmentStatus
+from lib.services.availability import availability_engine, date_range
 from settings import logger
 
+availability_engine.subscribe(event_bus)
+
+# Longest date range a multi-provider availability search may cover
+MAX_SEARCH_DAYS = 31
+
+# Appointment listing: window used when no dates are given, the longest window allowed, and page sizes
+DEFAULT_WINDOW_DAYS = 31
+MAX_WINDOW_DAYS = 366
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def build_appointment_query(
+        provider_id: Optional[str] = None,
+        patient_id: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        statuses: Optional[Sequence[str]] = None,
+        page: int = 1,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        today: Optional[date_cls] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build a filtered, windowed and paginated appointment query
+
+    Every filter is applied by the database. Queries always carry a date window so they stay on the
+    (provider_id, appointment_date, start_time) or (patient_id, appointment_date) index instead of reading the
+    whole history: without dates the window is the next DEFAULT_WINDOW_DAYS days, and a patient's history can be
+    listed by passing an explicit range. One row more than the page size is requested so the caller can tell whether
+    there is a next page.
+
+    :param provider_id: Only this provider's appointments
+    :param patient_id: Only this patient's appointments
+    :param start_date: First date in YYYY-MM-DD format
+    :param end_date: Last date in YYYY-MM-DD format (defaults to start_date when only start_date is given)
+    :param statuses: Only appointments in one of these states
+    :param page: 1-based page number
+    :param page_size: Appointments per page
+    :param today: Date the default window starts from (defaults to today)
+    :return: (statement, params)
+    :raises ValueError: If a date is malformed or the window is reversed or longer than MAX_WINDOW_DAYS
+    """
+    if start_date is None and end_date is None:
+        first = today or date_cls.today()
+        last = first + timedelta(days=DEFAULT_WINDOW_DAYS - 1)
+    else:
+        try:
+            first = datetime.strptime(start_date or end_date or "", "%Y-%m-%d").date()
+            last = datetime.strptime(end_date or start_date or "", "%Y-%m-%d").date()
+        except ValueError:
+            raise ValueError("Dates must be in YYYY-MM-DD format")
+    if last < first:
+        raise ValueError("end_date must not be before start_date")
+    if (last - first).days + 1 > MAX_WINDOW_DAYS:
+        raise ValueError(f"Date range must not exceed {MAX_WINDOW_DAYS} days")
+
+    page = max(1, page)
+    page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+    params: Dict[str, Any] = {
+        "start_date": first.isoformat(),
+        "end_date": last.isoformat(),
+        "limit": page_size + 1,
+        "start": (page - 1) * page_size,
+    }
+    # The leading equality comes first so the matching composite index is chosen
+    conditions = []
+    if provider_id:
+        conditions.append("provider_id = $provider_id")
+        params["provider_id"] = provider_id
+    if patient_id:
+        conditions.append("patient_id = $patient_id")
+        params["patient_id"] = patient_id
+    conditions.append("appointment_date >= $start_date AND appointment_date <= $end_date")
+    if statuses:
+        conditions.append("status IN $statuses")
+        params["statuses"] = list(statuses)
+
+    statement = (
+        f"SELECT * FROM appointment WHERE {' AND '.join(conditions)} "
+        "ORDER BY appointment_date, start_time LIMIT $limit START $start"
+    )
+    return statement, params
+
+
+APPOINTMENT_BY_ID_QUERY = "SELECT * FROM appointment WHERE id = $id"
+
+
+def appointment_page(records: List[Dict[str, Any]], params: Dict[str, Any]) -> Tuple[List[Appointment], bool]:
+    """
+    Split the rows of a build_appointment_query query into the page and whether there is a next page
+
+    :param records: Rows returned for the query
+    :param params: The params built with it
+    :return: (appointments, has_more)
+    """
+    page_size = params["limit"] - 1
+    return [Appointment.from_dict(record) for record in records[:page_size]], len(records) > page_size
+
 
 class SchedulingService:
     """
     Service for managing appointments
     """
-    def __init__(self) -> None:
+    def __init__(self, db_controller: Optional[DbController] = None) -> None:
         """
         Initialize the scheduling service
         This sets up the database controller for appointment management.
+        :param db_controller: Optional DbController instance. If None, a new DbController is created.
         :return: None
         """
-        self.db = DbController()
+        self.db = db_controller or DbController()
     
     def connect(self) -> None:
         """
@@ -155,9 +256,7 @@ class SchedulingService:
         :return: Appointment object if found, None otherwise
         """
         try:
-            query = "SELECT * FROM appointment WHERE id = $id"
-            params = {"id": appointment_id}
-            results = self.db.query(query, params)
+            results = self.db.query(APPOINTMENT_BY_ID_QUERY, {"id": appointment_id})
             if results:
                 for result in results:
                     if result.get('result'):
@@ -261,6 +360,28 @@ class SchedulingService:
             logger.error(f"Error getting appointments by provider: {e}")
             return []
     
+    def query_appointments(
+            self,
+            provider_id: Optional[str] = None,
+            patient_id: Optional[str] = None,
+            start_date: Optional[str] = None,
+            end_date: Optional[str] = None,
+            statuses: Optional[Sequence[str]] = None,
+            page: int = 1,
+            page_size: int = DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[Appointment], bool]:
+        """
+        Get one page of appointments matching the filters, ordered by date and start time
+
+        See build_appointment_query for how the filters and the date window are applied.
+        :return: (appointments, has_more)
+        :raises ValueError: If the dates are invalid
+        """
+        statement, params = build_appointment_query(
+            provider_id, patient_id, start_date, end_date, statuses, page, page_size
+        )
+        return appointment_page(self._records(self.db.query(statement, params)), params)
+
     def get_all_appointments(self) -> List[Appointment]:
         """
         Get all appointments (for debugging)
@@ -270,45 +391,13 @@ class SchedulingService:
         :return: List of all Appointment objects
         """
         try:
-            logger.debug("get_all_appointments: Starting query...")
-            
-            # First, let's see what tables exist
-            logger.debug("Checking what tables exist...")
-            tables_query = "INFO FOR DB"
-            tables_result = self.db.query(tables_query, {})
-            logger.debug(f"Tables query result: {tables_result}")
-            
-            # Try a simple query to see what's in the appointment table
-            logger.debug("Trying simple SELECT query...")
-            simple_query = "SELECT * FROM appointment"
-            simple_result = self.db.query(simple_query, {})
-            logger.debug(f"Simple query result: {simple_result}")
-            
-            # Now try the full query
             query = "SELECT * FROM appointment ORDER BY appointment_date, start_time"
-            logger.debug(f"Executing query: {query}")
             results = self.db.query(query, {})
-            logger.debug(f"Full query results: {results}")
-
-            appointments: List[Appointment] = []
-
-            for result in results:
-                logger.debug(f"Processing result: {result}")
-                # The result is already the record, not nested under 'result'
-                logger.debug(f"Processing record: {result}")
-                appointments.append(Appointment.from_dict(result))
-                if result.get('result'):
-                    # Fallback for nested structure
-                    for record in result['result']:
-                        logger.debug(f"Processing nested record: {record}")
-                        appointments.append(Appointment.from_dict(record))
-            
-            logger.debug(f"Final appointments list: {appointments}")
+            appointments = [Appointment.from_dict(record) for record in self._records(results)]
+            logger.debug("get_all_appointments: %d appointments", len(appointments))
             return appointments
         except Exception as e:
             logger.error(f"Error getting all appointments: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
             return []
     
     def update_appointment(self, appointment_id: str, updates: Dict[str, Any]) -> Tuple[bool, str]:
@@ -490,54 +579,98 @@ class SchedulingService:
         Get available time slots for a provider on a specific date
 
         This method retrieves available time slots for a provider on a given date.
-        It checks existing appointments and creates time slots based on business hours (9 AM to 5 PM).
+        Slots start every 30 minutes within business hours (9 AM to 5 PM) and are answered from the availability index.
         :param provider_id: ID of the provider
         :param date: Date in YYYY-MM-DD format
         :param duration_minutes: Duration of each time slot in minutes (default is 30 minutes)
         :return: List of available time slots as dictionaries with 'start_time' and 'end_time'
         """
         try:
-            # Get existing appointments for the date
-            appointments = self.get_appointments_by_date(date, provider_id)
-            
-            # Define business hours (9 AM to 5 PM)
-            business_start = datetime.strptime('09:00', '%H:%M')
-            business_end = datetime.strptime('17:00', '%H:%M')
-            
-            # Create time slots
-            slots: List[Dict[str, str]] = []
-            current_time = business_start
-            
-            while current_time + timedelta(minutes=duration_minutes) <= business_end:
-                slot_start = current_time.strftime('%H:%M')
-                slot_end = (current_time + timedelta(minutes=duration_minutes)).strftime('%H:%M')
-                
-                # Check if slot conflicts with existing appointments
-                conflict = False
-                for appointment in appointments:
-                    if self._times_overlap(slot_start, slot_end, appointment.start_time, appointment.end_time):
-                        conflict = True
-                        break
-                
-                if not conflict:
-                    slots.append({
-                        'start_time': slot_start,
-                        'end_time': slot_end
-                    })
-                
-                current_time += timedelta(minutes=30)  # 30-minute intervals
-            
-            return slots
-            
+            availability_engine.ensure_loaded(self._fetch_bookings, [provider_id], date, date)
+            return availability_engine.free_slots(provider_id, date, duration_minutes)
         except Exception as e:
             logger.error(f"Error getting available slots: {e}")
             return []
-    
+
+    def find_first_available_slot(
+            self,
+            provider_ids: List[str],
+            start_date: str,
+            end_date: str,
+            duration_minutes: int = 30
+    ) -> Optional[Dict[str, str]]:
+        """
+        Find the earliest free slot across several providers and days
+
+        All providers' bookings for the range are loaded with a single query, then searched in memory.
+        :param provider_ids: IDs of the providers to search
+        :param start_date: First date in YYYY-MM-DD format
+        :param end_date: Last date in YYYY-MM-DD format
+        :param duration_minutes: Length of the slot in minutes
+        :return: Dictionary with 'provider_id', 'date', 'start_time' and 'end_time', or None if nothing is free
+        """
+        if not provider_ids:
+            return None
+        if len(date_range(start_date, end_date)) > MAX_SEARCH_DAYS:
+            raise ValueError(f"Search range is limited to {MAX_SEARCH_DAYS} days")
+        availability_engine.ensure_loaded(self._fetch_bookings, provider_ids, start_date, end_date)
+        return availability_engine.first_free_slot(provider_ids, start_date, end_date, duration_minutes)
+
+    def get_provider_ids_by_specialty(self, specialty: str) -> List[str]:
+        """
+        Get the IDs of active providers with a given specialty
+
+        :param specialty: Medical specialty, e.g. "Cardiology"
+        :return: List of provider user IDs, in the "User:<id>" form stored in ``appointment.provider_id``
+        """
+        try:
+            results = self.db.query(
+                "SELECT id FROM User WHERE role = 'provider' AND specialty = $specialty AND is_active = true",
+                {"specialty": specialty}
+            )
+            return [str(record['id']) for record in self._records(results) if record.get('id')]
+        except Exception as e:
+            logger.error(f"Error getting providers by specialty: {e}")
+            return []
+
+    @staticmethod
+    def _records(results: Any) -> List[Dict[str, Any]]:
+        """
+        Flatten query results, accepting both plain rows and the nested ``{'result': [...]}`` shape.
+        """
+        records: List[Dict[str, Any]] = []
+        for result in results or []:
+            if isinstance(result, dict) and isinstance(result.get('result'), list):
+                records.extend(result['result'])
+            elif isinstance(result, dict):
+                records.append(result)
+        return records
+
+    def _fetch_bookings(self, provider_ids: List[str], start_date: str, end_date: str) -> List[Dict[str, Any]]:
+        """
+        Load the appointments of several providers over a date range in one query
+
+        :param provider_ids: IDs of the providers
+        :param start_date: First date in YYYY-MM-DD format
+        :param end_date: Last date in YYYY-MM-DD format
+        :return: List of appointment records with the fields the availability index needs
+        """
+        results = self.db.query(
+            """
+                SELECT id, provider_id, appointment_date, start_time, end_time, status FROM appointment
+                WHERE provider_id IN $provider_ids
+                AND appointment_date >= $start_date AND appointment_date <= $end_date
+            """,
+            {"provider_ids": provider_ids, "start_date": start_date, "end_date": end_date}
+        )
+        return self._records(results)
+
     def _check_time_conflict(self, provider_id: str, date: str, start_time: str, end_time: str, exclude_id: Optional[str] = None) -> Optional[str]:
         """
         Check for time conflicts with existing appointments
 
         This method checks if the provided time range conflicts with any existing appointments for a provider on a specific date.
+        The provider's day is reloaded first so that writes are always checked against the database.
         :param provider_id: ID of the provider
         :param date: Date in YYYY-MM-DD format
         :param start_time: Start time in HH:MM format
@@ -546,20 +679,14 @@ class SchedulingService:
         :return: None if no conflict, or a string message indicating the conflict
         """
         try:
-            appointments = self.get_appointments_by_date(date, provider_id)
-            
-            for appointment in appointments:
-                if exclude_id and appointment.id == exclude_id:
-                    continue
-                
-                if appointment.status in [AppointmentStatus.CANCELLED.value, AppointmentStatus.COMPLETED.value]:
-                    continue
-                
-                if self._times_overlap(start_time, end_time, appointment.start_time, appointment.end_time):
-                    return f"Conflicts with appointment at {appointment.start_time}-{appointment.end_time}"
-            
+            availability_engine.ensure_loaded(self._fetch_bookings, [provider_id], date, date, refresh=True)
+            conflict = availability_engine.find_conflict(
+                provider_id, date, start_time, end_time, exclude_id=str(exclude_id) if exclude_id else None
+            )
+            if conflict:
+                return f"Conflicts with appointment at {conflict[0]}-{conflict[1]}"
             return None
-            
+
         except Exception as e:
             logger.error(f"Error checking time conflict: {e}")
             return "Error checking availability"
@@ -584,3 +711,50 @@ class SchedulingService:
             return s1 < e2 and s2 < e1
         except ValueError:
             return False
+
+
+class AsyncSchedulingService:
+    """
+    Appointment reads for async views, on a pooled AsyncDbController
+    """
+    def __init__(self, db: AsyncDbController) -> None:
+        """
+        :param db: Connected AsyncDbController (see lib.db.async_pool)
+        :return: None
+        """
+        self.db = db
+
+    async def get_appointment(self, appointment_id: str) -> Optional[Appointment]:
+        """
+        Get appointment by ID; see SchedulingService.get_appointment
+
+        :param appointment_id: ID of the appointment to retrieve
+        :return: Appointment object if found, None otherwise
+        """
+        try:
+            records = SchedulingService._records(await self.db.query(APPOINTMENT_BY_ID_QUERY, {"id": appointment_id}))
+            return Appointment.from_dict(records[0]) if records else None
+        except Exception as e:
+            logger.error(f"Error getting appointment: {e}")
+            return None
+
+    async def query_appointments(
+            self,
+            provider_id: Optional[str] = None,
+            patient_id: Optional[str] = None,
+            start_date: Optional[str] = None,
+            end_date: Optional[str] = None,
+            statuses: Optional[Sequence[str]] = None,
+            page: int = 1,
+            page_size: int = DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[Appointment], bool]:
+        """
+        Get one page of appointments matching the filters; see SchedulingService.query_appointments
+
+        :return: (appointments, has_more)
+        :raises ValueError: If the dates are invalid
+        """
+        statement, params = build_appointment_query(
+            provider_id, patient_id, start_date, end_date, statuses, page, page_size
+        )
+        return appointment_page(SchedulingService._records(await self.db.query(statement, params)), params)
@@ -0,0 +1,108 @@
+"""
+Verification of Amazon SNS messages delivered to HTTPS endpoints.
+
+SNS signs every message with the private key of a certificate it hosts on ``sns.<region>.amazonaws.com``. An endpoint
+must check the signature before acting on a message, otherwise anyone who knows its URL can post forged
+notifications or subscription confirmations.
+See https://docs.aws.amazon.com/sns/latest/dg/sns-verify-signature-of-message.html
+"""
+import base64
+import re
+import threading
+from typing import Any, Dict, Mapping, Optional
+from urllib.parse import urlparse
+
+import requests
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+from lib.infra.instrumentation import record_cache, track_external
+from settings import logger
+
+SIGNING_CERT_HOST = re.compile(r'sns\.[a-z0-9-]+\.amazonaws\.com(\.cn)?')
+
+# Fields covered by the signature, in signing order. Subject is only signed when the notification has one.
+SIGNED_FIELDS = {
+    'Notification': ('Message', 'MessageId', 'Subject', 'Timestamp', 'TopicArn', 'Type'),
+    'SubscriptionConfirmation': ('Message', 'MessageId', 'SubscribeURL', 'Timestamp', 'Token', 'TopicArn', 'Type'),
+    'UnsubscribeConfirmation': ('Message', 'MessageId', 'SubscribeURL', 'Timestamp', 'Token', 'TopicArn', 'Type'),
+}
+
+SIGNATURE_HASHES = {'1': hashes.SHA1, '2': hashes.SHA256}
+
+# SNS rotates signing certificates rarely, so they are kept for the life of the process.
+_certificates: Dict[str, x509.Certificate] = {}
+_certificates_lock = threading.Lock()
+
+
+def is_signing_cert_url(url: str) -> bool:
+    """
+    Whether ``url`` points to an SNS signing certificate: an https URL of a .pem file on an SNS host.
+    :param url: SigningCertURL of a message.
+    :return: bool
+    """
+    parsed = urlparse(url)
+    return (parsed.scheme == 'https' and SIGNING_CERT_HOST.fullmatch(parsed.hostname or '') is not None
+            and parsed.path.endswith('.pem'))
+
+
+def string_to_sign(message: Mapping[str, Any]) -> Optional[bytes]:
+    """
+    Build the canonical string SNS signs for a message.
+    :param message: The decoded message envelope.
+    :return: The bytes to verify, or None for an unknown message type.
+    """
+    fields = SIGNED_FIELDS.get(message.get('Type') or '')
+    if fields is None:
+        return None
+    return ''.join(f"{field}\n{message[field]}\n" for field in fields if message.get(field) is not None).encode()
+
+
+def get_signing_certificate(url: str) -> x509.Certificate:
+    """
+    Fetch (or return the cached) signing certificate at ``url``. The URL must pass ``is_signing_cert_url``.
+    :param url: SigningCertURL of a message.
+    :return: The certificate.
+    """
+    with _certificates_lock:
+        certificate = _certificates.get(url)
+    record_cache("sns_certificate", hit=certificate is not None)
+    if certificate is not None:
+        return certificate
+    with track_external("sns", "signing_certificate"):
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+    certificate = x509.load_pem_x509_certificate(response.content)
+    with _certificates_lock:
+        _certificates[url] = certificate
+    return certificate
+
+
+def verify_sns_message(message: Mapping[str, Any]) -> bool:
+    """
+    Check that a message was signed by SNS.
+    :param message: The decoded message envelope.
+    :return: True if the signing certificate comes from an SNS host and the signature matches.
+    """
+    cert_url = message.get('SigningCertURL') or ''
+    if not is_signing_cert_url(cert_url):
+        logger.warning(f"Rejected SNS message with signing certificate URL {cert_url!r}")
+        return False
+    algorithm = SIGNATURE_HASHES.get(str(message.get('SignatureVersion')))
+    payload = string_to_sign(message)
+    if algorithm is None or payload is None or not message.get('Signature'):
+        return False
+    try:
+        public_key = get_signing_certificate(cert_url).public_key()
+        if not isinstance(public_key, rsa.RSAPublicKey):
+            return False
+        public_key.verify(base64.b64decode(message['Signature']), payload, padding.PKCS1v15(), algorithm())
+        return True
+    except InvalidSignature:
+        logger.warning(f"Rejected SNS message {message.get('MessageId')} with an invalid signature")
+        return False
+    except (requests.RequestException, ValueError) as e:
+        logger.error(f"Could not verify SNS message {message.get('MessageId')}: {e}")
+        return False
@@ -0,0 +1,311 @@
+"""
+Async Server-Sent Events gateway.
+
+Wraps the ASGI app and serves ``/api/events/stream`` on the event loop instead of a WSGI thread. Each process holds a
+single Redis pattern subscription (``user:*``) and fans messages out to connected clients through bounded queues, so
+a connection costs a coroutine and a small buffer rather than a worker thread and a Redis connection.
+
+Clients that fall more than ``SSE_CLIENT_BUFFER`` events behind are disconnected; they reconnect with Last-Event-ID
+and catch up from the user's Redis Stream with XRANGE.
+"""
+import asyncio
+from http.cookies import SimpleCookie
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs
+
+import redis.asyncio as aioredis
+
+from lib.data_types import UserID
+from lib.services.notifications import (REPLAY_LIMIT, decode_live_message,
+                                        event_stream_key, format_sse,
+                                        parse_stream_id, replay_start_id)
+from settings import (NOTIFICATIONS_CHANNEL, REDIS_HOST, REDIS_PORT,
+                      SSE_CLIENT_BUFFER, SSE_HEARTBEAT_SECONDS, logger)
+
+SSE_PATH = "/api/events/stream"
+CHANNEL_PREFIX = "user:"
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def _default_redis() -> Any:
+    """
+    Create the async Redis client used for the subscription and replays.
+    :return: redis.asyncio.Redis
+    """
+    return aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=NOTIFICATIONS_CHANNEL, decode_responses=True)
+
+
+class SSEClient:
+    """
+    One connected browser: a bounded queue of (stream ID, payload) pairs.
+    """
+    def __init__(self, user_id: str, buffer_size: int = SSE_CLIENT_BUFFER) -> None:
+        """
+        :param user_id: The user the client listens for.
+        :param buffer_size: Events buffered before the client is dropped.
+        """
+        self.user_id = user_id
+        self.queue: "asyncio.Queue[Tuple[Optional[str], str]]" = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = False
+
+    def offer(self, item: Tuple[Optional[str], str]) -> bool:
+        """
+        Queue an event without blocking; a full queue drops the client.
+        :param item: (stream ID, payload)
+        :return: bool - False if the client was (or now is) dropped.
+        """
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            return False
+
+
+class EventHub:
+    """
+    Per-process fan-out of one Redis pattern subscription to all connected clients.
+    """
+    def __init__(self, redis_factory: Optional[Callable[[], Any]] = None, buffer_size: int = SSE_CLIENT_BUFFER) -> None:
+        """
+        :param redis_factory: Creates the async Redis client; defaults to the settings connection.
+        :param buffer_size: Per-client buffer size.
+        """
+        self._redis_factory = redis_factory or _default_redis
+        self._redis: Any = None
+        self.buffer_size = buffer_size
+        self._clients: Dict[str, Set[SSEClient]] = {}
+        self._listener: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def redis(self) -> Any:
+        """
+        The async Redis client, created on first use.
+        :return: redis.asyncio.Redis
+        """
+        if self._redis is None:
+            self._redis = self._redis_factory()
+        return self._redis
+
+    @property
+    def client_count(self) -> int:
+        """
+        Number of connected clients.
+        :return: int
+        """
+        return sum(len(clients) for clients in self._clients.values())
+
+    def subscribe(self, user_id: str) -> SSEClient:
+        """
+        Register a client for a user's events and make sure the subscription is running.
+        :param user_id: The user to listen for.
+        :return: SSEClient
+        """
+        client = SSEClient(user_id, self.buffer_size)
+        self._clients.setdefault(user_id, set()).add(client)
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+        return client
+
+    def unsubscribe(self, client: SSEClient) -> None:
+        """
+        Remove a client.
+        :param client: SSEClient
+        :return: None
+        """
+        clients = self._clients.get(client.user_id)
+        if clients is not None:
+            clients.discard(client)
+            if not clients:
+                del self._clients[client.user_id]
+
+    def dispatch(self, channel: str, data: str) -> None:
+        """
+        Deliver a published message to the clients of the channel's user.
+        :param channel: e.g. "user:123"
+        :param data: Raw message data.
+        :return: None
+        """
+        clients = self._clients.get(channel[len(CHANNEL_PREFIX):])
+        if not clients:
+            return
+        item = decode_live_message(data)
+        for client in list(clients):
+            if not client.dropped and not client.offer(item):
+                logger.warning(f"SSE client for user {client.user_id} fell behind; dropping it")
+
+    def drop_all(self) -> None:
+        """
+        Drop every client so they reconnect and replay from the stream.
+        :return: None
+        """
+        for clients in self._clients.values():
+            for client in clients:
+                client.dropped = True
+
+    async def _listen(self) -> None:
+        """
+        Hold the pattern subscription, reconnecting with backoff.
+        :return: None
+        """
+        backoff = 1.0
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                backoff = 1.0
+                async for message in pubsub.listen():
+                    if message.get("type") == "pmessage":
+                        self.dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Messages published while we were disconnected are lost; clients recover them by replaying.
+                logger.error(f"SSE subscription failed, reconnecting in {backoff:.0f}s: {e}")
+                self.drop_all()
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+async def _wait_for_disconnect(receive: Receive) -> None:
+    """
+    Return once the client has gone away.
+    :param receive: ASGI receive callable.
+    :return: None
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+class SSEGateway:
+    """
+    ASGI middleware serving the event stream; every other request goes to the wrapped app.
+    """
+    def __init__(self, app: Any, flask_app: Any = None, hub: Optional[EventHub] = None,
+                 heartbeat_seconds: float = SSE_HEARTBEAT_SECONDS, path: str = SSE_PATH) -> None:
+        """
+        :param app: The ASGI app to wrap.
+        :param flask_app: The Flask app whose session cookie identifies the user.
+        :param hub: EventHub to use; one is created per process by default.
+        :param heartbeat_seconds: Seconds between keep-alive comments.
+        :param path: Path of the event stream.
+        """
+        self.app = app
+        self.flask_app = flask_app
+        self.hub = hub or EventHub()
+        self.heartbeat_seconds = heartbeat_seconds
+        self.path = path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] == self.path and scope["method"] == "GET":
+            await self.stream(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    def _session_user_id(self, cookie_header: str) -> Optional[str]:
+        """
+        Read user_id from the Flask session cookie.
+        :param cookie_header: Raw Cookie header.
+        :return: Optional[str]
+        """
+        if self.flask_app is None or not cookie_header:
+            return None
+        interface = self.flask_app.session_interface
+        if not hasattr(interface, "get_signing_serializer"):
+            return None
+        morsel = SimpleCookie(cookie_header).get(self.flask_app.config["SESSION_COOKIE_NAME"])
+        serializer = interface.get_signing_serializer(self.flask_app)
+        if morsel is None or serializer is None:
+            return None
+        try:
+            max_age = int(self.flask_app.permanent_session_lifetime.total_seconds())
+            data = serializer.loads(morsel.value, max_age=max_age)
+        except Exception:
+            return None
+        user_id = data.get("user_id")
+        return str(user_id) if user_id else None
+
+    async def stream(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """
+        Serve one event stream: replay from Last-Event-ID, then live events with heartbeats.
+        """
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        query = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode("latin-1")).items()}
+
+        # Same resolution as the Flask route: the session first, then the query parameter.
+        user_id = self._session_user_id(headers.get("cookie", "")) or query.get("user_id")
+        if not user_id:
+            await send({"type": "http.response.start", "status": 401,
+                        "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"Unauthorized"})
+            return
+
+        origin = headers.get("origin") or "*"
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+            (b"access-control-allow-origin", origin.encode("latin-1")),
+            (b"access-control-allow-credentials", b"false"),
+            (b"access-control-allow-headers", b"Content-Type, Authorization, Accept, Cache-Control"),
+        ]})
+
+        async def write(chunk: str) -> None:
+            await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+
+        # Subscribe before replaying so nothing published in between is missed; duplicates are skipped by ID.
+        client = self.hub.subscribe(user_id)
+        disconnected = asyncio.create_task(_wait_for_disconnect(receive))
+        pending_get: Optional["asyncio.Future[Tuple[Optional[str], str]]"] = None
+        try:
+            last_sent: Optional[Tuple[int, int]] = None
+            start = replay_start_id(headers.get("last-event-id") or query.get("last_event_id"), query.get("since"))
+            if start:
+                entries: List[Any] = await self.hub.redis.xrange(
+                    event_stream_key(UserID(user_id)), min=start, max="+", count=REPLAY_LIMIT
+                )
+                for entry_id, fields in entries:
+                    await write(format_sse(fields["data"], entry_id))
+                    last_sent = parse_stream_id(entry_id)
+
+            while not client.dropped:
+                if pending_get is None:
+                    pending_get = asyncio.create_task(client.queue.get())
+                waiting: Set["asyncio.Future[Any]"] = {pending_get, disconnected}
+                done, _ = await asyncio.wait(
+                    waiting, timeout=self.heartbeat_seconds,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnected in done:
+                    break
+                if pending_get not in done:
+                    await write(": ping\n\n")
+                    continue
+                stream_id, payload = pending_get.result()
+                pending_get = None
+                if stream_id and last_sent is not None and parse_stream_id(stream_id) <= last_sent:
+                    continue
+                await write(format_sse(payload, stream_id))
+                if stream_id:
+                    last_sent = parse_stream_id(stream_id)
+        finally:
+            self.hub.unsubscribe(client)
+            disconnected.cancel()
+            if pending_get is not None:
+                pending_get.cancel()
+            try:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            except Exception:
+                pass
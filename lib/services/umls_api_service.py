@@ -8,6 +8,8 @@ from typing import Dict, List, Optional, Union
 
 import requests
 
+from lib.infra.instrumentation import track_external
+
 #INTERVAL = 0.05 # 20 requests per second
 COURTESY_PADDING = 0.005
 INTERVAL = 0.05 + COURTESY_PADDING # 20 requests per second with padding
@@ -49,7 +51,9 @@ class UMLSApiService:
         if sabs:
             params["sabs"] = ",".join(sabs)
 
-        response = self.session.get(f"{self.base_url}/rest/search/current", params=params)
+        with track_external("umls", "search") as call:
+            response = self.session.get(f"{self.base_url}/rest/search/current", params=params)
+            call.ok = response.ok
 
         time.sleep(INTERVAL)
 
@@ -73,10 +77,12 @@ class UMLSApiService:
         """
         Return all atom names/synonyms for a given CUI.
         """
-        response = self.session.get(
-            f"{self.base_url}/rest/content/current/CUI/{cui}/atoms",
-            params={"apiKey": self.api_key},
-        )
+        with track_external("umls", "atoms") as call:
+            response = self.session.get(
+                f"{self.base_url}/rest/content/current/CUI/{cui}/atoms",
+                params={"apiKey": self.api_key},
+            )
+            call.ok = response.ok
 
         time.sleep(INTERVAL)
 
@@ -113,10 +119,12 @@ class UMLSApiService:
         """
         Return all ICD-10-CM codes mapped from a given UMLS CUI.
         """
-        response = self.session.get(
-            f"{self.base_url}/rest/crosswalk/current/source/UMLS/{cui}",
-            params={"apiKey": self.api_key, "targetSource": "ICD10CM"},
-        )
+        with track_external("umls", "crosswalk") as call:
+            response = self.session.get(
+                f"{self.base_url}/rest/crosswalk/current/source/UMLS/{cui}",
+                params={"apiKey": self.api_key, "targetSource": "ICD10CM"},
+            )
+            call.ok = response.ok
 
         time.sleep(INTERVAL)
 
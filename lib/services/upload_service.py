@@ -1,17 +1,140 @@
 """
 Service for handling file uploads and processing tasks using Celery.
+
+PDF OCR runs as a small state machine instead of blocking a worker while Textract works:
+
+1. ``process_upload_task`` checks the OCR cache and otherwise submits a Textract job;
+2. completion is picked up either by ``poll_textract_job_task`` (rescheduling itself with a countdown) or, when an
+   SNS topic is configured, by ``collect_textract_result_task`` triggered from the notification endpoint. With SNS a
+   poll is still scheduled after ``OCR_NOTIFICATION_FALLBACK`` seconds, so a lost notification cannot leave the
+   upload processing forever; whichever task runs second finds the upload finished and does nothing;
+3. all result pages are fetched, the text is cached by content hash and the upload is marked completed.
 """
+from typing import Any, Dict, Optional
+
 from celery import shared_task # type: ignore
-from lib.models.upload import Upload, UploadStatus, update_upload_status
-from lib.services.ocr import OCRService
-from settings import logger
+from lib.db.surreal import DbController
+from lib.models.ocr_cache import get_ocr_cache, store_ocr_cache
+from lib.models.upload import Upload, UploadStatus, get_upload_by_id, update_upload_status
+from lib.services.ocr import OCRService, extract_text_from_blocks
+from settings import (BUCKET_NAME, S3_AWS_ACCESS_KEY_ID,
+                      S3_AWS_SECRET_ACCESS_KEY, TEXTRACT_STUB, logger)
+
+# Seconds between Textract status checks, and how many checks before giving up (~10 minutes).
+OCR_POLL_INTERVAL = 5
+OCR_MAX_POLLS = 120
+# Delay before the fallback poll of a job that reports completion through SNS.
+OCR_NOTIFICATION_FALLBACK = OCR_POLL_INTERVAL * 60
+
+
+def _s3_etag_key(s3_key: str) -> str:
+    """
+    Derive a content key from the S3 object's ETag when no content hash was recorded at upload time.
+    :param s3_key: str - Key of the object in S3.
+    :return: str - Cache key, or an empty string if the object could not be inspected.
+    """
+    if TEXTRACT_STUB:
+        return ""
+    try:
+        import boto3  # type: ignore[import-untyped]
+        s3 = boto3.client(
+            's3',
+            aws_access_key_id=S3_AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=S3_AWS_SECRET_ACCESS_KEY,
+        )
+        etag = s3.head_object(Bucket=BUCKET_NAME, Key=s3_key)['ETag'].strip('"')
+        return f"etag:{etag}"
+    except Exception as e:
+        logger.warning(f"[Celery] Could not read ETag for {s3_key}: {e}")
+        return ""
+
+
+def get_cached_ocr_text(cache_key: str) -> Optional[str]:
+    """
+    Look up previously extracted text for a document.
+    :param cache_key: str - Content hash of the document.
+    :return: Optional[str] - The cached text, or None on a cache miss.
+    """
+    if not cache_key:
+        return None
+    db = DbController()
+    try:
+        db.connect()
+        cached = get_ocr_cache(db, cache_key)
+        return cached["text"] if cached else None
+    except Exception as e:
+        logger.error(f"[Celery] OCR cache lookup failed: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def cache_ocr_text(cache_key: str, text: str, block_count: int = 0) -> None:
+    """
+    Store extracted text for a document.
+    :param cache_key: str - Content hash of the document.
+    :param text: str - Extracted text.
+    :param block_count: int - Number of Textract blocks.
+    :return: None
+    """
+    if not cache_key:
+        return
+    db = DbController()
+    try:
+        db.connect()
+        store_ocr_cache(db, cache_key, text, block_count)
+    except Exception as e:
+        logger.error(f"[Celery] OCR cache store failed: {e}")
+    finally:
+        db.close()
+
+
+def textract_job_pending(upload: Dict[str, Any], upload_id: str, job_id: str) -> bool:
+    """
+    Whether an upload is still waiting for this Textract job: not finished yet and not resubmitted with another job.
+    :param upload: Dict[str, Any] - The upload record.
+    :param upload_id: str - The upload being processed.
+    :param job_id: str - The Textract job ID.
+    :return: bool
+    """
+    if upload.get("textract_job_id") and upload["textract_job_id"] != job_id:
+        logger.warning(f"[Celery] Ignoring stale Textract job {job_id} for upload {upload_id}")
+        return False
+    if upload.get("status") and upload["status"] != UploadStatus.PROCESSING.value:
+        logger.info(f"[Celery] Upload {upload_id} is already {upload['status']}, ignoring Textract job {job_id}")
+        return False
+    return True
+
+
+def finish_textract_job(ocr_service: OCRService, upload_id: str, job_id: str, cache_key: str, first_page: Dict[str, Any]) -> None:
+    """
+    Collect a finished Textract job's results and complete the upload.
+    :param ocr_service: OCRService - Service used to fetch result pages.
+    :param upload_id: str - The upload being processed.
+    :param job_id: str - The Textract job ID.
+    :param cache_key: str - Content hash to cache the text under.
+    :param first_page: Dict[str, Any] - The status response, reused as the first result page.
+    :return: None
+    """
+    status = first_page.get('JobStatus')
+    if status not in ('SUCCEEDED', 'PARTIAL_SUCCESS'):
+        raise Exception(f"Textract job {job_id} failed: {first_page.get('StatusMessage', status)}")
+
+    blocks = ocr_service.get_all_blocks(job_id, first_page=first_page)
+    result_text = extract_text_from_blocks(blocks)
+    cache_ocr_text(cache_key, result_text, len(blocks))
+    update_upload_status(upload_id, UploadStatus.COMPLETED, processed_text=result_text)
+    logger.info(f"[Celery] Upload {upload_id} processed successfully ({len(blocks)} Textract blocks).")
 
 
 @shared_task(bind=True)
-def process_upload_task(self, upload_id: str, file_type: str, s3_key: str):
+def process_upload_task(self, upload_id: str, file_type: str, s3_key: str, content_hash: str = ""):
     """
     Celery task to process an uploaded file (OCR or transcription).
     Updates the Upload status in the database.
+
+    PDFs are submitted to Textract and finished by a follow-up task, so this task never waits on the job.
+    Documents whose content was OCR'd before are completed straight from the cache.
     """
     logger.info(f"[Celery] Processing upload {upload_id} (type={file_type}, s3_key={s3_key})")
     try:
@@ -19,12 +142,28 @@ def process_upload_task(self, upload_id: str, file_type: str, s3_key: str):
         logger.debug(f"[Celery] Update upload status result: {result}")
         result_text = ""
         if file_type in ("pdf", "image"):
+            cache_key = content_hash or _s3_etag_key(s3_key)
+            cached_text = get_cached_ocr_text(cache_key)
+            if cached_text is not None:
+                logger.info(f"[Celery] OCR cache hit for upload {upload_id}")
+                update_upload_status(upload_id, UploadStatus.COMPLETED, processed_text=cached_text)
+                return
+
             ocr_service = OCRService()
-            # Use S3-based OCR for scalability
             if file_type == "pdf":
-                result_text = ocr_service.get_text_from_pdf_s3(s3_key)
-            else:
-                result_text = ocr_service.get_text_from_image_s3(s3_key)
+                job_id = ocr_service.start_pdf_text_detection(s3_key, job_tag=upload_id)
+                update_upload_status(
+                    upload_id, UploadStatus.PROCESSING,
+                    extra={"textract_job_id": job_id, "content_hash": cache_key}
+                )
+                countdown = OCR_NOTIFICATION_FALLBACK if ocr_service.notifications_enabled else OCR_POLL_INTERVAL
+                poll_textract_job_task.apply_async( # type: ignore
+                    args=[upload_id, job_id, cache_key, 1], countdown=countdown
+                )
+                return
+
+            result_text = ocr_service.get_text_from_image_s3(s3_key)
+            cache_ocr_text(cache_key, result_text)
         elif file_type == "audio":
             # Placeholder for audio transcription
             result_text = "[Transcription not implemented yet]"
@@ -32,8 +171,48 @@ def process_upload_task(self, upload_id: str, file_type: str, s3_key: str):
             # No processing for text/unknown
             result_text = ""
         result = update_upload_status(upload_id, UploadStatus.COMPLETED, processed_text=result_text)
-        logger.warning(f"[Celery] Update upload status result: {result}")
-        logger.warning(f"[Celery] Upload {upload_id} processed successfully.")
+        logger.debug(f"[Celery] Update upload status result: {result}")
+        logger.info(f"[Celery] Upload {upload_id} processed successfully.")
+    except Exception as e:
+        logger.error(f"[Celery] Failed to process upload {upload_id}: {e}")
+        update_upload_status(upload_id, UploadStatus.FAILED, processed_text=str(e))
+
+
+@shared_task(bind=True)  # type: ignore[misc]
+def poll_textract_job_task(self: Any, upload_id: str, job_id: str, cache_key: str, attempt: int) -> None:
+    """
+    Check a Textract job once; reschedule with a countdown while it is still running.
+    """
+    try:
+        if not textract_job_pending(get_upload_by_id(upload_id) or {}, upload_id, job_id):
+            return
+        ocr_service = OCRService()
+        page = ocr_service.get_job_page(job_id)
+        if page.get('JobStatus') == 'IN_PROGRESS':
+            if attempt >= OCR_MAX_POLLS:
+                raise Exception(f"Textract job {job_id} did not finish after {attempt} checks")
+            poll_textract_job_task.apply_async( # type: ignore
+                args=[upload_id, job_id, cache_key, attempt + 1], countdown=OCR_POLL_INTERVAL
+            )
+            return
+        finish_textract_job(ocr_service, upload_id, job_id, cache_key, page)
+    except Exception as e:
+        logger.error(f"[Celery] Failed to process upload {upload_id}: {e}")
+        update_upload_status(upload_id, UploadStatus.FAILED, processed_text=str(e))
+
+
+@shared_task(bind=True)  # type: ignore[misc]
+def collect_textract_result_task(self: Any, upload_id: str, job_id: str) -> None:
+    """
+    Finish an upload after Textract reported job completion through SNS.
+    """
+    try:
+        upload = get_upload_by_id(upload_id) or {}
+        if not textract_job_pending(upload, upload_id, job_id):
+            return
+        ocr_service = OCRService()
+        page = ocr_service.get_job_page(job_id)
+        finish_textract_job(ocr_service, upload_id, job_id, upload.get("content_hash", ""), page)
     except Exception as e:
         logger.error(f"[Celery] Failed to process upload {upload_id}: {e}")
         update_upload_status(upload_id, UploadStatus.FAILED, processed_text=str(e))
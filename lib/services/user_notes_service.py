@@ -1,7 +1,7 @@
 """
 User Notes Service for managing user notes.
 """
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from surrealdb import RecordID # type: ignore
 
@@ -9,6 +9,70 @@ from lib.db.surreal import DbController
 from lib.models.user.user_notes import UserNote
 from settings import logger
 
+# Title matches count this many times as much as content matches when ranking search results
+TITLE_BOOST = 2.0
+MAX_SEARCH_PAGE_SIZE = 100
+
+
+def build_note_search_query(
+        user_id: str,
+        query: str,
+        include_shared: bool = True,
+        tags: Optional[List[str]] = None,
+        prefix: bool = False,
+        page: int = 1,
+        page_size: int = 20
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build the full-text search statement for notes visible to a user
+
+    Word searches use the BM25 title and content indexes and also match notes with a tag equal to the query, prefix
+    searches the edge n-gram index over title and tags, and the tag filter the tags index. One row more than the
+    page size is requested so the caller can tell whether there is a next page.
+
+    :param user_id: ID of the user searching
+    :param query: Search text; may be empty when filtering by tags only
+    :param include_shared: Whether to include shared notes from other users
+    :param tags: Only notes carrying all of these tags
+    :param prefix: Match words that start with the query terms (typeahead)
+    :param page: 1-based page number
+    :param page_size: Notes per page
+    :return: (statement, params)
+    """
+    page = max(1, page)
+    page_size = min(max(1, page_size), MAX_SEARCH_PAGE_SIZE)
+    params: Dict[str, Any] = {
+        "user_id": user_id,
+        "limit": page_size + 1,
+        "start": (page - 1) * page_size,
+    }
+    conditions = ["(user_id = $user_id OR note_type = 'shared')" if include_shared else "user_id = $user_id"]
+    fields = ["*"]
+    order = ["date_updated DESC"]
+
+    if query and prefix:
+        conditions.append("search_prefix @0@ $query")
+        fields.append("search::score(0) AS score")
+        order.insert(0, "score DESC")
+        params["query"] = query
+    elif query:
+        conditions.append("(title @0@ $query OR content @1@ $query OR tags CONTAINS $query)")
+        fields.append("(search::score(0) ?? 0) * $title_boost + (search::score(1) ?? 0) AS score")
+        fields.append("search::highlight('<b>', '</b>', 1) AS highlight")
+        order.insert(0, "score DESC")
+        params["query"] = query
+        params["title_boost"] = TITLE_BOOST
+
+    if tags:
+        conditions.append("tags CONTAINSALL $tags")
+        params["tags"] = tags
+
+    statement = (
+        f"SELECT {', '.join(fields)} FROM UserNote WHERE {' AND '.join(conditions)} "
+        f"ORDER BY {', '.join(order)} LIMIT $limit START $start"
+    )
+    return statement, params
+
 
 class UserNotesService:
     """
@@ -247,6 +311,13 @@ class UserNotesService:
                     return False, msg, None
                 updates['tags'] = tags
             
+            # Keep the typeahead index in step with the title and tags
+            if 'title' in updates or 'tags' in updates:
+                updates['search_prefix'] = UserNote.prefix_text(
+                    updates.get('title', existing_note.title),
+                    updates.get('tags', existing_note.tags)
+                )
+
             # Always update the date_updated field
             from datetime import datetime, timezone
             updates['date_updated'] = datetime.now(timezone.utc).isoformat()
@@ -320,47 +391,70 @@ class UserNotesService:
             logger.error(f"Error deleting note: {e}")
             return False, f"Error deleting note: {str(e)}"
     
-    def search_notes(self, user_id: str, query: str, include_shared: bool = True) -> List[UserNote]:
+    def search_notes_page(
+            self,
+            user_id: str,
+            query: str,
+            include_shared: bool = True,
+            tags: Optional[List[str]] = None,
+            prefix: bool = False,
+            page: int = 1,
+            page_size: int = 20
+    ) -> Dict[str, Any]:
         """
-        Search notes by title, content, or tags
-        
+        Ranked, paginated full-text search over the notes a user can see
+
         :param user_id: ID of the user
-        :param query: Search query
+        :param query: Search text; may be empty when filtering by tags only
         :param include_shared: Whether to include shared notes from other users
-        :return: List of UserNote objects matching the search
+        :param tags: Only notes carrying all of these tags
+        :param prefix: Match words that start with the query terms (typeahead)
+        :param page: 1-based page number
+        :param page_size: Notes per page
+        :return: {"notes": [UserNote], "scores": [...], "highlights": [...], "page": n, "page_size": n, "has_more": bool}
         """
+        statement, params = build_note_search_query(user_id, query, include_shared, tags, prefix, page, page_size)
+        page_size = params["limit"] - 1
+        empty: Dict[str, Any] = {"notes": [], "scores": [], "highlights": [], "page": max(1, page),
+                                 "page_size": page_size, "has_more": False}
+        if not query and not tags:
+            return empty
         try:
-            logger.debug(f"search_notes - user_id: {user_id}, query: {query}, include_shared: {include_shared}")
-            
-            if include_shared:
-                result = self.db.query(
-                    """
-                    SELECT * FROM UserNote 
-                    WHERE (user_id = $user_id OR note_type = 'shared')
-                    AND (title CONTAINS $query OR content CONTAINS $query OR array::any(tags) CONTAINS $query)
-                    ORDER BY date_updated DESC
-                    """,
-                    {"user_id": user_id, "query": query}
-                )
-            else:
-                result = self.db.query(
-                    """
-                    SELECT * FROM UserNote 
-                    WHERE user_id = $user_id
-                    AND (title CONTAINS $query OR content CONTAINS $query OR array::any(tags) CONTAINS $query)
-                    ORDER BY date_updated DESC
-                    """,
-                    {"user_id": user_id, "query": query}
-                )
-            
-            notes: List[UserNote] = []
-            if result:
-                for note_data in result:
-                    notes.append(UserNote.from_dict(note_data))
-            
-            logger.debug(f"Found {len(notes)} notes matching query '{query}' for user {user_id}")
-            return notes
-            
+            logger.debug("search_notes - user_id: %s, query: %s, tags: %s, prefix: %s, page: %s",
+                         user_id, query, tags, prefix, page)
+            rows = self.db.query(statement, params) or []
+            page_rows = rows[:page_size]
+            return {
+                **empty,
+                "notes": [UserNote.from_dict(row) for row in page_rows],
+                "scores": [row.get('score') for row in page_rows],
+                "highlights": [row.get('highlight') for row in page_rows],
+                "has_more": len(rows) > page_size,
+            }
         except Exception as e:
             logger.error(f"Error searching notes: {e}")
-            return [] 
\ No newline at end of file
+            return empty
+
+    def search_notes(
+            self,
+            user_id: str,
+            query: str,
+            include_shared: bool = True,
+            tags: Optional[List[str]] = None,
+            prefix: bool = False,
+            page: int = 1,
+            page_size: int = 20
+    ) -> List[UserNote]:
+        """
+        Search notes by title, content, or tags, best match first
+
+        :param user_id: ID of the user
+        :param query: Search query
+        :param include_shared: Whether to include shared notes from other users
+        :param tags: Only notes carrying all of these tags
+        :param prefix: Match words that start with the query terms (typeahead)
+        :param page: 1-based page number
+        :param page_size: Notes per page
+        :return: List of UserNote objects matching the search
+        """
+        return self.search_notes_page(user_id, query, include_shared, tags, prefix, page, page_size)["notes"]
@@ -0,0 +1,263 @@
+"""
+Typeahead search over active users.
+
+Active users are mirrored in process by ``UserSearchIndex``. It has two parts:
+
+* A sorted word list for prefix matches. Words are taken from the username, the first and last names and the
+  email address.
+* Trigram posting lists for matches inside a word, such as "mith" finding "Smith".
+
+A query walks only the matching slice of the word list. It stops as soon as ``limit`` users are found. If that is
+not enough, it scans the rarest trigram's postings. Inactive users are never indexed, so neither the active-user
+filter nor the limit costs a pass over every user.
+
+Users created or changed in this process are applied to the live index through ``user_changed``. They go into a
+small overlay that is scanned linearly. Other workers pick up the changes when their index becomes older than
+``USER_SEARCH_INDEX_TTL_SECONDS``, and the rebuild folds the overlay back into the sorted structures.
+"""
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from lib.db.surreal import DbController
+from settings import USER_SEARCH_INDEX_TTL_SECONDS, logger
+
+DEFAULT_LIMIT = 20
+NGRAM = 3
+
+USER_SEARCH_FIELDS = "id, username, email, first_name, last_name, role, is_active"
+
+_WORD_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def _rows(result: Any) -> List[Dict[str, Any]]:
+    if result and isinstance(result, list) and isinstance(result[0], dict) and 'result' in result[0]:
+        return result[0]['result'] or []
+    return result or []
+
+
+def search_text(record: Dict[str, Any]) -> str:
+    """
+    The lowercase text a user is matched against.
+    """
+    return " ".join(str(record.get(field) or "") for field in ("username", "first_name", "last_name", "email")).lower()
+
+
+def search_words(text: str) -> List[str]:
+    """
+    Distinct words of ``search_text`` for prefix matching; the whole email address is kept as one word as well.
+    """
+    words = {word for word in _WORD_SPLIT.split(text) if word}
+    words.update(part for part in text.split() if "@" in part)
+    return sorted(words)
+
+
+def user_result(record: Dict[str, Any]) -> Dict[str, str]:
+    """
+    The public fields returned for a matching user.
+    """
+    username = record.get("username") or ""
+    first_name = record.get("first_name") or ""
+    last_name = record.get("last_name") or ""
+    return {
+        "id": str(record["id"]) if record.get("id") is not None else "",
+        "username": username,
+        "email": record.get("email") or "",
+        "first_name": first_name,
+        "last_name": last_name,
+        "role": record.get("role") or "",
+        "display_name": f"{first_name} {last_name}".strip() or username,
+        "avatar": f"https://ui-avatars.com/api/?name={first_name or username}&background=random",
+    }
+
+
+class UserSearchIndex:
+    """
+    Prefix and trigram index over active users; see the module docstring.
+    """
+
+    def __init__(self, records: Iterable[Dict[str, Any]]) -> None:
+        entries = [(user_result(r), search_text(r)) for r in records
+                   if r.get("id") is not None and r.get("is_active", True)]
+        entries.sort(key=lambda e: (e[0]["display_name"].lower(), e[0]["username"]))
+        self._users = [user for user, _ in entries]
+        self._texts = [text for _, text in entries]
+        self._user_words = [search_words(text) for text in self._texts]
+        self._slots = {user["id"]: i for i, user in enumerate(self._users)}
+        self._dead: Set[int] = set()
+        self._overlay: Dict[str, Tuple[Dict[str, str], str, List[str]]] = {}
+        self._lock = threading.Lock()
+
+        pairs = sorted((word, i) for i, words in enumerate(self._user_words) for word in words)
+        self._words = [word for word, _ in pairs]
+        self._word_owners = array("i", (i for _, i in pairs))
+
+        postings: Dict[str, "array[int]"] = {}
+        for i, text in enumerate(self._texts):
+            for gram in {text[j:j + NGRAM] for j in range(len(text) - NGRAM + 1)}:
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array("i")
+                posting.append(i)
+        self._postings = postings
+
+    def __len__(self) -> int:
+        return len(self._users) - len(self._dead) + len(self._overlay)
+
+    def upsert(self, record: Dict[str, Any]) -> None:
+        """
+        Apply a created or changed user; inactive users are removed.
+        """
+        user_id = str(record.get("id") or "")
+        if not user_id:
+            return
+        with self._lock:
+            slot = self._slots.get(user_id)
+            if slot is not None:
+                self._dead = self._dead | {slot}
+            overlay = dict(self._overlay)
+            overlay.pop(user_id, None)
+            if record.get("is_active", True):
+                text = search_text(record)
+                overlay[user_id] = (user_result(record), text, search_words(text))
+            self._overlay = overlay
+
+    def _prefix_matches(self, words: List[str]) -> Iterator[int]:
+        # Walk the slice for the longest (most selective) word and check the others against the user's text.
+        head = max(words, key=len)
+        rest = [w for w in words if w is not head]
+        start = bisect_left(self._words, head)
+        for k in range(start, len(self._words)):
+            if not self._words[k].startswith(head):
+                break
+            i = self._word_owners[k]
+            if all(any(w.startswith(r) for w in self._user_words[i]) for r in rest):
+                yield i
+
+    def _substring_matches(self, query: str) -> Iterator[int]:
+        if len(query) < NGRAM:
+            return
+        postings: List["array[int]"] = []
+        for gram in {query[j:j + NGRAM] for j in range(len(query) - NGRAM + 1)}:
+            posting = self._postings.get(gram)
+            if posting is None:
+                return
+            postings.append(posting)
+        for i in min(postings, key=len):
+            if query in self._texts[i]:
+                yield i
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT,
+               exclude_id: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        Active users matching ``query``, prefix matches first, then matches inside a word.
+        :param query: Case-insensitive text; every word must start a word of the user's name, username or email.
+        :param limit: Maximum number of users returned.
+        :param exclude_id: A user to leave out, normally the one searching.
+        :return: List of user dicts as produced by ``user_result``.
+        """
+        query = " ".join(query.lower().split())
+        words = [w for w in _WORD_SPLIT.split(query) if w]
+        dead, overlay = self._dead, self._overlay
+        results: List[Dict[str, str]] = []
+        seen = set()
+
+        def take(user: Dict[str, str]) -> bool:
+            if user["id"] not in seen and user["id"] != exclude_id:
+                seen.add(user["id"])
+                results.append(user)
+            return len(results) >= limit
+
+        if limit <= 0:
+            return results
+        if not words:
+            for i, user in enumerate(self._users):
+                if i not in dead and take(user):
+                    return results
+            for user, _, _ in overlay.values():
+                if take(user):
+                    return results
+            return results
+
+        for i in self._prefix_matches(words):
+            if i not in dead and take(self._users[i]):
+                return results
+        for user, _, user_words in overlay.values():
+            if all(any(w.startswith(q) for w in user_words) for q in words) and take(user):
+                return results
+        for i in self._substring_matches(query):
+            if i not in dead and take(self._users[i]):
+                return results
+        for user, text, _ in overlay.values():
+            if query in text and take(user):
+                return results
+        return results
+
+
+_index: Optional[UserSearchIndex] = None
+_index_loaded_at = 0.0
+_index_lock = threading.Lock()
+
+
+def load_users(db: DbController) -> List[Dict[str, Any]]:
+    """
+    Read the searchable fields of every active user.
+    """
+    return _rows(db.query(f"SELECT {USER_SEARCH_FIELDS} FROM User WHERE is_active = true", {}))
+
+
+def get_user_search_index(db: Optional[DbController] = None, refresh: bool = False) -> UserSearchIndex:
+    """
+    The process-wide user index, rebuilt when it is missing, stale or ``refresh`` is set.
+    :param db: Connected controller to load from; a short-lived one is opened otherwise.
+    :param refresh: Rebuild even if the current index is fresh.
+    :return: UserSearchIndex
+    """
+    global _index, _index_loaded_at
+    with _index_lock:
+        if not refresh and _index is not None and time.monotonic() - _index_loaded_at < USER_SEARCH_INDEX_TTL_SECONDS:
+            return _index
+        started = time.perf_counter()
+        if db is not None:
+            records = load_users(db)
+        else:
+            db = DbController()
+            try:
+                db.connect()
+                records = load_users(db)
+            finally:
+                db.close()
+        _index = UserSearchIndex(records)
+        _index_loaded_at = time.monotonic()
+        logger.debug("User search index built with %d users in %.1f ms", len(_index),
+                     (time.perf_counter() - started) * 1000)
+        return _index
+
+
+def user_changed(record: Dict[str, Any]) -> None:
+    """
+    Apply a created or updated user record to this process's index, if one is loaded.
+    """
+    index = _index
+    if index is not None:
+        index.upsert(record)
+
+
+def invalidate_user_search_index() -> None:
+    """
+    Drop the in-process index so the next search reloads it.
+    """
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def search_users(query: str, limit: int = DEFAULT_LIMIT, exclude_id: Optional[str] = None,
+                 db: Optional[DbController] = None) -> List[Dict[str, str]]:
+    """
+    Active users matching ``query``; see ``UserSearchIndex.search``.
+    """
+    return get_user_search_index(db).search(query, limit, exclude_id)
@@ -8,6 +8,7 @@ from lib.db.surreal import DbController
 from lib.models.user.user import User
 from lib.models.user.user_session import UserSession
 from lib.models.user.user_settings import UserSettings
+from lib.services.user_search import invalidate_user_search_index, user_changed
 from settings import logger
 
 
@@ -231,6 +232,7 @@ class UserService:
                             logger.error(f"Failed to create patient record for user: {user.id}")
                     except Exception as e:
                         logger.error(f"Exception during patient record creation: {e}")
+                user_changed({**user.to_dict(), 'id': str(user.id)})
                 return True, "User created successfully", user
             else:
                 logger.debug(f"Failed to create user. Result: {result}")
@@ -476,6 +478,7 @@ class UserService:
             
             result = self.db.update(f"User:{user_id}", updates)
             if result:
+                self._refresh_search_entry(user_id, result)
                 return True, "User updated successfully"
             else:
                 return False, "Failed to update user"
@@ -483,6 +486,19 @@ class UserService:
         except Exception as e:
             return False, f"Error updating user: {str(e)}"
     
+    def _refresh_search_entry(self, user_id: str, record: Dict[str, Any]) -> None:
+        """
+        Bring this worker's user search index in line with a saved change.
+
+        :param user_id: ID of the changed user, with or without the ``User:`` prefix
+        :param record: The saved record, or just the changed fields
+        """
+        record_id = f"User:{user_id.split(':')[-1]}"
+        if record.get('is_active') is False or record.get('username'):
+            user_changed({**record, 'id': record_id})
+        else:
+            invalidate_user_search_index()
+    
     def change_password(self, user_id: str, current_password: str, new_password: str) -> tuple[bool, str]:
         """
         Change user password
@@ -529,6 +545,7 @@ class UserService:
         try:
             result = self.db.update(f"User:{user_id}", {"is_active": False})
             if result:
+                self._refresh_search_entry(user_id, {"is_active": False})
                 return True, "User deactivated successfully"
             else:
                 return False, "Failed to deactivate user"
@@ -546,6 +563,7 @@ class UserService:
         try:
             result = self.db.update(f"User:{user_id}", {"is_active": True})
             if result:
+                self._refresh_search_entry(user_id, result)
                 return True, "User activated successfully"
             else:
                 return False, "Failed to activate user"
@@ -677,7 +695,7 @@ class UserService:
                 settings.set_openai_api_key("")
                 
                 # Save settings
-                return self.save_user_settings(user_id, settings)
+                return self._invalidate_openai_key(user_id, self.save_user_settings(user_id, settings))
             
             # Validate API key if not empty
             valid, msg = UserSettings.validate_openai_api_key(api_key)
@@ -693,11 +711,24 @@ class UserService:
             settings.set_openai_api_key(api_key)
             
             # Save settings
-            return self.save_user_settings(user_id, settings)
+            return self._invalidate_openai_key(user_id, self.save_user_settings(user_id, settings))
             
         except Exception as e:
             return False, f"Error updating API key: {str(e)}"
     
+    def _invalidate_openai_key(self, user_id: str, result: tuple[bool, str]) -> tuple[bool, str]:
+        """
+        Drop cached copies of the user's OpenAI key in every worker once a change has been saved.
+
+        :param user_id: ID of the user whose API key changed
+        :param result: (success, message) from saving the settings
+        :return: result, unchanged
+        """
+        if result[0]:
+            from lib.services.openai_security import get_openai_security_service
+            get_openai_security_service().invalidate_user(user_id)
+        return result
+
     def get_openai_api_key(self, user_id: str) -> str:
         """
         Get user's decrypted OpenAI API key
@@ -1,39 +1,223 @@
 """
 Video transcription Celery task service.
+
+Whisper models are cached for the lifetime of each worker process, and long recordings are split at silent points
+so the chunks can be transcribed in parallel across a process pool and stitched back together with timestamps.
 """
-import os, tempfile, subprocess, pathlib
+import json
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import boto3 # type: ignore
-# or minio
+import numpy as np
+from numpy.typing import NDArray
 
-import whisper # type: ignore
+from celery import shared_task  # type: ignore[import-untyped]
+from celery.signals import worker_process_init  # type: ignore[import-untyped]
 
-from celery import shared_task # type: ignore
+from lib.services.audio_chunking import AudioChunk, read_wav_mono, split_on_silence
 from settings import logger
 
-s3 = boto3.client(
-    "s3",
-    endpoint_url=os.getenv("S3_ENDPOINT_URL", "https://s3.amazonaws.com"),
-    aws_access_key_id=os.getenv("S3_ACCESS_KEY_ID", "your-access-key"),
-    aws_secret_key=os.getenv("S3_ACCESS_KEY_ID", "your-access-key"),
-    region_name=os.getenv("S3_REGION_NAME", "us-east-1"),
-)
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base.en")
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", 2))
+WHISPER_PRELOAD = os.getenv("WHISPER_PRELOAD", "false").lower() in ('true', '1', 't')
+WHISPER_CHUNK_SECONDS = float(os.getenv("WHISPER_CHUNK_SECONDS", 30))
+WHISPER_MAX_CHUNK_SECONDS = float(os.getenv("WHISPER_MAX_CHUNK_SECONDS", 60))
+
+_models: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+_s3: Any = None
+_s3_lock = threading.Lock()
+
+
+def get_s3_client() -> Any:
+    """
+    Return the S3 (or MinIO) client, creating it on first use so importing this module stays cheap.
+    :return: boto3 S3 client.
+    """
+    global _s3
+    if _s3 is None:
+        with _s3_lock:
+            if _s3 is None:
+                import boto3  # type: ignore[import-untyped]
+                _s3 = boto3.client(
+                    "s3",
+                    endpoint_url=os.getenv("S3_ENDPOINT_URL", "https://s3.amazonaws.com"),
+                    aws_access_key_id=os.getenv("S3_ACCESS_KEY_ID", "your-access-key"),
+                    aws_secret_access_key=os.getenv("S3_SECRET_ACCESS_KEY", "your-secret-key"),
+                    region_name=os.getenv("S3_REGION_NAME", "us-east-1"),
+                )
+    return _s3
+
+
+def get_whisper_model(name: Optional[str] = None) -> Any:
+    """
+    Return a Whisper model, loading it at most once per process.
+    :param name: Whisper model name; defaults to WHISPER_MODEL.
+    :return: The loaded Whisper model.
+    """
+    name = name or WHISPER_MODEL
+    model = _models.get(name)
+    if model is None:
+        with _models_lock:
+            model = _models.get(name)
+            if model is None:
+                import whisper  # type: ignore[import-untyped]
+                logger.info(f"Loading Whisper model '{name}' in process {os.getpid()}")
+                model = whisper.load_model(name)
+                _models[name] = model
+    return model
+
+
+@worker_process_init.connect  # type: ignore[misc]
+def _preload_whisper_model(**kwargs: Any) -> None:
+    """
+    Optionally load the Whisper model as soon as a Celery worker process starts.
+    :return: None
+    """
+    if WHISPER_PRELOAD:
+        get_whisper_model()
+
+
+def _init_pool_process(model_name: str) -> None:
+    """
+    Process pool initializer: load the model once per pool process.
+    :param model_name: Whisper model name.
+    :return: None
+    """
+    get_whisper_model(model_name)
+
 
+def get_transcription_pool() -> ProcessPoolExecutor:
+    """
+    Return the process pool used for parallel chunk transcription, creating it on first use.
 
-@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
-def transcribe_video_task(self, s3_uri: str, room: str, duration: float):
+    The pool lives as long as the worker process, so each pool process keeps its model in memory between tasks.
+    Processes are spawned rather than forked to avoid inheriting the parent's torch threads.
+    :return: ProcessPoolExecutor
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=WHISPER_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_pool_process,
+                    initargs=(WHISPER_MODEL,),
+                )
+    return _pool
+
+
+def transcribe_chunk(model_name: str, index: int, audio: NDArray[np.float32], offset: float) -> Dict[str, Any]:
+    """
+    Transcribe one chunk and shift its segment timestamps to the recording's timeline.
+    :param model_name: Whisper model name.
+    :param index: Chunk index.
+    :param audio: 16 kHz mono float32 samples of the chunk.
+    :param offset: Start of the chunk in the recording, in seconds.
+    :return: Dict with the chunk index, text and segments.
+    """
+    result = get_whisper_model(model_name).transcribe(audio)
+    segments = [
+        {"start": segment["start"] + offset, "end": segment["end"] + offset, "text": segment["text"]}
+        for segment in result.get("segments", [])
+    ]
+    return {"index": index, "text": result["text"], "segments": segments}
+
+
+def stitch_transcripts(results: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Join chunk transcripts back together in recording order.
+    :param results: Chunk results as returned by ``transcribe_chunk``.
+    :return: Tuple of (full text, segments with absolute timestamps).
+    """
+    ordered = sorted(results, key=lambda r: r["index"])
+    text = " ".join(r["text"].strip() for r in ordered if r["text"].strip())
+    segments = [segment for r in ordered for segment in r["segments"]]
+    return text, segments
+
+
+def transcribe_chunks(
+        samples: NDArray[np.float32],
+        chunks: List[AudioChunk],
+        on_partial: Optional[Callable[[str], None]] = None,
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Transcribe chunks in parallel and stitch the results.
+
+    With a single chunk, or ``WHISPER_WORKERS`` set to 1, chunks are transcribed in this process with the cached
+    model instead of the pool.
+
+    :param samples: The full recording (16 kHz mono float32).
+    :param chunks: Chunks to transcribe.
+    :param on_partial: Called with the transcript of the longest finished prefix of chunks whenever it grows.
+    :return: Tuple of (full text, segments with absolute timestamps).
+    """
+    results: Dict[int, Dict[str, Any]] = {}
+    next_index = 0
+
+    def collect(result: Dict[str, Any]) -> None:
+        nonlocal next_index
+        results[result["index"]] = result
+        if on_partial is None or result["index"] != next_index:
+            return
+        while next_index in results:
+            next_index += 1
+        text, _ = stitch_transcripts([results[i] for i in range(next_index)])
+        on_partial(text)
+
+    if WHISPER_WORKERS <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            audio = samples[chunk.start:chunk.end]
+            collect(transcribe_chunk(WHISPER_MODEL, chunk.index, audio, chunk.start_seconds))
+    else:
+        pool = get_transcription_pool()
+        futures: List[Future[Dict[str, Any]]] = [
+            pool.submit(
+                transcribe_chunk, WHISPER_MODEL, chunk.index,
+                np.ascontiguousarray(samples[chunk.start:chunk.end]), chunk.start_seconds
+            )
+            for chunk in chunks
+        ]
+        for future in as_completed(futures):
+            collect(future.result())
+
+    return stitch_transcripts(list(results.values()))
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, max_retries=3)  # type: ignore[misc]
+def transcribe_video_task(self: Any, s3_uri: str, room: str, duration: float, stream: bool = False) -> Dict[str, Any]:
     """
     1. Download mp4 from S3/MinIO
     2. Extract audio (ffmpeg) → wav
-    3. Run Whisper → text
-    4. Upload .txt to transcripts/ bucket/key.txt
+    3. Split on silence and run Whisper over the chunks in parallel → text + timestamped segments
+    4. Upload .txt and .json to transcripts/ bucket/key
+
+    With ``stream`` set, a ``.partial.txt`` transcript is uploaded every time the finished prefix of chunks grows.
     """
+    s3 = get_s3_client()
     bucket, key = s3_uri.replace("s3://", "").split("/", 1)
 
+    out_bucket = os.getenv("TRANSCRIPT_BUCKET", bucket)
+    out_base   = key.replace("recordings/", "transcripts/").rsplit(".", 1)[0]
+    out_key    = out_base + ".txt"
+    segments_key = out_base + ".json"
+    partial_key  = out_base + ".partial.txt"
+
     with tempfile.TemporaryDirectory() as tmpdir:
         mp4_path = f"{tmpdir}/video.mp4"
         wav_path = f"{tmpdir}/audio.wav"
         txt_path = f"{tmpdir}/transcript.txt"
+        segments_path = f"{tmpdir}/transcript.json"
 
         # 1. download
         s3.download_file(bucket, key, mp4_path)
@@ -46,14 +230,32 @@ def transcribe_video_task(self, s3_uri: str, room: str, duration: float):
         )
 
         # 3. whisper
-        model = whisper.load_model(os.getenv("WHISPER_MODEL", "base.en"))
-        result = model.transcribe(wav_path)
+        samples, sample_rate = read_wav_mono(wav_path)
+        chunks = split_on_silence(
+            samples, sample_rate,
+            target_seconds=WHISPER_CHUNK_SECONDS,
+            max_seconds=WHISPER_MAX_CHUNK_SECONDS,
+        )
+        logger.info(f"Transcribing {key} in {len(chunks)} chunks")
+
+        def upload_partial(text: str) -> None:
+            s3.put_object(Bucket=out_bucket, Key=partial_key, Body=text.encode("utf-8"))
+
+        text, segments = transcribe_chunks(samples, chunks, on_partial=upload_partial if stream else None)
         with open(txt_path, "w") as f:
-            f.write(result["text"])
+            f.write(text)
+        with open(segments_path, "w") as f:
+            json.dump(segments, f)
 
         # 4. upload
-        out_bucket = os.getenv("TRANSCRIPT_BUCKET", bucket)
-        out_key    = key.replace("recordings/", "transcripts/").rsplit(".", 1)[0] + ".txt"
         s3.upload_file(txt_path, out_bucket, out_key)
+        s3.upload_file(segments_path, out_bucket, segments_key)
+        if stream:
+            s3.delete_object(Bucket=out_bucket, Key=partial_key)
 
-        return {"out": f"s3://{out_bucket}/{out_key}", "duration": duration}
+        return {
+            "out": f"s3://{out_bucket}/{out_key}",
+            "segments": f"s3://{out_bucket}/{segments_key}",
+            "chunks": len(chunks),
+            "duration": duration
+        }
@@ -11,6 +11,7 @@ from typing import Dict, Any
 import requests
 
 from lib.db.surreal import DbController
+from lib.infra.instrumentation import track_external
 from lib.models.webhook_subscription import WebhookSubscription
 from settings import logger
 
@@ -106,12 +107,14 @@ def _deliver_to_subscription(
         try:
             logger.debug(f"Attempting webhook delivery to {subscription.target_url} (attempt {attempt + 1})")
             
-            response = requests.post(
-                subscription.target_url,
-                data=body,
-                headers=headers,
-                timeout=10
-            )
+            with track_external("webhook", payload["event"]) as call:
+                response = requests.post(
+                    subscription.target_url,
+                    data=body,
+                    headers=headers,
+                    timeout=10
+                )
+                call.ok = response.status_code < 400
             
             if response.status_code < 400:
                 logger.info(f"Webhook delivered successfully to {subscription.target_url}")
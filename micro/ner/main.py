@@ -1,36 +1,197 @@
 """
 A simple FastAPI app for extracting named entities from text using spaCy.
+
+Requests are not run one at a time on the event loop: a micro-batcher coalesces concurrent requests (and the texts
+of ``/ner/extract_batch`` calls) into ``nlp.pipe`` calls, which run in a pool of worker processes that each load the
+model once. With ``NER_WORKERS=0`` batches run on a thread in this process instead, which is handy for local dev.
 """
+import asyncio
+import logging
+import multiprocessing
 import os
-from fastapi import FastAPI
+import subprocess
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import spacy, logging, subprocess, sys
+import spacy
 
 #MODEL = "en_core_sci_sm"   # swap for _md, _lg or _scibert if you wish
 MODEL = os.environ.get("MODEL_NAME", "en_core_web_sm")  # default to small English model
 PIPE_DISABLE = ["parser", "lemmatizer"]  # we only need NER
 
-import time
-print("Starting load...")
-t0 = time.time()
+NER_WORKERS = int(os.environ.get("NER_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+NER_BATCH_SIZE = int(os.environ.get("NER_BATCH_SIZE", 64))      # texts per nlp.pipe call
+NER_BATCH_WAIT_MS = float(os.environ.get("NER_BATCH_WAIT_MS", 10))  # how long to wait for a batch to fill
+NER_MAX_BATCH_TEXTS = int(os.environ.get("NER_MAX_BATCH_TEXTS", 1000))  # per /ner/extract_batch request
+
+# uvicorn only configures its own loggers; this also covers the worker processes, which import this module.
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"),
+                    format="%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+nlp: Any = None
+
+
+def load_model() -> Any:
+    """
+    Load the spaCy model once per process.
+    """
+    global nlp
+    if nlp is None:
+        logger.info("Loading %s...", MODEL)
+        t0 = time.time()
+        # Lazy-load with download fallback (useful for local dev runs)
+        try:
+            nlp = spacy.load(MODEL, disable=PIPE_DISABLE)
+        except OSError:
+            logger.warning("%s not found – downloading...", MODEL)
+            subprocess.run([sys.executable, "-m", "spacy", "download", MODEL], check=True)
+            nlp = spacy.load(MODEL, disable=PIPE_DISABLE)
+        logger.info("Model loaded in %.2f seconds (pid %d)", time.time() - t0, os.getpid())
+    return nlp
+
+
+def extract_entities(texts: List[str]) -> List[List[Dict[str, Any]]]:
+    """
+    Run NER over a batch of texts with nlp.pipe. Runs inside the worker processes.
+    """
+    model = load_model()
+    return [
+        [
+            {"text": e.text, "label": e.label_, "start_char": e.start_char, "end_char": e.end_char}
+            for e in doc.ents
+        ]
+        for doc in model.pipe(texts, batch_size=NER_BATCH_SIZE)
+    ]
+
+
+class MicroBatcher:
+    """
+    Coalesces texts submitted by concurrent requests into batches for ``extract_entities``.
+
+    A batch is sent once it holds ``max_batch`` texts or ``max_wait`` seconds after its first text arrived. At most
+    ``max_in_flight`` batches run at once, so a burst queues up here instead of piling onto the pool.
+    """
+
+    def __init__(self, executor: Executor, max_batch: int, max_wait: float, max_in_flight: int) -> None:
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "asyncio.Queue[Tuple[str, asyncio.Future]]" = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._collect())
 
-# Lazy-load with download fallback (useful for local dev runs)
-try:
-    nlp = spacy.load(MODEL, disable=PIPE_DISABLE)
-except OSError:
-    logging.warning(f"{MODEL} not found – downloading...")
-    subprocess.run([sys.executable, "-m", "spacy", "download", MODEL], check=True)
-    nlp = spacy.load(MODEL, disable=PIPE_DISABLE)
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
 
-print(f"Model loaded in {time.time() - t0:.2f} seconds")
+    async def submit(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
+        """
+        Queue texts and wait for their entities; results are in the same order as ``texts``.
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self._queue.put_nowait((text, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
 
-app = FastAPI(title="Concept Extraction API", version="0.1.0")
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._slots.acquire()
+            loop.create_task(self._run(items))
+
+    async def _run(self, items: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            texts = [text for text, _ in items]
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, extract_entities, texts)
+            for (_, future), entities in zip(items, results):
+                if not future.done():
+                    future.set_result(entities)
+        except Exception as e:
+            logger.exception("NER batch failed")
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+
+def _init_worker() -> None:
+    load_model()
+
+
+def make_executor() -> Executor:
+    """
+    Process pool whose workers load the model up front, or a single thread when NER_WORKERS=0.
+    """
+    if NER_WORKERS <= 0:
+        load_model()
+        return ThreadPoolExecutor(max_workers=1)
+    return ProcessPoolExecutor(
+        max_workers=NER_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+batcher: Optional[MicroBatcher] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global batcher
+    executor = make_executor()
+    # Warm every worker so the first requests don't pay for model loading.
+    await asyncio.gather(*[
+        asyncio.get_running_loop().run_in_executor(executor, extract_entities, ["warm up"])
+        for _ in range(max(1, NER_WORKERS))
+    ])
+    batcher = MicroBatcher(
+        executor,
+        max_batch=NER_BATCH_SIZE,
+        max_wait=NER_BATCH_WAIT_MS / 1000,
+        max_in_flight=max(1, NER_WORKERS) * 2,
+    )
+    batcher.start()
+    try:
+        yield
+    finally:
+        await batcher.stop()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(title="Concept Extraction API", version="0.2.0", lifespan=lifespan)
 
 
 class TextIn(BaseModel):
     text: str
 
 
+class TextsIn(BaseModel):
+    texts: list[str]
+
+
 class EntityOut(BaseModel):
     text: str
     label: str
@@ -42,22 +203,32 @@ class ExtractionOut(BaseModel):
     entities: list[EntityOut]
 
 
+class BatchExtractionOut(BaseModel):
+    results: list[ExtractionOut]
+
+
 @app.post("/ner/extract", response_model=ExtractionOut)
 async def extract(payload: TextIn) -> ExtractionOut:
     """
     Extract named entities from the provided text.
     """
-    doc = nlp(payload.text)
-    ents = [
-        EntityOut(
-            text=e.text,
-            label=e.label_,
-            start_char=e.start_char,
-            end_char=e.end_char,
-        )
-        for e in doc.ents
-    ]
-    return ExtractionOut(entities=ents)
+    assert batcher is not None
+    (entities,) = await batcher.submit([payload.text])
+    return ExtractionOut(entities=[EntityOut(**e) for e in entities])
+
+
+@app.post("/ner/extract_batch", response_model=BatchExtractionOut)
+async def extract_batch(payload: TextsIn) -> BatchExtractionOut:
+    """
+    Extract named entities from many texts; results are returned in the same order.
+    """
+    if len(payload.texts) > NER_MAX_BATCH_TEXTS:
+        raise HTTPException(status_code=413, detail=f"At most {NER_MAX_BATCH_TEXTS} texts per request")
+    assert batcher is not None
+    results = await batcher.submit(payload.texts)
+    return BatchExtractionOut(
+        results=[ExtractionOut(entities=[EntityOut(**e) for e in entities]) for entities in results]
+    )
 
 
 @app.get("/ner/ready")
@@ -65,4 +236,4 @@ async def ready() -> dict:
     """
     Check if the service is ready.
     """
-    return {"status": "ready", "model": MODEL}
+    return {"status": "ready", "model": MODEL, "workers": NER_WORKERS, "batch_size": NER_BATCH_SIZE}
@@ -6,12 +6,15 @@ from dotenv import load_dotenv
 
 from lib.logger import Logger
 
-logger: Logger = Logger()
-
-
 dotenv_path = join(dirname(__file__), '.env')
 load_dotenv(dotenv_path)
 
+# 'json' emits one JSON object per line; LOG_ASYNC hands records to a background thread so requests never block on stderr
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+LOG_ASYNC = os.environ.get('LOG_ASYNC', 'true').lower() in ('true', '1', 't')
+
+logger: Logger = Logger(json_format=LOG_FORMAT == 'json', use_queue=LOG_ASYNC)
+
 
 SURREALDB_NAMESPACE = os.environ.get("SURREALDB_NAMESPACE")
 SURREALDB_DATABASE = os.environ.get("SURREALDB_DATABASE")
@@ -26,26 +29,19 @@ SURREALDB_URL = f"{SURREALDB_PROTOCOL}://{SURREALDB_HOST}:{SURREALDB_PORT}"
 
 SURREALDB_ICD_DB = os.environ.get("SURREALDB_ICD_DB", 'diagnosis')
 
-print("SUREALDB_NAMESPACE:", SURREALDB_NAMESPACE)
-print("SURREALDB_DATABASE:", SURREALDB_DATABASE)
-print("SURREALDB_URL:", SURREALDB_URL)
-print("SURREALDB_USER:", SURREALDB_USER)
-print("SURREALDB_PASS:", SURREALDB_PASS)
+# Credentials and keys are never logged
+logger.debug("SurrealDB: %s, namespace %s, database %s", SURREALDB_URL, SURREALDB_NAMESPACE, SURREALDB_DATABASE)
 
 # Security
 ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY')
 if not ENCRYPTION_KEY:
     raise ValueError("ENCRYPTION_KEY must be set in settings.py or environment variable")
 
-print("ENCRYPTION_KEY:", "SET" if ENCRYPTION_KEY else "NOT SET")
-
 PORT = os.environ.get('PORT', 5000)
 DEBUG = True if os.environ.get('DEBUG', 'true').lower() in ('true', '1', 't') else False
 HOST = os.environ.get('HOST', '0.0.0.0')
 
-print("PORT:", PORT)
-print("DEBUG:", DEBUG)
-print("HOST:", HOST)
+logger.debug("Serving on %s:%s, DEBUG=%s", HOST, PORT, DEBUG)
 
 NCBI_API_KEY = os.environ.get('NCBI_API_KEY')
 
@@ -67,6 +63,30 @@ REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
 NOTIFICATIONS_CHANNEL = 0
 UPLOADS_CHANNEL = 1
 
+# Server-Sent Events: seconds between keep-alive comments, and events buffered per client before it is dropped
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+SSE_CLIENT_BUFFER = int(os.environ.get('SSE_CLIENT_BUFFER', 100))
+
+# Async serving: Flask requests in flight per ASGI worker, and SurrealDB connections shared by the async views
+ASGI_MAX_CONCURRENT_REQUESTS = int(os.environ.get('ASGI_MAX_CONCURRENT_REQUESTS', 512))
+ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 16))
+
+# Sync SurrealDB connections kept open between requests, and seconds an idle one is kept before being reopened
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+DB_POOL_MAX_IDLE_SECONDS = float(os.environ.get('DB_POOL_MAX_IDLE_SECONDS', 300))
+
+# Slow-query log: database calls slower than this many milliseconds are counted, and the statement text (never the
+# parameters) of the given fraction of them is logged, cut to SLOW_QUERY_TEXT_LIMIT characters
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 250))
+SLOW_QUERY_LOG_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_LOG_SAMPLE_RATE', 0.1))
+SLOW_QUERY_TEXT_LIMIT = int(os.environ.get('SLOW_QUERY_TEXT_LIMIT', 500))
+
+# Emit OpenTelemetry spans for database and external calls (needs the opentelemetry packages and a configured SDK)
+TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'false').lower() in ('true', '1', 't')
+
+# Seconds a provider's cached bookings for a day are trusted before being reloaded (picks up other processes' writes)
+AVAILABILITY_TTL_SECONDS = float(os.environ.get('AVAILABILITY_TTL_SECONDS', 30))
+
 SENTRY_DSN = os.environ.get('SENTRY_DSN', None)
 if not SENTRY_DSN:
     logger.error("SENTRY_DSN is not set. Sentry will not be initialized.")
@@ -83,8 +103,36 @@ S3_AWS_SECRET_ACCESS_KEY = os.environ.get('S3_SECRET_ACCESS_KEY', 'your-secret-a
 TEXTRACT_AWS_ACCESS_KEY_ID = os.environ.get('TEXTRACT_AWS_ACCESS_KEY_ID', 'your-access-key-id')
 TEXTRACT_AWS_SECRET_ACCESS_KEY = os.environ.get('TEXTRACT_AWS_SECRET_ACCESS_KEY', 'your-secret-access-key')
 
+# Textract completion notifications (optional). When both are set, PDF OCR jobs publish to SNS instead of being polled.
+TEXTRACT_SNS_TOPIC_ARN = os.environ.get('TEXTRACT_SNS_TOPIC_ARN')
+TEXTRACT_SNS_ROLE_ARN = os.environ.get('TEXTRACT_SNS_ROLE_ARN')
+
+# Use the in-process Textract stub instead of AWS (local development and tests). Its jobs live in one process's memory,
+# so it needs the app and the Celery worker in a single process.
+TEXTRACT_STUB = os.environ.get('TEXTRACT_STUB', 'false').lower() in ('true', '1', 't')
+
 UMLS_API_KEY = os.environ.get('UMLS_API_KEY', 'your-umls-api-key')
 
+# Clinic search: seconds the in-process clinic index is trusted before reloading, and query answers memoised per build
+CLINIC_INDEX_TTL_SECONDS = float(os.environ.get('CLINIC_INDEX_TTL_SECONDS', 300))
+CLINIC_QUERY_CACHE_SIZE = int(os.environ.get('CLINIC_QUERY_CACHE_SIZE', 1024))
+
+# User typeahead: seconds the in-process user index is trusted before reloading changes made by other workers
+USER_SEARCH_INDEX_TTL_SECONDS = float(os.environ.get('USER_SEARCH_INDEX_TTL_SECONDS', 300))
+
+# OpenAI credentials: decrypted keys are cached in process memory only
+OPENAI_KEY_CACHE_TTL_SECONDS = float(os.environ.get('OPENAI_KEY_CACHE_TTL_SECONDS', 300))
+OPENAI_KEY_CACHE_SIZE = int(os.environ.get('OPENAI_KEY_CACHE_SIZE', 10000))
+OPENAI_RATE_LIMIT_PER_HOUR = int(os.environ.get('OPENAI_RATE_LIMIT_PER_HOUR', 100))
+
+# LLM usage ledger: entries are written in batches of up to this size, at least every N seconds
+USAGE_LEDGER_BATCH_SIZE = int(os.environ.get('USAGE_LEDGER_BATCH_SIZE', 100))
+USAGE_LEDGER_FLUSH_SECONDS = float(os.environ.get('USAGE_LEDGER_FLUSH_SECONDS', 5))
+
+NER_URL = os.environ.get('NER_URL', 'https://demo.arsmedicatech.com/ner')
+NER_TIMEOUT_SECONDS = float(os.environ.get('NER_TIMEOUT_SECONDS', 30))
+NER_CLIENT_BATCH_SIZE = int(os.environ.get('NER_CLIENT_BATCH_SIZE', 256))
+
 
 # AWS Cognito Configuration
 AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
@@ -103,12 +151,4 @@ LOGOUT_URI = f"http://localhost:{PORT}/" if DEBUG else "https://demo.arsmedicate
 REACT_PORT = os.environ.get('REACT_PORT', 3000)
 APP_URL = f'http://localhost:{REACT_PORT}/' if DEBUG else 'https://demo.arsmedicatech.com/'
 
-
-print("COGNITO DOMAIN:", COGNITO_DOMAIN)
-print("USER POOL ID:", USER_POOL_ID)
-print("CLIENT ID:", CLIENT_ID)
-
-print("REDIRECT URI:", REDIRECT_URI)
-print("COGNITO LOGIN URL:", COGNITO_LOGIN_URL)
-
-print("APP URL:", APP_URL)
+logger.debug("Cognito domain %s, redirect URI %s, app URL %s", COGNITO_DOMAIN, REDIRECT_URI, APP_URL)
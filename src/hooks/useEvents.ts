@@ -11,7 +11,8 @@ interface EventCallbacks {
 const useEvents = (callbacks: EventCallbacks = {}) => {
   const eventSourceRef = useRef<EventSource | null>(null);
   const reconnectTimeoutRef = useRef<NodeJS.Timeout | null>(null);
-  const lastEventTimestampRef = useRef<string>('');
+  // Stream ID of the last event received, sent back on reconnect so the server replays what was missed.
+  const lastEventIdRef = useRef<string>('');
 
   const connect = useCallback(() => {
     if (eventSourceRef.current) {
@@ -22,7 +23,11 @@ const useEvents = (callbacks: EventCallbacks = {}) => {
     const user = JSON.parse(localStorage.getItem('user') || '{}');
     const user_id = user.id || 'test-user-id';
 
-    const sseUrl = `${API_URL}/api/events/stream?since=${lastEventTimestampRef.current}&user_id=${user_id}`;
+    const params = new URLSearchParams({ user_id });
+    if (lastEventIdRef.current) {
+      params.set('last_event_id', lastEventIdRef.current);
+    }
+    const sseUrl = `${API_URL}/api/events/stream?${params.toString()}`;
     logger.debug('Connecting to SSE URL:', sseUrl);
     logger.debug('API_URL:', API_URL);
     logger.debug('User ID for SSE:', user_id);
@@ -65,7 +70,9 @@ const useEvents = (callbacks: EventCallbacks = {}) => {
               // Process the chunk for SSE events
               const lines = chunk.split('\n');
               for (const line of lines) {
-                if (line.startsWith('data: ')) {
+                if (line.startsWith('id: ')) {
+                  lastEventIdRef.current = line.slice(4);
+                } else if (line.startsWith('data: ')) {
                   const data = line.slice(6);
                   try {
                     const eventData = JSON.parse(data);
@@ -29,8 +29,27 @@ function isSameDay(date1: Date, date2: Date): boolean {
   );
 }
 
+function toISODate(date: Date): string {
+  const month = String(date.getMonth() + 1).padStart(2, '0');
+  const day = String(date.getDate()).padStart(2, '0');
+  return `${date.getFullYear()}-${month}-${day}`;
+}
+
+// Dates the month view can show: the month plus the days around it that
+// fill its first and last weeks.
+function visibleRange(month: Date) {
+  const start = new Date(month.getFullYear(), month.getMonth(), -6);
+  const end = new Date(month.getFullYear(), month.getMonth() + 1, 7);
+  return {
+    start_date: toISODate(start),
+    end_date: toISODate(end),
+    page_size: 500,
+  };
+}
+
 const Schedule = () => {
   const [calendarValue, setCalendarValue] = useState(new Date());
+  const [activeMonth, setActiveMonth] = useState(new Date());
   const [appointments, setAppointments] = useState<Appointment[]>([]);
   const [selectedDate, setSelectedDate] = useState<Date | null>(null);
   const [isModalOpen, setIsModalOpen] = useState(false);
@@ -43,7 +62,9 @@ const Schedule = () => {
       if (isAuthenticated) {
         try {
           logger.debug('Loading appointments from backend...');
-          const response = await appointmentService.getAppointments();
+          const response = await appointmentService.getAppointments(
+            visibleRange(activeMonth)
+          );
           logger.debug('Backend appointments response:', response);
 
           // Convert backend appointments to frontend format
@@ -68,7 +89,7 @@ const Schedule = () => {
     };
 
     loadAppointments();
-  }, [isAuthenticated]);
+  }, [isAuthenticated, activeMonth]);
 
   // Also load appointments when component becomes visible (for navigation back)
   useEffect(() => {
@@ -77,7 +98,9 @@ const Schedule = () => {
         logger.debug('Page became visible, refreshing appointments...');
         const loadAppointments = async () => {
           try {
-            const response = await appointmentService.getAppointments();
+            const response = await appointmentService.getAppointments(
+              visibleRange(activeMonth)
+            );
             const convertedAppointments = response.appointments.map(apt => ({
               id: apt.id,
               patientName: `Patient ${apt.patient_id}`,
@@ -101,7 +124,7 @@ const Schedule = () => {
     document.addEventListener('visibilitychange', handleVisibilityChange);
     return () =>
       document.removeEventListener('visibilitychange', handleVisibilityChange);
-  }, [isAuthenticated]);
+  }, [isAuthenticated, activeMonth]);
 
   const handleCalendarChange = (
     value: Value,
@@ -138,7 +161,9 @@ const Schedule = () => {
       try {
         logger.debug('Refreshing appointments...');
 
-        const response = await appointmentService.getAppointments();
+        const response = await appointmentService.getAppointments(
+          visibleRange(activeMonth)
+        );
 
         if (!response.appointments || response.appointments.length === 0) {
           logger.debug('No appointments returned from backend');
@@ -326,6 +351,9 @@ const Schedule = () => {
           <Calendar
             onChange={handleCalendarChange}
             value={calendarValue}
+            onActiveStartDateChange={({ activeStartDate }) =>
+              activeStartDate && setActiveMonth(activeStartDate)
+            }
             tileContent={tileContent}
             tileClassName={tileClassName}
             className={!isAuthenticated ? 'calendar-disabled' : ''}
@@ -56,16 +56,23 @@ class AppointmentService {
 
   async getAppointments(params?: {
     date?: string;
+    start_date?: string;
+    end_date?: string;
     patient_id?: string;
     provider_id?: string;
     status?: string;
+    page_size?: number;
   }): Promise<{ appointments: Appointment[]; total: number }> {
     const queryParams = new URLSearchParams();
     if (params?.date) queryParams.append('date', params.date);
+    if (params?.start_date) queryParams.append('start_date', params.start_date);
+    if (params?.end_date) queryParams.append('end_date', params.end_date);
     if (params?.patient_id) queryParams.append('patient_id', params.patient_id);
     if (params?.provider_id)
       queryParams.append('provider_id', params.provider_id);
     if (params?.status) queryParams.append('status', params.status);
+    if (params?.page_size)
+      queryParams.append('page_size', String(params.page_size));
 
     const response = await apiService.getAPI(
       `${this.baseUrl}?${queryParams.toString()}`
@@ -0,0 +1,72 @@
+"""
+Unit tests for in-place decoding of SurrealDB results and the JSON provider.
+"""
+
+import json
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+import pytest
+from flask import Flask
+from surrealdb import RecordID
+
+from lib.db.decoding import decode_rows
+from lib.db.surreal import DbController
+from lib.infra.json_provider import SurrealJSONProvider
+from lib.models.patient.encounter_crud import serialize_encounter
+from lib.models.patient.patient_crud import serialize_patient
+
+pytestmark = pytest.mark.unit
+
+
+def test_decode_rows_replaces_record_ids_in_place():
+    row = {"id": RecordID("patient", 1), "links": [RecordID("clinic", "a"), "x"],
+           "nested": {"owner": RecordID("User", "u")}, "age": 3}
+    rows = decode_rows([{"result": [row]}])
+
+    assert rows[0] is row
+    assert row == {"id": "patient:1", "links": ["clinic:a", "x"], "nested": {"owner": "User:u"}, "age": 3}
+    assert decode_rows(None) == [] and decode_rows({"id": RecordID("a", "b")}) == [{"id": "a:b"}]
+
+
+def test_controller_select_many_does_not_copy_rows():
+    db = DbController()
+    db.db = Mock()
+    row = {"id": RecordID("patient", "p1"), "first_name": "Ada"}
+    db.db.select.return_value = [row]
+
+    assert db.select_many("patient")[0] is row
+    assert row["id"] == "patient:p1"
+
+
+def test_serializers_convert_in_place():
+    patient = {"id": RecordID("patient", 5), "demographic_no": 5, "ids": [1, "a"], "active": True}
+    assert serialize_patient(patient) is patient
+    assert patient == {"id": "patient:5", "demographic_no": "5", "ids": ["1", "a"], "active": "True"}
+
+    soap = {"subjective": "s", "objective": "o", "assessment": "a", "plan": "p"}
+    encounter = {"id": RecordID("encounter", "n1"), "note_text": json.dumps(soap), "patient": RecordID("patient", 5),
+                 "diagnostic_codes": ["A00"], "date_created": "2024-03-04"}
+    assert serialize_encounter(encounter) is encounter
+    assert encounter["note_text"] == soap and encounter["note_type"] == "soap"
+    # Fields after note_text are kept as well.
+    assert encounter["patient"] == "patient:5" and encounter["date_created"] == "2024-03-04"
+
+    plain = serialize_encounter({"id": "encounter:n2", "note_text": "Patient is well."})
+    assert plain["note_text"] == "Patient is well." and "note_type" not in plain
+
+
+def test_json_provider_encodes_record_ids():
+    app = Flask(__name__)
+    app.json = SurrealJSONProvider(app)
+    when = datetime(2024, 3, 4, 9, 30, tzinfo=timezone.utc)
+
+    with app.app_context():
+        encoded = app.json.dumps({"id": RecordID("patient", 1), "when": when, "big": 2 ** 70})
+        pretty = app.json.dumps({"b": 1, "a": [RecordID("x", "y")]}, indent=2)
+
+    assert json.loads(encoded) == {"id": "patient:1", "when": "Mon, 04 Mar 2024 09:30:00 GMT",
+                                   "big": 2 ** 70}
+    assert json.loads(pretty) == {"a": ["x:y"], "b": 1} and "\n" in pretty
+    with pytest.raises(TypeError):
+        app.json.dumps({"x": object()})
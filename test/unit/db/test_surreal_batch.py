@@ -0,0 +1,127 @@
+"""
+Unit tests for batched record fetches and transactions on DbController and AsyncDbController.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from surrealdb import RecordID
+
+from lib.db.surreal import (AsyncDbController, DbController, Transaction,
+                            TransactionError, build_select_by_ids,
+                            to_record_id)
+
+pytestmark = pytest.mark.unit
+
+
+def rows_for(statement, params):
+    # Answer like SurrealDB would: existing records only, in no particular order, with RecordID ids.
+    existing = {"clinic:a", "clinic:c", "clinic:7"}
+    return [{"id": rid, "name": str(rid)} for rid in reversed(params["ids"]) if str(rid) in existing]
+
+
+def test_to_record_id_accepts_every_form():
+    assert to_record_id("clinic:abc") == RecordID("clinic", "abc")
+    assert to_record_id("abc", table="clinic") == RecordID("clinic", "abc")
+    assert to_record_id("clinic:abc", table="clinic") == RecordID("clinic", "abc")
+    assert to_record_id("clinic:7") == RecordID("clinic", 7)
+    assert to_record_id(RecordID("clinic", "x"), table="other") == RecordID("clinic", "x")
+    with pytest.raises(ValueError):
+        to_record_id("abc")
+
+
+def test_build_select_by_ids_is_parametrised():
+    statement, params = build_select_by_ids(["a", "clinic:b"], table="clinic")
+    assert statement == "SELECT * FROM $ids"
+    assert params["ids"] == [RecordID("clinic", "a"), RecordID("clinic", "b")]
+
+
+def test_select_many_by_ids_preserves_order_and_chunks():
+    db = DbController()
+    db.db = Mock()
+    db.db.query.side_effect = rows_for
+
+    records = db.select_many_by_ids(["c", "b", "a", "c", "7"], table="clinic", chunk_size=2)
+
+    assert [r and r["id"] for r in records] == ["clinic:c", None, "clinic:a", "clinic:c", "clinic:7"]
+    # Four distinct ids in chunks of two; the duplicate is fetched once.
+    assert db.db.query.call_count == 2
+    assert db.select_many_by_ids([]) == []
+
+
+def test_fetch_batch_reports_missing_ids():
+    db = DbController()
+    db.db = Mock()
+    db.db.query.side_effect = lambda statement, params: [{"result": rows_for(statement, params)}]
+
+    found, missing = db.fetch_batch(["clinic:a", "clinic:zz", "clinic:c"])
+
+    assert [r["id"] for r in found] == ["clinic:a", "clinic:c"]
+    assert missing == ["clinic:zz"]
+    assert db.db.query.call_count == 1
+
+
+def test_async_fetch_batch_matches_sync():
+    db = AsyncDbController()
+    db.db = Mock()
+    db.db.query = AsyncMock(side_effect=rows_for)
+
+    found, missing = asyncio.run(db.fetch_batch(["a", "b", "7"], table="clinic", chunk_size=1))
+
+    assert [r["id"] for r in found] == ["clinic:a", "clinic:7"]
+    assert missing == ["clinic:b"]
+    assert db.db.query.await_count == 3
+
+
+def test_transaction_namespaces_params_and_returns_each_result():
+    tx = Transaction()
+    tx.add("LET $existing = (SELECT * FROM thing WHERE id = $id);", {"id": 1})
+    tx.add("FOR $row IN $rows { UPDATE $row.id SET seen = true }", {"rows": [1]})
+    tx.add("UPDATE $id SET ids = $ids", {"id": 2, "ids": [3]})
+
+    statement, params = tx.build()
+
+    assert statement == ("BEGIN TRANSACTION;\n"
+                         "LET $existing = (SELECT * FROM thing WHERE id = $s0_id);\n"
+                         "FOR $row IN $s1_rows { UPDATE $row.id SET seen = true };\n"
+                         "UPDATE $s2_id SET ids = $s2_ids;\n"
+                         "COMMIT TRANSACTION;")
+    assert params == {"s0_id": 1, "s1_rows": [1], "s2_id": 2, "s2_ids": [3]}
+    assert Transaction(atomic=False).build() == ("", {})
+
+    db = DbController()
+    db.db = Mock()
+    db.db.query_raw.return_value = {"result": [{"status": "OK", "result": None},
+                                               {"status": "OK", "result": []},
+                                               {"status": "OK", "result": [{"id": "x"}]}]}
+    assert db.execute(tx) == [None, [], [{"id": "x"}]]
+    db.db.query_raw.assert_called_once_with(statement, params)
+
+
+def test_transaction_failure_names_the_cause():
+    tx = Transaction()
+    tx.add("CREATE a")
+    tx.add("THROW 'nope'")
+    response = {"result": [
+        {"status": "ERR", "result": "The query was not executed due to a failed transaction"},
+        {"status": "ERR", "result": "An error occurred: nope"},
+    ]}
+
+    with pytest.raises(TransactionError) as raised:
+        tx.parse(response)
+
+    assert raised.value.index == 1 and "nope" in str(raised.value)
+    with pytest.raises(TransactionError):
+        tx.parse({"error": {"code": -32000, "message": "Parse error"}})
+
+
+def test_async_execute_sends_one_request():
+    db = AsyncDbController()
+    db.db = Mock()
+    db.db.query_raw = AsyncMock(return_value={"result": [{"status": "OK", "result": [1]}]})
+    tx = Transaction(atomic=False)
+    tx.add("RETURN $x", {"x": 1})
+
+    assert asyncio.run(db.execute(tx)) == [[1]]
+    assert db.db.query_raw.await_args.args == ("RETURN $s0_x;\n", {"s0_x": 1})
@@ -8,7 +8,7 @@ in SurrealDB, including relationship creation, querying, and edge cases.
 import pytest
 import asyncio
 from unittest.mock import Mock, AsyncMock, patch
-from lib.db.surreal_graph import GraphController, AsyncGraphController
+from lib.db.surreal_graph import GraphController, AsyncGraphController, GraphCache
 
 
 # Module-level fixtures that can be used across all test classes
@@ -131,21 +131,78 @@ class TestGraphController:
         expected_query = "SELECT <-FRIEND<-person FROM person:123"
         mock_db_controller.query.assert_called_once_with(expected_query)
 
-    def test_count_connections_not_implemented(self, graph_controller, mock_db_controller):
-        """Test that count_connections method is not yet implemented."""
-        result = graph_controller.count_connections()
-        
-        # Should call query with empty string (as per current implementation)
-        mock_db_controller.query.assert_called_once_with("")
-        assert result is not None  # Should return whatever the mock returns
+    def test_relate_many_single_transaction(self, graph_controller, mock_db_controller):
+        """Test that edges of several tables are written in one parametrised transaction."""
+        graph_controller.relate_many([
+            ("diagnosis:flu", "HAS_SYMPTOM", "symptom:fatigue", {"note": "Common"}),
+            ("diagnosis:flu", "HAS_SYMPTOM", "symptom:fever", None),
+            ("medication:ibuprofen", "TREATS", "diagnosis:flu", None),
+        ])
+
+        statement, params = mock_db_controller.query.call_args.args
+        assert mock_db_controller.query.call_count == 1
+        assert statement == ("BEGIN TRANSACTION; INSERT RELATION INTO HAS_SYMPTOM $edges_0; "
+                             "INSERT RELATION INTO TREATS $edges_1; COMMIT TRANSACTION;")
+        assert [str(edge["out"]) for edge in params["edges_0"]] == ["symptom:fatigue", "symptom:fever"]
+        assert params["edges_0"][0]["note"] == "Common"
+        assert str(params["edges_1"][0]["in"]) == "medication:ibuprofen"
+
+    def test_relate_many_rejects_unsafe_table_names(self, graph_controller, mock_db_controller):
+        """Test that edge table names are validated before being interpolated."""
+        with pytest.raises(ValueError):
+            graph_controller.relate_many([("a:1", "X; DELETE user", "b:2", None)])
+        mock_db_controller.query.assert_not_called()
+
+    def test_traverse_reports_first_depth(self, graph_controller, mock_db_controller):
+        """Test multi-hop traversal in one query, keeping the smallest depth per node."""
+        mock_db_controller.query.return_value = [{
+            "depth_1": ["diagnosis:flu", "diagnosis:depression"],
+            "depth_2": [["symptom:fatigue", "symptom:fever"], ["symptom:fatigue", "symptom:loss_of_appetite"]],
+        }]
+
+        result = graph_controller.traverse("symptom:fatigue", "HAS_SYMPTOM", direction="<->", max_depth=2)
+
+        statement, params = mock_db_controller.query.call_args.args
+        assert statement == ("SELECT array::distinct(<->HAS_SYMPTOM<->?) AS depth_1, "
+                             "array::distinct(<->HAS_SYMPTOM<->?<->HAS_SYMPTOM<->?) AS depth_2 FROM $start")
+        assert str(params["start"]) == "symptom:fatigue"
+        assert result == {"diagnosis:flu": 1, "diagnosis:depression": 1,
+                          "symptom:fever": 2, "symptom:loss_of_appetite": 2}
+
+        with pytest.raises(ValueError):
+            graph_controller.traverse("symptom:fatigue", max_depth=50)
+
+    def test_count_connections(self, graph_controller, mock_db_controller):
+        """Test degree counts for many nodes in one query."""
+        mock_db_controller.query.return_value = [
+            {"result": [{"id": "diagnosis:flu", "out_degree": 2, "in_degree": 1}]}
+        ]
+
+        result = graph_controller.count_connections(["diagnosis:flu", "diagnosis:missing"], ["HAS_SYMPTOM", "TREATS"])
+
+        statement = mock_db_controller.query.call_args.args[0]
+        assert "count(->(HAS_SYMPTOM, TREATS)) AS out_degree" in statement
+        assert result == {"diagnosis:flu": {"out": 2, "in": 1, "total": 3},
+                          "diagnosis:missing": {"out": 0, "in": 0, "total": 0}}
+
+    def test_find_path_queries_one_level_at_a_time(self, graph_controller, mock_db_controller):
+        """Test that the breadth-first search issues one query per level and returns a shortest path."""
+        graph = {
+            "a:1": ["a:2", "a:3"],
+            "a:2": ["a:4"],
+            "a:3": ["a:4", "a:5"],
+            "a:4": ["a:6"],
+            "a:5": ["a:6"],
+        }
+        mock_db_controller.query.side_effect = lambda statement, params: [
+            {"id": str(node), "next": graph.get(str(node), [])} for node in params["nodes"]
+        ]
 
-    def test_find_path_not_implemented(self, graph_controller, mock_db_controller):
-        """Test that find_path method is not yet implemented."""
-        result = graph_controller.find_path()
-        
-        # Should call query with empty string (as per current implementation)
-        mock_db_controller.query.assert_called_once_with("")
-        assert result is not None  # Should return whatever the mock returns
+        assert graph_controller.find_path("a:1", "a:6", "LINK") == ["a:1", "a:2", "a:4", "a:6"]
+        assert mock_db_controller.query.call_count == 3
+        assert graph_controller.find_path("a:1", "a:6", "LINK", max_depth=2) is None
+        assert graph_controller.find_path("a:6", "a:1", "LINK") is None
+        assert graph_controller.find_path("a:1", "a:1") == ["a:1"]
 
     def test_execute_with_sync_db(self, graph_controller, mock_db_controller):
         """Test _execute method with synchronous database controller."""
@@ -260,20 +317,25 @@ class TestAsyncGraphController:
         mock_async_db_controller.query.assert_called_once_with(expected_query)
 
     @pytest.mark.asyncio
-    async def test_count_connections_not_implemented(self, async_graph_controller, mock_async_db_controller):
-        """Test that async count_connections method is not yet implemented."""
-        await async_graph_controller.count_connections()
-        
-        # Should call query with empty string (as per current implementation)
-        mock_async_db_controller.query.assert_called_once_with("")
+    async def test_count_connections(self, async_graph_controller, mock_async_db_controller):
+        """Test async degree counts."""
+        mock_async_db_controller.query.return_value = [{"id": "diagnosis:flu", "out_degree": 2, "in_degree": 0}]
+
+        result = await async_graph_controller.count_connections(["diagnosis:flu"])
+
+        assert "count(->?) AS out_degree" in mock_async_db_controller.query.call_args.args[0]
+        assert result == {"diagnosis:flu": {"out": 2, "in": 0, "total": 2}}
 
     @pytest.mark.asyncio
-    async def test_find_path_not_implemented(self, async_graph_controller, mock_async_db_controller):
-        """Test that async find_path method is not yet implemented."""
-        await async_graph_controller.find_path()
-        
-        # Should call query with empty string (as per current implementation)
-        mock_async_db_controller.query.assert_called_once_with("")
+    async def test_find_path(self, async_graph_controller, mock_async_db_controller):
+        """Test async breadth-first search."""
+        graph = {"a:1": ["a:2"], "a:2": ["a:3"]}
+        mock_async_db_controller.query.side_effect = lambda statement, params: [
+            {"id": str(node), "next": graph.get(str(node), [])} for node in params["nodes"]
+        ]
+
+        assert await async_graph_controller.find_path("a:1", "a:3", "LINK") == ["a:1", "a:2", "a:3"]
+        assert mock_async_db_controller.query.call_count == 2
 
 
 class TestGraphControllerIntegration:
@@ -358,3 +420,57 @@ class TestGraphControllerEdgeCases:
         
         expected_query = "SELECT ->-> FROM "
         mock_db_controller.query.assert_called_once_with(expected_query)
+
+
+class TestGraphCache:
+    """Test cases for the in-memory adjacency cache."""
+
+    pytestmark = pytest.mark.unit
+
+    @pytest.fixture
+    def cache(self):
+        def edge(source, target, source_name="", target_name=""):
+            return {"in": source, "out": target, "in_name": source_name, "out_name": target_name}
+
+        return GraphCache({
+            "HAS_SYMPTOM": [
+                edge("diagnosis:flu", "symptom:fatigue", "Influenza (Flu)"),
+                edge("diagnosis:flu", "symptom:fever"),
+                edge("diagnosis:flu", "symptom:cough"),
+                edge("diagnosis:depression", "symptom:fatigue", "Depression"),
+                edge("diagnosis:depression", "symptom:loss_of_appetite"),
+                edge("diagnosis:anemia", "symptom:fatigue", "Anemia"),
+            ],
+            "TREATS": [edge("medication:ibuprofen", "diagnosis:flu")],
+        })
+
+    def test_load_cache_uses_one_query_per_edge_table(self):
+        """Test that the cache is built from one query per edge table."""
+        mock_db = Mock()
+        mock_db.query.return_value = [{"in": "diagnosis:flu", "out": "symptom:fever", "in_name": "Influenza (Flu)"}]
+
+        cache = GraphController(mock_db).load_cache(["HAS_SYMPTOM", "TREATS"])
+
+        assert mock_db.query.call_count == 2
+        assert cache.neighbours("diagnosis:flu", "HAS_SYMPTOM") == {"symptom:fever"}
+        assert cache.names["diagnosis:flu"] == "Influenza (Flu)"
+
+    def test_neighbours_degree_traverse_and_path(self, cache):
+        """Test lookups against the cached adjacency lists."""
+        assert cache.neighbours("symptom:fatigue", "HAS_SYMPTOM", "<-") == {
+            "diagnosis:flu", "diagnosis:depression", "diagnosis:anemia"}
+        assert cache.degree("diagnosis:flu") == {"out": 3, "in": 1, "total": 4}
+        assert cache.traverse("medication:ibuprofen", max_depth=2) == {
+            "diagnosis:flu": 1, "symptom:fatigue": 2, "symptom:fever": 2, "symptom:cough": 2}
+        assert cache.find_path("medication:ibuprofen", "diagnosis:depression", direction="<->") == [
+            "medication:ibuprofen", "diagnosis:flu", "symptom:fatigue", "diagnosis:depression"]
+
+    def test_candidate_diagnoses_prefers_specific_symptoms(self, cache):
+        """Test that rare symptoms outweigh ones shared by many diagnoses."""
+        ranked = cache.candidate_diagnoses(["symptom:fatigue", "symptom:loss_of_appetite", "symptom:unknown"])
+
+        assert [c["diagnosis"] for c in ranked] == ["diagnosis:depression", "diagnosis:anemia", "diagnosis:flu"]
+        assert ranked[0]["score"] == pytest.approx(1.0)
+        assert ranked[0]["name"] == "Depression"
+        assert ranked[0]["matched"] == ["symptom:fatigue", "symptom:loss_of_appetite"]
+        assert cache.candidate_diagnoses(["symptom:unknown"]) == []
@@ -0,0 +1,164 @@
+"""
+Unit tests for the shared event loop, async views under the ASGI adapter, and the async connection pool.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from asgiref.wsgi import WsgiToAsgi
+from flask import g, jsonify, request
+
+from lib.db.async_pool import AsyncDbPool
+from lib.infra import async_runtime
+from lib.infra.async_runtime import (AsyncServingMiddleware, SharedLoopFlask,
+                                     run_sync)
+from lib.services.conversation_service import AsyncConversationService
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(autouse=True)
+def unbound_loop():
+    async_runtime.bind_loop(None)
+    yield
+    async_runtime.bind_loop(None)
+
+
+def test_run_sync_reuses_one_loop():
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    first = run_sync(current_loop())
+    assert run_sync(current_loop()) is first is async_runtime.get_loop()
+
+    async def nested():
+        return run_sync(current_loop())
+
+    with pytest.raises(RuntimeError):
+        run_sync(nested())
+
+
+def test_async_views_share_the_loop_and_see_the_request():
+    app = SharedLoopFlask(__name__)
+    loops = set()
+
+    @app.route("/echo")
+    async def echo():
+        loops.add(asyncio.get_running_loop())
+        g.seen = request.args["v"]
+        await asyncio.sleep(0.2)
+        return jsonify(value=g.seen)
+
+    def call(i):
+        with app.test_request_context(f"/echo?v={i}"):
+            return app.ensure_sync(echo)().get_json()["value"]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(100) as pool:
+        values = list(pool.map(call, range(100)))
+
+    assert values == [str(i) for i in range(100)]
+    assert loops == {async_runtime.get_loop()}
+    # 100 views sleeping 0.2 s each overlap on the loop.
+    assert time.perf_counter() - started < 2
+
+
+def test_asgi_requests_run_concurrently_on_the_server_loop():
+    app = SharedLoopFlask(__name__)
+    server_loops = []
+
+    @app.route("/slow")
+    def slow():
+        time.sleep(0.2)
+        return "ok"
+
+    @app.route("/loop")
+    async def loop():
+        server_loops.append(asyncio.get_running_loop())
+        return "ok"
+
+    asgi = AsyncServingMiddleware(WsgiToAsgi(app), max_concurrent_requests=50)
+
+    async def get(path):
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                 "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+                 "headers": [(b"host", b"test")], "client": ("127.0.0.1", 1), "server": ("test", 80)}
+        await asgi(scope, receive, send)
+        return sent[0]["status"]
+
+    async def main():
+        started = time.perf_counter()
+        statuses = await asyncio.gather(*(get("/slow") for _ in range(20)))
+        elapsed = time.perf_counter() - started
+        await get("/loop")
+        return statuses, elapsed, asyncio.get_running_loop()
+
+    statuses, elapsed, test_loop = asyncio.run(main())
+
+    assert statuses == [200] * 20
+    # asgiref alone would run the 20 requests one after another (4 s).
+    assert elapsed < 2
+    assert server_loops == [test_loop]
+
+
+def test_pool_reuses_and_bounds_connections():
+    opened = []
+
+    def factory():
+        db = Mock()
+        db.connect = AsyncMock()
+        db.close = AsyncMock()
+        opened.append(db)
+        return db
+
+    pool = AsyncDbPool(size=2, factory=factory)
+    active = []
+    peak = []
+
+    async def work():
+        async with pool.connection() as db:
+            active.append(db)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.remove(db)
+
+    async def failing():
+        async with pool.connection():
+            raise ValueError("boom")
+
+    async def main():
+        await asyncio.gather(*(work() for _ in range(10)))
+        with pytest.raises(ValueError):
+            await failing()
+        await pool.close()
+
+    asyncio.run(main())
+
+    assert len(opened) == 2 and max(peak) == 2
+    # The connection used by the failing block was closed rather than returned, and close() closed the other.
+    assert all(db.close.await_count == 1 for db in opened) and pool.opened == 0
+
+
+def test_async_conversation_reads_use_two_queries():
+    db = Mock()
+    db.query = AsyncMock(side_effect=[
+        [{"id": "Conversation:c1", "participants": ["User:a", "User:b"], "last_message_preview": "hi"}],
+        [{"id": "User:b", "username": "bee", "first_name": "Bea", "last_name": "Smith"}],
+    ])
+
+    summaries = asyncio.run(AsyncConversationService(db).get_conversation_summaries("User:a"))
+
+    assert summaries[0]["other_participant"]["first_name"] == "Bea" and summaries[0]["last_message"] == "hi"
+    assert db.query.await_count == 2
@@ -0,0 +1,100 @@
+"""
+Unit tests for database, external-call and cache instrumentation and the per-route breakdown.
+"""
+
+from unittest.mock import Mock
+
+import pytest
+from flask import Flask
+
+from lib.db.surreal import SurrealWrapper
+from lib.infra import instrumentation
+from lib.infra.instrumentation import (CACHE_REQUESTS, DB_QUERY_ROWS,
+                                       DB_SLOW_QUERIES, EXTERNAL_CALL_SECONDS,
+                                       REQUEST_COMPONENT_SECONDS,
+                                       REQUEST_DB_QUERIES, count_rows,
+                                       record_cache, track_external)
+
+pytestmark = pytest.mark.unit
+
+
+def value(metric, suffix="_sum", **labels):
+    return next((sample.value for family in metric.collect() for sample in family.samples
+                 if sample.name.endswith(suffix) and sample.labels == labels), 0.0)
+
+
+def test_count_rows_handles_each_result_shape():
+    assert count_rows(None) == 0
+    assert count_rows([{"id": 1}, {"id": 2}]) == 2
+    assert count_rows({"id": 1}) == 1
+    raw = {"result": [{"status": "OK", "result": [{}, {}, {}]}, {"status": "OK", "result": None}]}
+    assert count_rows(raw) == 4
+
+
+def test_wrapper_records_timing_rows_and_slow_queries(monkeypatch):
+    logger = Mock()
+    monkeypatch.setattr(instrumentation, "logger", logger)
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_THRESHOLD_MS", 0)
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_LOG_SAMPLE_RATE", 1.0)
+    client = Mock()
+    client.query.return_value = [{"id": 1}, {"id": 2}, {"id": 3}]
+    rows_before = value(DB_QUERY_ROWS, operation="query")
+    slow_before = value(DB_SLOW_QUERIES, "_total", operation="query")
+
+    result = SurrealWrapper(client).query("SELECT *\n    FROM patient WHERE ssn = $ssn", {"ssn": "123-45-6789"})
+
+    assert len(result) == 3
+    assert value(DB_QUERY_ROWS, operation="query") - rows_before == 3
+    assert value(DB_SLOW_QUERIES, "_total", operation="query") - slow_before == 1
+    logged = " ".join(str(arg) for arg in logger.warning.call_args.args)
+    assert "SELECT * FROM patient WHERE ssn = $ssn" in logged and "123-45-6789" not in logged
+
+
+def test_failed_external_calls_are_labelled():
+    before = value(EXTERNAL_CALL_SECONDS, "_count", service="ner", operation="extract", outcome="error")
+
+    with pytest.raises(ConnectionError):
+        with track_external("ner", "extract"):
+            raise ConnectionError("down")
+    with track_external("ner", "extract") as call:
+        call.ok = False
+
+    assert value(EXTERNAL_CALL_SECONDS, "_count", service="ner", operation="extract", outcome="error") - before == 2
+
+
+def test_cache_lookups_are_counted():
+    hits = value(CACHE_REQUESTS, "_total", cache="test", result="hit")
+    misses = value(CACHE_REQUESTS, "_total", cache="test", result="miss")
+
+    record_cache("test", hit=True, count=3)
+    record_cache("test", hit=False)
+    record_cache("test", hit=False, count=0)
+
+    assert value(CACHE_REQUESTS, "_total", cache="test", result="hit") - hits == 3
+    assert value(CACHE_REQUESTS, "_total", cache="test", result="miss") - misses == 1
+
+
+def test_requests_report_time_per_component():
+    app = Flask(__name__)
+    instrumentation.init_app(app)
+    client = Mock()
+    client.select.return_value = {"id": "patient:1"}
+
+    @app.route("/profiled")
+    def profiled():
+        wrapper = SurrealWrapper(client)
+        wrapper.select("patient:1")
+        wrapper.select("patient:2")
+        with track_external("umls", "search"):
+            pass
+        return "ok"
+
+    queries_before = value(REQUEST_DB_QUERIES, endpoint="profiled")
+    umls_before = value(REQUEST_COMPONENT_SECONDS, "_count", endpoint="profiled", component="umls")
+
+    assert app.test_client().get("/profiled").status_code == 200
+
+    assert value(REQUEST_DB_QUERIES, endpoint="profiled") - queries_before == 2
+    assert value(REQUEST_COMPONENT_SECONDS, "_count", endpoint="profiled", component="db") >= 1
+    assert value(REQUEST_COMPONENT_SECONDS, "_count", endpoint="profiled", component="umls") - umls_before == 1
+    assert instrumentation.current_profile() is None
@@ -0,0 +1,61 @@
+"""
+Unit tests for the lazy, queue-backed logger facade.
+"""
+
+import io
+import json
+import logging
+from unittest.mock import MagicMock, Mock
+
+import pytest
+
+from lib.logger import Logger
+
+pytestmark = pytest.mark.unit
+
+
+def make_logger(name, **kwargs):
+    logger = Logger(name=name, **kwargs)
+    stream = io.StringIO()
+    logger._handler.setStream(stream)
+    return logger, stream
+
+
+def test_disabled_levels_skip_formatting():
+    logger, stream = make_logger("test.lazy", level=logging.WARN)
+    expensive = MagicMock()
+    message = Mock(return_value="never")
+
+    logger.debug("result: %s", expensive)
+    logger.debug(message)
+
+    expensive.__str__.assert_not_called()
+    message.assert_not_called()
+    assert stream.getvalue() == ""
+
+
+def test_message_styles_and_caller_location():
+    logger, stream = make_logger("test.styles", level=logging.DEBUG)
+    logger.info("rows: %d", 3)
+    logger.info(lambda: "built lazily")
+    logger.info("print style:", 1, {"a": 2})
+
+    lines = stream.getvalue().splitlines()
+    assert "rows: 3" in lines[0] and "test_logger.py" in lines[0]
+    assert "built lazily" in lines[1]
+    assert "print style: 1 {'a': 2}" in lines[2]
+
+
+def test_queued_json_records_are_written_by_the_listener():
+    logger, stream = make_logger("test.queue", level=logging.INFO, json_format=True, use_queue=True)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        logger.exception("failed for %s", "user:1", extra={"request_id": "abc"})
+    logger.shutdown()
+
+    entry = json.loads(stream.getvalue())
+    assert entry["message"] == "failed for user:1"
+    assert entry["level"] == "ERROR" and entry["request_id"] == "abc"
+    assert "ValueError: boom" in entry["exception"]
+    assert entry["file"] == "test_logger.py"
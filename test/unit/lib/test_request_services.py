@@ -0,0 +1,111 @@
+"""
+Unit tests for the request-scoped database handle, the service container and the connection pool.
+"""
+
+from unittest.mock import Mock
+
+import pytest
+from flask import Flask
+
+from lib.db import surreal
+from lib.db.pool import DbPool
+from lib.infra import request_services
+from lib.infra.request_services import (DB_CONNECTIONS_PER_REQUEST,
+                                        RequestServices, get_db, get_service)
+
+pytestmark = pytest.mark.unit
+
+
+class FakeService:
+    def __init__(self, db_controller=None):
+        self.db = db_controller
+
+    def load(self):
+        self.db.connect()
+        self.db.close()
+        return self.db.db
+
+
+def make_pool(size=2, max_idle_seconds=300):
+    opened = []
+
+    def factory():
+        db = Mock(spec=["connect", "db", "client"])
+        db.db = None
+
+        def connect():
+            db.db = db.client = Mock()
+            surreal._connection_opened()
+            opened.append(db)
+        db.connect = connect
+        return db
+
+    return DbPool(size=size, max_idle_seconds=max_idle_seconds, factory=factory), opened
+
+
+@pytest.fixture
+def app(monkeypatch):
+    pool, opened = make_pool()
+    monkeypatch.setattr(request_services, "get_db_pool", lambda: pool)
+    app = Flask(__name__)
+    request_services.init_app(app)
+
+    @app.route("/twice")
+    def twice():
+        first, second = get_service(FakeService), get_service(FakeService)
+        assert first is second and first.db is get_db()
+        return str(id(first.load()) == id(second.load()))
+
+    @app.route("/boom")
+    def boom():
+        get_service(FakeService).load()
+        raise ValueError("boom")
+
+    app.pool, app.opened = pool, opened
+    return app
+
+
+def observed(endpoint):
+    return DB_CONNECTIONS_PER_REQUEST.labels(endpoint=endpoint)._sum.get()
+
+
+def test_services_in_a_request_share_one_pooled_connection(app):
+    client = app.test_client()
+    before = observed("twice")
+
+    assert client.get("/twice").get_data(as_text=True) == "True"
+    assert client.get("/twice").get_data(as_text=True) == "True"
+
+    # The second request reused the connection the first one returned.
+    assert len(app.opened) == 1 and len(app.pool) == 1
+    assert observed("twice") - before == 1
+
+
+def test_connection_is_discarded_after_an_error(app):
+    app.testing = False
+    client = app.test_client()
+
+    assert client.get("/boom").status_code == 500
+
+    assert len(app.opened) == 1 and len(app.pool) == 0
+    assert app.opened[0].db is None
+    app.opened[0].client.close.assert_called_once()
+
+
+def test_pool_drops_stale_and_surplus_connections():
+    pool, opened = make_pool(size=1, max_idle_seconds=-1)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+
+    assert len(pool) == 1 and second.db is None
+    # first was idle for longer than max_idle_seconds, so a new connection is opened and first is closed.
+    third = pool.acquire()
+    assert third not in (first, second) and len(opened) == 3
+    first.client.close.assert_called_once()
+
+
+def test_get_service_outside_a_request_builds_its_own():
+    assert get_service(FakeService).db is None
+    services = RequestServices(make_pool()[0])
+    assert services.get(FakeService) is services.get(FakeService)
@@ -0,0 +1,202 @@
+"""
+Unit tests for the decision tree compiler.
+
+Covers scalar lookups, vectorized batch classification and the ``path_taken``
+explanations produced by compiled trees.
+"""
+
+import enum
+import importlib
+import itertools
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from lib.llm.mcp.tree_compiler import (INVALID_VALUE, UNANSWERED,
+                                       compile_tree, register_compare_op)
+
+pytestmark = pytest.mark.unit
+
+
+BP_TREE = {
+    "question": "What is your diastolic blood pressure?",
+    "branches": {
+        ('>=', 120): "Hypertensive crisis - Seek emergency care immediately",
+        ('<', 120): {
+            "question": "What is your systolic blood pressure?",
+            "branches": {
+                ('>=', 180): "Hypertensive crisis - Seek emergency care immediately",
+                ('>=', 140): "Hypertension Stage 2 - Discuss medication",
+                ('in', range(130, 140)): "Hypertension Stage 1 - Lifestyle changes",
+                ('in', range(120, 130)): "Elevated blood pressure - Adopt heart‑healthy lifestyle",
+                ('<', 120): "Normal blood pressure - Maintain current healthy habits"
+            }
+        }
+    }
+}
+
+BP_FEATURES = ('systolic_blood_pressure', 'diastolic_blood_pressure')
+
+
+class Purpose(enum.Enum):
+    HOME = "home"
+    EDUCATION = "education"
+
+
+ENHANCED_TREE = {
+    "question": "What is the loan purpose?",
+    "branches": {
+        Purpose.HOME: "Declined - Mortgages not offered",
+        Purpose.EDUCATION: {
+            "question": "Which country is your university located in?",
+            "branches": {
+                ('in', frozenset({'US', 'Canada'})): "Approved - Domestic study",
+                ('not in', frozenset({'US', 'Canada'})): "Declined - Foreign study"
+            }
+        }
+    }
+}
+
+
+@pytest.fixture
+def bp_tree():
+    """Compiled blood pressure tree."""
+    return compile_tree(BP_TREE, features=BP_FEATURES)
+
+
+class TestCompiledLookup:
+    """Scalar lookups on a compiled tree."""
+
+    def test_matches_interpreted_output(self, bp_tree):
+        result = bp_tree.lookup(systolic_blood_pressure=128, diastolic_blood_pressure=78)
+
+        assert result['decision'] == "Elevated blood pressure"
+        assert result['reason'] == "Adopt heart‑healthy lifestyle"
+        assert result['path_taken'] == [
+            "Checked diastolic blood pressure: 78 < 120",
+            "Checked systolic blood pressure: 128 in range(120, 130)",
+        ]
+
+    def test_enum_and_membership_branches(self):
+        tree = compile_tree(ENHANCED_TREE, features=('loan_purpose', 'country'))
+
+        result = tree.lookup(loan_purpose=Purpose.EDUCATION, country='US')
+
+        assert result['decision'] == "Approved"
+        assert result['reason'] == "Domestic study"
+        assert "'US' in frozenset" in result['path_taken'][1]
+
+    def test_unanswerable_question(self, bp_tree):
+        result = bp_tree.lookup(diastolic_blood_pressure=70)
+
+        assert result['decision'] == "Error"
+        assert "could not be answered" in result['reason']
+        assert len(result['path_taken']) == 1
+
+    def test_float_outside_integer_range_is_invalid(self, bp_tree):
+        result = bp_tree.lookup(systolic_blood_pressure=129.5, diastolic_blood_pressure=70)
+
+        assert result['decision'] == "Error"
+        assert result['reason'] == "Invalid value for systolic blood pressure: 129.5"
+
+    def test_unregistered_operator_rejected(self):
+        with pytest.raises(ValueError, match="Unsupported operator"):
+            compile_tree({"question": "x?", "branches": {('~', 1): "A"}}, features=('x',))
+
+    def test_registered_operator(self):
+        register_compare_op('divisible_by', lambda x, y: x % y == 0)
+        tree = compile_tree(
+            {"question": "What is x?", "branches": {('divisible_by', 3): "Fizz", ('>=', 0): "Other"}},
+            features=('x',)
+        )
+
+        assert tree.lookup(x=9)['decision'] == "Fizz"
+        assert tree.lookup(x=10)['decision'] == "Other"
+
+
+class TestBatchClassification:
+    """Vectorized batch classification."""
+
+    def test_batch_agrees_with_scalar_lookup(self, bp_tree):
+        systolic, diastolic = np.meshgrid(np.arange(90, 200, 3), np.arange(50, 130, 4))
+        systolic = systolic.ravel()
+        diastolic = diastolic.ravel()
+
+        batch = bp_tree.classify_batch({
+            'systolic_blood_pressure': systolic,
+            'diastolic_blood_pressure': diastolic,
+        })
+
+        assert len(batch) == systolic.size
+        for row in range(systolic.size):
+            expected = bp_tree.lookup(
+                systolic_blood_pressure=int(systolic[row]),
+                diastolic_blood_pressure=int(diastolic[row])
+            )
+            assert batch.record(row) == expected
+
+    def test_decisions_and_error_codes(self, bp_tree):
+        batch = bp_tree.classify_batch({
+            'systolic_blood_pressure': [115.0, 135.0, 129.5, 150.0],
+            'diastolic_blood_pressure': [70.0, 85.0, 70.0, 125.0],
+        })
+
+        assert list(batch.decisions) == [
+            "Normal blood pressure", "Hypertension Stage 1", "Error", "Hypertensive crisis"
+        ]
+        assert batch.leaf[2] == INVALID_VALUE
+        assert batch.explain(3) == ["Checked diastolic blood pressure: 125.0 >= 120"]
+
+    def test_missing_column_is_unanswered(self, bp_tree):
+        batch = bp_tree.classify_batch({'diastolic_blood_pressure': [70, 130]})
+
+        assert batch.leaf[0] == UNANSWERED
+        assert batch.decisions[1] == "Hypertensive crisis"
+
+    def test_generic_branches_in_batch(self):
+        tree = compile_tree(ENHANCED_TREE, features=('purpose', 'country'))
+
+        records = tree.classify_batch({
+            'purpose': [Purpose.EDUCATION, Purpose.HOME, Purpose.EDUCATION],
+            'country': ['Canada', 'US', 'France'],
+        }).to_records()
+
+        assert [r['decision'] for r in records] == ["Approved", "Declined", "Declined"]
+        assert records[2]['reason'] == "Foreign study"
+
+    def test_mismatched_column_lengths(self, bp_tree):
+        with pytest.raises(ValueError, match="rows"):
+            bp_tree.classify_batch({
+                'systolic_blood_pressure': [120, 130],
+                'diastolic_blood_pressure': [80],
+            })
+
+
+@pytest.fixture(scope="module")
+def trees():
+    """The MCP tree module, imported the way the MCP server does (from its own directory)."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.syspath_prepend(str(Path(__file__).resolve().parents[3] / "lib" / "llm" / "mcp"))
+        yield importlib.import_module("trees")
+
+
+class TestBundledTrees:
+    """The lookups in lib/llm/mcp/trees.py give the same answers compiled as interpreted."""
+
+    def test_loan_tree(self, trees):
+        answers = itertools.product([600, 640, 700], [40000, 50000, 90000], [5000, 10000, 20000])
+        for credit_score, income, requested_amount in answers:
+            expected = trees.decision_tree_lookup(trees.LOAN_DECISION_TREE, credit_score=credit_score,
+                                                  income=income, requested_amount=requested_amount)
+            assert trees.loan_decision_tree_lookup(credit_score, income, requested_amount) == expected
+
+        assert trees.COMPILED_LOAN_TREE.lookup(credit_score=700, income=40000) == trees.decision_tree_lookup(
+            trees.LOAN_DECISION_TREE, credit_score=700, income=40000)
+
+    def test_enhanced_tree(self, trees):
+        answers = itertools.product([*trees.Purpose, "car"], [550, 600, 720], ["US", "Canada", "France"])
+        for purpose, credit_score, country in answers:
+            expected = trees.decision_tree_lookup(trees.ENHANCED_TREE, purpose=purpose,
+                                                  credit_score=credit_score, country=country)
+            assert trees.enhanced_tree_lookup(purpose, credit_score, country) == expected
@@ -0,0 +1,65 @@
+"""
+Unit tests for the server-side filtered and paginated appointment listing.
+"""
+
+from datetime import date
+from unittest.mock import Mock
+
+import pytest
+
+from lib.services.scheduling import (MAX_PAGE_SIZE, SchedulingService,
+                                     build_appointment_query)
+
+pytestmark = pytest.mark.unit
+
+
+def test_filters_are_pushed_into_the_query():
+    statement, params = build_appointment_query(
+        provider_id="user:dr_a", patient_id="patient:1", start_date="2024-03-01", end_date="2024-03-31",
+        statuses=["scheduled", "confirmed"], page=3, page_size=20)
+
+    assert statement.startswith("SELECT * FROM appointment WHERE provider_id = $provider_id AND patient_id = $patient_id")
+    assert "status IN $statuses" in statement
+    assert statement.endswith("ORDER BY appointment_date, start_time LIMIT $limit START $start")
+    assert params == {"provider_id": "user:dr_a", "patient_id": "patient:1", "start_date": "2024-03-01",
+                      "end_date": "2024-03-31", "statuses": ["scheduled", "confirmed"], "limit": 21, "start": 40}
+
+
+def test_default_window_and_single_day():
+    statement, params = build_appointment_query(today=date(2024, 12, 20))
+    assert (params["start_date"], params["end_date"]) == ("2024-12-20", "2025-01-19")
+    assert "provider_id" not in statement and "status" not in statement
+
+    _, params = build_appointment_query(start_date="2024-03-04")
+    assert (params["start_date"], params["end_date"]) == ("2024-03-04", "2024-03-04")
+
+
+def test_page_bounds_are_clamped():
+    _, params = build_appointment_query(start_date="2024-03-04", page=0, page_size=10_000)
+    assert params["start"] == 0 and params["limit"] == MAX_PAGE_SIZE + 1
+
+
+@pytest.mark.parametrize("start_date,end_date", [
+    ("2024-13-01", None),
+    ("2024-03-05", "2024-03-04"),
+    ("2024-01-01", "2025-01-02"),
+])
+def test_invalid_windows_are_rejected(start_date, end_date):
+    with pytest.raises(ValueError):
+        build_appointment_query(start_date=start_date, end_date=end_date)
+
+
+def test_query_appointments_reports_next_page():
+    service = SchedulingService()
+    service.db = Mock()
+    rows = [{"id": f"appointment:{i}", "patient_id": "patient:1", "provider_id": "user:dr_a",
+             "appointment_date": "2024-03-04", "start_time": f"{9 + i:02d}:00", "end_time": f"{9 + i:02d}:30",
+             "status": "scheduled"} for i in range(3)]
+
+    service.db.query.return_value = [{"result": rows}]
+    appointments, has_more = service.query_appointments(provider_id="user:dr_a", start_date="2024-03-04", page_size=2)
+    assert [a.id for a in appointments] == ["appointment:0", "appointment:1"] and has_more
+
+    service.db.query.return_value = rows[:2]
+    appointments, has_more = service.query_appointments(provider_id="user:dr_a", start_date="2024-03-04", page_size=2)
+    assert len(appointments) == 2 and not has_more
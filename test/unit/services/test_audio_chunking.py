@@ -0,0 +1,93 @@
+"""
+Unit tests for silence-based audio chunking.
+"""
+
+import wave
+
+import numpy as np
+import pytest
+
+from lib.services.audio_chunking import (frame_energy_db, read_wav_mono,
+                                         split_on_silence)
+
+pytestmark = pytest.mark.unit
+
+SAMPLE_RATE = 16000
+
+
+def _speech_with_pauses(speech_seconds, pause_seconds, repeats):
+    """Alternate noisy 'speech' bursts with near-silent pauses."""
+    rng = np.random.default_rng(0)
+    parts = []
+    for _ in range(repeats):
+        parts.append(0.3 * rng.standard_normal(int(speech_seconds * SAMPLE_RATE)))
+        parts.append(0.0005 * rng.standard_normal(int(pause_seconds * SAMPLE_RATE)))
+    return np.concatenate(parts).astype(np.float32)
+
+
+class TestSplitOnSilence:
+    """Chunk boundaries for split_on_silence."""
+
+    def test_empty_audio(self):
+        assert split_on_silence(np.zeros(0, dtype=np.float32), SAMPLE_RATE) == []
+
+    def test_short_audio_single_chunk(self):
+        samples = _speech_with_pauses(5, 1, 2)
+
+        chunks = split_on_silence(samples, SAMPLE_RATE, target_seconds=30, max_seconds=60)
+
+        assert len(chunks) == 1
+        assert chunks[0].start == 0
+        assert chunks[0].end == len(samples)
+
+    def test_cuts_land_in_silence(self):
+        # 8 s of speech followed by 1 s of silence, twelve times (108 s total).
+        samples = _speech_with_pauses(8, 1, 12)
+
+        chunks = split_on_silence(samples, SAMPLE_RATE, target_seconds=20, max_seconds=40)
+
+        assert len(chunks) > 1
+        for previous, current in zip(chunks, chunks[1:]):
+            assert previous.end == current.start
+            position_in_cycle = (current.start / SAMPLE_RATE) % 9
+            assert 8 <= position_in_cycle <= 9
+        assert all(c.end_seconds - c.start_seconds <= 40 for c in chunks)
+        assert chunks[-1].end == len(samples)
+
+    def test_hard_cut_without_silence(self):
+        rng = np.random.default_rng(1)
+        samples = (0.3 * rng.standard_normal(50 * SAMPLE_RATE)).astype(np.float32)
+
+        chunks = split_on_silence(samples, SAMPLE_RATE, target_seconds=10, max_seconds=20, silence_db=-60)
+
+        assert [round(c.end_seconds) for c in chunks] == [20, 40, 50]
+
+    def test_silent_chunks_dropped(self):
+        samples = np.concatenate([
+            _speech_with_pauses(5, 0.5, 1),
+            np.zeros(30 * SAMPLE_RATE, dtype=np.float32),
+            _speech_with_pauses(5, 0.5, 1),
+        ])
+
+        chunks = split_on_silence(samples, SAMPLE_RATE, target_seconds=5, max_seconds=10, silence_db=-50)
+
+        assert [c.index for c in chunks] == list(range(len(chunks)))
+        assert sum(c.end - c.start for c in chunks) < len(samples)
+
+
+def test_read_wav_mono_downmixes(tmp_path):
+    path = tmp_path / "stereo.wav"
+    left = np.full(1600, 16384, dtype='<i2')
+    right = np.zeros(1600, dtype='<i2')
+    with wave.open(str(path), 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(np.column_stack([left, right]).tobytes())
+
+    samples, rate = read_wav_mono(str(path))
+
+    assert rate == SAMPLE_RATE
+    assert samples.shape == (1600,)
+    assert np.allclose(samples, 0.25)
+    assert frame_energy_db(samples, rate).max() == pytest.approx(20 * np.log10(0.25), abs=0.01)
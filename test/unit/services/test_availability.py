@@ -0,0 +1,131 @@
+"""
+Unit tests for the bitset-based availability engine and its use by SchedulingService.
+"""
+
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+from surrealdb import RecordID
+
+from lib.events import AppointmentCreated, AppointmentUpdated
+from lib.infra.event_bus import EventBus
+from lib.services.availability import (AvailabilityEngine, range_mask,
+                                       run_starts, to_minutes)
+from lib.models.user.user import User
+from lib.services.scheduling import SchedulingService
+
+pytestmark = pytest.mark.unit
+
+
+def appt(id, provider, date, start, end, status="scheduled"):
+    return {"id": id, "provider_id": provider, "appointment_date": date,
+            "start_time": start, "end_time": end, "status": status}
+
+
+BOOKINGS = [
+    appt("appointment:1", "dr_a", "2024-03-04", "09:00", "10:00"),
+    appt("appointment:2", "dr_a", "2024-03-04", "10:30", "11:00"),
+    appt("appointment:3", "dr_a", "2024-03-04", "13:00", "14:00", status="cancelled"),
+    appt("appointment:4", "dr_b", "2024-03-04", "09:00", "17:00"),
+    appt("appointment:5", "dr_b", "2024-03-05", "09:00", "09:30"),
+]
+
+
+@pytest.fixture
+def engine():
+    engine = AvailabilityEngine(ttl_seconds=60)
+    fetch = Mock(side_effect=lambda providers, start, end: [
+        b for b in BOOKINGS if b["provider_id"] in providers and start <= b["appointment_date"] <= end
+    ])
+    engine.ensure_loaded(fetch, ["dr_a", "dr_b"], "2024-03-04", "2024-03-05")
+    engine.fetch = fetch
+    return engine
+
+
+def test_bit_helpers():
+    assert to_minutes("09:30") == 570 and to_minutes("24:00") == 1440
+    assert to_minutes("9") is None and to_minutes("25:00") is None
+    free = range_mask(0, 10) & ~range_mask(3, 5)
+    assert run_starts(free, 3) == range_mask(0, 1) | range_mask(5, 8)
+
+
+def test_free_slots_skip_bookings_and_ignore_cancelled(engine):
+    slots = engine.free_slots("dr_a", "2024-03-04", 30)
+    starts = [s["start_time"] for s in slots]
+    assert starts[:3] == ["10:00", "11:00", "11:30"]
+    assert "13:00" in starts and "10:30" not in starts
+    assert slots[-1] == {"start_time": "16:30", "end_time": "17:00"}
+    assert engine.free_slots("dr_b", "2024-03-04", 30) == []
+
+
+def test_conflicts_and_exclusion(engine):
+    assert engine.find_conflict("dr_a", "2024-03-04", "09:45", "10:15") == ("09:00", "10:00")
+    assert engine.find_conflict("dr_a", "2024-03-04", "10:00", "10:30") is None
+    assert engine.find_conflict("dr_a", "2024-03-04", "09:15", "09:45", exclude_id="appointment:1") is None
+
+
+def test_first_free_slot_across_providers_and_days(engine):
+    assert engine.first_free_slot(["dr_b", "dr_a"], "2024-03-04", "2024-03-05", 45) == {
+        "provider_id": "dr_a", "date": "2024-03-04", "start_time": "11:00", "end_time": "11:45"
+    }
+    assert engine.first_free_slot(["dr_b"], "2024-03-04", "2024-03-05", 45)["start_time"] == "09:30"
+
+
+def test_loaded_days_are_cached_and_kept_in_sync_by_events(engine):
+    bus = EventBus()
+    engine.subscribe(bus)
+    engine.ensure_loaded(engine.fetch, ["dr_a"], "2024-03-04", "2024-03-04")
+    assert engine.fetch.call_count == 1
+
+    bus.publish(AppointmentCreated("appointment:9", "p", "dr_a", "2024-03-04", "11:00", "12:00",
+                                   "consultation", datetime.now()))
+    assert engine.find_conflict("dr_a", "2024-03-04", "11:30", "11:45") == ("11:00", "12:00")
+
+    bus.publish(AppointmentUpdated("appointment:9", "p", "dr_a", "2024-03-04", "15:00", "15:30",
+                                   "consultation", "scheduled", {}, datetime.now()))
+    assert engine.find_conflict("dr_a", "2024-03-04", "11:30", "11:45") is None
+    assert engine.find_conflict("dr_a", "2024-03-04", "15:00", "15:10") == ("15:00", "15:30")
+
+    bus.publish(AppointmentUpdated("appointment:9", "p", "dr_a", "2024-03-04", "15:00", "15:30",
+                                   "consultation", "cancelled", {}, datetime.now()))
+    assert engine.find_conflict("dr_a", "2024-03-04", "15:00", "15:10") is None
+
+
+def test_scheduling_service_reads_bookings_in_one_query(monkeypatch):
+    engine = AvailabilityEngine(ttl_seconds=60)
+    monkeypatch.setattr("lib.services.scheduling.availability_engine", engine)
+    service = SchedulingService()
+    service.db = Mock()
+    service.db.query.return_value = [{"result": BOOKINGS}]
+
+    slot = service.find_first_available_slot(["dr_b", "dr_a"], "2024-03-04", "2024-03-08", 60)
+    assert slot == {"provider_id": "dr_a", "date": "2024-03-04", "start_time": "11:00", "end_time": "12:00"}
+    assert service.get_available_slots("dr_a", "2024-03-04", 60)[0]["start_time"] == "11:00"
+    assert service.db.query.call_count == 1
+
+    assert service._check_time_conflict("dr_a", "2024-03-04", "10:45", "11:15") == \
+        "Conflicts with appointment at 10:30-11:00"
+    assert service.db.query.call_count == 2
+
+
+def test_providers_by_specialty_are_read_from_the_user_table():
+    # A provider as SurrealDB returns it from the User table, and a patient who must not match.
+    tables = {"User": [
+        {"id": RecordID("User", "house"), "role": "provider", "specialty": "Cardiology", "is_active": True},
+        {"id": RecordID("User", "jane"), "role": "patient", "specialty": None, "is_active": True},
+    ]}
+
+    def query(statement, params):
+        table = statement.split(" FROM ")[1].split()[0]
+        return [{"id": row["id"]} for row in tables.get(table, [])
+                if row["role"] == "provider" and row["is_active"] and row["specialty"] == params["specialty"]]
+
+    service = SchedulingService()
+    service.db = Mock()
+    service.db.query.side_effect = query
+
+    provider_ids = service.get_provider_ids_by_specialty("Cardiology")
+
+    # The same form the routes store in appointment.provider_id (current_user.user_id, from User.from_dict).
+    assert provider_ids == [User.from_dict(tables["User"][0]).id] == ["User:house"]
@@ -0,0 +1,115 @@
+"""
+Unit tests for the in-process clinic index and the database radius search.
+"""
+
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from lib.services import clinic_locator
+from lib.services.clinic_locator import ClinicIndex, haversine_m
+
+pytestmark = pytest.mark.unit
+
+
+def random_clinics(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{
+        "id": f"clinic:{i}",
+        "name": f"Clinic {i}",
+        "location": {"type": "Point", "coordinates": [float(lon), float(lat)]},
+        "organization_id": f"organization:{i % 3}",
+        "specialties": ["Cardiology"] if i % 4 == 0 else ["family medicine"],
+    } for i, (lon, lat) in enumerate(zip(rng.uniform(-180, 180, n), rng.uniform(-90, 90, n)))]
+
+
+def brute_force(clinics, lon, lat, predicate=lambda c: True):
+    ranked = sorted((float(haversine_m(lon, lat, *c["location"]["coordinates"])), c["id"])
+                    for c in clinics if predicate(c))
+    return [clinic_id for _, clinic_id in ranked]
+
+
+def test_haversine_matches_known_distance():
+    # Paris to London, about 343.5 km.
+    assert float(haversine_m(2.3522, 48.8566, -0.1276, 51.5072)) == pytest.approx(343_500, rel=2e-3)
+
+
+def test_nearest_and_within_match_brute_force_with_filters():
+    clinics = random_clinics(2000)
+    index = ClinicIndex(clinics)
+    rng = np.random.default_rng(1)
+
+    for lon, lat in zip(rng.uniform(-180, 180, 20), rng.uniform(-90, 90, 20)):
+        assert [c["id"] for c in index.nearest(lon, lat, k=7)] == brute_force(clinics, lon, lat)[:7]
+
+        cardiology = index.nearest(lon, lat, k=3, organization_id="organization:1", specialty="cardiology")
+        expected = brute_force(clinics, lon, lat, lambda c: c["organization_id"] == "organization:1"
+                               and "Cardiology" in c["specialties"])[:3]
+        assert [c["id"] for c in cardiology] == expected
+
+        within = index.within(lon, lat, radius_m=1_500_000)
+        assert all(c["distance_m"] <= 1_500_000 for c in within)
+        assert [c["id"] for c in within] == [
+            cid for cid in brute_force(clinics, lon, lat)
+            if haversine_m(lon, lat, *clinics[int(cid.split(":")[1])]["location"]["coordinates"]) <= 1_500_000]
+
+
+def test_nearest_respects_max_distance_and_unknown_filters():
+    index = ClinicIndex(random_clinics(100))
+    assert index.nearest(0, 0, k=5, max_distance_m=1) == []
+    assert index.nearest(0, 0, k=5, organization_id="organization:99") == []
+    assert index.nearest(0, 0, k=5, specialty="dermatology") == []
+    with pytest.raises(ValueError):
+        index.nearest(200, 0)
+
+
+def test_repeated_queries_are_memoised():
+    index = ClinicIndex(random_clinics(50))
+    first = index.nearest(10, 10, k=3)
+    index._search = Mock()
+    first[0]["name"] = "changed by the caller"
+    first.pop()
+
+    again = index.nearest(10, 10, k=3)
+    assert len(again) == 3 and again[0]["name"] != "changed by the caller"
+    index._search.assert_not_called()
+
+
+def test_bulk_assignment_matches_nearest(monkeypatch):
+    clinics = random_clinics(300)
+    index = ClinicIndex(clinics)
+    monkeypatch.setattr(clinic_locator, "get_clinic_index", lambda: index)
+    rng = np.random.default_rng(2)
+    patients = [{"id": f"patient:{i}", "longitude": float(lon), "latitude": float(lat)}
+                for i, (lon, lat) in enumerate(zip(rng.uniform(-180, 180, 5000), rng.uniform(-90, 90, 5000)))]
+
+    assignments = clinic_locator.assign_nearest_clinics(patients, organization_id="organization:2")
+
+    for patient, assignment in list(zip(patients, assignments))[:200]:
+        nearest = index.nearest(patient["longitude"], patient["latitude"], k=1, organization_id="organization:2")[0]
+        assert assignment["patient_id"] == patient["id"]
+        assert assignment["clinic_id"] == nearest["id"]
+        assert assignment["distance_m"] == pytest.approx(nearest["distance_m"])
+
+    unassigned = clinic_locator.assign_nearest_clinics(patients[:3], max_distance_m=1)
+    assert [a["clinic_id"] for a in unassigned] == [None, None, None]
+    with pytest.raises(ValueError):
+        clinic_locator.assign_nearest_clinics([{"id": "patient:x", "longitude": 0}])
+
+
+def test_database_radius_search_is_parametrised():
+    db = Mock()
+    db.query.return_value = [{"result": [{"id": "clinic:1", "distance_m": 10.0}]}]
+
+    rows = clinic_locator.find_clinics_within(-118.41, 34.08, 5000, organization_id="organization:1",
+                                              specialty="Cardiology", limit=10, db=db)
+
+    statement, params = db.query.call_args.args
+    assert rows == [{"id": "clinic:1", "distance_m": 10.0}]
+    assert "latitude >= $min_latitude" in statement
+    # Specialties match case-insensitively, as in the in-process index.
+    assert "string::lowercase" in statement and params["specialty"] == "cardiology"
+    assert params["point"] == [-118.41, 34.08] and params["limit"] == 10
+    assert params["min_latitude"] == pytest.approx(34.08 - 0.045, abs=1e-3)
+    db.close.assert_not_called()
@@ -0,0 +1,73 @@
+"""
+Unit tests for the batched conversation list.
+"""
+
+from unittest.mock import Mock
+
+import pytest
+
+from lib.db.surreal import TransactionError
+from lib.models.conversation import PREVIEW_LENGTH, message_preview
+from lib.services.conversation_service import ConversationService
+
+pytestmark = pytest.mark.unit
+
+
+def conversation_row(i, participants, **extra):
+    return {"id": f"Conversation:c{i}", "participants": participants, "conversation_type": "user_to_user",
+            "created_at": "2024-01-01T00:00:00Z", "last_message_at": f"2024-01-0{i}T00:00:00Z", **extra}
+
+
+def test_preview_is_single_line_and_bounded():
+    assert message_preview("Hello\n  there") == "Hello there"
+    long = message_preview("word " * 100)
+    assert len(long) <= PREVIEW_LENGTH and long.endswith("…")
+
+
+def test_summaries_take_two_queries_for_any_number_of_threads():
+    db = Mock()
+    rows = [conversation_row(i, ["User:me", f"User:u{i % 3}"], last_message_preview=f"hi {i}") for i in range(1, 10)]
+    rows.append(conversation_row(0, ["User:me", "User:u0"], latest_message_text="From before\\npreviews"))
+    db.query.side_effect = [
+        rows,
+        [{"id": "User:u0", "first_name": "Ada", "last_name": "Lovelace", "username": "ada"},
+         {"id": "User:u1", "first_name": None, "last_name": None, "username": "bob"}],
+    ]
+
+    summaries = ConversationService(db_controller=db).get_conversation_summaries("User:me")
+
+    assert db.query.call_count == 2
+    _, params = db.query.call_args.args
+    assert sorted(str(user_id) for user_id in params["users"]) == ["User:u0", "User:u1", "User:u2"]
+    assert summaries[0]["last_message"] == "hi 1" and summaries[0]["other_participant"]["username"] == "bob"
+    assert summaries[1]["other_participant"] is None
+    assert summaries[-1]["last_message"] == "From before\\npreviews"
+    assert summaries[-1]["other_participant"]["first_name"] == "Ada"
+
+
+def test_add_message_is_one_transaction():
+    db = Mock()
+    db.execute.return_value = [None, [{"id": "Message:m1"}], [conversation_row(1, ["User:me", "User:you"])]]
+
+    success, _, message = ConversationService(db_controller=db).add_message("c1", "User:me", "See you at\n3pm")
+
+    assert success and message.id == "Message:m1"
+    statement, params = db.execute.call_args.args[0].build()
+    assert "THROW" in statement and "CREATE Message CONTENT $s1_message" in statement
+    assert "UPDATE $s2_conversation MERGE $s2_changes" in statement
+    assert str(params["s0_conversation"]) == "Conversation:c1" and params["s0_user_id"] == "User:me"
+    assert params["s2_changes"]["last_message_preview"] == "See you at 3pm"
+    assert params["s2_changes"]["last_message_sender_id"] == "User:me"
+    db.query.assert_not_called()
+    db.select.assert_not_called()
+
+
+def test_add_message_reports_the_failed_participant_check():
+    db = Mock()
+    db.execute.side_effect = TransactionError(
+        "An error occurred: User is not a participant in this conversation", 0, [])
+
+    success, reason, message = ConversationService(db_controller=db).add_message("c1", "User:x", "hi")
+
+    assert not success and message is None
+    assert reason == "User is not a participant in this conversation"
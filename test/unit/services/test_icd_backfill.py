@@ -0,0 +1,123 @@
+"""
+Unit tests for the bulk ICD autocoding backfill job.
+"""
+
+from unittest.mock import Mock
+
+import pytest
+
+from lib.models.patient.caching import create_text_hash
+from lib.services.icd_backfill import ICDBackfillJob, UMLSLookupCache
+
+pytestmark = pytest.mark.unit
+
+
+def encounter(n, text):
+    return {"id": f"encounter:{n:03d}", "note_text": text, "note_type": "text"}
+
+
+ENCOUNTERS = [
+    encounter(1, "Patient has diabetes."),
+    encounter(2, "Patient has diabetes."),
+    encounter(3, "Hypertension and Diabetes noted."),
+    encounter(4, ""),
+    encounter(5, "Cached note."),
+]
+
+
+class FakeDb:
+    def __init__(self, encounters, cached=None, checkpoint=None):
+        self.encounters = encounters
+        self.cached = cached or {}
+        self.checkpoint = checkpoint
+        self.written = {}
+        self.inserted = []
+        self.statements = []
+
+    def query(self, statement, params=None):
+        self.statements.append(statement)
+        params = params or {}
+        if statement.startswith("SELECT id, note_text"):
+            after = str(params["after"]) if "after" in params else ""
+            return [e for e in self.encounters if e["id"] > after][:params["limit"]]
+        if statement.startswith("SELECT text_hash"):
+            return [{"result": [self.cached[h] for h in params["text_hashes"] if h in self.cached]}]
+        if statement.startswith("INSERT INTO entity_cache"):
+            self.inserted.extend(params["rows"])
+            return []
+        if statement.startswith("FOR $row"):
+            for row in params["rows"]:
+                self.written[row["id"]] = row["codes"]
+            return []
+        if statement.startswith("UPSERT"):
+            self.checkpoint = params["data"]
+            return []
+        if statement.startswith("SELECT * FROM type::thing"):
+            return [self.checkpoint] if self.checkpoint else []
+        if statement.startswith("DELETE"):
+            self.checkpoint = None
+            return []
+        raise AssertionError(statement)
+
+
+def ner(texts):
+    return [
+        [{"text": word.strip("."), "label": "DISEASE", "start_char": 0, "end_char": 1}
+         for word in text.split() if word.lower().strip(".") in ("diabetes", "hypertension")]
+        + [{"text": "Patient", "label": "PERSON", "start_char": 0, "end_char": 7}]
+        for text in texts
+    ]
+
+
+@pytest.fixture
+def umls():
+    umls = Mock()
+    umls.search_concept.side_effect = lambda term, sabs=None: {"cui": f"C_{term.lower()}"}
+    umls.get_icd10cm_from_cui.side_effect = lambda cui: [{"code": cui.upper()[2:5], "name": cui}]
+    return umls
+
+
+def test_umls_lookups_are_memoised(umls):
+    cache = UMLSLookupCache(umls)
+    coded = cache.code([{"text": "Diabetes", "label": "DISEASE"}, {"text": "diabetes.", "label": "DISEASE"}])
+    assert [e["icd10cm"] for e in coded] == ["DIA", "DIA"]
+    assert umls.search_concept.call_count == 1 and umls.get_icd10cm_from_cui.call_count == 1
+    assert cache.lookups == 2
+
+
+def test_backfill_dedupes_texts_and_writes_in_bulk(umls):
+    cached_hash = create_text_hash("Cached note.")
+    db = FakeDb(ENCOUNTERS, cached={cached_hash: {
+        "text_hash": cached_hash, "entities": [{"text": "asthma", "cui": "C1", "icd10cm": "J45", "icd10cm_name": "Asthma"}]
+    }})
+    ner_batch = Mock(side_effect=ner)
+    job = ICDBackfillJob(db, batch_size=10, umls=umls, ner=ner_batch)
+
+    report = job.run()
+
+    ner_batch.assert_called_once_with(["Patient has diabetes.", "Hypertension and Diabetes noted."])
+    assert umls.search_concept.call_count == 2
+    assert db.written["encounter:001"] == [{"text": "diabetes", "cui": "C_diabetes", "icd10cm": "DIA",
+                                            "icd10cm_name": "C_diabetes"}]
+    assert db.written["encounter:002"] == db.written["encounter:001"]
+    assert [c["icd10cm"] for c in db.written["encounter:003"]] == ["HYP", "DIA"]
+    assert db.written["encounter:004"] == []
+    assert db.written["encounter:005"][0]["icd10cm"] == "J45"
+    assert len(db.inserted) == 2
+    assert sum(s.startswith("FOR $row") for s in db.statements) == 1
+    assert report["encounters"] == 5 and report["unique_texts"] == 3 and report["cache_hits"] == 1
+    assert db.checkpoint["last_id"] == "encounter:005"
+
+
+def test_backfill_resumes_from_checkpoint(umls):
+    db = FakeDb(ENCOUNTERS, checkpoint={"last_id": "encounter:002"})
+    job = ICDBackfillJob(db, batch_size=2, umls=umls, ner=ner, only_missing=False)
+
+    report = job.run(limit=2)
+
+    assert set(db.written) == {"encounter:003", "encounter:004"}
+    assert report["pages"] == 1
+    assert db.checkpoint["last_id"] == "encounter:004"
+
+    ICDBackfillJob(db, batch_size=2, umls=umls, ner=ner).run(restart=True)
+    assert "encounter:001" in db.written
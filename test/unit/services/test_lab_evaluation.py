@@ -0,0 +1,84 @@
+"""
+Unit tests for vectorized lab-result evaluation.
+"""
+
+import numpy as np
+import pytest
+
+from lib.services.lab_evaluation import (CRITICAL_LOW, DELTA, HIGH, LOW,
+                                         UNIT_MISMATCH, LabColumns,
+                                         conversion_factor, evaluate,
+                                         synthetic_columns)
+from lib.services.lab_results import (LabResultsService, general_chemistry,
+                                      hematology)
+
+pytestmark = pytest.mark.unit
+
+
+def result(patient, analyte, day, value, **extra):
+    return {"patient_id": patient, "analyte": analyte, "collected_at": f"2024-03-{day:02d}", "result": value, **extra}
+
+
+def test_unit_conversions():
+    assert conversion_factor("Hemoglobin", "g/dL", "g/L") == 10.0
+    assert conversion_factor("Creatinine", "mg/dL", "umol/L") == pytest.approx(88.4, rel=1e-3)
+    assert conversion_factor("Hemoglobin", "mmol/L", "g/L") == pytest.approx(16.1145)
+    assert conversion_factor("Hematocrit", "%", "L/L") == 0.01
+    assert conversion_factor("RDW", "%", "L/L") is None
+    assert conversion_factor("Sodium", "U/L", "mmol/L") is None
+
+
+def test_flags_ranges_critical_limits_units_and_inf():
+    columns = LabColumns.from_records([
+        result("p1", "Hemoglobin", 1, 14.0, units="g/dL"),         # 140 g/L, normal
+        result("p1", "Sodium", 1, 118),                           # low and critical low
+        result("p2", "Estimated GFR", 1, 5000),                   # INF upper bound: not high
+        result("p2", "Albumin", 1, 0.9, units="mmol/L"),          # ~59.9 g/L: high
+        result("p2", "Creatinine", 1, 1.0, units="furlongs"),     # unconvertible
+        result("p3", "MCV", 1, 99, reference_range=[80, 100]),    # own range
+    ])
+    flags = evaluate(columns).flags
+
+    assert columns.value[0] == pytest.approx(140.0)
+    assert flags[0] == 0
+    assert flags[1] == LOW | CRITICAL_LOW
+    assert flags[2] == 0
+    assert flags[3] == HIGH
+    assert flags[4] == UNIT_MISMATCH
+    assert flags[5] == 0
+
+
+def test_delta_checks_follow_each_patient_and_analyte_in_time_order():
+    columns = LabColumns.from_records([
+        result("p1", "Hemoglobin", 10, 100),
+        result("p1", "Hemoglobin", 1, 140),
+        result("p2", "Hemoglobin", 5, 100),
+        result("p1", "Sodium", 2, 140),
+        result("p1", "Hemoglobin", 20, 105),
+    ])
+    evaluation = evaluate(columns)
+
+    assert np.isnan(evaluation.previous[1]) and np.isnan(evaluation.previous[2])
+    assert evaluation.previous[0] == 140 and evaluation.previous[4] == 100
+    assert evaluation.flags[0] & DELTA and not evaluation.flags[4] & DELTA
+    assert not evaluation.flags[2] & DELTA
+
+
+def test_population_summary_matches_row_flags():
+    columns = synthetic_columns(20000, patients=500, seed=1)
+    evaluation = evaluate(columns)
+    summary = evaluation.summary()
+
+    assert sum(s["results"] for s in summary.values()) == 20000
+    hb = columns.analytes.index("Hemoglobin")
+    rows = columns.analyte == hb
+    assert summary["Hemoglobin"]["high"] == int(((evaluation.flags[rows] & HIGH) != 0).sum())
+    abnormal = rows & ((evaluation.flags & (LOW | HIGH)) != 0)
+    assert summary["Hemoglobin"]["patients_flagged"] == len(np.unique(columns.patient[abnormal]))
+
+
+def test_service_adds_flags_to_panels():
+    flagged = LabResultsService(hematology=hematology, general_chemistry=general_chemistry).flagged("patient:1")
+    assert flagged["general_chemistry"]["Albumin"]["flags"] == ["high"]
+    assert flagged["general_chemistry"]["Estimated GFR"]["flags"] == []
+    assert flagged["hematology"]["WBC"]["flags"] == []
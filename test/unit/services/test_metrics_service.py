@@ -0,0 +1,96 @@
+"""
+Unit tests for the metric time-series layer.
+"""
+
+import datetime
+from unittest.mock import Mock
+
+import pytest
+
+from lib.models.metrics import parse_metric_value, to_timestamp
+from lib.services import metrics_service
+
+pytestmark = pytest.mark.unit
+
+
+def test_values_and_timestamps_are_normalised():
+    assert parse_metric_value("120") == 120.0
+    assert parse_metric_value(" 1,250.5 ") == 1250.5
+    assert parse_metric_value("120/80") is None and parse_metric_value(True) is None
+    assert to_timestamp("2024-03-04") == "2024-03-04T00:00:00Z"
+    assert to_timestamp("2024-03-04T10:30:00+02:00") == "2024-03-04T08:30:00Z"
+    assert to_timestamp(datetime.date(2024, 3, 4)) == "2024-03-04T00:00:00Z"
+
+
+def test_upsert_writes_set_and_typed_points_in_one_query():
+    db = Mock()
+    metrics_service.upsert_user_metric_set_by_date("user:1", "2024-03-04", [
+        {"metric_name": "weight", "metric_value": "81.5", "metric_unit": "kg", "range": [60, 90]},
+        {"metric_name": "blood_pressure", "metric_value": "120/80", "metric_unit": "mmHg"},
+    ], db=db)
+
+    assert db.execute.call_count == 1
+    db.query.assert_not_called()
+    statement, params = db.execute.call_args.args[0].build()
+    assert statement.startswith("BEGIN TRANSACTION;")
+    assert "UPSERT type::thing('metric_point'" in statement and "CREATE MetricSet" in statement
+    weight, pressure = params["s3_points"]
+    assert weight["value"] == 81.5 and weight["range_low"] == 60.0 and weight["timestamp"] == "2024-03-04T00:00:00Z"
+    assert pressure["value"] is None and pressure["text_value"] == "120/80"
+    db.close.assert_not_called()
+
+
+def test_upsert_removes_points_of_metrics_dropped_from_the_set():
+    db = Mock()
+    metrics_service.upsert_user_metric_set_by_date("user:1", "2024-03-04", [
+        {"metric_name": "weight", "metric_value": "81.5", "metric_unit": "kg"},
+    ], db=db)
+
+    statement, params = db.execute.call_args.args[0].build()
+    delete = statement.index("DELETE metric_point")
+    assert statement.index("CREATE MetricSet") < delete < statement.index("UPSERT type::thing('metric_point'")
+    assert "metric_name NOTINSIDE $s2_metric_names" in statement
+    assert params["s2_user_id"] == "user:1" and params["s2_timestamp"] == "2024-03-04T00:00:00Z"
+    assert params["s2_metric_names"] == ["weight"]
+
+    metrics_service.upsert_user_metric_set_by_date("user:1", "2024-03-04", [], db=db)
+    statement, params = db.execute.call_args.args[0].build()
+    assert "DELETE metric_point" in statement and "UPSERT" not in statement
+    assert params["s2_metric_names"] == []
+
+
+def test_downsampled_series_are_returned_as_columns():
+    db = Mock()
+    db.query.return_value = [
+        {"metric_name": "weight", "timestamp": datetime.datetime(2024, 3, 4), "avg": 81.0, "min": 80.0,
+         "max": 82.0, "count": 3},
+        {"metric_name": "weight", "timestamp": datetime.datetime(2024, 3, 11), "avg": 80.5, "min": 80.5,
+         "max": 80.5, "count": 1},
+    ]
+
+    series = metrics_service.get_metric_series("user:1", ["weight", "glucose"], "2024-01-01", "2025-01-01",
+                                               resolution="week", db=db)
+
+    statement, params = db.query.call_args.args
+    assert "GROUP BY metric_name, bucket" in statement and "time::floor(timestamp + 3d, 1w) - 3d" in statement
+    assert params["start"] == "2024-01-01T00:00:00Z" and params["metric_names"] == ["weight", "glucose"]
+    assert series["weight"] == {"timestamp": ["2024-03-04T00:00:00Z", "2024-03-11T00:00:00Z"],
+                                "avg": [81.0, 80.5], "min": [80.0, 80.5], "max": [82.0, 80.5], "count": [3, 1]}
+    assert series["glucose"]["timestamp"] == []
+
+    with pytest.raises(ValueError):
+        metrics_service.get_metric_series("user:1", ["weight"], "2024-01-01", "2025-01-01", resolution="hour", db=db)
+
+
+def test_managed_connection_is_closed(monkeypatch):
+    db = Mock()
+    db.query.return_value = [{"result": [{"metric_name": "weight", "timestamp": "2024-03-04T00:00:00Z",
+                                          "value": 81.0, "text_value": None, "unit": "kg"}]}]
+    monkeypatch.setattr(metrics_service, "DbController", Mock(return_value=db))
+
+    columns = metrics_service.export_metric_columns("user:1", "2024-01-01", "2025-01-01")
+
+    assert columns["value"] == [81.0] and columns["unit"] == ["kg"]
+    assert "metric_name IN" not in db.query.call_args.args[0]
+    db.connect.assert_called_once()
+    db.close.assert_called_once()
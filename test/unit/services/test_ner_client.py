@@ -0,0 +1,59 @@
+"""
+Unit tests for the pooled NER client used by the ICD autocoder.
+"""
+
+from unittest.mock import Mock
+
+import pytest
+
+from lib.services import icd_autocoder_service
+
+pytestmark = pytest.mark.unit
+
+
+def response(status, body):
+    resp = Mock(status_code=status, text=str(body))
+    resp.json.return_value = body
+    return resp
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = Mock()
+    monkeypatch.setattr(icd_autocoder_service, "get_ner_session", lambda: session)
+    return session
+
+
+def test_session_is_shared_and_pooled(monkeypatch):
+    monkeypatch.setattr(icd_autocoder_service, "_ner_session", None)
+    first = icd_autocoder_service.get_ner_session()
+    assert icd_autocoder_service.get_ner_session() is first
+    adapter = first.get_adapter("https://example.org")
+    assert adapter._pool_maxsize == 16 and adapter.max_retries.total == 3
+
+
+def test_batch_extraction_chunks_requests_and_keeps_order(session):
+    def post(url, json, timeout):
+        assert url.endswith("/extract_batch")
+        return response(200, {"results": [
+            {"entities": [{"text": t, "label": "DISEASE", "start_char": 0, "end_char": len(t)}]}
+            for t in json["texts"]
+        ]})
+
+    session.post.side_effect = post
+    texts = [f"note {i}" for i in range(5)]
+    results = icd_autocoder_service.ner_extract_batch(texts, batch_size=2)
+
+    assert session.post.call_count == 3
+    assert [r[0]["text"] for r in results] == texts
+
+
+def test_batch_extraction_raises_on_errors(session):
+    session.post.return_value = response(503, {"detail": "busy"})
+    with pytest.raises(RuntimeError):
+        icd_autocoder_service.ner_extract_batch(["note"])
+
+    # A short answer would otherwise shift every later text's entities onto the wrong text.
+    session.post.return_value = response(200, {"results": [{"entities": []}]})
+    with pytest.raises(RuntimeError, match="1 results for 2 texts"):
+        icd_autocoder_service.ner_extract_batch(["first", "second"])
@@ -0,0 +1,115 @@
+"""
+Unit tests for streaming multipart uploads and presigned URLs.
+"""
+
+import base64
+import hashlib
+import io
+
+import pytest
+
+from lib.services.object_storage import (MIN_PART_SIZE, HashingReader,
+                                         create_presigned_put, stream_to_s3)
+
+pytestmark = pytest.mark.unit
+
+
+class FakeS3:
+    """Records multipart calls and keeps completed objects in memory."""
+
+    def __init__(self, fail_on_part=None):
+        self.fail_on_part = fail_on_part
+        self.parts = {}
+        self.objects = {}
+        self.aborted = []
+        self.max_part = 0
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.parts["mpu-1"] = []
+        return {"UploadId": "mpu-1"}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.fail_on_part:
+            raise RuntimeError("connection reset")
+        self.max_part = max(self.max_part, len(Body))
+        self.parts[UploadId].append((PartNumber, Body))
+        return {"ETag": f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        self.objects[Key] = b"".join(body for n, body in self.parts.pop(UploadId) if n in numbers)
+        return {"ETag": '"final"'}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.parts.pop(UploadId, None)
+        self.aborted.append(Key)
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://s3.test/{Params['Bucket']}/{Params['Key']}?op={operation}"
+
+
+class TrickleStream(io.BytesIO):
+    """Returns short reads, like a socket."""
+
+    def read(self, size=-1):
+        return super().read(min(size, 4096) if size and size > 0 else 4096)
+
+
+def test_hashing_reader_counts_and_hashes():
+    reader = HashingReader(io.BytesIO(b"hello world"))
+    assert reader.read(5) == b"hello"
+    reader.read()
+    assert reader.size == 11
+    assert reader.sha256 == hashlib.sha256(b"hello world").hexdigest()
+
+
+def test_stream_splits_into_bounded_parts():
+    body = bytes(range(256)) * (MIN_PART_SIZE * 2 // 256 + 100)
+    s3 = FakeS3()
+    result = stream_to_s3(TrickleStream(body), "bucket", "k", part_size=MIN_PART_SIZE, client=s3)
+
+    assert result.committed
+    assert result.size == len(body)
+    assert result.sha256 == hashlib.sha256(body).hexdigest()
+    assert s3.objects["k"] == body
+    assert s3.max_part == MIN_PART_SIZE
+
+
+def test_small_body_uses_single_part():
+    s3 = FakeS3()
+    result = stream_to_s3(io.BytesIO(b"%PDF-1.4"), "bucket", "k", client=s3)
+    assert result.committed and s3.objects["k"] == b"%PDF-1.4"
+
+
+def test_vetoed_upload_is_aborted():
+    seen = []
+    s3 = FakeS3()
+    result = stream_to_s3(io.BytesIO(b"duplicate"), "bucket", "k", client=s3,
+                          before_commit=lambda sha256, size: seen.append((sha256, size)) and False)
+
+    assert not result.committed
+    assert seen == [(hashlib.sha256(b"duplicate").hexdigest(), 9)]
+    assert "k" not in s3.objects and s3.aborted == ["k"]
+
+
+def test_failures_abort_the_multipart_upload():
+    s3 = FakeS3(fail_on_part=2)
+    with pytest.raises(RuntimeError):
+        stream_to_s3(io.BytesIO(b"x" * (MIN_PART_SIZE + 1)), "bucket", "k", part_size=MIN_PART_SIZE, client=s3)
+    assert s3.aborted == ["k"] and not s3.parts
+
+
+def test_empty_body_is_rejected():
+    s3 = FakeS3()
+    with pytest.raises(ValueError):
+        stream_to_s3(io.BytesIO(b""), "bucket", "k", client=s3)
+    assert s3.aborted == ["k"]
+
+
+def test_presigned_put_binds_checksum():
+    digest = hashlib.sha256(b"scan").hexdigest()
+    presigned = create_presigned_put("bucket", "k", sha256=digest, content_type="application/pdf", client=FakeS3())
+
+    assert presigned["method"] == "PUT"
+    assert presigned["headers"]["x-amz-checksum-sha256"] == base64.b64encode(hashlib.sha256(b"scan").digest()).decode()
+    assert presigned["headers"]["Content-Type"] == "application/pdf"
@@ -0,0 +1,118 @@
+"""
+Unit tests for the OpenAI credential cache, Redis rate limits and the usage ledger.
+"""
+
+from unittest.mock import Mock
+
+import pytest
+
+from lib.services import openai_security
+from lib.services.openai_security import (CredentialCache,
+                                          OpenAISecurityService, UsageLedger)
+
+pytestmark = pytest.mark.unit
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+        return int(self.data[key])
+
+    def expire(self, key, seconds):
+        return True
+
+    def setex(self, key, seconds, value):
+        self.data[key] = value
+
+    def pipeline(self):
+        redis, calls = self, []
+
+        class Pipeline:
+            def __getattr__(self, name):
+                return lambda *args: calls.append((name, args))
+
+            def execute(self):
+                return [getattr(redis, name)(*args) for name, args in calls]
+
+        return Pipeline()
+
+
+def make_service(redis, **kwargs):
+    service = OpenAISecurityService(redis=redis, usage_ledger=Mock(), **kwargs)
+    service._load_api_key = Mock(return_value="sk-test")
+    service.validate_api_key = Mock(return_value=(True, ""))
+    return service
+
+
+def test_cached_key_skips_database_and_validation():
+    service = make_service(FakeRedis())
+
+    assert service.get_user_api_key_with_validation("user:1") == ("sk-test", "")
+    assert service.get_user_api_key_with_validation("user:1") == ("sk-test", "")
+
+    service._load_api_key.assert_called_once_with("user:1")
+    service.validate_api_key.assert_called_once_with("sk-test")
+
+
+def test_invalidation_reaches_other_workers():
+    redis = FakeRedis()
+    worker_a, worker_b = make_service(redis), make_service(redis)
+    worker_a.get_user_api_key_with_validation("user:1")
+    worker_b.get_user_api_key_with_validation("user:1")
+
+    worker_a.invalidate_user("user:1")
+    worker_b._load_api_key.return_value = "sk-new"
+
+    assert worker_b.get_user_api_key_with_validation("user:1") == ("sk-new", "")
+    assert worker_b._load_api_key.call_count == 2
+    assert "sk-test" not in redis.data.values() and "sk-new" not in redis.data.values()
+
+
+def test_rate_limit_is_shared_through_redis():
+    redis = FakeRedis()
+    worker_a, worker_b = make_service(redis), make_service(redis)
+    worker_a.max_requests_per_hour = worker_b.max_requests_per_hour = 2
+
+    assert worker_a.check_rate_limit("user:1") == (True, "")
+    assert worker_b.check_rate_limit("user:1") == (True, "")
+    assert worker_a.check_rate_limit("user:1")[0] is False
+    assert worker_b.get_usage_stats("user:1")["requests_this_hour"] == 3
+
+
+def test_credential_cache_expires_and_evicts(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(openai_security.time, "monotonic", lambda: clock[0])
+    cache = CredentialCache(ttl_seconds=10, max_entries=2)
+    cache.put("a", "sk-a", "0")
+    cache.put("b", "sk-b", "0")
+    cache.put("c", "sk-c", "0")
+
+    assert cache.get("a", "0") is None and cache.get("b", "0") == "sk-b"
+    assert cache.get("b", "1") is None
+    clock[0] = 11
+    assert cache.get("c", None) is None
+
+
+def test_usage_ledger_writes_batches_and_requeues_on_failure(monkeypatch):
+    db = Mock()
+    monkeypatch.setattr(openai_security, "DbController", Mock(return_value=db))
+    ledger = UsageLedger(batch_size=100, flush_seconds=60)
+    ledger._ensure_thread = Mock()
+
+    ledger.record("user:1", "gpt-4.1-nano", 10)
+    ledger.record("user:2", "gpt-4.1-nano", 20)
+    db.query.side_effect = RuntimeError("down")
+    assert ledger.flush() == 0
+
+    db.query.side_effect = None
+    assert ledger.flush() == 2
+    statement, params = db.query.call_args.args
+    assert statement == "INSERT INTO llm_usage $rows"
+    assert [row["tokens_used"] for row in params["rows"]] == [10, 20]
+    assert ledger.flush() == 0
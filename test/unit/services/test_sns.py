@@ -0,0 +1,100 @@
+"""
+Unit tests for SNS message signature verification and the Textract notification endpoint.
+"""
+
+import base64
+import datetime
+import json
+from unittest.mock import Mock
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+from flask import Flask
+
+from lib.routes import uploads
+from lib.services import sns
+from lib.services.sns import string_to_sign, verify_sns_message
+
+pytestmark = pytest.mark.unit
+
+TOPIC_ARN = "arn:aws:sns:us-east-1:123456789012:textract"
+CERT_URL = "https://sns.us-east-1.amazonaws.com/SimpleNotificationService-abc.pem"
+
+
+@pytest.fixture(scope="module")
+def signing_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "sns.amazonaws.com")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(1).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    return key, cert.public_bytes(serialization.Encoding.PEM)
+
+
+@pytest.fixture
+def cert_fetch(monkeypatch, signing_key):
+    fetch = Mock(return_value=Mock(content=signing_key[1], raise_for_status=Mock()))
+    monkeypatch.setattr(sns.requests, "get", fetch)
+    monkeypatch.setattr(sns, "_certificates", {})
+    return fetch
+
+
+def signed(signing_key, version="2", **fields):
+    message = {"TopicArn": TOPIC_ARN, "MessageId": "m-1", "Timestamp": "2024-03-04T09:00:00.000Z",
+               "SignatureVersion": version, "SigningCertURL": CERT_URL, **fields}
+    algorithm = hashes.SHA256() if version == "2" else hashes.SHA1()
+    signature = signing_key[0].sign(string_to_sign(message), padding.PKCS1v15(), algorithm)
+    message["Signature"] = base64.b64encode(signature).decode()
+    return message
+
+
+def notification(signing_key, version="2"):
+    return signed(signing_key, version, Type="Notification",
+                  Message=json.dumps({"JobId": "job-1", "JobTag": "upload:1", "Status": "SUCCEEDED"}))
+
+
+@pytest.mark.parametrize("version", ["1", "2"])
+def test_signed_messages_verify_and_the_certificate_is_fetched_once(signing_key, cert_fetch, version):
+    assert verify_sns_message(notification(signing_key, version))
+    assert verify_sns_message(signed(signing_key, version, Type="SubscriptionConfirmation", Message="confirm",
+                                     SubscribeURL="https://sns.us-east-1.amazonaws.com/?Action=Confirm",
+                                     Token="t"))
+    cert_fetch.assert_called_once_with(CERT_URL, timeout=10)
+
+
+def test_tampered_messages_are_rejected(signing_key, cert_fetch):
+    message = notification(signing_key)
+    message["Message"] = json.dumps({"JobId": "job-2", "JobTag": "upload:2"})
+
+    assert not verify_sns_message(message)
+    assert not verify_sns_message({**notification(signing_key), "Signature": "not base64!"})
+
+
+@pytest.mark.parametrize("cert_url", [
+    "http://sns.us-east-1.amazonaws.com/cert.pem",
+    "https://sns.us-east-1.amazonaws.com.attacker.example/cert.pem",
+    "https://attacker.s3.amazonaws.com/cert.pem",
+    "https://sns.us-east-1.amazonaws.com/cert.txt",
+])
+def test_certificates_from_other_hosts_are_not_fetched(signing_key, cert_fetch, cert_url):
+    assert not verify_sns_message({**notification(signing_key), "SigningCertURL": cert_url})
+    cert_fetch.assert_not_called()
+
+
+def test_notification_route_only_enqueues_verified_messages(signing_key, cert_fetch, monkeypatch):
+    enqueue = Mock()
+    monkeypatch.setattr(uploads, "TEXTRACT_SNS_TOPIC_ARN", TOPIC_ARN)
+    monkeypatch.setattr(uploads.collect_textract_result_task, "apply_async", enqueue)
+    app = Flask(__name__)
+    app.register_blueprint(uploads.uploads_bp)
+    client = app.test_client()
+    forged = {**notification(signing_key), "Signature": notification(signing_key, "1")["Signature"]}
+
+    assert client.post("/api/uploads/textract-notifications", json=forged).status_code == 403
+    enqueue.assert_not_called()
+    assert client.post("/api/uploads/textract-notifications", json=notification(signing_key)).status_code == 200
+    enqueue.assert_called_once_with(args=["upload:1", "job-1"])
@@ -0,0 +1,203 @@
+"""
+Unit tests for the SSE gateway: replay from Last-Event-ID, live fan-out, heartbeats and slow-client dropping.
+
+Redis is replaced by an in-memory fake; the gateway is driven through its ASGI interface.
+"""
+
+import asyncio
+
+import pytest
+
+from lib.services.notifications import (decode_live_message,
+                                        encode_live_message, parse_stream_id,
+                                        replay_start_id)
+from lib.services.sse_gateway import EventHub, SSEGateway
+
+pytestmark = pytest.mark.unit
+
+
+def stream_range(entries, start, count):
+    first = (0, 0) if start == "-" else parse_stream_id(start)
+    return [(i, {"data": d}) for i, d in entries if parse_stream_id(i) >= first][:count]
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def psubscribe(self, pattern):
+        self.redis.subscriptions.append(pattern)
+
+    async def listen(self):
+        while True:
+            channel, data = await self.redis.published.get()
+            yield {"type": "pmessage", "pattern": "user:*", "channel": channel, "data": data}
+
+    async def aclose(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self, entries=()):
+        self.entries = list(entries)
+        self.subscriptions = []
+        self.published = asyncio.Queue()
+
+    async def xrange(self, key, min, max, count):
+        return stream_range(self.entries, min, count)
+
+    def pubsub(self, **kwargs):
+        return FakePubSub(self)
+
+
+async def run_stream(gateway, query=b"user_id=u1", headers=(), until=None, timeout=2.0):
+    """Run one request until ``until(body)`` holds, then disconnect; returns (status, body)."""
+    sent = []
+    gone = asyncio.Event()
+
+    async def receive():
+        await gone.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "path": "/api/events/stream", "method": "GET",
+             "query_string": query, "headers": list(headers)}
+    task = asyncio.ensure_future(gateway(scope, receive, send))
+
+    def body():
+        return b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body").decode()
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while until is not None and not until(body()) and loop.time() < deadline and not task.done():
+        await asyncio.sleep(0.01)
+    gone.set()
+    await asyncio.wait_for(task, timeout)
+    return sent[0]["status"], body()
+
+
+def test_live_message_encoding():
+    assert decode_live_message(encode_live_message("5-1", '{"a": 1}')) == ("5-1", '{"a": 1}')
+    assert decode_live_message('{"a": "b c"}') == (None, '{"a": "b c"}')
+    assert replay_start_id("17-4") == "17-5"
+    assert replay_start_id(None, "2.5") == "2501-0"
+    assert replay_start_id(None, None) == "-"
+    assert replay_start_id(None, "") == "-"
+    assert replay_start_id("not-an-id") is None
+
+
+def test_requires_a_user():
+    status, body = asyncio.run(run_stream(SSEGateway(None, hub=EventHub(FakeRedis)), query=b""))
+    assert status == 401 and body == "Unauthorized"
+
+
+def test_replays_after_last_event_id_then_streams_live():
+    async def scenario():
+        redis = FakeRedis([("1-0", '{"n": 1}'), ("2-0", '{"n": 2}'), ("3-0", '{"n": 3}')])
+        gateway = SSEGateway(None, hub=EventHub(lambda: redis))
+
+        async def publish():
+            while not redis.subscriptions:
+                await asyncio.sleep(0.01)
+            # 3-0 was already replayed and must not be sent twice.
+            await redis.published.put(("user:u1", encode_live_message("3-0", '{"n": 3}')))
+            await redis.published.put(("user:someone-else", encode_live_message("4-0", '{"n": 0}')))
+            await redis.published.put(("user:u1", encode_live_message("4-1", '{"n": 4}')))
+
+        publisher = asyncio.ensure_future(publish())
+        result = await run_stream(gateway, headers=[(b"last-event-id", b"1-0")], until=lambda b: '"n": 4' in b)
+        await publisher
+        return result, gateway.hub.client_count
+
+    (status, body), remaining = asyncio.run(scenario())
+    assert status == 200
+    assert body == 'id: 2-0\ndata: {"n": 2}\n\nid: 3-0\ndata: {"n": 3}\n\nid: 4-1\ndata: {"n": 4}\n\n'
+    assert remaining == 0
+
+
+def test_idle_streams_get_heartbeats():
+    gateway = SSEGateway(None, hub=EventHub(FakeRedis), heartbeat_seconds=0.02)
+    status, body = asyncio.run(run_stream(gateway, until=lambda b: b.count(": ping") >= 2))
+    assert status == 200 and body.startswith(": ping\n\n")
+
+
+def test_clients_share_one_subscription_and_slow_ones_are_dropped():
+    async def scenario():
+        redis = FakeRedis()
+        hub = EventHub(lambda: redis, buffer_size=2)
+        fast, slow = hub.subscribe("u1"), hub.subscribe("u1")
+        other = hub.subscribe("u2")
+        await asyncio.sleep(0)
+        for i in range(3):
+            hub.dispatch("user:u1", encode_live_message(f"{i}-0", "{}"))
+            if i < 2:
+                fast.queue.get_nowait()
+        return redis.subscriptions, fast, slow, other
+
+    subscriptions, fast, slow, other = asyncio.run(scenario())
+    assert subscriptions == ["user:*"]
+    assert not fast.dropped and fast.queue.qsize() == 1
+    assert slow.dropped and slow.queue.qsize() == 2
+    assert other.queue.empty()
+
+
+# The browser client connects with fetch: ?user_id= on the first connection, plus ?last_event_id= on reconnects.
+BUFFERED = [("1-0", '{"n": 1}'), ("2-0", '{"n": 2}'), ("3-0", '{"n": 3}')]
+
+
+def frame_ids(body):
+    return [line[4:] for line in body.splitlines() if line.startswith("id: ")]
+
+
+def test_gateway_replays_the_buffer_then_resumes_after_the_last_id_seen():
+    gateway = SSEGateway(None, hub=EventHub(lambda: FakeRedis(BUFFERED)), heartbeat_seconds=0.02)
+
+    _, first = asyncio.run(run_stream(gateway, query=b"user_id=u1", until=lambda b: ": ping" in b))
+    _, resumed = asyncio.run(run_stream(gateway, query=f"user_id=u1&last_event_id={frame_ids(first)[1]}".encode(),
+                                        until=lambda b: ": ping" in b))
+
+    assert frame_ids(first) == ["1-0", "2-0", "3-0"]
+    assert frame_ids(resumed) == ["3-0"]
+
+
+class SyncPubSub:
+    def subscribe(self, channel):
+        pass
+
+    def get_message(self, ignore_subscribe_messages, timeout):
+        return None
+
+    def close(self):
+        pass
+
+
+class SyncRedis:
+    def pubsub(self):
+        return SyncPubSub()
+
+    def xrange(self, key, min, max, count):
+        return stream_range(BUFFERED, min, count)
+
+
+def test_flask_route_replays_the_buffer_then_resumes_after_the_last_id_seen(monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, "get_redis_connection", SyncRedis)
+    client = app_module.app.test_client()
+
+    def read_until_heartbeat(url):
+        response = client.get(url, buffered=False)
+        body = ""
+        for chunk in response.response:
+            body += chunk.decode() if isinstance(chunk, bytes) else chunk
+            if ": ping" in body:
+                break
+        response.close()
+        return body
+
+    first = read_until_heartbeat("/api/events/stream?user_id=u1")
+    resumed = read_until_heartbeat(f"/api/events/stream?user_id=u1&last_event_id={frame_ids(first)[1]}")
+
+    assert frame_ids(first) == ["1-0", "2-0", "3-0"]
+    assert frame_ids(resumed) == ["3-0"]
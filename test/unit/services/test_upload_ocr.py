@@ -0,0 +1,149 @@
+"""
+Unit tests for the non-blocking Textract flow in the upload service.
+
+Uses LocalTextractStub in place of AWS and patches out database access.
+"""
+
+from unittest.mock import Mock
+
+import pytest
+
+from lib.models.upload import UploadStatus
+from lib.services import upload_service
+from lib.services.ocr import LocalTextractStub, OCRService
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def stub():
+    return LocalTextractStub(
+        documents={"uploads/u/report.pdf": [f"line {i}" for i in range(7)]},
+        polls_until_done=2,
+        page_size=3,
+        failing_keys=("uploads/u/broken.pdf",),
+    )
+
+
+@pytest.fixture
+def flow(monkeypatch, stub):
+    """Wire the upload service to the stub and record status updates, cache writes and scheduled polls."""
+    statuses = []
+    cache = {}
+    scheduled = []
+    uploads = {}
+
+    def update_upload_status(upload_id, status, processed_text="", task_id="", extra=None):
+        statuses.append((status, processed_text, extra))
+        uploads.setdefault(upload_id, {}).update(status=status.value, **(extra or {}))
+        return True
+
+    monkeypatch.setattr(upload_service, "OCRService", lambda: OCRService(bucket_name="bucket", client=stub))
+    monkeypatch.setattr(upload_service, "update_upload_status", update_upload_status)
+    monkeypatch.setattr(upload_service, "get_upload_by_id", uploads.get)
+    monkeypatch.setattr(upload_service, "get_cached_ocr_text", lambda key: cache.get(key))
+    monkeypatch.setattr(upload_service, "cache_ocr_text",
+                        lambda key, text, block_count=0: cache.__setitem__(key, text))
+    monkeypatch.setattr(upload_service.poll_textract_job_task, "apply_async",
+                        Mock(side_effect=lambda args, countdown: scheduled.append(args)))
+    return statuses, cache, scheduled
+
+
+def test_get_all_blocks_follows_next_token(stub):
+    service = OCRService(bucket_name="bucket", client=stub)
+    job_id = service.start_pdf_text_detection("uploads/u/report.pdf")
+    stub.polls_until_done = 1
+
+    blocks = service.get_all_blocks(job_id)
+
+    assert [b["Text"] for b in blocks if b["BlockType"] == "LINE"] == [f"line {i}" for i in range(7)]
+    assert stub.calls.count("get_document_text_detection") == 3
+
+
+def test_pdf_submits_and_reschedules_until_done(flow, stub):
+    statuses, cache, scheduled = flow
+
+    upload_service.process_upload_task("up1", "pdf", "uploads/u/report.pdf", content_hash="abc")
+
+    assert stub.calls == ["start_document_text_detection"]
+    assert statuses[-1][0] == UploadStatus.PROCESSING
+    assert statuses[-1][2]["content_hash"] == "abc"
+    job_id = statuses[-1][2]["textract_job_id"]
+    assert scheduled == [["up1", job_id, "abc", 1]]
+
+    # First poll: still running, so the task reschedules itself instead of sleeping.
+    upload_service.poll_textract_job_task(*scheduled[-1])
+    assert scheduled[-1] == ["up1", job_id, "abc", 2]
+
+    upload_service.poll_textract_job_task(*scheduled[-1])
+    status, text, _ = statuses[-1]
+    assert status == UploadStatus.COMPLETED
+    assert text.splitlines() == [f"line {i}" for i in range(7)]
+    assert cache["abc"] == text
+
+
+def test_cached_document_skips_textract(flow, stub):
+    statuses, cache, scheduled = flow
+    cache["abc"] = "cached text"
+
+    upload_service.process_upload_task("up2", "pdf", "uploads/u/report.pdf", content_hash="abc")
+
+    assert stub.calls == []
+    assert scheduled == []
+    assert statuses[-1][:2] == (UploadStatus.COMPLETED, "cached text")
+
+
+def test_failed_job_marks_upload_failed(flow, stub):
+    statuses, _, scheduled = flow
+    stub.polls_until_done = 1
+
+    upload_service.process_upload_task("up3", "pdf", "uploads/u/broken.pdf", content_hash="def")
+    upload_service.poll_textract_job_task(*scheduled[-1])
+
+    status, text, _ = statuses[-1]
+    assert status == UploadStatus.FAILED
+    assert "Stub failure" in text
+
+
+def test_poll_gives_up_after_max_attempts(flow, stub, monkeypatch):
+    statuses, _, scheduled = flow
+    stub.polls_until_done = 10 ** 6
+    monkeypatch.setattr(upload_service, "OCR_MAX_POLLS", 2)
+
+    upload_service.process_upload_task("up4", "pdf", "uploads/u/report.pdf", content_hash="ghi")
+    upload_service.poll_textract_job_task(*scheduled[-1])
+    upload_service.poll_textract_job_task(*scheduled[-1])
+
+    assert statuses[-1][0] == UploadStatus.FAILED
+    assert len(scheduled) == 2
+
+
+def test_sns_jobs_get_a_late_fallback_poll(flow, stub, monkeypatch):
+    statuses, _, scheduled = flow
+    stub.polls_until_done = 1
+    monkeypatch.setattr(OCRService, "notifications_enabled", property(lambda self: True))
+
+    upload_service.process_upload_task("up5", "pdf", "uploads/u/report.pdf", content_hash="jkl")
+
+    job_id = statuses[-1][2]["textract_job_id"]
+    assert scheduled == [["up5", job_id, "jkl", 1]]
+    countdown = upload_service.poll_textract_job_task.apply_async.call_args.kwargs["countdown"]
+    assert countdown == upload_service.OCR_NOTIFICATION_FALLBACK > upload_service.OCR_POLL_INTERVAL
+
+    # The notification arrives first; the fallback poll then finds the upload completed and leaves it alone.
+    upload_service.collect_textract_result_task("up5", job_id)
+    assert statuses[-1][0] == UploadStatus.COMPLETED
+    calls, updates = len(stub.calls), len(statuses)
+    upload_service.poll_textract_job_task(*scheduled[-1])
+    assert (len(stub.calls), len(statuses)) == (calls, updates)
+
+
+def test_fallback_poll_completes_a_job_whose_notification_was_lost(flow, stub, monkeypatch):
+    statuses, _, scheduled = flow
+    stub.polls_until_done = 1
+    monkeypatch.setattr(OCRService, "notifications_enabled", property(lambda self: True))
+
+    upload_service.process_upload_task("up6", "pdf", "uploads/u/report.pdf", content_hash="mno")
+    upload_service.poll_textract_job_task(*scheduled[-1])
+
+    assert statuses[-1][0] == UploadStatus.COMPLETED
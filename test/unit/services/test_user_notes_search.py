@@ -0,0 +1,83 @@
+"""
+Unit tests for indexed user note search.
+"""
+
+from unittest.mock import Mock
+
+import pytest
+
+from lib.models.user.user_notes import UserNote
+from lib.services.user_notes_service import (UserNotesService,
+                                             build_note_search_query)
+
+pytestmark = pytest.mark.unit
+
+
+def note_row(i, **extra):
+    return {"id": f"UserNote:{i}", "user_id": "User:1", "title": f"Note {i}", "content": "Diabetes follow-up",
+            "note_type": "private", "tags": ["diabetes"], **extra}
+
+
+def test_word_search_uses_ranked_indexes_and_pagination():
+    statement, params = build_note_search_query("User:1", "diabetes", page=3, page_size=10)
+
+    assert "(title @0@ $query OR content @1@ $query OR tags CONTAINS $query)" in statement
+    assert "title CONTAINS" not in statement and "content CONTAINS" not in statement
+    assert "ORDER BY score DESC, date_updated DESC LIMIT $limit START $start" in statement
+    assert params["limit"] == 11 and params["start"] == 20
+    assert "(user_id = $user_id OR note_type = 'shared')" in statement
+
+
+def test_word_search_finds_notes_by_tag():
+    db = Mock()
+    notes = [note_row(1, title="Visit", content="Routine check", tags=["cardiology"]), note_row(2)]
+
+    def query(statement, params):
+        assert "tags CONTAINS $query" in statement
+        return [dict(row, score=0) for row in notes if params["query"] in row["tags"]]
+    db.query.side_effect = query
+
+    page = UserNotesService(db_controller=db).search_notes_page("User:1", "cardiology")
+
+    assert [n.id for n in page["notes"]] == ["UserNote:1"]
+
+
+def test_prefix_tags_and_private_only():
+    statement, params = build_note_search_query("User:1", "diab", include_shared=False, tags=["a", "b"],
+                                                prefix=True, page_size=1000)
+
+    assert "search_prefix @0@ $query" in statement and "tags CONTAINSALL $tags" in statement
+    assert "note_type = 'shared'" not in statement
+    assert params["tags"] == ["a", "b"] and params["limit"] == 101
+
+    statement, params = build_note_search_query("User:1", "", tags=["a"])
+    assert "@" not in statement and "ORDER BY date_updated DESC" in statement and "query" not in params
+
+
+def test_search_page_reports_has_more_and_scores():
+    db = Mock()
+    db.query.return_value = [note_row(i, score=10 - i, highlight=f"<b>Diabetes</b> {i}") for i in range(3)]
+    service = UserNotesService(db_controller=db)
+
+    page = service.search_notes_page("User:1", "diabetes", page_size=2)
+
+    assert [n.id for n in page["notes"]] == ["UserNote:0", "UserNote:1"]
+    assert page["scores"] == [10, 9] and page["has_more"] is True
+    assert service.search_notes("User:1", "", tags=None) == []
+    assert db.query.call_count == 1
+
+
+def test_writes_keep_typeahead_field_in_step():
+    assert UserNote("User:1", "Diabetes plan", "...", tags=["endo"]).to_dict()["search_prefix"] == "Diabetes plan endo"
+
+    db = Mock()
+    service = UserNotesService(db_controller=db)
+    service.get_note_by_id = Mock(return_value=UserNote("User:1", "Old", "...", tags=["endo"], id="UserNote:1"))
+    db.query.return_value = [note_row(1)]
+
+    service.update_note("UserNote:1", "User:1", title="New title")
+    statement, params = db.query.call_args.args
+    assert params["search_prefix"] == "New title endo" and "search_prefix = $search_prefix" in statement
+
+    service.update_note("UserNote:1", "User:1", content="Only the body changed")
+    assert "search_prefix" not in db.query.call_args.args[1]
@@ -0,0 +1,94 @@
+"""
+Unit tests for the in-process user typeahead index.
+"""
+
+import random
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from lib.services import user_search
+from lib.services.user_search import UserSearchIndex, search_text
+
+pytestmark = pytest.mark.unit
+
+FIRST = ["Ada", "Alan", "Grace", "Linus", "Margaret", "Barbara", "Edsger", "Donald", "Frances", "John"]
+LAST = ["Lovelace", "Turing", "Hopper", "Torvalds", "Hamilton", "Liskov", "Dijkstra", "Knuth", "Allen", "Smith"]
+
+
+def user(i, first, last, active=True):
+    return {"id": f"User:{i}", "username": f"{first[0]}{last}{i}".lower(), "email": f"{first}.{last}@example.org".lower(),
+            "first_name": first, "last_name": last, "role": "provider", "is_active": active}
+
+
+def random_users(n, seed=0):
+    rng = random.Random(seed)
+    return [user(i, rng.choice(FIRST), rng.choice(LAST), active=rng.random() > 0.1) for i in range(n)]
+
+
+def brute_force(records, query, exclude_id=None):
+    return {f"User:{r['id'].split(':')[1]}" for r in records
+            if r["is_active"] and r["id"] != exclude_id and query.lower() in search_text(r)}
+
+
+def test_matches_agree_with_substring_scan():
+    records = random_users(2000)
+    index = UserSearchIndex(records)
+    for query in ["ada", "Hop", "ovel", "grace hopper", "@example", "lknuth1", "ing", "zzz", "dijkstra1"]:
+        found = index.search(query, limit=10_000, exclude_id="User:3")
+        ids = {u["id"] for u in found}
+        assert len(ids) == len(found)
+        # Everything a substring scan finds is found, and multi-word queries may also match words in any order.
+        assert brute_force(records, query, "User:3") <= ids
+        assert all(r["is_active"] for r in records if r["id"] in ids)
+        assert "User:3" not in ids
+
+
+def test_prefix_matches_rank_first_and_limit_applies():
+    index = UserSearchIndex([user(1, "Ada", "Lovelace"), user(2, "Grace", "Hopper"), user(3, "Bob", "Kadar")])
+    assert [u["id"] for u in index.search("ada")] == ["User:1", "User:3"]
+    assert [u["id"] for u in index.search("ada", limit=1)] == ["User:1"]
+    assert [u["display_name"] for u in index.search("")] == ["Ada Lovelace", "Bob Kadar", "Grace Hopper"]
+    assert index.search("lovelace ada")[0]["id"] == "User:1"
+
+
+def test_changes_are_applied_to_the_live_index():
+    index = UserSearchIndex([user(1, "Ada", "Lovelace"), user(2, "Grace", "Hopper")])
+    index.upsert(user(1, "Ada", "Byron"))
+    index.upsert(user(4, "Alan", "Turing"))
+    index.upsert({"id": "User:2", "is_active": False})
+
+    assert [u["last_name"] for u in index.search("ada")] == ["Byron"]
+    assert index.search("lovelace") == [] and index.search("grace") == []
+    assert [u["id"] for u in index.search("turi")] == ["User:4"]
+    assert len(index) == 2
+
+
+def test_index_is_loaded_once_and_reloaded_after_invalidation(monkeypatch):
+    monkeypatch.setattr(user_search, "_index", None)
+    db = Mock()
+    db.query.return_value = [{"result": [user(1, "Ada", "Lovelace")]}]
+
+    assert user_search.search_users("ada", db=db)[0]["id"] == "User:1"
+    user_search.search_users("ada", db=db)
+    assert db.query.call_count == 1
+    assert "WHERE is_active = true" in db.query.call_args.args[0]
+
+    user_search.user_changed(user(2, "Ada", "Yonath"))
+    assert len(user_search.search_users("ada", db=db)) == 2
+
+    user_search.invalidate_user_search_index()
+    user_search.search_users("ada", db=db)
+    assert db.query.call_count == 2
+
+
+def test_typeahead_latency_at_100k_users():
+    index = UserSearchIndex(random_users(100_000))
+    queries = ["a", "al", "gr", "hop", "ovel", "grace h", "@exa", "zzz", "smith9"]
+    started = time.perf_counter()
+    for _ in range(10):
+        for query in queries:
+            index.search(query)
+    per_query_ms = (time.perf_counter() - started) * 1000 / (10 * len(queries))
+    assert per_query_ms < 10
@@ -0,0 +1,72 @@
+"""
+Unit tests for chunked transcription in the video transcription service.
+"""
+
+import sys
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from lib.services import video_transcription
+from lib.services.audio_chunking import AudioChunk
+
+pytestmark = pytest.mark.unit
+
+
+class FakeWhisperModel:
+    """Returns the chunk length as its transcript."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def transcribe(self, audio):
+        self.calls += 1
+        seconds = len(audio) / 16000
+        return {
+            "text": f" {seconds:g}s",
+            "segments": [{"start": 0.0, "end": seconds, "text": f" {seconds:g}s"}],
+        }
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    model = FakeWhisperModel()
+    monkeypatch.setattr(video_transcription, "_models", {video_transcription.WHISPER_MODEL: model})
+    monkeypatch.setattr(video_transcription, "WHISPER_WORKERS", 1)
+    return model
+
+
+def test_model_loaded_once_per_process(monkeypatch):
+    model = FakeWhisperModel()
+    load_model = Mock(return_value=model)
+    monkeypatch.setitem(sys.modules, "whisper", SimpleNamespace(load_model=load_model))
+    monkeypatch.setattr(video_transcription, "_models", {})
+
+    assert video_transcription.get_whisper_model() is model
+    assert video_transcription.get_whisper_model() is model
+    load_model.assert_called_once_with(video_transcription.WHISPER_MODEL)
+
+
+def test_transcribe_chunks_stitches_with_offsets(fake_model):
+    samples = np.zeros(16000 * 5, dtype=np.float32)
+    chunks = [AudioChunk(0, 0, 32000, 16000), AudioChunk(1, 32000, 80000, 16000)]
+    partials = []
+
+    text, segments = video_transcription.transcribe_chunks(samples, chunks, on_partial=partials.append)
+
+    assert text == "2s 3s"
+    assert [(s["start"], s["end"]) for s in segments] == [(0.0, 2.0), (2.0, 5.0)]
+    assert partials == ["2s", "2s 3s"]
+    assert fake_model.calls == 2
+
+
+def test_stitch_transcripts_orders_by_index():
+    text, segments = video_transcription.stitch_transcripts([
+        {"index": 1, "text": " world", "segments": [{"start": 1.0, "end": 2.0, "text": " world"}]},
+        {"index": 0, "text": "hello ", "segments": [{"start": 0.0, "end": 1.0, "text": "hello"}]},
+    ])
+
+    assert text == "hello world"
+    assert [s["start"] for s in segments] == [0.0, 1.0]